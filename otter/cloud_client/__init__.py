@@ -471,7 +471,10 @@ class CLBNotActiveError(Exception):
 class CLBRateLimitError(Exception):
     """
     Error to be raised when CLB returns 413 (rate limiting).
+
+    :ivar retry_after: When to retry, as per :func:`_retry_after`
     """
+    retry_after = None
 
 
 @attributes([Attribute('lb_id', instance_of=six.text_type)])
@@ -517,6 +520,9 @@ def _only_json_api_errors(f):
 
     If the decorated function cannot parse the error (either because it's not
     JSON or not recognized), reraise the error.
+
+    Rate limiting errors raised by the decorated function are told when to
+    retry with :func:`_retry_after`.
     """
     @wraps(f)
     def try_parsing(api_error_exc_info):
@@ -526,13 +532,38 @@ def _only_json_api_errors(f):
         except (ValueError, TypeError):
             pass
         else:
-            f(api_error.code, body)
+            try:
+                f(api_error.code, body)
+            except (CLBRateLimitError, NovaRateLimitError) as e:
+                e.retry_after = _retry_after(api_error.headers, body)
+                raise
 
         six.reraise(*api_error_exc_info)
 
     return catch(APIError, try_parsing)
 
 
+def _retry_after(headers, body):
+    """
+    Get when to retry a rate-limited request: the value of the
+    ``Retry-After`` header of the response, which is a number of seconds, or
+    else the ``retryAfter`` of its ``overLimit`` body, which is a timestamp.
+
+    :param headers: Response headers, as ``Headers`` or a dict
+    :param dict body: JSON response body
+    :return: ``str`` or None
+    """
+    if hasattr(headers, 'getRawHeaders'):
+        values = headers.getRawHeaders('retry-after') or [None]
+        value = values[0]
+    else:
+        value = {name.lower(): value
+                 for name, value in (headers or {}).items()}.get('retry-after')
+    if value is None:
+        value = get_in(('overLimit', 'retryAfter'), body, None)
+    return value
+
+
 def add_clb_nodes(lb_id, nodes):
     """
     Generate effect to add one or more nodes to a load balancer.
@@ -805,7 +836,10 @@ class ServerMetadataOverLimitError(Exception):
 class NovaRateLimitError(ExceptionWithMessage):
     """
     Exception to be raised when Nova has rate-limited requests.
+
+    :ivar retry_after: When to retry, as per :func:`_retry_after`
     """
+    retry_after = None
 
 
 class NovaComputeFaultError(ExceptionWithMessage):
@@ -65,7 +65,7 @@ from otter.supervisor import (
 from otter.supervisor import (
     remove_server_from_group as worker_remove_server_from_group)
 from otter.util.config import config_value
-from otter.util.deferredutils import unwrap_first_error
+from otter.util.deferredutils import unwrap_first_error, wait
 from otter.util.fp import assoc_obj
 from otter.util.retry import (
     exponential_backoff_interval,
@@ -303,6 +303,18 @@ def empty_group(log, trans_id, group):
     return d
 
 
+def _is_retryable(group, modifier):
+    """
+    Can ``modifier`` be called again if the state it returned could not be
+    written? Executing a policy or obeying a config change only computes the
+    new desired capacity for convergence tenants, but launches or deletes
+    servers for others.
+    """
+    func = getattr(modifier, 'func', modifier)
+    return (func in (maybe_execute_scaling_policy, obey_config_change) and
+            tenant_is_enabled(group.tenant_id, config_value))
+
+
 @defer.inlineCallbacks
 def modify_and_trigger(dispatcher, group, logargs, modifier, *args, **kwargs):
     """
@@ -314,6 +326,8 @@ def modify_and_trigger(dispatcher, group, logargs, modifier, *args, **kwargs):
 
     :return: Deferred with None
     """
+    if _is_retryable(group, modifier):
+        kwargs['modify_state_retryable'] = True
     cannot_exec_pol_err = None
     try:
         yield group.modify_state(modifier, *args, **kwargs)
@@ -328,6 +342,44 @@ def modify_and_trigger(dispatcher, group, logargs, modifier, *args, **kwargs):
         raise cannot_exec_pol_err
 
 
+@wait(ignore_kwargs=['dispatcher', 'group', 'logargs', 'modifier',
+                     'modify_state_reason'])
+def _joined_modify_and_trigger(key, **kwargs):
+    """
+    Call :func:`modify_and_trigger` with ``kwargs``, or wait for the result
+    of the call with the same ``key`` that has not completed yet.
+    """
+    return modify_and_trigger(**kwargs)
+
+
+def coalesced_modify_and_trigger(key, **kwargs):
+    """
+    Call :func:`modify_and_trigger` with ``kwargs`` to execute a policy.
+
+    If the policy has a cooldown, the call is coalesced with the execution
+    of the same policy that has not completed yet, if any, whose result it
+    gets instead: the policy cannot be executed again before its cooldown
+    anyway. Requests executing such a policy while an earlier execution is
+    waiting for the group's lock or running then join it rather than taking
+    the lock and reading and writing the group's state once more each.
+    Executions of a policy without cooldown are never coalesced, so that
+    each of them applies its change.
+
+    :param tuple key: ``(tenant_id, group_id, policy_id)`` of the policy
+    :param kwargs: Arguments of :func:`modify_and_trigger` given as keyword
+        arguments
+
+    :return: Deferred with None
+    """
+    def execute(policy):
+        if policy['cooldown'] > 0:
+            return _joined_modify_and_trigger(key, **kwargs)
+        return modify_and_trigger(**kwargs)
+
+    d = kwargs['group'].get_policy(key[2], cached=True)
+    return d.addCallback(execute)
+
+
 def converge(log, transaction_id, config, scaling_group, state, launch_config,
              policy, config_value=config_value):
     """
@@ -423,12 +475,12 @@ def maybe_execute_scaling_policy(
 
     # make sure that the policy (and the group) exists before doing
     # anything else
-    deferred = scaling_group.get_policy(policy_id, version)
+    deferred = scaling_group.get_policy(policy_id, version, cached=True)
 
     def _do_get_configs(policy):
         deferred = defer.gatherResults([
-            scaling_group.view_config(),
-            scaling_group.view_launch_config()
+            scaling_group.view_config(cached=True),
+            scaling_group.view_launch_config(cached=True)
         ])
         return deferred.addCallback(lambda results: results + [policy])
 
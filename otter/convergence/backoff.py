@@ -0,0 +1,129 @@
+"""
+Backoff of groups whose convergence iterations only wait.
+
+A group whose servers are building is converged every ``interval`` seconds
+until they are built, and every one of those iterations gathers all of the
+group's servers and load balancers only to plan :obj:`ConvergeLater`. When an
+iteration's result is :obj:`ConvergenceIterationStatus.Idle`, the group is
+recorded in a :obj:`ConvergenceBackoff` with :obj:`RecordConvergence`, and is
+not converged again until a delay that doubles with every consecutive idle
+iteration has passed, up to a jittered ceiling. A group whose divergent flag
+changes, e.g. because a policy was executed, is converged right away.
+"""
+
+import random
+
+import attr
+
+from effect import TypeDispatcher, sync_performer
+
+
+DEFAULT_MAX_BACKOFF = 300
+"""Default maximum number of seconds a group's convergence is delayed."""
+
+
+@attr.s
+class _Backoff(object):
+    idle = attr.ib()     # number of consecutive idle iterations
+    version = attr.ib()  # version of the divergent flag when last converged
+    until = attr.ib()    # time before which the group is not converged
+
+
+class ConvergenceBackoff(object):
+    """
+    Groups whose convergence is delayed because their last iterations were
+    idle.
+
+    After ``n`` consecutive idle iterations, a group is not converged for
+    ``interval * 2 ** n`` seconds, up to ``max_delay`` seconds. Every delay
+    is shortened by a random fraction of up to ``jitter`` so that groups that
+    started waiting together do not all converge together again.
+
+    :param clock: ``IReactorTime`` provider
+    :param float interval: Interval between convergence iterations of a group
+    :param float max_delay: Maximum delay of a group's convergence
+    :param float jitter: Maximum fraction by which delays are shortened
+    :param callable random: Returns a random float in [0, 1)
+    """
+
+    def __init__(self, clock, interval, max_delay=DEFAULT_MAX_BACKOFF,
+                 jitter=0.25, random=random.random):
+        self.clock = clock
+        self.interval = interval
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.random = random
+        self._groups = {}  # group_id -> _Backoff
+
+    def delay(self, idle):
+        """
+        Get the number of seconds to delay convergence of a group after
+        ``idle`` consecutive idle iterations.
+        """
+        delay = min(self.interval * 2 ** idle, self.max_delay)
+        return delay * (1 - self.jitter * self.random())
+
+    def record(self, group_id, version, idle):
+        """
+        Record the result of a convergence iteration of a group.
+
+        :param version: Version of the group's divergent flag the iteration
+            was started for
+        :param bool idle: Whether the iteration was idle. A group that is not
+            idle is forgotten.
+        """
+        if not idle:
+            self._groups.pop(group_id, None)
+            return
+        previous = self._groups.get(group_id)
+        count = 1 if previous is None else previous.idle + 1
+        self._groups[group_id] = _Backoff(
+            count, version, self.clock.seconds() + self.delay(count))
+
+    def backed_off(self):
+        """
+        Get the groups whose convergence is still delayed.
+
+        Groups whose delay ended long ago, and which therefore were not
+        converged here since, e.g. because they moved to another node, are
+        forgotten.
+
+        :return: dict of group ID to the version of its divergent flag when
+            it was last converged
+        """
+        now = self.clock.seconds()
+        self._groups = {group_id: backoff
+                        for group_id, backoff in self._groups.items()
+                        if now - backoff.until < self.max_delay}
+        return {group_id: backoff.version
+                for group_id, backoff in self._groups.items()
+                if now < backoff.until}
+
+
+@attr.s
+class RecordConvergence(object):
+    """
+    Intent to record the result of a group's convergence iteration in a
+    :obj:`ConvergenceBackoff`.
+    """
+    group_id = attr.ib()
+    version = attr.ib()
+    idle = attr.ib()
+
+
+@attr.s
+class GetBackedOff(object):
+    """
+    Intent to get the result of :func:`ConvergenceBackoff.backed_off`.
+    """
+
+
+def get_backoff_dispatcher(backoff):
+    """
+    Get dispatcher that performs :obj:`RecordConvergence` and
+    :obj:`GetBackedOff` with the given :obj:`ConvergenceBackoff`.
+    """
+    return TypeDispatcher({
+        RecordConvergence: sync_performer(
+            lambda d, i: backoff.record(i.group_id, i.version, i.idle)),
+        GetBackedOff: sync_performer(lambda d, i: backoff.backed_off())})
@@ -0,0 +1,210 @@
+"""
+Batching of CLB steps across the groups of a tenant that converge together.
+
+Groups of a tenant often share load balancers, and :func:`optimize_steps
+<otter.convergence.transforming.optimize_steps>` only merges the
+:obj:`AddNodesToCLB` and :obj:`RemoveNodesFromCLB` steps within one group's
+plan. Every group then changes the load balancer with its own request, and
+those requests wait on each other's "load balancer immutable" state.
+
+:func:`steps_to_effect <otter.convergence.effecting.steps_to_effect>`
+executes such steps with a :obj:`BatchedStep` intent, performed by the
+converger's :obj:`StepBatcher`. A step is executed right away unless another
+step of the tenant for the same load balancer is executing. Steps submitted
+meanwhile, within ``window`` seconds of each other, are merged into steps
+changing at most ``limit`` nodes. The result of a merged step that succeeds
+is the result of each of the steps it was merged from; when it does not,
+each of them is executed again on its own, so that a node of one group that
+cannot be changed does not fail the other groups.
+"""
+
+from functools import partial
+
+import attr
+
+from effect import Effect, TypeDispatcher
+
+from twisted.internet.defer import Deferred, maybeDeferred
+from twisted.python.failure import Failure
+
+from txeffect import deferred_performer, perform
+
+from otter.cloud_client import TenantScope
+from otter.convergence.model import StepResult
+from otter.convergence.steps import AddNodesToCLB, RemoveNodesFromCLB
+from otter.convergence.transforming import optimize_steps
+from otter.log.intents import with_log
+
+
+DEFAULT_BATCH_WINDOW = 1
+"""
+Default number of seconds steps wait for other steps to be merged with.
+"""
+
+CLB_BATCH_LIMIT = 10
+"""Maximum number of nodes changed by a merged CLB step."""
+
+_BATCHED_NODES = {
+    AddNodesToCLB: 'address_configs',
+    RemoveNodesFromCLB: 'node_ids',
+}
+"""Step types that are batched, and their attribute holding nodes."""
+
+
+def is_batched(step):
+    """Is the step executed with a :obj:`BatchedStep`?"""
+    return type(step) in _BATCHED_NODES
+
+
+def _num_nodes(step):
+    return len(getattr(step, _BATCHED_NODES[type(step)]))
+
+
+def _chunk_steps(pending, limit):
+    """
+    Split pending ``(step, ...)`` tuples into chunks whose steps change at
+    most ``limit`` nodes, except for a single step changing more than that,
+    which is not split.
+    """
+    chunks = []
+    chunk, num = [], 0
+    for entry in pending:
+        n = _num_nodes(entry[0])
+        if chunk and num + n > limit:
+            chunks.append(chunk)
+            chunk, num = [], 0
+        chunk.append(entry)
+        num += n
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+class StepBatcher(object):
+    """
+    Merges the CLB steps of a tenant for the same load balancer that are
+    submitted while one of them is executing, within ``window`` seconds of
+    the first of them.
+
+    :param clock: ``IReactorTime`` provider
+    :param float window: Number of seconds a step waits for other steps to be
+        merged with
+    :param int limit: Maximum number of nodes changed by a merged step
+    """
+
+    def __init__(self, clock, window=DEFAULT_BATCH_WINDOW,
+                 limit=CLB_BATCH_LIMIT):
+        self.clock = clock
+        self.window = window
+        self.limit = limit
+        # (tenant_id, step type, lb_id) -> [(step, Deferred, execute)]
+        self._pending = {}
+        # (tenant_id, step type, lb_id) -> number of steps executing
+        self._executing = {}
+
+    def submit(self, tenant_id, step, execute, execute_merged):
+        """
+        Submit a step to be executed merged with others.
+
+        :param step: :obj:`AddNodesToCLB` or :obj:`RemoveNodesFromCLB`
+        :param callable execute: Called with a step to execute it in the
+            context of the group that submitted it, returning a ``Deferred``
+            of its result
+        :param callable execute_merged: Called with a merged step to execute
+            it in the context of the tenant
+
+        :return: ``Deferred`` of the result of executing the step
+        """
+        key = (tenant_id, type(step), step.lb_id)
+        if key not in self._pending and not self._executing.get(key):
+            return self._execute(key, execute, step)
+        d = Deferred()
+        if key not in self._pending:
+            self._pending[key] = []
+            self.clock.callLater(self.window, self._flush, key,
+                                 execute_merged)
+        self._pending[key].append((step, d, execute))
+        return d
+
+    def _execute(self, key, execute, step):
+        """Execute ``step``, counting it as executing for ``key``."""
+        self._executing[key] = self._executing.get(key, 0) + 1
+
+        def done(result):
+            self._executing[key] -= 1
+            if not self._executing[key]:
+                del self._executing[key]
+            return result
+
+        return maybeDeferred(execute, step).addBoth(done)
+
+    def _flush(self, key, execute_merged):
+        """Execute the merged steps submitted for ``key``."""
+        pending = self._pending.pop(key)
+        for chunk in _chunk_steps(pending, self.limit):
+            if len(chunk) == 1:
+                [(step, d, execute)] = chunk
+                self._execute(key, execute, step).chainDeferred(d)
+                continue
+            [merged] = optimize_steps([step for step, _, _ in chunk])
+            self._execute(key, execute_merged, merged).addBoth(
+                self._fan_out, key, chunk)
+
+    def _fan_out(self, result, key, chunk):
+        """
+        Fire the deferreds of the steps in ``chunk`` with the ``result`` of
+        their merged step if it succeeded, or else execute each of the steps
+        again on its own.
+        """
+        if (not isinstance(result, Failure) and
+                result[0] == StepResult.SUCCESS):
+            for _, d, _ in chunk:
+                d.callback(result)
+        else:
+            for step, d, execute in chunk:
+                self._execute(key, execute, step).chainDeferred(d)
+
+
+@attr.s
+class BatchedStep(object):
+    """
+    Intent to execute a step of a tenant merged with others by a
+    :obj:`StepBatcher`.
+    """
+    tenant_id = attr.ib()
+    step = attr.ib()
+
+
+@deferred_performer
+def perform_batched_step(batcher, execute_step, tenant_dispatcher, dispatcher,
+                         intent):
+    """
+    Perform :obj:`BatchedStep` with ``batcher``. Steps are executed by
+    performing the effect returned by ``execute_step(tenant_id, step)``, with
+    the dispatcher of the intent when executed on their own and with
+    ``tenant_dispatcher``, in the scope of the tenant, when merged.
+    """
+    tenant_id = intent.tenant_id
+    return batcher.submit(
+        tenant_id, intent.step,
+        lambda step: perform(dispatcher, execute_step(tenant_id, step)),
+        lambda step: perform(
+            tenant_dispatcher,
+            with_log(Effect(TenantScope(execute_step(tenant_id, step),
+                                        tenant_id)),
+                     otter_service='converger', tenant_id=tenant_id)))
+
+
+def get_batch_dispatcher(batcher, execute_step, tenant_dispatcher):
+    """
+    Get dispatcher that performs :obj:`BatchedStep` with the given
+    :obj:`StepBatcher`.
+
+    :param callable execute_step: Called with tenant ID and step to get the
+        effect of executing the step
+    :param tenant_dispatcher: Dispatcher performing merged steps, which do
+        not belong to any one group's log context, in a :obj:`TenantScope`
+    """
+    return TypeDispatcher(
+        {BatchedStep: partial(perform_batched_step, batcher, execute_step,
+                              tenant_dispatcher)})
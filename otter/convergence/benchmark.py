@@ -0,0 +1,400 @@
+"""
+Micro-benchmarks for convergence planning.
+
+Synthetic groups of :obj:`NovaServer`, :obj:`CLBNode` and :obj:`RCv3Node` are
+generated in a number of sizes and :obj:`Destiny` mixes, and each stage of
+:func:`plan_launch_server` is timed against them along with the peak memory
+it used.  No external service is needed.
+
+Run with ``python -m otter.convergence.benchmark`` or ``make benchmark``.
+"""
+
+from __future__ import print_function
+
+import argparse
+import cPickle as pickle
+import gc
+import json
+import os
+import resource
+import sys
+import time
+
+import attr
+
+from pyrsistent import pmap, pset
+
+from otter.convergence.model import (
+    CLBDescription,
+    CLBNode,
+    DesiredServerGroupState,
+    EncodedJSON,
+    NovaServer,
+    RCv3Description,
+    RCv3Node,
+    ServerState)
+from otter.convergence.planning import (
+    DRAINING_METADATA,
+    converge_launch_server,
+    plan_launch_server)
+from otter.convergence.transforming import (
+    get_step_limits_from_conf,
+    limit_steps_by_count,
+    optimize_steps)
+
+
+DRAINING = 'DRAINING'
+"""
+Stands in for a :obj:`ServerState` in a :obj:`Mix` to mean an ``ACTIVE``
+server that has the draining metadata set.
+"""
+
+NOW = 1000000.0
+BUILD_TIMEOUT = 3600.0
+
+
+@attr.s
+class Size(object):
+    """
+    How big a synthetic group is.
+
+    :ivar int servers: Number of servers in the group.
+    :ivar int nodes: Number of LB nodes on the tenant.  Nodes beyond the ones
+        belonging to the group's servers belong to servers of other groups.
+    """
+    servers = attr.ib()
+    nodes = attr.ib()
+
+
+@attr.s
+class Mix(object):
+    """
+    What a synthetic group looks like.
+
+    :ivar float capacity_ratio: Desired capacity as a ratio of the number of
+        servers.
+    :ivar tuple states: ``(weight, state)`` pairs, where ``state`` is a
+        :obj:`ServerState` or :data:`DRAINING`.  Servers are given states
+        round-robin in proportion to the weights.
+    :ivar int unbalanced_every: Every nth server is not in the LB state it
+        should be in: it is either missing its nodes or has a node with the
+        wrong weight.  0 means every server is balanced.
+    :ivar float draining_timeout: The group's draining timeout.
+    """
+    capacity_ratio = attr.ib()
+    states = attr.ib()
+    unbalanced_every = attr.ib(default=0)
+    draining_timeout = attr.ib(default=0.0)
+
+
+SIZES = pmap({
+    'small': Size(servers=10, nodes=100),
+    'medium': Size(servers=1000, nodes=10000),
+    'large': Size(servers=10000, nodes=100000),
+})
+
+MIXES = pmap({
+    'steady': Mix(capacity_ratio=1.0, states=((1, ServerState.ACTIVE),)),
+    'scale-up': Mix(capacity_ratio=1.5, states=((1, ServerState.ACTIVE),),
+                    unbalanced_every=4),
+    'scale-down': Mix(capacity_ratio=0.5, states=((1, ServerState.ACTIVE),),
+                      draining_timeout=30.0),
+    'churn': Mix(capacity_ratio=1.0,
+                 states=((10, ServerState.ACTIVE),
+                         (2, ServerState.BUILD),
+                         (1, ServerState.HARD_REBOOT),
+                         (1, ServerState.SUSPENDED),
+                         (1, ServerState.ERROR),
+                         (1, ServerState.DELETED),
+                         (1, ServerState.UNKNOWN_TO_OTTER),
+                         (1, DRAINING)),
+                 unbalanced_every=10,
+                 draining_timeout=30.0),
+})
+
+STAGES = ('converge', 'limit', 'optimize', 'plan')
+
+CLB_IDS = ('1001', '1002')
+RCV3_ID = 'c6fe49fa-114a-4ea4-9425-0af8b30ff1e7'
+
+
+def _address(prefix, i):
+    """
+    Get a distinct IPv4 address for ``i`` in the /8 ``prefix``.
+    """
+    return '{0}.{1}.{2}.{3}'.format(
+        prefix, (i >> 16) & 255, (i >> 8) & 255, i & 255)
+
+
+def _state_pattern(states):
+    """
+    Expand ``(weight, state)`` pairs to a list of states to cycle through.
+    """
+    return [state for weight, state in states for _ in range(weight)]
+
+
+def generate_group(size, mix):
+    """
+    Generate a synthetic group.
+
+    Servers are created a second apart going back from :data:`NOW` and all
+    want to be on the CLBs in :data:`CLB_IDS` and the RCv3 LB
+    :data:`RCV3_ID`.  The result is deterministic for a given size and mix.
+
+    :param Size size: How big the group is.
+    :param Mix mix: What the group looks like.
+
+    :return: ``(desired_state, servers, lb_nodes)`` suitable for passing
+        to :func:`converge_launch_server`
+    """
+    clb_descs = [CLBDescription(lb_id=lb_id, port=80) for lb_id in CLB_IDS]
+    rcv3_desc = RCv3Description(lb_id=RCV3_ID)
+    desired_lbs = pset(clb_descs + [rcv3_desc])
+    pattern = _state_pattern(mix.states)
+
+    servers = []
+    nodes = []
+    for i in range(size.servers):
+        server_id = 'server-{0}'.format(i)
+        address = _address(10, i)
+        state = pattern[i % len(pattern)]
+        metadata = {}
+        if state is DRAINING:
+            state = ServerState.ACTIVE
+            metadata = dict([DRAINING_METADATA])
+        servers.append(NovaServer(
+            id=server_id, state=state, created=NOW - i,
+            image_id='image', flavor_id='flavor', desired_lbs=desired_lbs,
+            servicenet_address=address, metadata=pmap(metadata),
+            json=EncodedJSON.encode({'id': server_id, 'status': state.name,
+                                     'metadata': metadata})))
+
+        unbalanced = mix.unbalanced_every and i % mix.unbalanced_every == 0
+        if unbalanced and (i // mix.unbalanced_every) % 2 == 0:
+            continue
+        for lb_id in CLB_IDS:
+            nodes.append(CLBNode(
+                node_id='{0}-{1}'.format(lb_id, i), address=address,
+                description=CLBDescription(
+                    lb_id=lb_id, port=80, weight=2 if unbalanced else 1)))
+        nodes.append(RCv3Node(
+            node_id='rcv3-{0}'.format(i), cloud_server_id=server_id,
+            description=rcv3_desc))
+
+    for i in range(max(size.nodes - len(nodes), 0)):
+        desc = clb_descs[i % len(clb_descs)]
+        nodes.append(CLBNode(
+            node_id='other-{0}'.format(i), address=_address(172, i),
+            description=desc))
+
+    desired = DesiredServerGroupState(
+        server_config={'server': {'flavorRef': 'flavor'}},
+        capacity=int(size.servers * mix.capacity_ratio),
+        desired_lbs=desired_lbs,
+        draining_timeout=mix.draining_timeout)
+    return desired, servers, nodes
+
+
+def stage_runners(desired, servers, nodes, step_limits):
+    """
+    Get the stages of planning to be benchmarked.
+
+    The inputs of every stage are computed here so that running a stage only
+    measures that stage.
+
+    :return: `dict` of stage name -> no-argument function running that stage
+    """
+    steps = converge_launch_server(desired, servers, nodes, NOW,
+                                   timeout=BUILD_TIMEOUT)
+    limited = limit_steps_by_count(steps, step_limits)
+    return {
+        'converge': lambda: converge_launch_server(
+            desired, servers, nodes, NOW, timeout=BUILD_TIMEOUT),
+        'limit': lambda: limit_steps_by_count(steps, step_limits),
+        'optimize': lambda: optimize_steps(limited),
+        'plan': lambda: plan_launch_server(
+            desired, NOW, BUILD_TIMEOUT, step_limits, servers, nodes),
+    }
+
+
+def _status_kib(*names):
+    """
+    Read memory fields, in KiB, from ``/proc/self/status``.
+
+    Where there is no such file (i.e. not on Linux), every field is the peak
+    resident set size of the process.
+    """
+    try:
+        with open('/proc/self/status') as status:
+            fields = dict(line.split(':', 1) for line in status)
+        return [int(fields[name].split()[0]) for name in names]
+    except IOError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # OS X reports bytes where Linux reports KiB
+        if sys.platform == 'darwin':
+            peak //= 1024
+        return [peak] * len(names)
+
+
+def _reset_peak():
+    """
+    Reset the peak resident set size of this process, where supported.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except IOError:
+        pass
+
+
+def _run(func):
+    """
+    Run ``func`` once.
+
+    :return: ``(seconds, peak KiB above what was in use before, number of
+        steps returned)``
+    """
+    gc.collect()
+    _reset_peak()
+    before, = _status_kib('VmRSS')
+    start = time.time()
+    result = func()
+    elapsed = time.time() - start
+    peak, = _status_kib('VmHWM')
+    return elapsed, max(peak - before, 0), len(result)
+
+
+def measure(func, isolate=True):
+    """
+    Measure running ``func``.
+
+    Peak memory is only meaningful when ``isolate`` is true: the function is
+    then run in a forked child process, so that the high-water mark from
+    earlier stages does not hide the one of this stage.
+
+    :return: ``(seconds, peak KiB, number of steps returned)``
+    """
+    if not isolate:
+        return _run(func)
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        os.close(read_fd)
+        status = 1
+        try:
+            with os.fdopen(write_fd, 'wb') as out:
+                pickle.dump(_run(func), out, pickle.HIGHEST_PROTOCOL)
+            status = 0
+        finally:
+            os._exit(status)
+    os.close(write_fd)
+    with os.fdopen(read_fd, 'rb') as result:
+        data = result.read()
+    _, status = os.waitpid(pid, 0)
+    if status != 0:
+        raise RuntimeError('benchmark child exited with status {0}'
+                           .format(status))
+    return pickle.loads(data)
+
+
+def run_benchmarks(sizes, mixes, stages=STAGES, repeat=3, isolate=True,
+                   step_limits=None):
+    """
+    Run the benchmarks.
+
+    :param list sizes: names of :data:`SIZES` to run
+    :param list mixes: names of :data:`MIXES` to run
+    :param list stages: names of :data:`STAGES` to run
+    :param int repeat: number of times each stage is run.  The fastest time
+        and the largest peak memory are reported.
+    :param bool isolate: See :func:`measure`.
+    :param dict step_limits: step class -> limit.  Defaults to the limits
+        used when nothing is configured.
+
+    :return: `list` of result `dict` with keys ``size``, ``mix``, ``stage``,
+        ``servers``, ``nodes``, ``seconds``, ``peak_kib`` and ``steps``
+    """
+    if step_limits is None:
+        step_limits = get_step_limits_from_conf({})
+    results = []
+    for size_name in sizes:
+        size = SIZES[size_name]
+        for mix_name in mixes:
+            desired, servers, nodes = generate_group(size, MIXES[mix_name])
+            runners = stage_runners(desired, servers, nodes, step_limits)
+            for stage in stages:
+                runs = [measure(runners[stage], isolate)
+                        for _ in range(repeat)]
+                results.append({
+                    'size': size_name,
+                    'mix': mix_name,
+                    'stage': stage,
+                    'servers': len(servers),
+                    'nodes': len(nodes),
+                    'seconds': min(r[0] for r in runs),
+                    'peak_kib': max(r[1] for r in runs),
+                    'steps': runs[0][2]})
+    return results
+
+
+def format_results(results):
+    """
+    Format results of :func:`run_benchmarks` as a table.
+    """
+    fmt = '{:<8} {:<11} {:<9} {:>8} {:>8} {:>10} {:>10} {:>7}'
+    lines = [fmt.format('size', 'mix', 'stage', 'servers', 'nodes',
+                        'seconds', 'peak KiB', 'steps')]
+    lines.extend(
+        fmt.format(r['size'], r['mix'], r['stage'], r['servers'], r['nodes'],
+                   '{:.4f}'.format(r['seconds']), r['peak_kib'], r['steps'])
+        for r in results)
+    return '\n'.join(lines)
+
+
+def _names(choices):
+    """
+    Get an argparse type for a comma-separated list of names in ``choices``.
+    """
+    def parse(value):
+        names = value.split(',')
+        unknown = [name for name in names if name not in choices]
+        if unknown:
+            raise argparse.ArgumentTypeError(
+                'unknown: {0} (choose from {1})'.format(
+                    ', '.join(unknown), ', '.join(sorted(choices))))
+        return names
+    return parse
+
+
+def main(argv=None):
+    """
+    Run the benchmarks from the command line.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument(
+        '--sizes', type=_names(SIZES), default=['small', 'medium', 'large'],
+        help='Comma-separated group sizes. Default: small,medium,large')
+    parser.add_argument(
+        '--mixes', type=_names(MIXES), default=sorted(MIXES),
+        help='Comma-separated server mixes. Default: all')
+    parser.add_argument(
+        '--stages', type=_names(STAGES), default=list(STAGES),
+        help='Comma-separated stages. Default: all')
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='Times each stage is run. Default: 3')
+    parser.add_argument(
+        '--json', action='store_true',
+        help='Print results as JSON instead of a table')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.mixes, args.stages,
+                             repeat=args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    else:
+        print(format_results(results))
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
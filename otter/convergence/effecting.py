@@ -1,14 +1,50 @@
 """Code related to effecting change based on a convergence plan."""
 
-from effect import parallel
+from effect import Effect, parallel
 
+from otter.convergence.batching import BatchedStep, is_batched
 from otter.convergence.model import ErrorReason, StepResult
+from otter.convergence.throttling import ThrottledStep
+from otter.convergence.timing import timed
 
 
-def steps_to_effect(steps):
-    """Turns a collection of :class:`IStep` providers into an effect."""
+def step_outcome(result):
+    """
+    Get the outcome of executing a step to record in timings, which is the
+    name of its :obj:`StepResult`.
+    """
+    status, reasons = result
+    return status.name
+
+
+def execute_step(tenant_id, step):
+    """
+    Get effect of executing a step when the tenant's limits allow it, through
+    a :obj:`ThrottledStep`, timed as ``execute-<step class name>``.
+
+    :param str tenant_id: Tenant the step is executed for
+    :param step: :class:`IStep` provider
+    """
+    return Effect(ThrottledStep(
+        tenant_id, type(step),
+        timed('execute-' + type(step).__name__, step.as_effect(),
+              step_outcome)))
+
+
+def steps_to_effect(steps, tenant_id):
+    """
+    Turns a collection of :class:`IStep` providers into an effect.
+
+    Each step is executed with :func:`execute_step`, except for CLB steps
+    that can be merged with those of the tenant's other groups, which are
+    executed through a :obj:`BatchedStep`.
+
+    :param steps: Steps to execute
+    :param str tenant_id: Tenant the steps are executed for
+    """
     # Treat unknown errors as RETRY.
     return parallel([
-        s.as_effect().on(error=lambda e: (StepResult.RETRY,
-                                          [ErrorReason.Exception(e)]))
+        (Effect(BatchedStep(tenant_id, s)) if is_batched(s)
+         else execute_step(tenant_id, s)).on(
+            error=lambda e: (StepResult.RETRY, [ErrorReason.Exception(e)]))
         for s in steps])
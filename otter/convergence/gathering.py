@@ -1,14 +1,24 @@
 """Code related to gathering data to inform convergence."""
 from functools import partial
 
-from effect import catch, parallel
+import attr
+
+from effect import (
+    Constant, Effect, TypeDispatcher, catch, parallel, sync_performer)
 from effect.do import do, do_return
 
+from pyrsistent import pmap, pset
+
 from toolz.curried import filter, groupby, keyfilter, map
 from toolz.dicttoolz import assoc, get_in, merge
 from toolz.functoolz import compose, curry, identity
 from toolz.itertoolz import concat
 
+from twisted.internet.defer import Deferred, maybeDeferred, succeed
+from twisted.python.failure import Failure
+
+from txeffect import deferred_performer, perform
+
 from otter.auth import NoSuchEndpoint
 from otter.cloud_client import (
     CLBNotFoundError,
@@ -19,7 +29,9 @@ from otter.cloud_client import (
     list_stacks_all,
     service_request)
 from otter.constants import ServiceType
+from otter.convergence.composition import json_to_LBConfigs
 from otter.convergence.model import (
+    CLBDescription,
     CLBNode,
     CLBNodeCondition,
     HeatStack,
@@ -28,13 +40,16 @@ from otter.convergence.model import (
     RCv3Node,
     get_stack_tag_for_group,
     group_id_from_metadata)
+from otter.convergence.timing import timed
 from otter.indexer import atom
-from otter.models.cass import CassScalingGroupServersCache
+from otter.models.cass import (
+    CassCLBNodeDrainedAtCache, CassScalingGroupServersCache)
+from otter.util.config import config_value
 from otter.util.fp import assoc_obj
 from otter.util.http import append_segments
 from otter.util.retry import (
     exponential_backoff_interval, retry_effect, retry_times)
-from otter.util.timestamp import timestamp_to_epoch
+from otter.util.timestamp import datetime_to_epoch, timestamp_to_epoch
 
 
 def _retry(eff):
@@ -43,6 +58,143 @@ def _retry(eff):
         eff, retry_times(5), exponential_backoff_interval(2))
 
 
+class GatherCache(object):
+    """
+    A short-lived cache of tenant-wide gathered data, so that groups of the
+    same tenant converging in the same converger run share one listing of
+    servers and load balancers instead of each fetching their own.
+
+    Concurrent lookups of a key that is being fetched wait on the fetch
+    already in flight. Failures are never cached.
+
+    It also remembers when periodic work, like a full scan of the tenant's
+    load balancers, was last due. See :func:`due`.
+
+    :param clock: ``IReactorTime`` provider used to expire results
+    :param float ttl: Number of seconds a fetched result is served from the
+        cache. This should not exceed the interval between convergence
+        iterations of a group so that a group never plans with data gathered
+        before its previous iteration executed its steps.
+    """
+
+    def __init__(self, clock, ttl):
+        self.clock = clock
+        self.ttl = ttl
+        self._results = {}    # key -> (time fetch started, result)
+        self._in_flight = {}  # key -> list of Deferreds waiting on the fetch
+        self._due = {}        # key -> (time last due, interval)
+
+    def expire(self):
+        """Forget all the results older than the TTL."""
+        now = self.clock.seconds()
+        self._results = {key: (fetched, result)
+                         for key, (fetched, result) in self._results.items()
+                         if now - fetched < self.ttl}
+        self._due = {key: (at, interval)
+                     for key, (at, interval) in self._due.items()
+                     if now - at < interval}
+
+    def due(self, key, interval):
+        """
+        Is the work identified by ``key`` due? It is due if it was not due
+        in the last ``interval`` seconds, in which case now is recorded as
+        the time it was last due.
+
+        :param key: Hashable key identifying the work. Should include the
+            tenant ID.
+        :param number interval: Seconds between work
+        :rtype: bool
+        """
+        now = self.clock.seconds()
+        if key in self._due and now - self._due[key][0] < interval:
+            return False
+        self._due[key] = (now, interval)
+        return True
+
+    def get(self, key, fetch):
+        """
+        Get the result for ``key``, fetching it with ``fetch`` if it is not
+        cached and not already being fetched.
+
+        :param key: Hashable cache key. Should include the tenant ID.
+        :param fetch: No-argument callable returning result or a Deferred
+            of it.
+        :return: ``Deferred`` of the result
+        """
+        now = self.clock.seconds()
+        if key in self._results:
+            fetched, result = self._results[key]
+            if now - fetched < self.ttl:
+                return succeed(result)
+            del self._results[key]
+        if key in self._in_flight:
+            d = Deferred()
+            self._in_flight[key].append(d)
+            return d
+        waiters = self._in_flight[key] = []
+
+        def fetched(result):
+            del self._in_flight[key]
+            if isinstance(result, Failure):
+                for d in waiters:
+                    d.errback(result)
+            else:
+                self._results[key] = (now, result)
+                for d in waiters:
+                    d.callback(result)
+            return result
+
+        return maybeDeferred(fetch).addBoth(fetched)
+
+
+@attr.s
+class CachedGather(object):
+    """
+    Intent to get the result of ``effect`` from the :obj:`GatherCache`,
+    performing it only if ``key`` is not cached.
+    """
+    key = attr.ib()
+    effect = attr.ib()
+
+
+def cached_gather(tenant_id, name, eff):
+    """
+    Return Effect of ``eff``'s result shared across all groups of the
+    tenant through the :obj:`GatherCache`.
+
+    :param tenant_id: Tenant whose data is gathered by ``eff``
+    :param name: Identifies the data gathered by ``eff`` within the tenant
+    :param Effect eff: Effect gathering tenant-wide data
+    """
+    return Effect(CachedGather((tenant_id, name), eff))
+
+
+@attr.s
+class IsDue(object):
+    """
+    Intent to find out if periodic work identified by ``key`` is due as per
+    :func:`GatherCache.due`.
+    """
+    key = attr.ib()
+    interval = attr.ib()
+
+
+@deferred_performer
+def perform_cached_gather(cache, dispatcher, intent):
+    """Perform :obj:`CachedGather` by looking up ``cache``."""
+    return cache.get(intent.key, partial(perform, dispatcher, intent.effect))
+
+
+def get_gather_cache_dispatcher(cache):
+    """
+    Get dispatcher that performs :obj:`CachedGather` and :obj:`IsDue` with
+    given :obj:`GatherCache`.
+    """
+    return TypeDispatcher({
+        CachedGather: partial(perform_cached_gather, cache),
+        IsDue: sync_performer(lambda d, i: cache.due(i.key, i.interval))})
+
+
 def get_all_server_details(changes_since=None, batch_size=100):
     """
     Return all servers of a tenant.
@@ -107,6 +259,37 @@ def mark_deleted_servers(old, new):
     return merge(old, new).values()
 
 
+def merge_server_changes(old, changes):
+    """
+    Given cached servers and the servers changed since the cache was updated,
+    return a list of all the servers. Nova returns servers deleted since then
+    with a status of DELETED, so unlike :func:`mark_deleted_servers`, old
+    servers absent from the changes are kept as they are.
+
+    :param list old: List of cached servers
+    :param list changes: List of servers changed since the cache was updated
+    :return: List of updated servers
+    """
+    return merge({s['id']: s for s in old},
+                 {s['id']: s for s in changes}).values()
+
+
+def full_resync_due(last_update, now, interval):
+    """
+    Is a full listing of servers needed instead of getting the changes since
+    the cache was last updated? This is true for the first update in every
+    ``interval`` window so that any drift between the cache and Nova, like
+    changes missed because of clock skew, does not last.
+
+    :param datetime last_update: When the servers cache was last updated
+    :param datetime now: Current time
+    :param number interval: Seconds between full listings
+    :rtype: bool
+    """
+    return (datetime_to_epoch(last_update) // interval !=
+            datetime_to_epoch(now) // interval)
+
+
 @curry
 def server_of_group(group_id, server):
     """
@@ -119,7 +302,8 @@ def server_of_group(group_id, server):
 def get_scaling_group_servers(tenant_id, group_id, now,
                               all_as_servers=get_all_scaling_group_servers,
                               all_servers=get_all_server_details,
-                              cache_class=CassScalingGroupServersCache):
+                              cache_class=CassScalingGroupServersCache,
+                              full_resync_interval=None):
     """
     Get a group's servers taken from cache if it exists. Updates cache
     if it is empty from newly fetched servers
@@ -127,16 +311,35 @@ def get_scaling_group_servers(tenant_id, group_id, now,
     # scoped on the tenant because cache calls require tenant_id. Should
     # they also not take tenant_id and work on the scope?
 
+    When the cache exists only the servers changed since it was last updated
+    are listed and merged into it, except for a periodic full listing.
+
+    :param datetime now: Current time
+    :param number full_resync_interval: Seconds between full listings of
+        servers. Defaults to "converger.full_resync_interval" config or 600.
+
     :return: Servers as list of dicts
     :rtype: Effect
     """
+    if full_resync_interval is None:
+        full_resync_interval = (
+            config_value('converger.full_resync_interval') or 600)
     cache = cache_class(tenant_id, group_id)
     cached_servers, last_update = yield cache.get_servers(False)
     if last_update is None:
-        servers = (yield all_as_servers()).get(group_id, [])
+        all_group_servers = yield cached_gather(
+            tenant_id, 'as-servers', timed('gather-nova', all_as_servers()))
+        servers = all_group_servers.get(group_id, [])
     else:
-        current = yield all_servers()
-        servers = mark_deleted_servers(cached_servers, current)
+        if full_resync_due(last_update, now, full_resync_interval):
+            current = yield cached_gather(
+                tenant_id, 'servers', timed('gather-nova', all_servers()))
+            servers = mark_deleted_servers(cached_servers, current)
+        else:
+            changes = yield cached_gather(
+                tenant_id, 'servers-since-{}'.format(last_update.isoformat()),
+                timed('gather-nova', all_servers(last_update)))
+            servers = merge_server_changes(cached_servers, changes)
         servers = list(filter(server_of_group(group_id), servers))
     yield do_return(servers)
 
@@ -154,9 +357,121 @@ def get_scaling_group_stacks(group_id, get_all_stacks=get_all_stacks):
     return get_all_stacks(stack_tag=get_stack_tag_for_group(group_id))
 
 
+class CLBDrainedAtCache(object):
+    """
+    In-memory cache of times when tenants' CLB nodes started DRAINING, in
+    front of the persistent :obj:`CassCLBNodeDrainedAtCache`. A tenant's
+    times are read from the persistent cache the first time they are needed
+    and written through it on updates.
+
+    Since the cache is valid only while this node converges the tenant's
+    groups, tenants should be removed with :func:`retain` when they are not
+    ours anymore. Tenants whose groups are converged by several nodes at
+    once are never kept in memory: their times are always read from the
+    persistent cache, which sees the other nodes' updates.
+
+    :param cache_class: Like :obj:`CassCLBNodeDrainedAtCache`
+    :param callable is_shared: Called with a tenant ID, returns whether the
+        tenant's groups can be converged by other nodes at the same time
+    """
+
+    def __init__(self, cache_class=CassCLBNodeDrainedAtCache,
+                 is_shared=lambda tenant_id: False):
+        self.cache_class = cache_class
+        self.is_shared = is_shared
+        self._tenants = {}  # tenant_id -> pmap of (lb_id, node_id) -> time
+
+    def retain(self, predicate):
+        """Keep only the tenants for whom ``predicate`` returns True."""
+        self._tenants = {tenant_id: drained_at
+                         for tenant_id, drained_at in self._tenants.items()
+                         if predicate(tenant_id)}
+
+    def get(self, tenant_id):
+        """
+        Return Effect of pmap of (lb_id, node_id) -> EPOCH when the node
+        started DRAINING.
+        """
+        if tenant_id in self._tenants:
+            return Effect(Constant(self._tenants[tenant_id]))
+        if self.is_shared(tenant_id):
+            return self.cache_class(tenant_id).get_drained_at().on(pmap)
+
+        def cache(drained_at):
+            self._tenants[tenant_id] = pmap(drained_at)
+            return self._tenants[tenant_id]
+
+        return self.cache_class(tenant_id).get_drained_at().on(cache)
+
+    def update(self, tenant_id, drained_at, evict):
+        """
+        Return Effect of adding ``drained_at`` mapping and removing ``evict``
+        nodes of the tenant.
+        """
+        def cache(_):
+            if tenant_id in self._tenants:
+                updated = self._tenants[tenant_id].update(drained_at)
+                for node in evict:
+                    updated = updated.discard(node)
+                self._tenants[tenant_id] = updated
+
+        persistent = self.cache_class(tenant_id)
+        return parallel([persistent.insert_drained_at(drained_at),
+                         persistent.delete_drained_at(evict)]).on(cache)
+
+
+@attr.s
+class GetCLBDrainedAt(object):
+    """
+    Intent to get tenant's DRAINING CLB nodes' drain start times as pmap of
+    (lb_id, node_id) -> EPOCH seconds.
+    """
+    tenant_id = attr.ib()
+
+
+@attr.s
+class UpdateCLBDrainedAt(object):
+    """
+    Intent to cache drain start times of newly DRAINING CLB nodes and forget
+    nodes that are not DRAINING anymore.
+
+    :ivar drained_at: pmap of (lb_id, node_id) -> EPOCH seconds to add
+    :ivar evict: pset of (lb_id, node_id) to remove
+    """
+    tenant_id = attr.ib()
+    drained_at = attr.ib()
+    evict = attr.ib()
+
+
+def get_drained_at_dispatcher(cache):
+    """
+    Get dispatcher that performs :obj:`GetCLBDrainedAt` and
+    :obj:`UpdateCLBDrainedAt` with given :obj:`CLBDrainedAtCache`.
+    """
+    return TypeDispatcher({
+        GetCLBDrainedAt: sync_performer(
+            lambda d, i: cache.get(i.tenant_id)),
+        UpdateCLBDrainedAt: sync_performer(
+            lambda d, i: cache.update(i.tenant_id, i.drained_at, i.evict))
+    })
+
+
+def _node_key(node):
+    return (node.description.lb_id, node.node_id)
+
+
 @do
-def get_clb_contents():
-    """Get Rackspace Cloud Load Balancer contents as list of `CLBNode`."""
+def get_clb_contents(tenant_id, lb_ids=None):
+    """
+    Get Rackspace Cloud Load Balancer contents as list of `CLBNode`.
+
+    The time a node started DRAINING is taken from its atom feed only the
+    first time it is seen DRAINING and is cached until it leaves DRAINING.
+
+    :param tenant_id: Tenant whose load balancers are gathered
+    :param lb_ids: IDs of the load balancers to gather. All the tenant's load
+        balancers are gathered if this is None.
+    """
     # If we get a CLBNotFoundError while fetching feeds, we should throw away
     # all nodes related to that load balancer, because we don't want to act on
     # data that we know is invalid/outdated (for example, if we can't fetch a
@@ -166,7 +481,11 @@ def get_clb_contents():
 
     def gone(r):
         return catch(CLBNotFoundError, lambda exc: r)
-    lb_ids = [lb['id'] for lb in (yield _retry(get_clbs()))]
+    if lb_ids is None:
+        lb_ids = [lb['id'] for lb in (yield _retry(get_clbs()))]
+        scanned = None
+    else:
+        scanned = set(map(str, lb_ids))
     node_reqs = [_retry(get_clb_nodes(lb_id).on(error=gone([])))
                  for lb_id in lb_ids]
     all_nodes = yield parallel(node_reqs)
@@ -174,22 +493,31 @@ def get_clb_contents():
                 for lb_id, nodes in zip(lb_ids, all_nodes)}
     draining = [n for n in concat(lb_nodes.values())
                 if n.description.condition == CLBNodeCondition.DRAINING]
-    feeds = yield parallel(
+    cached = yield Effect(GetCLBDrainedAt(tenant_id))
+    unknown = [n for n in draining if _node_key(n) not in cached]
+    feeds = yield timed('gather-clb-feeds', parallel(
         [_retry(get_clb_node_feed(n.description.lb_id, n.node_id).on(
             error=gone(None)))
-         for n in draining]
-    )
-    nodes_to_feeds = dict(zip(draining, feeds))
+         for n in unknown]
+    ))
+    nodes_to_feeds = dict(zip(unknown, feeds))
     deleted_lbs = set([
         node.description.lb_id
         for (node, feed) in nodes_to_feeds.items() if feed is None])
+    new = pmap({_node_key(node): extract_CLB_drained_at(feed)
+                for node, feed in nodes_to_feeds.items() if feed is not None})
+    draining_keys = pset(map(_node_key, draining))
+    evict = pset(key for key in cached.keys()
+                 if scanned is None or key[0] in scanned) - draining_keys
+    if new or evict:
+        yield Effect(UpdateCLBDrainedAt(tenant_id, new, evict))
+    drained_at = cached.update(new)
 
     def update_drained_at(node):
-        feed = nodes_to_feeds.get(node)
         if node.description.lb_id in deleted_lbs:
             return None
-        if feed is not None:
-            return assoc_obj(node, drained_at=extract_CLB_drained_at(feed))
+        if _node_key(node) in draining_keys:
+            return assoc_obj(node, drained_at=drained_at[_node_key(node)])
         else:
             return node
     nodes = map(update_drained_at, concat(lb_nodes.values()))
@@ -248,35 +576,78 @@ def get_rcv3_contents():
         error=catch(NoSuchEndpoint, lambda _: []))
 
 
+def get_group_clb_ids(launch_config, servers):
+    """
+    Get IDs of the CLBs a group's servers should be or may have been added
+    to: the ones in the group's launch config and the ones recorded in the
+    servers' metadata.
+
+    :param dict launch_config: Group's launch config
+    :param list servers: List of group's :obj:`NovaServer`
+    :return: ``set`` of CLB IDs
+    """
+    configured = json_to_LBConfigs(
+        launch_config['args'].get('loadBalancers', []))
+    return set(lb.lb_id
+               for lb in concat([configured] +
+                                [s.desired_lbs for s in servers])
+               if isinstance(lb, CLBDescription))
+
+
+@do
 def get_all_launch_server_data(
         tenant_id,
         group_id,
         now,
+        launch_config,
         get_scaling_group_servers=get_scaling_group_servers,
         get_clb_contents=get_clb_contents,
-        get_rcv3_contents=get_rcv3_contents):
+        get_rcv3_contents=get_rcv3_contents,
+        clb_full_scan_interval=None):
     """
     Gather all launch_server data relevant for convergence w.r.t given time,
     in parallel where possible.
 
+    Only the CLBs in the group's launch config or servers' metadata are
+    gathered (see :func:`get_group_clb_ids`), except that all the tenant's
+    CLBs are scanned for each group once every ``clb_full_scan_interval``
+    seconds (defaults to "converger.clb_full_scan_interval" config or 600)
+    so that nodes of the group's servers on other CLBs get cleaned up.
+
+    The tenant-wide load balancer contents are shared with the tenant's other
+    groups through :func:`cached_gather`.
+
     Returns an Effect of {'servers': [NovaServer], 'lb_nodes': [LBNode]}.
     """
-    eff = parallel(
+    if clb_full_scan_interval is None:
+        clb_full_scan_interval = (
+            config_value('converger.clb_full_scan_interval') or 600)
+    servers, rcv3 = yield parallel(
         [get_scaling_group_servers(tenant_id, group_id, now)
          .on(map(NovaServer.from_server_details_json)).on(list),
-         get_clb_contents(),
-         get_rcv3_contents()]
-    ).on(lambda (servers, clb, rcv3): {
-        'servers': servers,
-        'lb_nodes': list(concat([clb, rcv3]))
-    })
-    return eff
+         cached_gather(tenant_id, 'rcv3',
+                       timed('gather-rcv3', get_rcv3_contents()))])
+    full_scan = yield Effect(
+        IsDue((tenant_id, group_id, 'clb-full-scan'),
+              clb_full_scan_interval))
+    if full_scan:
+        clb = yield cached_gather(
+            tenant_id, 'clb',
+            timed('gather-clb', get_clb_contents(tenant_id)))
+    else:
+        lb_ids = sorted(get_group_clb_ids(launch_config, servers))
+        clb = yield cached_gather(
+            tenant_id, ('clb',) + tuple(lb_ids),
+            timed('gather-clb', get_clb_contents(tenant_id, lb_ids)))
+    yield do_return({'servers': servers,
+                     'lb_nodes': list(concat([clb, rcv3]))})
 
 
 def get_all_launch_stack_data(
         tenant_id,
         group_id,
         now,
+        launch_config,
         get_scaling_group_stacks=get_scaling_group_stacks):
     """
     Gather all launch_stack data relevant for convergence w.r.t given time
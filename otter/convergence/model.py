@@ -141,6 +141,7 @@ class ConvergenceIterationStatus(object):
     """Result of a single convergence iteration."""
     Stop = constructor()  # Stop converging. Dirty flag can be deleted
     Continue = constructor()  # Continue converging. Don't delete flag.
+    Idle = constructor()  # Only waiting. Continue converging, but back off.
     GroupDeleted = constructor()  # Group disappeared; force-delete dirty flag.
 
 
@@ -224,14 +225,51 @@ def _lbs_from_metadata(metadata):
     return pset(desired_lbs)
 
 
+_SERVER_STATES = frozenset(ServerState.iterconstants())
+
+
 def _validate_state(_1, _2, state):
     """
     Assert that a state is in ServerState
     """
-    if state not in ServerState.iterconstants():
+    if state not in _SERVER_STATES:
         raise AssertionError("{0} is not a ServerState".format(state))
 
 
+@attr.s
+class EncodedJSON(object):
+    """
+    A JSON document kept encoded until it is needed.
+
+    Decoded JSON, and even more so a frozen copy of it, takes many times the
+    memory of its encoding, so this is how documents that are only
+    occasionally needed in full are held.
+
+    :ivar str encoded: The encoded document.
+    """
+    encoded = attr.ib(validator=instance_of(str))
+
+    @classmethod
+    def encode(cls, document):
+        """
+        Encode a JSON document.
+
+        :param document: A JSON-compatible object; pyrsistent collections in
+            it are thawed first.
+        :return: :obj:`EncodedJSON`
+        """
+        return cls(json.dumps(thaw(document), separators=(',', ':'),
+                              sort_keys=True))
+
+    def decode(self):
+        """
+        Decode the document.
+
+        :return: A newly decoded, mutable copy of the document.
+        """
+        return json.loads(self.encoded)
+
+
 @attr.s(repr=False)
 class NovaServer(object):
     """
@@ -249,8 +287,11 @@ class NovaServer(object):
     :ivar str flavor_id: The ID of the flavor the server was launched with
     :ivar PSet desired_lbs: An immutable mapping of load balancer IDs to lists
         of :class:`CLBDescription` instances.
-    :var dict json: JSON dict received from Nova from which this server
-        is created
+    :ivar PMap metadata: The server's metadata.
+    :ivar json: JSON dict received from Nova from which this server
+        is created.  Only the fields above are needed for convergence, so it
+        is kept encoded.
+    :type json: :class:`EncodedJSON`
     """
     id = attr.ib()
     state = attr.ib(validator=_validate_state)
@@ -264,7 +305,10 @@ class NovaServer(object):
                           validator=instance_of(PSet))
     servicenet_address = attr.ib(default='',
                                  validator=instance_of(string_types))
-    json = attr.ib(default=attr.Factory(pmap), validator=instance_of(PMap))
+    metadata = attr.ib(default=attr.Factory(pmap),
+                       validator=instance_of(PMap))
+    json = attr.ib(default=attr.Factory(lambda: EncodedJSON.encode({})),
+                   validator=instance_of(EncodedJSON))
 
     @classmethod
     def from_server_details_json(cls, server_json):
@@ -296,7 +340,8 @@ class NovaServer(object):
             links=freeze(server_json['links']),
             desired_lbs=_lbs_from_metadata(metadata),
             servicenet_address=_servicenet_address(server_json),
-            json=freeze(server_json))
+            metadata=pmap(metadata),
+            json=EncodedJSON.encode(server_json))
 
     def __repr__(self):
         """
@@ -306,9 +351,12 @@ class NovaServer(object):
         kvpairs = []
         # this gives us an ordered list
         for a in attr.fields(self.__class__):
+            if a.name == "metadata":
+                # already in the JSON
+                continue
             value = thaw(getattr(self, a.name))
             if a.name == "json":
-                value = {k: v for k, v in value.items() if k in
+                value = {k: v for k, v in value.decode().items() if k in
                          ('status', 'metadata', 'updated', 'name',
                           'OS-EXT-STS:task_state')}
             kvpairs.append("{0}={1}".format(a.name, repr(value)))
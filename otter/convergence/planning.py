@@ -308,9 +308,47 @@ _STATE_TO_DESTINY = {
     for state in states}
 
 
+def _lb_nodes_matcher(lb_nodes):
+    """
+    Index the given load balancer nodes so that the nodes matching a server
+    can be found without scanning every node on the tenant.
+
+    :class:`CLBNode` providers are indexed by address and :class:`RCv3Node`
+    providers by cloud server ID; any other kind of node is always considered
+    a candidate.  Candidates are still checked with :func:`ILBNode.matches`,
+    so the result is the same as filtering ``lb_nodes`` with it.
+
+    :param lb_nodes: an iterable of :obj:`ILBNode` providers
+    :return: a function that takes a :obj:`NovaServer` and returns the `list`
+        of nodes matching it, in the order they appear in ``lb_nodes``
+    """
+    by_key = defaultdict(list)
+    unindexed = []
+    for position, node in enumerate(lb_nodes):
+        if isinstance(node, CLBNode):
+            by_key[('address', node.address)].append((position, node))
+        elif isinstance(node, RCv3Node):
+            by_key[('server_id', node.cloud_server_id)].append(
+                (position, node))
+        else:
+            unindexed.append((position, node))
+    by_key = dict(by_key)
+
+    def matching_nodes(server):
+        candidates = (
+            by_key.get(('address', getattr(server, 'servicenet_address',
+                                           None)), []) +
+            by_key.get(('server_id', getattr(server, 'id', None)), []) +
+            unindexed)
+        return [node for _, node in sorted(candidates, key=lambda c: c[0])
+                if node.matches(server)]
+
+    return matching_nodes
+
+
 def get_destiny(server):
     """Get the obj:`Destiny` of a server."""
-    metadata = server.json.get('metadata', {})
+    metadata = server.metadata
     if (server.state in (ServerState.ACTIVE, ServerState.BUILD) and
             metadata.get(DRAINING_METADATA[0]) == DRAINING_METADATA[1]):
         return Destiny.DRAIN
@@ -340,6 +378,7 @@ def converge_launch_server(desired_state, servers_with_cheese,
 
     """
     newest_to_oldest = sorted(servers_with_cheese, key=lambda s: -s.created)
+    matching_lb_nodes = _lb_nodes_matcher(load_balancer_contents)
 
     servers = defaultdict(lambda: [], groupby(get_destiny, newest_to_oldest))
     servers_in_active = servers[Destiny.CONSIDER_AVAILABLE]
@@ -376,7 +415,7 @@ def converge_launch_server(desired_state, servers_with_cheese,
         return _drain_and_delete(
             server,
             desired_state.draining_timeout,
-            [node for node in load_balancer_contents if node.matches(server)],
+            matching_lb_nodes(server),
             now)
 
     scale_down_steps = list(mapcat(drain_and_delete_a_server,
@@ -392,7 +431,7 @@ def converge_launch_server(desired_state, servers_with_cheese,
     cleanup_errored_and_deleted_steps = [
         remove_node_from_lb(lb_node)
         for server in servers[Destiny.DELETE] + servers[Destiny.CLEANUP]
-        for lb_node in load_balancer_contents if lb_node.matches(server)]
+        for lb_node in matching_lb_nodes(server)]
 
     # converge all the servers that remain to their desired load balancer state
     still_active_servers = filter(lambda s: s not in servers_to_delete,
@@ -400,9 +439,7 @@ def converge_launch_server(desired_state, servers_with_cheese,
     lb_converge_steps = [
         step
         for server in still_active_servers
-        for step in _converge_lb_state(
-            server,
-            [node for node in load_balancer_contents if node.matches(server)])
+        for step in _converge_lb_state(server, matching_lb_nodes(server))
         ]
 
     # Converge again if we expect state transitions on any servers
@@ -92,9 +92,9 @@ from hashlib import sha1
 
 import attr
 
-from effect import Constant, Effect, Func, parallel
+from effect import ComposedDispatcher, Effect, Func, parallel, sync_perform
 from effect.do import do, do_return
-from effect.ref import Reference
+from effect.ref import Reference, reference_dispatcher
 
 from kazoo.exceptions import BadVersionError, NoNodeError
 from kazoo.recipe.partitioner import PartitionState
@@ -107,6 +107,7 @@ import six
 from sumtypes import match
 
 from toolz.functoolz import curry
+from toolz.itertoolz import partition_all
 
 from twisted.application.service import MultiService
 
@@ -114,25 +115,44 @@ from txeffect import exc_info_to_failure, perform
 
 from otter.cloud_client import TenantScope
 from otter.constants import CONVERGENCE_DIRTY_DIR
+from otter.convergence.backoff import (
+    ConvergenceBackoff, DEFAULT_MAX_BACKOFF, GetBackedOff, RecordConvergence,
+    get_backoff_dispatcher)
+from otter.convergence.batching import (
+    DEFAULT_BATCH_WINDOW, StepBatcher, get_batch_dispatcher)
 from otter.convergence.composition import (get_desired_server_group_state,
                                            get_desired_stack_group_state)
-from otter.convergence.effecting import steps_to_effect
+from otter.convergence.effecting import execute_step, steps_to_effect
 from otter.convergence.errors import present_reasons, structure_reason
-from otter.convergence.gathering import (get_all_launch_server_data,
-                                         get_all_launch_stack_data)
+from otter.convergence.gathering import (CLBDrainedAtCache,
+                                         GatherCache,
+                                         get_all_launch_server_data,
+                                         get_all_launch_stack_data,
+                                         get_drained_at_dispatcher,
+                                         get_gather_cache_dispatcher)
 from otter.convergence.logging import log_steps
 from otter.convergence.model import (
     ConvergenceIterationStatus,
     ServerState,
     StepResult)
 from otter.convergence.planning import plan_launch_server, plan_launch_stack
+from otter.convergence.steps import ConvergeLater
+from otter.convergence.throttling import (
+    StepThrottle, get_step_throttles_from_conf, get_throttle_dispatcher)
+from otter.convergence.timing import (
+    TimingRegistry, get_timing_dispatcher, timed)
 from otter.convergence.transforming import get_step_limits_from_conf
+from otter.convergence.workqueue import (
+    ConvergenceQueue, DEFAULT_MAX_IN_FLIGHT, QueuedConvergence,
+    get_queue_dispatcher)
 from otter.log.cloudfeeds import cf_err, cf_msg
 from otter.log.intents import err, msg, msg_with_time, with_log
 from otter.models.intents import (
     DeleteGroup, GetScalingGroupInfo, UpdateGroupErrorReasons,
     UpdateGroupStatus, UpdateServersCache)
 from otter.models.interface import NoSuchScalingGroupError, ScalingGroupStatus
+from otter.util.config import config_value
+from otter.util.hashring import jump_hash
 from otter.util.timestamp import datetime_to_epoch
 from otter.util.zk import CreateOrSet, DeleteNode, GetChildren, GetStat
 
@@ -191,7 +211,7 @@ def update_servers_cache(group, now, servers, lb_nodes, include_deleted=True):
     """
     server_dicts = []
     for server in servers:
-        sd = thaw(server.json)
+        sd = server.json.decode()
         if is_autoscale_active(server, lb_nodes):
             sd["_is_as_active"] = True
         if server.state != ServerState.DELETED or include_deleted:
@@ -202,15 +222,15 @@ def update_servers_cache(group, now, servers, lb_nodes, include_deleted=True):
 
 
 @do
-def _execute_steps(steps):
+def _execute_steps(tenant_id, steps):
     """
-    Given a set of steps, executes them, logs the result, and returns the worst
-    priority with a list of reasons for that result.
+    Given a set of steps of a tenant, executes them, logs the result, and
+    returns the worst priority with a list of reasons for that result.
 
     :return: a tuple of (:class:`StepResult` constant., list of reasons)
     """
     if len(steps) > 0:
-        results = yield steps_to_effect(steps)
+        results = yield steps_to_effect(steps, tenant_id)
 
         severity = [StepResult.FAILURE, StepResult.RETRY,
                     StepResult.LIMITED_RETRY, StepResult.SUCCESS]
@@ -251,7 +271,7 @@ def convergence_exec_data(tenant_id, group_id, now, get_executor):
 
     executor = get_executor(launch_config)
 
-    resources = yield executor.gather(tenant_id, group_id, now)
+    resources = yield executor.gather(tenant_id, group_id, now, launch_config)
 
     if group_state.status == ScalingGroupStatus.DELETING:
         desired_capacity = 0
@@ -290,7 +310,9 @@ def execute_convergence(tenant_id, group_id, build_timeout, waiting,
         allowed in a convergence cycle
     :param callable get_executor: like :func`get_executor`, used for testing.
 
-    :return: Effect of :obj:`ConvergenceIterationStatus`.
+    :return: Effect of :obj:`ConvergenceIterationStatus`. It is ``Idle``
+        rather than ``Continue`` when all the steps were :obj:`ConvergeLater`
+        that are not limited, i.e. there was nothing to do but wait.
     :raise: :obj:`NoSuchScalingGroupError` if the group doesn't exist.
     """
     clean_waiting = _clean_waiting(waiting, group_id)
@@ -299,21 +321,30 @@ def execute_convergence(tenant_id, group_id, build_timeout, waiting,
     now_dt = yield Effect(Func(datetime.utcnow))
     all_data = yield msg_with_time(
         "gather-convergence-data",
-        convergence_exec_data(tenant_id, group_id, now_dt,
-                              get_executor=get_executor))
+        timed('gather', convergence_exec_data(tenant_id, group_id, now_dt,
+                                              get_executor=get_executor)))
     (executor, scaling_group, group_state, desired_group_state,
      resources) = all_data
 
     # prepare plan
-    steps = executor.plan(desired_group_state, datetime_to_epoch(now_dt),
-                          build_timeout, step_limits, **resources)
+    steps = yield timed('plan', Effect(Func(partial(
+        executor.plan, desired_group_state, datetime_to_epoch(now_dt),
+        build_timeout, step_limits, **resources))))
     yield log_steps(steps)
 
     # Execute plan
     yield msg('execute-convergence',
               steps=steps, now=now_dt, desired=desired_group_state,
               **resources)
-    worst_status, reasons = yield _execute_steps(steps)
+    worst_status, reasons = yield _execute_steps(tenant_id, steps)
+    # Groups waiting on LIMITED_RETRY steps are not idle: they are given up
+    # on after limited_retry_iterations iterations, which backing them off
+    # would stretch.
+    if (worst_status != StepResult.LIMITED_RETRY and steps and
+            all(isinstance(step, ConvergeLater) for step in steps)):
+        keep_going = ConvergenceIterationStatus.Idle()
+    else:
+        keep_going = ConvergenceIterationStatus.Continue()
 
     if worst_status != StepResult.LIMITED_RETRY:
         # If we're not waiting any more, there's no point in keeping track of
@@ -322,10 +353,11 @@ def execute_convergence(tenant_id, group_id, build_timeout, waiting,
 
     # Handle the status from execution
     if worst_status == StepResult.SUCCESS:
-        result = yield convergence_succeeded(
-            executor, scaling_group, group_state, resources, now_dt)
+        result = yield timed('convergence-succeeded', convergence_succeeded(
+            executor, scaling_group, group_state, resources, now_dt))
     elif worst_status == StepResult.FAILURE:
-        result = yield convergence_failed(scaling_group, reasons)
+        result = yield timed('convergence-failed',
+                             convergence_failed(scaling_group, reasons))
     elif worst_status is StepResult.LIMITED_RETRY:
         # We allow further iterations to proceed as long as we haven't been
         # waiting for a LIMITED_RETRY for N consecutive iterations.
@@ -334,14 +366,16 @@ def execute_convergence(tenant_id, group_id, build_timeout, waiting,
             yield msg('converge-limited-retry-too-long')
             yield clean_waiting
             # Prefix "Timed out" to all limited retry reasons
-            result = yield convergence_failed(scaling_group, reasons, True)
+            result = yield timed(
+                'convergence-failed',
+                convergence_failed(scaling_group, reasons, True))
         else:
             yield waiting.modify(
                 lambda group_iterations:
                     group_iterations.set(group_id, current_iterations + 1))
-            result = ConvergenceIterationStatus.Continue()
+            result = keep_going
     else:
-        result = ConvergenceIterationStatus.Continue()
+        result = keep_going
     yield do_return(result)
 
 
@@ -366,8 +400,9 @@ def convergence_succeeded(executor, scaling_group, group_state, resources,
         yield cf_msg('group-status-active',
                      status=ScalingGroupStatus.ACTIVE.name)
     # update servers cache with latest servers
-    yield executor.update_cache(scaling_group, now, include_deleted=False,
-                                **resources)
+    yield timed('update-cache',
+                executor.update_cache(scaling_group, now,
+                                      include_deleted=False, **resources))
     yield do_return(ConvergenceIterationStatus.Stop())
 
 
@@ -539,7 +574,8 @@ def get_my_divergent_groups(my_buckets, all_buckets, divergent_flags):
     num_buckets = len(all_buckets)
     converging = [
         info for info in dirty_info
-        if bucket_of_tenant(info['tenant_id'], num_buckets) in my_buckets]
+        if bucket_of_group(info['tenant_id'], info['group_id'],
+                           num_buckets) in my_buckets]
     return converging
 
 
@@ -551,16 +587,21 @@ def eff_finally(eff, after_eff):
 
 @do
 def converge_one_group(currently_converging, recently_converged, waiting,
-                       tenant_id, group_id, version,
+                       flag_versions, tenant_id, group_id, version,
                        build_timeout, limited_retry_iterations, step_limits,
                        execute_convergence=execute_convergence):
     """
     Converge one group, non-concurrently, and clean up the dirty flag when
-    done.
+    done. Whether the iteration was idle is recorded with
+    :obj:`RecordConvergence`, so that idle groups back off.
 
     :param Reference currently_converging: pset of currently converging groups
     :param Reference recently_converged: pmap of recently converged groups
     :param Reference waiting: pmap of waiting groups
+    :param Reference flag_versions: pmap of divergent flag path to its
+        version, as per :func:`get_divergent_versions`. The group's flag is
+        forgotten whenever it is deleted, as its version is then stale, and
+        statted again when it is kept, in case it was set again meanwhile.
     :param str tenant_id: the tenant ID of the group that is converging
     :param str group_id: the ID of the group that is converging
     :param version: version number of ZNode of the group's dirty flag
@@ -580,6 +621,20 @@ def converge_one_group(currently_converging, recently_converged, waiting,
         execute_convergence(tenant_id, group_id, build_timeout, waiting,
                             limited_retry_iterations, step_limits),
         mark_recently_converged)
+    flag = CONVERGENCE_DIRTY_DIR + '/' + format_dirty_flag(tenant_id, group_id)
+
+    def delete_flag(version):
+        return flag_versions.modify(
+            lambda versions: versions.discard(flag)).on(
+                lambda _: delete_divergent_flag(tenant_id, group_id, version))
+
+    def refresh_flag_version():
+        # Setting the flag again does not change the divergent directory's
+        # children, so only a stat shows its new version
+        return Effect(GetStat(flag)).on(
+            lambda stat: flag_versions.modify(
+                lambda versions: versions.discard(flag) if stat is None
+                else versions.set(flag, stat.version)))
 
     try:
         result = yield non_concurrently(currently_converging, group_id, cvg)
@@ -589,44 +644,53 @@ def converge_one_group(currently_converging, recently_converged, waiting,
     except NoSuchScalingGroupError:
         yield err(None, 'converge-fatal-error')
         yield _clean_waiting(waiting, group_id)
-        yield delete_divergent_flag(tenant_id, group_id, version)
+        yield delete_flag(version)
         return
     except Exception:
         # We specifically don't clean up the dirty flag in the case of
         # unexpected errors, so convergence will be retried.
         yield err(None, 'converge-non-fatal-error')
     else:
+        yield Effect(RecordConvergence(
+            group_id, version, result == ConvergenceIterationStatus.Idle()))
+
         @match(ConvergenceIterationStatus)
         class clean_up(object):
             def Continue():
-                return Effect(Constant(None))
+                return refresh_flag_version()
+
+            def Idle():
+                return refresh_flag_version()
 
             def Stop():
-                return delete_divergent_flag(tenant_id, group_id, version)
+                return delete_flag(version)
 
             def GroupDeleted():
                 # Delete the divergent flag to avoid any queued-up convergences
                 # that will imminently fail.
-                return delete_divergent_flag(tenant_id, group_id, -1)
+                return delete_flag(-1)
         yield clean_up(result)
 
 
 @do
 def converge_all_groups(
-        currently_converging, recently_converged, waiting,
+        currently_converging, recently_converged, waiting, flag_versions,
         my_buckets, all_buckets,
         divergent_flags, build_timeout, interval,
         limited_retry_iterations, step_limits,
         converge_one_group=converge_one_group):
     """
     Check for groups that need convergence and which match up to the
-    buckets we've been allocated.
+    buckets we've been allocated, and queue their convergence with
+    :obj:`QueuedConvergence`.
 
     :param Reference currently_converging: pset of currently converging groups
     :param Reference recently_converged: pmap of group ID to time last
         convergence finished
     :param Reference waiting: pmap of group ID to number of iterations already
         waited
+    :param Reference flag_versions: pmap of divergent flag path to its
+        version, as per :func:`get_divergent_versions`
     :param my_buckets: The buckets that should be checked for group IDs to
         converge on.
     :param all_buckets: The set of all buckets that can be checked for group
@@ -636,7 +700,10 @@ def converge_all_groups(
         building before it's is timed out and deleted
     :param number interval: number of seconds between attempts at convergence.
         Groups will not be converged if less than this amount of time has
-        passed since the end of its last convergence.
+        passed since the end of its last convergence. Groups backed off after
+        idle iterations, as per :obj:`GetBackedOff`, wait longer, unless the
+        version of their divergent flag has changed since. Their flags are
+        statted again on every call to notice that.
     :param int limited_retry_iterations: number of iterations to wait for
         LIMITED_RETRY steps
     :param dict step_limits: Mapping of step class to number of executions
@@ -654,41 +721,143 @@ def converge_all_groups(
     yield msg('converge-all-groups', group_infos=group_infos,
               currently_converging=list(cc))
 
-    @do
-    def converge(tenant_id, group_id, dirty_flag):
-        stat = yield Effect(GetStat(dirty_flag))
-        # If the node disappeared, ignore it. `stat` will be None here if the
-        # divergent flag was discovered only after the group is removed from
-        # currently_converging, but before the divergent flag is deleted, and
-        # then the deletion happens, and then our GetStat happens. This
-        # basically means it happens when one convergence is starting as
-        # another one for the same group is ending.
-        if stat is None:
-            yield msg('converge-divergent-flag-disappeared', znode=dirty_flag)
-        else:
-            eff = converge_one_group(currently_converging, recently_converged,
-                                     waiting,
-                                     tenant_id, group_id,
-                                     stat.version, build_timeout,
-                                     limited_retry_iterations, step_limits)
-            result = yield Effect(TenantScope(eff, tenant_id))
-            yield do_return(result)
+    def converge(tenant_id, group_id, dirty_flag, version):
+        # If the node disappeared, ignore it. `version` will be None here if
+        # the divergent flag was discovered only after the group is removed
+        # from currently_converging, but before the divergent flag is
+        # deleted, and then the deletion happens, and then our GetStat
+        # happens. This basically means it happens when one convergence is
+        # starting as another one for the same group is ending.
+        if version is None:
+            return msg('converge-divergent-flag-disappeared', znode=dirty_flag)
+        eff = converge_one_group(currently_converging, recently_converged,
+                                 waiting, flag_versions,
+                                 tenant_id, group_id,
+                                 version, build_timeout,
+                                 limited_retry_iterations, step_limits)
+        return Effect(QueuedConvergence(
+            tenant_id, group_id, version, group_id in waiting_groups,
+            Effect(TenantScope(eff, tenant_id))))
 
     recent_groups = yield get_recently_converged_groups(recently_converged,
                                                         interval)
+    waiting_groups = yield waiting.read()
+    # Don't converge a group if it has recently been converged.
+    group_infos = [info for info in group_infos
+                   if info['group_id'] not in recent_groups]
+    # Nor if it is backed off, unless its flag was set again since. Setting
+    # a flag again does not change the children of the divergent directory,
+    # so the versions kept of backed off groups' flags are refreshed first.
+    backed_off = yield Effect(GetBackedOff())
+    backed_off_paths = [info['dirty-flag'] for info in group_infos
+                        if info['group_id'] in backed_off]
+    if backed_off_paths:
+        fresh = yield refresh_divergent_versions(flag_versions,
+                                                 backed_off_paths)
+
+        def flag_set_again(info):
+            version = fresh.get(info['dirty-flag'])
+            return (version is not None and
+                    version != backed_off[info['group_id']])
+
+        group_infos = [info for info in group_infos
+                       if info['group_id'] not in backed_off or
+                       flag_set_again(info)]
+    versions = yield get_divergent_versions(
+        flag_versions, divergent_flags,
+        [info['dirty-flag'] for info in group_infos])
     effs = []
     for info in group_infos:
         tenant_id, group_id = info['tenant_id'], info['group_id']
-        if group_id in recent_groups:
-            # Don't converge a group if it has recently been converged.
-            continue
-        eff = converge(tenant_id, group_id, info['dirty-flag'])
+        eff = converge(tenant_id, group_id, info['dirty-flag'],
+                       versions.get(info['dirty-flag']))
         effs.append(
             with_log(eff, tenant_id=tenant_id, scaling_group_id=group_id))
 
     yield do_return(parallel(effs))
 
 
+DIVERGENT_FLAG_STAT_BATCH = 10
+"""
+Number of divergent flags statted at once by :func:`get_divergent_versions`.
+This is the default size of the ZooKeeper client's thread pool.
+"""
+
+
+@do
+def get_divergent_versions(flag_versions, divergent_flags, paths,
+                           batch_size=DIVERGENT_FLAG_STAT_BATCH):
+    """
+    Get the versions of the divergent flags at ``paths``.
+
+    Versions of flags seen before are kept in ``flag_versions`` and not
+    fetched again; only new flags are statted, ``batch_size`` at a time, so
+    as not to hog the ZooKeeper client's threads. Flags that are no longer
+    divergent are forgotten. A flag being set again does not change the
+    children of the divergent directory, so :func:`converge_one_group`
+    refreshes the kept version after every iteration that keeps the flag, and
+    :func:`converge_all_groups` those of backed off groups with
+    :func:`refresh_divergent_versions`.
+
+    :param Reference flag_versions: pmap of flag path to its version
+    :param divergent_flags: Names of all the divergent flags
+    :param paths: Paths of the flags to get versions of
+
+    :return: Effect of dict of path to version, without the flags that do
+        not exist anymore.
+    """
+    present = set(CONVERGENCE_DIRTY_DIR + '/' + flag
+                  for flag in divergent_flags)
+    known = yield flag_versions.read()
+    versions = {path: known[path] for path in paths if path in known}
+    fetched = yield _stat_flags(
+        [path for path in paths if path not in versions], batch_size)
+    if fetched or set(known) - present:
+        yield flag_versions.modify(
+            lambda versions: pmap(
+                {path: version for path, version in versions.items()
+                 if path in present}).update(fetched))
+    versions.update(fetched)
+    yield do_return(versions)
+
+
+@do
+def refresh_divergent_versions(flag_versions, paths,
+                               batch_size=DIVERGENT_FLAG_STAT_BATCH):
+    """
+    Stat the divergent flags at ``paths`` again, ``batch_size`` at a time,
+    and keep their versions in ``flag_versions``, forgetting the flags that
+    do not exist anymore.
+
+    :param Reference flag_versions: pmap of flag path to its version
+    :param paths: Paths of the flags to refresh
+
+    :return: Effect of dict of path to version, without the flags that do
+        not exist anymore.
+    """
+    fetched = yield _stat_flags(paths, batch_size)
+    paths = set(paths)
+    yield flag_versions.modify(
+        lambda versions: pmap(
+            {path: version for path, version in versions.items()
+             if path not in paths}).update(fetched))
+    yield do_return(fetched)
+
+
+@do
+def _stat_flags(paths, batch_size):
+    """
+    Stat the flags at ``paths``, ``batch_size`` at a time, returning an
+    effect of dict of path to version of the flags that exist.
+    """
+    fetched = {}
+    for batch in partition_all(batch_size, paths):
+        stats = yield parallel([Effect(GetStat(path)) for path in batch])
+        fetched.update((path, stat.version)
+                       for path, stat in zip(batch, stats) if stat is not None)
+    yield do_return(fetched)
+
+
 @do
 def get_recently_converged_groups(recently_converged, interval):
     """
@@ -705,6 +874,36 @@ def get_recently_converged_groups(recently_converged, interval):
     yield do_return(cleaned.keys())
 
 
+DEFAULT_NUM_BUCKETS = 10
+"""
+Default number of buckets groups are mapped to and distributed between
+converger nodes.
+"""
+
+DEFAULT_RING_BUCKETS = 128
+"""
+Default number of buckets when they are distributed with a consistent-hash
+ring. There should be many more of them than nodes, for every node to get an
+even share.
+"""
+
+
+def uses_hash_ring():
+    """
+    Are buckets distributed between converger nodes with a consistent-hash
+    ring and tenants mapped to them with :func:`jump_hash`? This is so if the
+    ``converger.hash_ring`` config is set. Otherwise buckets are dealt out in
+    turn by Kazoo and tenants are mapped to them by their hash modulo the
+    number of buckets.
+
+    Nodes that map groups differently compute different owners for the same
+    group and would converge it at the same time, so this config and
+    ``converger.buckets`` must be switched on all converger nodes together:
+    stop every converger node, change the config, then start them again.
+    """
+    return bool(config_value('converger.hash_ring'))
+
+
 def _stable_hash(s):
     """Get a stable hash of a string as an integer."""
     # :func:`hash` is not stable with different pythons/architectures.
@@ -713,14 +912,43 @@ def _stable_hash(s):
 
 def bucket_of_tenant(tenant, num_buckets):
     """
-    Return the bucket associated with the given tenant.
+    Return the bucket associated with the given tenant. With
+    :func:`uses_hash_ring`, tenants are mapped with :func:`jump_hash`, so
+    changing the number of buckets moves only the tenants that need to move.
 
     :param str tenant: tenant ID
     :param int num_buckets: global number of buckets
     """
+    if uses_hash_ring():
+        return jump_hash(_stable_hash(tenant), num_buckets)
     return _stable_hash(tenant) % num_buckets
 
 
+def is_split_tenant(tenant_id):
+    """
+    Are the groups of the tenant spread over buckets instead of all being in
+    the tenant's bucket? This is so for the tenants listed in the
+    ``converger.split_tenants`` config, whose many groups would otherwise
+    all be converged by the same node.
+    """
+    return tenant_id in (config_value('converger.split_tenants') or ())
+
+
+def bucket_of_group(tenant_id, group_id, num_buckets):
+    """
+    Return the bucket associated with the given group: the bucket of its
+    tenant, unless the tenant is split as per :func:`is_split_tenant`.
+
+    :param str tenant_id: tenant ID
+    :param str group_id: group ID
+    :param int num_buckets: global number of buckets
+    """
+    if is_split_tenant(tenant_id):
+        return bucket_of_tenant(format_dirty_flag(tenant_id, group_id),
+                                num_buckets)
+    return bucket_of_tenant(tenant_id, num_buckets)
+
+
 class Converger(MultiService):
     """
     A service that searches for groups that need converging and then does the
@@ -734,14 +962,37 @@ class Converger(MultiService):
       the API). group IDs are deterministically mapped to these buckets.
     - we repeatedly check for 'dirty flags' created by the
       :obj:`ConvergenceStarter` service, and determine if they're "ours" with
-      the partitioner.
+      the partitioner. The flags last seen by the ZooKeeper watch, and the
+      versions of those we converged, are kept in memory so that they are
+      not all read again on every check.
     - we ensure we don't execute convergence for the same group concurrently.
+    - tenant-wide data gathered for a group is shared with the tenant's other
+      groups converging in the same run via a :obj:`GatherCache`.
+    - times when CLB nodes started DRAINING are cached in a
+      :obj:`CLBDrainedAtCache` for the tenants in our buckets, except for
+      split tenants, whose groups other nodes converge too.
+    - how long each phase of convergence takes, and how it turns out, is
+      recorded in a :obj:`TimingRegistry`.
+    - at most ``max_in_flight`` groups are converged at once. The others wait
+      in a :obj:`ConvergenceQueue`, which starts newly divergent groups first
+      and those waiting on LIMITED_RETRY steps last, taking turns between
+      tenants.
+    - groups whose iterations have nothing to do but wait, e.g. for servers
+      to build, back off exponentially as per :obj:`ConvergenceBackoff`.
+    - steps are executed within per tenant and step type limits of a
+      :obj:`StepThrottle`, which also holds back the steps of tenants that
+      were rate-limited.
+    - CLB steps of a tenant's groups for the same load balancer are merged
+      by a :obj:`StepBatcher`.
     """
 
     def __init__(self, log, dispatcher, num_buckets, partitioner_factory,
                  build_timeout, interval,
                  limited_retry_iterations, step_limits,
-                 converge_all_groups=converge_all_groups):
+                 converge_all_groups=converge_all_groups,
+                 gather_cache_ttl=None, clock=None, timings=None,
+                 max_in_flight=None, max_backoff=None, step_throttles=None,
+                 clb_batch_window=None):
         """
         :param log: a bound log
         :param dispatcher: The dispatcher to use to perform effects.
@@ -761,6 +1012,23 @@ class Converger(MultiService):
             LIMITED_RETRY steps
         :param dict step_limits: Mapping of step name to number of executions
             allowed in a convergence cycle
+        :param float gather_cache_ttl: Number of seconds gathered tenant data
+            is shared between groups. Defaults to ``interval`` and should not
+            be more than that.
+        :param clock: ``IReactorTime`` provider used by the gather cache
+            and to time convergence
+        :param timings: :obj:`TimingRegistry` to record timings of
+            convergence in. A new one is created if not given.
+        :param int max_in_flight: Maximum number of groups converged at once.
+            Defaults to :data:`DEFAULT_MAX_IN_FLIGHT`.
+        :param float max_backoff: Maximum number of seconds idle groups are
+            backed off. Defaults to :data:`DEFAULT_MAX_BACKOFF`.
+        :param dict step_throttles: Mapping of step name to dict of
+            :obj:`StepLimit` attributes for executing steps of that type
+        :param float clb_batch_window: Number of seconds CLB steps submitted
+            while another for their load balancer is executing wait to be
+            merged with those of other groups of the tenant. Defaults to
+            :data:`DEFAULT_BATCH_WINDOW`.
         """
         MultiService.__init__(self)
         self.log = log.bind(otter_service='converger')
@@ -775,24 +1043,75 @@ class Converger(MultiService):
         self.interval = interval
         self.limited_retry_iterations = limited_retry_iterations
         self.step_limits = get_step_limits_from_conf(step_limits)
+        if clock is None:  # pragma: no cover
+            from twisted.internet import reactor as clock
+        if gather_cache_ttl is None:
+            gather_cache_ttl = interval
+        if max_in_flight is None:
+            max_in_flight = DEFAULT_MAX_IN_FLIGHT
+        if max_backoff is None:
+            max_backoff = DEFAULT_MAX_BACKOFF
+        if clb_batch_window is None:
+            clb_batch_window = DEFAULT_BATCH_WINDOW
 
         # ephemeral mutable state
+        self.clock = clock
+        self.timings = TimingRegistry() if timings is None else timings
+        self.gather_cache = GatherCache(clock, gather_cache_ttl)
+        self.drained_at_cache = CLBDrainedAtCache(is_shared=is_split_tenant)
+        self.queue = ConvergenceQueue(max_in_flight)
+        self.backoff = ConvergenceBackoff(clock, interval, max_backoff)
+        self.throttle = StepThrottle(
+            clock, get_step_throttles_from_conf(step_throttles or {}))
+        self.batcher = StepBatcher(clock, clb_batch_window)
         self.currently_converging = Reference(pset())
         self.recently_converged = Reference(pmap())
         # Groups we're waiting on temporarily, and may give up on.
         self.waiting = Reference(pmap())  # {group_id: num_iterations_waited}
+        self.flag_versions = Reference(pmap())  # {flag path: version}
+        # Divergent flags as last seen by the watch; None until it fires
+        self.divergent_flags = None
 
     def _converge_all(self, my_buckets, divergent_flags):
         """Run :func:`converge_all_groups` and log errors."""
+        self.gather_cache.expire()
+        self.throttle.expire()
+        self.drained_at_cache.retain(
+            lambda tenant_id: bucket_of_tenant(
+                tenant_id, len(self._buckets)) in my_buckets)
+        divergent = set(
+            info['group_id'] for info in get_my_divergent_groups(
+                my_buckets, self._buckets, divergent_flags))
+        self.queue.retain(lambda group_id: group_id in divergent)
         eff = self._converge_all_groups(
             self.currently_converging, self.recently_converged,
-            self.waiting,
+            self.waiting, self.flag_versions,
             my_buckets, self._buckets, divergent_flags, self.build_timeout,
             self.interval, self.limited_retry_iterations, self.step_limits)
         return eff.on(
             error=lambda e: err(
                 exc_info_to_failure(e), 'converge-all-groups-error'))
 
+    def _perform(self, eff):
+        """
+        Perform effect with the dispatcher extended to share gathered data
+        through the gather cache and the CLB nodes' drained_at cache, to
+        record timings, to queue group convergences, to back them off, and to
+        throttle and batch their steps.
+        """
+        dispatcher = ComposedDispatcher([
+            get_gather_cache_dispatcher(self.gather_cache),
+            get_drained_at_dispatcher(self.drained_at_cache),
+            get_timing_dispatcher(self.clock, self.timings),
+            get_queue_dispatcher(self.queue),
+            get_backoff_dispatcher(self.backoff),
+            get_throttle_dispatcher(self.throttle),
+            self._dispatcher])
+        dispatcher = ComposedDispatcher([
+            get_batch_dispatcher(self.batcher, execute_step, dispatcher),
+            dispatcher])
+        return perform(dispatcher, self._with_conv_runid(eff))
+
     def _with_conv_runid(self, eff):
         """
         Return Effect wrapped with converger_run_id log field
@@ -803,17 +1122,21 @@ class Converger(MultiService):
 
     def buckets_acquired(self, my_buckets):
         """
-        Get dirty flags from zookeeper and run convergence with them.
+        Get dirty flags from zookeeper, unless the watch has already told us
+        about them, and run convergence with them.
 
         This is used as the partitioner callback.
         """
-        ceff = Effect(GetChildren(CONVERGENCE_DIRTY_DIR)).on(
-            partial(self._converge_all, my_buckets))
+        if self.divergent_flags is None:
+            ceff = Effect(GetChildren(CONVERGENCE_DIRTY_DIR)).on(
+                partial(self._converge_all, my_buckets))
+        else:
+            ceff = self._converge_all(my_buckets, self.divergent_flags)
         # Return deferred as 1-element tuple for testing only.
         # Returning deferred would block otter from shutting down until
         # it is fired which we don't need to do since convergence is itempotent
         # and will be triggered in next start of otter
-        return (perform(self._dispatcher, self._with_conv_runid(ceff)), )
+        return (self._perform(ceff), )
 
     def divergent_changed(self, children):
         """
@@ -821,17 +1144,28 @@ class Converger(MultiService):
         divergent groups have changed. If any of the divergent flags are for
         tenants associated with this service's buckets, a convergence will be
         triggered.
+
+        The kept versions of flags that are not reported anymore are
+        forgotten right away, so that a flag created again gets statted
+        rather than taken to have its old version.
         """
+        self.divergent_flags = children
+        paths = set(CONVERGENCE_DIRTY_DIR + '/' + child for child in children)
+        sync_perform(reference_dispatcher, self.flag_versions.modify(
+            lambda versions: pmap(
+                {path: version for path, version in versions.items()
+                 if path in paths})))
         if self.partitioner.get_current_state() != PartitionState.ACQUIRED:
             return
         my_buckets = self.partitioner.get_current_buckets()
         changed_buckets = set(
-            bucket_of_tenant(parse_dirty_flag(child)[0], len(self._buckets))
+            bucket_of_group(*parse_dirty_flag(child),
+                            num_buckets=len(self._buckets))
             for child in children)
         if set(my_buckets).intersection(changed_buckets):
             # the return value is ignored, but we return this for testing
             eff = self._converge_all(my_buckets, children)
-            return perform(self._dispatcher, self._with_conv_runid(eff))
+            return self._perform(eff)
 
 
 @attr.s
@@ -0,0 +1,303 @@
+"""
+Concurrency and rate limits on executing convergence steps, shared by all the
+groups converging on this node.
+
+:func:`steps_to_effect <otter.convergence.effecting.steps_to_effect>` executes
+every step with a :obj:`ThrottledStep` intent, performed by the converger's
+:obj:`StepThrottle`. For each tenant, steps of a type configured with a
+:obj:`StepLimit` are executed at most ``concurrency`` at a time and started at
+most ``rate`` per second.
+
+When Nova or CLB rate-limit a request of a tenant, the tenant's steps that use
+that service are not executed, but retried by a later convergence iteration,
+until the time the service told us to retry after.
+"""
+
+from functools import partial
+
+import attr
+
+from effect import TypeDispatcher
+
+from iso8601 import ParseError
+
+from sumtypes import match
+
+from twisted.internet.defer import DeferredSemaphore, maybeDeferred, succeed
+from twisted.internet.task import deferLater
+from twisted.python.failure import Failure
+
+from txeffect import deferred_performer, perform
+
+from otter.cloud_client import CLBRateLimitError, NovaRateLimitError
+from otter.constants import ServiceType
+from otter.convergence.model import ErrorReason, StepResult
+from otter.convergence.steps import (
+    AddNodesToCLB,
+    ChangeCLBNode,
+    CreateServer,
+    DeleteServer,
+    RemoveNodesFromCLB,
+    SetMetadataItemOnServer)
+from otter.convergence.transforming import step_conf_to_class
+from otter.util.timestamp import timestamp_to_epoch
+
+
+DEFAULT_RETRY_AFTER = 10
+"""
+Number of seconds a tenant's requests to a service are held back after being
+rate-limited, when the service does not tell when to retry.
+"""
+
+_STEP_SERVICES = {
+    CreateServer: ServiceType.CLOUD_SERVERS,
+    DeleteServer: ServiceType.CLOUD_SERVERS,
+    SetMetadataItemOnServer: ServiceType.CLOUD_SERVERS,
+    AddNodesToCLB: ServiceType.CLOUD_LOAD_BALANCERS,
+    RemoveNodesFromCLB: ServiceType.CLOUD_LOAD_BALANCERS,
+    ChangeCLBNode: ServiceType.CLOUD_LOAD_BALANCERS,
+}
+
+_RATE_LIMIT_ERRORS = {
+    NovaRateLimitError: ServiceType.CLOUD_SERVERS,
+    CLBRateLimitError: ServiceType.CLOUD_LOAD_BALANCERS,
+}
+
+
+@attr.s
+class StepLimit(object):
+    """
+    Limits on executing the steps of a type for a tenant.
+
+    :ivar int concurrency: Maximum number of steps executed at once, or None
+        for no limit
+    :ivar float rate: Maximum number of steps started per second, or None for
+        no limit
+    :ivar int burst: Number of steps that can be started at once when none
+        were started for a while
+    """
+    concurrency = attr.ib(default=None)
+    rate = attr.ib(default=None)
+    burst = attr.ib(default=1)
+
+
+def get_step_throttles_from_conf(throttle_conf):
+    """
+    Get step limits from configuration.
+
+    :param dict throttle_conf: Mapping of step name, as in
+        :data:`step_conf_to_class`, to a dict of the :obj:`StepLimit`
+        attributes
+
+    :return: `dict` of step class -> :obj:`StepLimit`
+    """
+    return {step_conf_to_class[step_conf]: StepLimit(**limit)
+            for step_conf, limit in throttle_conf.items()}
+
+
+class TokenBucket(object):
+    """
+    A token bucket filled with ``rate`` tokens per second, up to ``burst``
+    tokens.
+
+    :param float rate: Tokens added per second
+    :param int burst: Maximum number of tokens
+    :param float now: Current time
+    """
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def take(self, now):
+        """
+        Take a token. If there are none, the next one is taken in advance.
+
+        :return: Number of seconds to wait until the taken token is there
+        """
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(0, -self.tokens / self.rate)
+
+    def is_full(self, now):
+        """Is the bucket filled up to ``burst`` tokens at ``now``?"""
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+
+class _Lane(object):
+    """Executions of the steps of a type for a tenant."""
+
+    def __init__(self, limit, now):
+        self.semaphore = (DeferredSemaphore(limit.concurrency)
+                          if limit.concurrency is not None else None)
+        self.bucket = (TokenBucket(limit.rate, limit.burst, now)
+                       if limit.rate is not None else None)
+        self.in_flight = 0  # steps waiting or executing
+
+    def is_idle(self, now):
+        """
+        Is the lane as good as new at ``now``, with no steps in flight and a
+        full token bucket?
+        """
+        return self.in_flight == 0 and (self.bucket is None or
+                                        self.bucket.is_full(now))
+
+
+@match(ErrorReason)
+class _reason_error(object):
+    """Get the exception of an ErrorReason, or None."""
+    def Exception(exc_info):
+        return exc_info[1]
+
+    def _(_):
+        return None
+
+
+def _retry_delay(retry_after, now):
+    """
+    Get number of seconds to wait before retrying as per the ``retry_after``
+    of a rate limiting error, which is a number of seconds or a timestamp.
+    """
+    if retry_after is None:
+        return DEFAULT_RETRY_AFTER
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        return timestamp_to_epoch(retry_after) - now
+    except ParseError:
+        return DEFAULT_RETRY_AFTER
+
+
+class StepThrottle(object):
+    """
+    Executes steps within per tenant and step type :obj:`StepLimit`, and holds
+    back steps of tenants that were rate-limited by the service they use.
+
+    A tenant's state for a step type is kept across convergence iterations,
+    so that the rate limit holds between them, until :meth:`expire` finds it
+    idle, when it is no different from a new one.
+
+    :param clock: ``IReactorTime`` provider
+    :param dict limits: Mapping of step class to :obj:`StepLimit`. Steps of
+        other types are not limited.
+    """
+
+    def __init__(self, clock, limits=None):
+        self.clock = clock
+        self.limits = {} if limits is None else limits
+        self._lanes = {}  # (tenant_id, step type) -> _Lane
+        self._rate_limited = {}  # (tenant_id, service type) -> time
+
+    def run(self, tenant_id, step_type, f, *args, **kwargs):
+        """
+        Call ``f``, which executes a step of type ``step_type`` for the
+        tenant, when the limits allow it.
+
+        :return: ``Deferred`` of the result of ``f``, or of a RETRY result if
+            the tenant is rate-limited by the service used by the step.
+        """
+        now = self.clock.seconds()
+        service = _STEP_SERVICES.get(step_type)
+        until = self._rate_limited.get((tenant_id, service))
+        if until is not None:
+            if now < until:
+                return succeed((StepResult.RETRY, [ErrorReason.String(
+                    'rate-limited by {} for {:.0f} more seconds'.format(
+                        service.name, until - now))]))
+            del self._rate_limited[(tenant_id, service)]
+
+        limit = self.limits.get(step_type)
+        if limit is None:
+            d = maybeDeferred(f, *args, **kwargs)
+        else:
+            key = (tenant_id, step_type)
+            lane = self._lanes.get(key)
+            if lane is None:
+                lane = self._lanes[key] = _Lane(limit, now)
+            d = self._run_in_lane(lane, f, args, kwargs)
+        return d.addBoth(self._check_rate_limited, tenant_id)
+
+    def expire(self):
+        """
+        Forget the tenants' lanes that are idle, as per :meth:`_Lane.is_idle`,
+        and the rate limiting of services that has ended.
+        """
+        now = self.clock.seconds()
+        self._lanes = {key: lane for key, lane in self._lanes.items()
+                       if not lane.is_idle(now)}
+        self._rate_limited = {key: until
+                              for key, until in self._rate_limited.items()
+                              if now < until}
+
+    def _run_in_lane(self, lane, f, args, kwargs):
+        """Call ``f`` once there is room and a token in ``lane``."""
+        def paced():
+            wait = (lane.bucket.take(self.clock.seconds())
+                    if lane.bucket is not None else 0)
+            if wait > 0:
+                return deferLater(self.clock, wait, f, *args, **kwargs)
+            return maybeDeferred(f, *args, **kwargs)
+
+        def done(result):
+            lane.in_flight -= 1
+            return result
+
+        lane.in_flight += 1
+        if lane.semaphore is not None:
+            d = lane.semaphore.run(paced)
+        else:
+            d = paced()
+        return d.addBoth(done)
+
+    def _check_rate_limited(self, result, tenant_id):
+        """
+        Hold back the tenant's steps of a service if ``result``, the result
+        of executing a step, is or has a rate limiting error of the service.
+        """
+        if isinstance(result, Failure):
+            errors = [result.value]
+        else:
+            status, reasons = result
+            errors = ([] if status == StepResult.SUCCESS
+                      else map(_reason_error, reasons))
+        now = self.clock.seconds()
+        for error in errors:
+            service = _RATE_LIMIT_ERRORS.get(type(error))
+            if service is not None:
+                self._rate_limited[(tenant_id, service)] = max(
+                    now + _retry_delay(error.retry_after, now),
+                    self._rate_limited.get((tenant_id, service), now))
+        return result
+
+
+@attr.s
+class ThrottledStep(object):
+    """
+    Intent to perform ``effect``, the execution of a step of type
+    ``step_type`` for a tenant, when the :obj:`StepThrottle` allows it.
+    """
+    tenant_id = attr.ib()
+    step_type = attr.ib()
+    effect = attr.ib()
+
+
+@deferred_performer
+def perform_throttled_step(throttle, dispatcher, intent):
+    """Perform :obj:`ThrottledStep` with ``throttle``."""
+    return throttle.run(intent.tenant_id, intent.step_type,
+                        perform, dispatcher, intent.effect)
+
+
+def get_throttle_dispatcher(throttle):
+    """
+    Get dispatcher that performs :obj:`ThrottledStep` with the given
+    :obj:`StepThrottle`.
+    """
+    return TypeDispatcher(
+        {ThrottledStep: partial(perform_throttled_step, throttle)})
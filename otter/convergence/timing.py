@@ -0,0 +1,141 @@
+"""
+Latency histograms and outcome counters of the phases of convergence.
+
+Code wraps a phase in :func:`timed` and the performer of the resulting
+:obj:`Timed` intent, given by :func:`get_timing_dispatcher`, records how long
+it took and how it turned out in a :obj:`TimingRegistry`.
+"""
+
+from bisect import bisect_left
+from collections import Counter
+from functools import partial
+
+import attr
+
+from effect import Effect, TypeDispatcher, sync_performer
+
+import six
+
+
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+"""Upper bounds in seconds of the default histogram buckets."""
+
+
+class Histogram(object):
+    """
+    Counts of observed values in buckets.
+
+    :ivar tuple buckets: Sorted upper bounds of the buckets.  Values greater
+        than the last bound are counted in an overflow bucket.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """
+        Count ``value`` in the bucket it belongs to.
+        """
+        self._counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_json(self):
+        """
+        Get the histogram as a JSON-compatible object.  The bucket counts are
+        cumulative, i.e. each is the count of values up to its bound.
+        """
+        cumulative = 0
+        buckets = []
+        for bound, count in zip(self.buckets + ('+Inf',), self._counts):
+            cumulative += count
+            buckets.append([bound, cumulative])
+        return {'count': self.count, 'sum': self.sum, 'buckets': buckets}
+
+
+class TimingRegistry(object):
+    """
+    Latency :obj:`Histogram` and outcome counts per timed name.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._latencies = {}
+        self._outcomes = {}
+
+    def observe(self, name, seconds, outcome):
+        """
+        Record that what is called ``name`` took ``seconds`` and ended up
+        with ``outcome``.
+        """
+        if name not in self._latencies:
+            self._latencies[name] = Histogram(self.buckets)
+            self._outcomes[name] = Counter()
+        self._latencies[name].observe(seconds)
+        self._outcomes[name][outcome] += 1
+
+    def as_json(self):
+        """
+        Get everything recorded as a JSON-compatible object like::
+
+            {"plan": {"latency": {"count": 2, "sum": 0.3,
+                                  "buckets": [[0.01, 0], ..., ["+Inf", 2]]},
+                      "outcomes": {"success": 2}}}
+        """
+        return {name: {'latency': self._latencies[name].as_json(),
+                       'outcomes': dict(self._outcomes[name])}
+                for name in self._latencies}
+
+
+@attr.s
+class Timed(object):
+    """
+    Intent to perform ``effect`` and record how long it took under ``name``.
+
+    :ivar outcome: Callable getting the outcome to record from the result of
+        ``effect``.  If None, the outcome is ``"success"``.  The outcome is
+        always ``"error"`` if ``effect`` fails.
+    """
+    name = attr.ib()
+    effect = attr.ib()
+    outcome = attr.ib(default=None)
+
+
+def timed(name, eff, outcome=None):
+    """
+    Return Effect of :obj:`Timed`.
+    """
+    return Effect(Timed(name, eff, outcome))
+
+
+@sync_performer
+def perform_timed(clock, registry, dispatcher, intent):
+    """
+    Perform :obj:`Timed` by recording in ``registry`` how long its effect
+    took as per ``clock``.
+    """
+    start = clock.seconds()
+
+    def observe(outcome):
+        registry.observe(intent.name, clock.seconds() - start, outcome)
+
+    def succeeded(result):
+        observe('success' if intent.outcome is None
+                else intent.outcome(result))
+        return result
+
+    def failed(exc_info):
+        observe('error')
+        six.reraise(*exc_info)
+
+    return intent.effect.on(succeeded, failed)
+
+
+def get_timing_dispatcher(clock, registry):
+    """
+    Get dispatcher that performs :obj:`Timed` recording in ``registry``.
+    """
+    return TypeDispatcher({Timed: partial(perform_timed, clock, registry)})
@@ -14,9 +14,12 @@ from toolz.itertoolz import concat, concatv
 
 from otter.convergence.steps import (
     AddNodesToCLB,
+    ChangeCLBNode,
     CreateServer,
     CreateStack,
-    RemoveNodesFromCLB)
+    DeleteServer,
+    RemoveNodesFromCLB,
+    SetMetadataItemOnServer)
 
 
 _optimizers = {}
@@ -96,7 +99,14 @@ _DEFAULT_STEP_LIMITS = pmap({
 })
 
 
-step_conf_to_class = {"create_server": CreateServer}
+step_conf_to_class = {
+    "create_server": CreateServer,
+    "delete_server": DeleteServer,
+    "set_metadata_item_on_server": SetMetadataItemOnServer,
+    "add_nodes_to_clb": AddNodesToCLB,
+    "remove_nodes_from_clb": RemoveNodesFromCLB,
+    "change_clb_node": ChangeCLBNode,
+}
 
 
 def get_step_limits_from_conf(limit_conf):
@@ -0,0 +1,212 @@
+"""
+Bounded queue of group convergences, started in priority order and fairly
+between tenants.
+
+:func:`converge_all_groups <otter.convergence.service.converge_all_groups>`
+finds every divergent group of this node at once. Rather than converging them
+all at the same time, which could mean hundreds of simultaneous convergences
+after a partition change or a burst of policy executions, each one is
+submitted with a :obj:`QueuedConvergence` intent to the converger's
+:obj:`ConvergenceQueue`, which runs at most ``max_in_flight`` of them at a
+time.
+"""
+
+from collections import OrderedDict, deque
+from functools import partial
+
+import attr
+
+from effect import TypeDispatcher
+
+from twisted.internet.defer import Deferred, succeed
+from twisted.python.constants import NamedConstant, Names
+
+from txeffect import deferred_performer, perform
+
+
+DEFAULT_MAX_IN_FLIGHT = 50
+"""
+Default number of group convergences a node runs at once. Before the queue,
+there was no such limit; set ``converger.max_in_flight`` higher to allow more.
+"""
+
+
+class Priority(Names):
+    """
+    Priorities of queued convergences, in the order they are started.
+    """
+
+    NEW = NamedConstant()
+    """
+    The group was marked divergent since its last convergence started on
+    this node, e.g. because a policy was executed or the group is being
+    deleted, so it likely has a capacity deficit or servers to delete.
+    """
+
+    CONTINUING = NamedConstant()
+    """The group is still converging towards the same desired state."""
+
+    WAITING = NamedConstant()
+    """The group is only waiting for LIMITED_RETRY steps to resolve."""
+
+
+@attr.s
+class QueuedConvergence(object):
+    """
+    Intent to perform ``effect``, the convergence of a group, when the
+    :obj:`ConvergenceQueue` has room for it.
+
+    :ivar int version: Version of the group's divergent flag
+    :ivar bool waiting: Whether the group is waiting on LIMITED_RETRY steps
+    """
+    tenant_id = attr.ib()
+    group_id = attr.ib()
+    version = attr.ib()
+    waiting = attr.ib()
+    effect = attr.ib()
+
+
+class ConvergenceQueue(object):
+    """
+    Queue of group convergences that runs at most ``max_in_flight`` of them at
+    a time. Queued convergences are started in the order of their
+    :obj:`Priority`, and round-robin between tenants within a priority so that
+    a tenant with many divergent groups does not starve the others.
+
+    A group is queued only once: submitting a group that is already queued
+    does nothing, just like trying to converge a group that is already
+    converging.
+
+    :param int max_in_flight: Maximum number of convergences run at once
+    """
+
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        # priority -> tenant ID -> deque of (intent, dispatcher, Deferred)
+        self._queues = OrderedDict(
+            (priority, OrderedDict()) for priority in Priority.iterconstants())
+        self._queued = set()   # group IDs
+        self._versions = {}    # group ID -> flag version last started
+        self._starting = False
+
+    def __len__(self):
+        """Number of queued convergences that have not started yet."""
+        return len(self._queued)
+
+    def retain(self, predicate):
+        """
+        Forget the groups for which ``predicate`` returns False, e.g. because
+        their divergent flag was deleted or they are not in this node's
+        buckets anymore. Their queued convergences are dropped, with their
+        submissions succeeding with None, so that they are not converged by
+        this node as well as by the one that now owns them. Their flag
+        versions are forgotten too, so such a group is converged as
+        :obj:`Priority.NEW` when it comes back.
+        """
+        self._versions = {group_id: version
+                          for group_id, version in self._versions.items()
+                          if predicate(group_id)}
+        dropped = []
+        for tenants in self._queues.values():
+            for tenant_id, jobs in tenants.items():
+                kept = deque()
+                for job in jobs:
+                    if predicate(job[0].group_id):
+                        kept.append(job)
+                    else:
+                        dropped.append(job)
+                if kept:
+                    tenants[tenant_id] = kept
+                else:
+                    del tenants[tenant_id]
+        for intent, _, d in dropped:
+            self._queued.remove(intent.group_id)
+            d.callback(None)
+
+    def priority(self, intent):
+        """
+        Get the :obj:`Priority` of the convergence of a
+        :obj:`QueuedConvergence`.
+        """
+        if self._versions.get(intent.group_id) != intent.version:
+            return Priority.NEW
+        elif intent.waiting:
+            return Priority.WAITING
+        else:
+            return Priority.CONTINUING
+
+    def submit(self, dispatcher, intent):
+        """
+        Queue the convergence of a :obj:`QueuedConvergence` to be performed
+        with ``dispatcher``.
+
+        :return: ``Deferred`` of the convergence's result, or of None if the
+            group is already queued
+        """
+        if intent.group_id in self._queued:
+            return succeed(None)
+        d = Deferred()
+        tenants = self._queues[self.priority(intent)]
+        tenants.setdefault(intent.tenant_id, deque()).append(
+            (intent, dispatcher, d))
+        self._queued.add(intent.group_id)
+        self._start()
+        return d
+
+    def _pop(self):
+        """
+        Remove and return the next queued convergence to start, or None if
+        nothing is queued.
+        """
+        for tenants in self._queues.values():
+            if tenants:
+                tenant_id, jobs = tenants.popitem(last=False)
+                job = jobs.popleft()
+                if jobs:
+                    # the tenant goes to the back of the line
+                    tenants[tenant_id] = jobs
+                return job
+        return None
+
+    def _start(self):
+        """Start queued convergences while there is room for them."""
+        # Convergences that finish synchronously call this again while
+        # starting; the loop below will pick up the room they left
+        if self._starting:
+            return
+        self._starting = True
+        try:
+            while self.in_flight < self.max_in_flight:
+                job = self._pop()
+                if job is None:
+                    break
+                intent, dispatcher, d = job
+                self._queued.remove(intent.group_id)
+                self._versions[intent.group_id] = intent.version
+                self.in_flight += 1
+                result = perform(dispatcher, intent.effect)
+                result.addBoth(self._finished)
+                result.chainDeferred(d)
+        finally:
+            self._starting = False
+
+    def _finished(self, result):
+        self.in_flight -= 1
+        self._start()
+        return result
+
+
+@deferred_performer
+def perform_queued_convergence(queue, dispatcher, intent):
+    """Perform :obj:`QueuedConvergence` by submitting it to ``queue``."""
+    return queue.submit(dispatcher, intent)
+
+
+def get_queue_dispatcher(queue):
+    """
+    Get dispatcher that performs :obj:`QueuedConvergence` with the given
+    :obj:`ConvergenceQueue`.
+    """
+    return TypeDispatcher(
+        {QueuedConvergence: partial(perform_queued_convergence, queue)})
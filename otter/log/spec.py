@@ -208,6 +208,9 @@ msg_types = {
         "change in desired number of servers. Either group min or max "
         "capacity has been reached or policy execution will result in current "
         "desired number of servers"),
+    "sch-exec-lag": (
+        "Executed {num_events} scheduled events up to {max_lag_seconds} "
+        "seconds after their trigger time"),
     "sch-exec-pol": "Executing scheduled policy {policy_id}",
     "sch-exec-pol-err": "Error executing scheduled policy {policy_id}"
 }
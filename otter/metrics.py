@@ -20,7 +20,7 @@ from effect.do import do
 from silverberg.cluster import RoundRobinCassandraCluster
 
 from toolz.curried import filter, get_in
-from toolz.dicttoolz import keyfilter, merge
+from toolz.dicttoolz import dissoc, keyfilter, merge
 from toolz.functoolz import compose, flip
 from toolz.itertoolz import groupby
 
@@ -42,7 +42,7 @@ from otter.convergence.model import (
 from otter.effect_dispatcher import get_legacy_dispatcher, get_log_dispatcher
 from otter.log import log as otter_log
 from otter.models.cass import CassScalingGroupCollection
-from otter.models.intents import GetAllValidGroups, get_model_dispatcher
+from otter.models.intents import get_model_dispatcher
 from otter.util.fp import partition_bool
 
 
@@ -265,10 +265,16 @@ def collect_metrics(reactor, config, log, client=None, authenticator=None,
     dispatcher = get_dispatcher(reactor, authenticator, log,
                                 get_service_configs(config), store)
 
-    # calculate metrics on launch_server groups
-    groups = yield perform(dispatcher, Effect(GetAllValidGroups()))
-    groups = [g for g in groups
-              if json.loads(g["launch_config"]).get("type") == "launch_server"]
+    # calculate metrics on launch_server groups, keeping only the columns
+    # needed of each batch of groups as they are scanned
+    groups = []
+
+    def add_groups(batch):
+        groups.extend(
+            dissoc(g, "launch_config") for g in batch
+            if json.loads(g["launch_config"]).get("type") == "launch_server")
+
+    yield store.scan_valid_groups(add_groups, props=["launch_config"])
     tenanted_groups = groupby(lambda g: g["tenantId"], groups)
     group_metrics = yield get_all_metrics(
         dispatcher, tenanted_groups, log, _print=_print)
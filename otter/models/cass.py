@@ -2,10 +2,14 @@
 Cassandra implementation of the store for the front-end scaling groups engine
 """
 
+import base64
 import functools
+import hashlib
 import json
 import time
 import uuid
+import zlib
+from collections import OrderedDict
 from datetime import datetime
 from itertools import cycle, takewhile
 
@@ -24,6 +28,7 @@ from silverberg.client import ConsistencyLevel
 
 from toolz.curried import filter, map
 from toolz.dicttoolz import keymap, merge
+from toolz.itertoolz import concat, groupby, partition_all
 from toolz.functoolz import compose
 
 from twisted.internet import defer
@@ -37,6 +42,7 @@ from otter.models.interface import (
     GroupNotEmptyError,
     GroupState,
     IAdmin,
+    ICLBNodeDrainedAtCache,
     IScalingGroup,
     IScalingGroupCollection,
     IScalingGroupServersCache,
@@ -53,7 +59,7 @@ from otter.models.interface import (
 from otter.util import timestamp
 from otter.util.config import config_value
 from otter.util.cqlbatch import Batch, batch
-from otter.util.deferredutils import with_lock
+from otter.util.deferredutils import unwrap_first_error, with_lock
 from otter.util.hashkey import generate_capability, generate_key_str
 from otter.util.retry import repeating_interval, retry, retry_times
 from otter.util.weaklocks import WeakLocks
@@ -63,8 +69,57 @@ LOCK_PATH = '/locks'
 
 DEFAULT_CONSISTENCY = ConsistencyLevel.QUORUM
 
+ACTIVE_CACHE_TTL = 5
+"""Seconds the active servers of groups are kept by the collection"""
+
+ACTIVE_CACHES_PER_QUERY = 50
+"""Maximum number of groups whose servers cache is fetched in one query"""
+
 QUERY_LIMIT = 10000
 
+GROUP_CACHE_SIZE = 1000
+"""Default number of groups whose documents are kept by the collection"""
+
+GROUP_CACHE_TTL = 30
+"""Default seconds documents of groups are kept by the collection"""
+
+CAPABILITY_CACHE_SIZE = 10000
+"""Default number of capability hashes whose webhook is kept"""
+
+CAPABILITY_CACHE_TTL = 300
+"""Default seconds the webhook of a capability hash is kept"""
+
+UNKNOWN_CAPABILITY_TTL = 10
+"""Default seconds a capability hash is kept as not existing"""
+
+CAS_ATTEMPTS = 5
+"""
+Default number of times a group's state is read, modified and written with
+compare-and-set by :meth:`CassScalingGroup.modify_state` before giving up
+"""
+
+SCAN_RANGES = 16
+"""Default number of token ranges scaling group rows are scanned in"""
+
+SCAN_PARALLEL = 4
+"""Default number of token ranges of scaling group rows scanned at a time"""
+
+MIN_TOKEN = -2 ** 63
+MAX_TOKEN = 2 ** 63 - 1
+
+
+def token_ranges(num):
+    """
+    Split the token ring of Cassandra's ``Murmur3Partitioner`` into ``num``
+    contiguous ranges that together cover all of it.
+
+    :return: ``list`` of ``(start, end)`` tuples, each being the range of
+        tokens greater than ``start`` and not greater than ``end``
+    """
+    width = (MAX_TOKEN - MIN_TOKEN) // num
+    bounds = [MIN_TOKEN + width * i for i in range(num)] + [MAX_TOKEN]
+    return zip(bounds, bounds[1:])
+
 
 @attributes(['query', 'params', 'consistency_level'])
 class CQLQueryExecute(object):
@@ -159,6 +214,18 @@ _cql_insert_group_state = (
     '"policyTouched", paused, desired) VALUES(:tenantId, :groupId, :active, '
     ':pending, :groupTouched, :policyTouched, :paused, :desired) '
     'USING TIMESTAMP :ts')
+_cql_view_versioned_state = (
+    'SELECT "tenantId", "groupId", group_config, '
+    'launch_config, active, pending, "groupTouched", '
+    '"policyTouched", paused, desired, created_at, status, error_reasons, '
+    'deleting, state_version FROM {cf} '
+    'WHERE "tenantId" = :tenantId AND "groupId" = :groupId')
+_cql_cas_group_state = (
+    'UPDATE {cf} SET active = :active, pending = :pending, '
+    '"groupTouched" = :groupTouched, "policyTouched" = :policyTouched, '
+    'paused = :paused, desired = :desired, state_version = :new_version '
+    'WHERE "tenantId" = :tenantId AND "groupId" = :groupId '
+    'IF state_version = :version AND group_config = :group_config')
 
 # --- Event related queries
 _cql_insert_group_event = (
@@ -243,6 +310,10 @@ _cql_count_for_group = (
     'SELECT COUNT(*) FROM {cf} WHERE "tenantId" = :tenantId '
     'AND "groupId" = :groupId;')
 _cql_count_all = ('SELECT COUNT(*) FROM {cf};')
+_cql_active_caches = (
+    'SELECT "groupId", server_blob, server_as_active, last_update, '
+    'generation FROM {cf} WHERE "tenantId"=:tenantId AND '
+    '"groupId" IN ({group_ids});')
 
 # seems to be pretty quick no matter the consistency - unfortunately this only
 # checks we can connect to Cassandra, and not whether the otter keyspace is
@@ -593,6 +664,154 @@ def _check_deleting(group, get_deleting=False):
     return group
 
 
+class StateConflictError(Exception):
+    """
+    Error to be raised when a group's state kept being changed by others
+    while modifying it with compare-and-set.
+    """
+    def __init__(self, tenant_id, group_id, attempts):
+        super(StateConflictError, self).__init__(
+            "State of group {g} for tenant {t} changed concurrently in each "
+            "of {n} attempts to modify it".format(
+                t=tenant_id, g=group_id, n=attempts))
+
+
+class GroupDocumentCache(object):
+    """
+    Per-process cache of the documents of scaling groups that rarely change:
+    their config, launch config and policies, as stored in Cassandra.
+
+    Documents of at most ``size`` groups are kept, evicting the least
+    recently used group. A document expires ``ttl`` seconds after it was
+    fetched, so that changes made by other nodes are seen, and is
+    invalidated when changed through this process. A document fetched before
+    it was invalidated is not cached.
+
+    :param clock: ``IReactorTime`` provider
+    :param int size: Maximum number of groups whose documents are kept.
+        Nothing is cached if it is 0.
+    :param float ttl: Seconds a document is kept after it was fetched
+    """
+
+    def __init__(self, clock, size=GROUP_CACHE_SIZE, ttl=GROUP_CACHE_TTL):
+        self.clock = clock
+        self.size = size
+        self.ttl = ttl
+        # (tenant_id, group_id) -> {name: (time fetched, document)}, where
+        # name None is when all the group's documents were invalidated
+        self._groups = OrderedDict()
+
+    def _pop(self, tenant_id, group_id):
+        return self._groups.pop((tenant_id, group_id), {})
+
+    def _put(self, tenant_id, group_id, docs):
+        self._groups[(tenant_id, group_id)] = docs
+        while len(self._groups) > self.size:
+            self._groups.popitem(last=False)
+
+    def get(self, tenant_id, group_id, name):
+        """
+        Get a document of a group.
+
+        :return: The document, or ``None`` if it is not cached
+        """
+        docs = self._pop(tenant_id, group_id)
+        if docs:
+            self._put(tenant_id, group_id, docs)
+        fetched, doc = docs.get(name, (None, None))
+        if fetched is None or self.clock.seconds() - fetched >= self.ttl:
+            return None
+        return doc
+
+    def set(self, tenant_id, group_id, name, doc, fetched):
+        """
+        Cache a document of a group.
+
+        :param float fetched: Time at which fetching the document started
+        """
+        docs = self._pop(tenant_id, group_id)
+        if all(fetched > docs.get(key, (fetched - 1,))[0]
+               for key in (name, None)):
+            docs[name] = (fetched, doc)
+        self._put(tenant_id, group_id, docs)
+
+    def invalidate(self, tenant_id, group_id, name=None):
+        """
+        Invalidate a document of a group, or all its documents if ``name`` is
+        ``None``.
+        """
+        docs = self._pop(tenant_id, group_id)
+        if name is None:
+            docs = {}
+        docs[name] = (self.clock.seconds(), None)
+        self._put(tenant_id, group_id, docs)
+
+
+class CapabilityCache(object):
+    """
+    Per-process cache of the tenant, group and policy of webhooks' capability
+    hashes, and of capability hashes that do not exist.
+
+    At most ``size`` hashes are kept, evicting the least recently used one.
+    The policy of a hash is kept for ``ttl`` seconds and a hash that does
+    not exist is kept for ``unknown_ttl`` seconds, so that webhooks created
+    or deleted by other nodes are seen. Hashes of deleted webhooks are
+    invalidated when they are deleted through this process.
+
+    :param clock: ``IReactorTime`` provider
+    :param int size: Maximum number of hashes kept. Nothing is cached if it
+        is 0.
+    :param float ttl: Seconds the policy of a hash is kept
+    :param float unknown_ttl: Seconds a hash that does not exist is kept
+    """
+
+    def __init__(self, clock, size=CAPABILITY_CACHE_SIZE,
+                 ttl=CAPABILITY_CACHE_TTL, unknown_ttl=UNKNOWN_CAPABILITY_TTL):
+        self.clock = clock
+        self.size = size
+        self.ttl = ttl
+        self.unknown_ttl = unknown_ttl
+        # capability hash -> (expiry time, (tenant_id, group_id, policy_id)
+        # or None if it does not exist)
+        self._hashes = OrderedDict()
+
+    def get(self, capability_hash):
+        """
+        Get the policy of a capability hash.
+
+        :return: ``(cached, info)`` where ``info`` is ``(tenant_id,
+            group_id, policy_id)``, or ``None`` if the hash does not exist
+        """
+        expires, info = self._hashes.pop(capability_hash, (None, None))
+        if expires is None or self.clock.seconds() >= expires:
+            return (False, None)
+        self._hashes[capability_hash] = (expires, info)
+        return (True, info)
+
+    def set(self, capability_hash, info):
+        """
+        Cache the policy of a capability hash.
+
+        :param info: ``(tenant_id, group_id, policy_id)``, or ``None`` if the
+            hash does not exist
+        """
+        ttl = self.unknown_ttl if info is None else self.ttl
+        self._hashes.pop(capability_hash, None)
+        self._hashes[capability_hash] = (self.clock.seconds() + ttl, info)
+        while len(self._hashes) > self.size:
+            self._hashes.popitem(last=False)
+
+    def invalidate(self, tenant_id, group_id, policy_id=None):
+        """
+        Invalidate the hashes of the webhooks of a group, or only of one of
+        its policies.
+        """
+        for capability_hash, (_, info) in self._hashes.items():
+            if (info is not None and info[:2] == (tenant_id, group_id) and
+                    policy_id in (None, info[2])):
+                del self._hashes[capability_hash]
+
+
 @implementer(IScalingGroup)
 class CassScalingGroup(object):
     """
@@ -620,6 +839,14 @@ class CassScalingGroup(object):
     :ivar local_locks: Local locks used when modifying state
     :type local_locks: :class:`WeakLocks`
 
+    :ivar group_cache: Cache of the group's config, launch config and
+        policies, or ``None`` to not cache them
+    :type group_cache: :class:`GroupDocumentCache`
+
+    :ivar capability_cache: Cache of capability hashes of webhooks, whose
+        deleted webhooks are invalidated, or ``None``
+    :type capability_cache: :class:`CapabilityCache`
+
     IMPORTANT REMINDER: In CQL, update will create a new row if one doesn't
     exist.  Therefore, before doing an update, a read must be performed first
     else an entry is created where none should have been.
@@ -634,7 +861,8 @@ class CassScalingGroup(object):
 
     """
     def __init__(self, log, tenant_id, uuid, connection, buckets, kz_client,
-                 reactor, local_locks):
+                 reactor, local_locks, group_cache=None,
+                 capability_cache=None):
         """
         Creates a CassScalingGroup object.
         """
@@ -648,6 +876,8 @@ class CassScalingGroup(object):
         self.kz_client = kz_client
         self.reactor = reactor
         self.local_locks = local_locks
+        self.group_cache = group_cache
+        self.capability_cache = capability_cache
 
         self.group_table = "scaling_group"
         self.launch_table = "launch_config"
@@ -674,6 +904,43 @@ class CassScalingGroup(object):
             return func(get_client_ts(self.reactor), *args)
         return wrapper
 
+    def _cached(self, name):
+        """
+        Get a document of the group from :attr:`group_cache`, if it is
+        cached.
+        """
+        if self.group_cache is None:
+            return None
+        return self.group_cache.get(self.tenant_id, self.uuid, name)
+
+    def _cache(self, name, doc, fetched):
+        """
+        Cache a document of the group fetched at the given time in
+        :attr:`group_cache`.
+        """
+        if self.group_cache is not None:
+            self.group_cache.set(self.tenant_id, self.uuid, name, doc,
+                                 fetched)
+
+    def _invalidate(self, result, name=None):
+        """
+        Invalidate a document of the group, or all of them, in
+        :attr:`group_cache` and return ``result``.
+        """
+        if self.group_cache is not None:
+            self.group_cache.invalidate(self.tenant_id, self.uuid, name)
+        return result
+
+    def _invalidate_capabilities(self, result, policy_id=None):
+        """
+        Invalidate the capability hashes of the group's webhooks, or of one
+        of its policies, in :attr:`capability_cache` and return ``result``.
+        """
+        if self.capability_cache is not None:
+            self.capability_cache.invalidate(self.tenant_id, self.uuid,
+                                             policy_id)
+        return result
+
     def view_manifest(self, with_policies=True, with_webhooks=False,
                       get_deleting=False):
         """
@@ -699,6 +966,11 @@ class CassScalingGroup(object):
                 assemble_webhooks_in_policies(policies, webhooks),
                 group)
 
+        def _cache_configs(group):
+            for column in ('group_config', 'launch_config'):
+                self._cache(column, group[column], fetched)
+            return group
+
         def _generate_manifest_group_part(group):
             m = {
                 'groupConfiguration': _jsonloads_data(group['group_config']),
@@ -708,6 +980,7 @@ class CassScalingGroup(object):
             }
             return m
 
+        fetched = self.reactor.seconds()
         view_query = _cql_view_manifest.format(
             cf=self.group_table)
         del_query = _cql_delete_all_in_group.format(
@@ -719,6 +992,7 @@ class CassScalingGroup(object):
                           NoSuchScalingGroupError(self.tenant_id, self.uuid),
                           self.log)
         d.addCallback(_check_deleting, get_deleting)
+        d.addCallback(_cache_configs)
         d.addCallback(_generate_manifest_group_part)
 
         if with_policies:
@@ -730,12 +1004,17 @@ class CassScalingGroup(object):
 
         return d
 
-    def view_config(self):
+    def _view_config_column(self, column, cached):
         """
-        see :meth:`otter.models.interface.IScalingGroup.view_config`
+        View a JSON column of the group's row, from :attr:`group_cache` if
+        ``cached`` and the column is cached there.
         """
-        view_query = _cql_view.format(
-            cf=self.group_table, column='group_config')
+        raw = self._cached(column) if cached else None
+        if raw is not None:
+            return defer.succeed(_jsonloads_data(raw))
+
+        fetched = self.reactor.seconds()
+        view_query = _cql_view.format(cf=self.group_table, column=column)
         del_query = _cql_delete_all_in_group.format(
             cf=self.group_table, name='')
         d = verified_view(self.connection, view_query, del_query,
@@ -745,26 +1024,23 @@ class CassScalingGroup(object):
                           NoSuchScalingGroupError(self.tenant_id, self.uuid),
                           self.log)
 
-        return d.addCallback(lambda group:
-                             _jsonloads_data(group['group_config']))
+        def _extract(group):
+            self._cache(column, group[column], fetched)
+            return _jsonloads_data(group[column])
+
+        return d.addCallback(_extract)
 
-    def view_launch_config(self):
+    def view_config(self, cached=False):
         """
-        see :meth:`otter.models.interface.IScalingGroup.view_launch_config`
+        see :meth:`otter.models.interface.IScalingGroup.view_config`
         """
-        view_query = _cql_view.format(
-            cf=self.group_table, column='launch_config')
-        del_query = _cql_delete_all_in_group.format(
-            cf=self.group_table, name='')
-        d = verified_view(self.connection, view_query, del_query,
-                          {"tenantId": self.tenant_id,
-                           "groupId": self.uuid},
-                          DEFAULT_CONSISTENCY,
-                          NoSuchScalingGroupError(self.tenant_id, self.uuid),
-                          self.log)
+        return self._view_config_column('group_config', cached)
 
-        return d.addCallback(lambda group:
-                             _jsonloads_data(group['launch_config']))
+    def view_launch_config(self, cached=False):
+        """
+        see :meth:`otter.models.interface.IScalingGroup.view_launch_config`
+        """
+        return self._view_config_column('launch_config', cached)
 
     def view_state(self, consistency=None, get_deleting=False):
         """
@@ -786,21 +1062,55 @@ class CassScalingGroup(object):
         d.addCallback(_check_deleting, get_deleting)
         return d.addCallback(_unmarshal_state)
 
+    def _view_versioned_state(self):
+        """
+        View the group's state along with the version written with it by
+        :meth:`modify_state` when it uses compare-and-set, and the serialized
+        group config that the write requires to be still present.
+
+        :return: ``Deferred`` of (:obj:`GroupState`, version, group config)
+        """
+        d = verified_view(self.connection,
+                          _cql_view_versioned_state.format(
+                              cf=self.group_table),
+                          _cql_delete_all_in_group.format(
+                              cf=self.group_table, name=''),
+                          {"tenantId": self.tenant_id,
+                           "groupId": self.uuid},
+                          DEFAULT_CONSISTENCY,
+                          NoSuchScalingGroupError(self.tenant_id, self.uuid),
+                          self.log)
+        d.addCallback(_check_deleting)
+        return d.addCallback(
+            lambda group: (_unmarshal_state(group), group['state_version'],
+                           group['group_config']))
+
     def modify_state(self, modifier_callable, *args, **kwargs):
         """
         see :meth:`otter.models.interface.IScalingGroup.modify_state`
+
+        By default the state is modified holding a ZooKeeper lock of the
+        group. If the ``modify_state.strategy`` config is ``"cas"``, it is
+        instead written only if its version is still the one read, with a
+        Cassandra lightweight transaction. Only when the caller passes
+        ``modify_state_retryable=True``, promising the modifier has no side
+        effects, is the state read and modified again on a conflict, up to
+        ``modify_state.cas_attempts`` times. Other modifiers are called once,
+        holding the lock, and a conflict fails with
+        :class:`StateConflictError`. All nodes should use the same strategy,
+        since state written holding the lock does not change its version.
         """
         modify_state_reason = kwargs.pop('modify_state_reason', None)
+        retryable = kwargs.pop('modify_state_retryable', False)
         log = self.log.bind(
             system='CassScalingGroup.modify_state',
             modify_state_reason=modify_state_reason)
         consistency = DEFAULT_CONSISTENCY
 
-        @self.with_timestamp
-        def _write_state(timestamp, new_state):
+        def _state_params(new_state):
             assert (new_state.tenant_id == self.tenant_id and
                     new_state.group_id == self.uuid)
-            params = {
+            return {
                 'tenantId': new_state.tenant_id,
                 'groupId': new_state.group_id,
                 'active': serialize_json_data(new_state.active, 1),
@@ -810,8 +1120,12 @@ class CassScalingGroup(object):
                 'groupTouched': new_state.group_touched,
                 'policyTouched': serialize_json_data(new_state.policy_touched,
                                                      1),
-                'ts': timestamp
             }
+
+        @self.with_timestamp
+        def _write_state(timestamp, new_state):
+            params = _state_params(new_state)
+            params['ts'] = timestamp
             return self.connection.execute(
                 _cql_insert_group_state.format(cf=self.group_table),
                 params, consistency)
@@ -822,11 +1136,52 @@ class CassScalingGroup(object):
                 self, state, *args, **kwargs))
             return d.addCallback(_write_state)
 
+        def _cas_write_state(new_state, version, group_config, attempt,
+                             attempts):
+            params = _state_params(new_state)
+            params.update(version=version, new_version=uuid.uuid1(),
+                          group_config=group_config)
+            d = self.connection.execute(
+                _cql_cas_group_state.format(cf=self.group_table),
+                params, consistency)
+
+            def _check_applied(rows):
+                if rows[0]['[applied]']:
+                    return None
+                # a row that is gone returns none of the compared columns
+                if rows[0].get('group_config') is None:
+                    raise NoSuchScalingGroupError(self.tenant_id, self.uuid)
+                log.msg("State changed concurrently", attempt=attempt,
+                        category='cas')
+                if attempt >= attempts:
+                    raise StateConflictError(self.tenant_id, self.uuid,
+                                             attempts)
+                return _cas_modify_state(attempt + 1, attempts)
+
+            return d.addCallback(_check_applied)
+
+        def _cas_modify_state(attempt, attempts):
+            d = self._view_versioned_state()
+            d.addCallback(
+                lambda (state, version, group_config): defer.maybeDeferred(
+                    modifier_callable, self, state, *args, **kwargs
+                ).addCallback(_cas_write_state, version, group_config,
+                              attempt, attempts))
+            return d
+
+        local_lock = self.local_locks.get_lock(self.uuid)
+        cas = config_value('modify_state.strategy') == 'cas'
+        if cas and retryable:
+            cas_attempts = (config_value('modify_state.cas_attempts') or
+                            CAS_ATTEMPTS)
+            return local_lock.run(_cas_modify_state, 1, cas_attempts)
+
         lock = self.kz_client.Lock(LOCK_PATH + '/' + self.uuid)
         lock.acquire = functools.partial(lock.acquire, timeout=120)
-        local_lock = self.local_locks.get_lock(self.uuid)
         return local_lock.run(
-            with_lock, self.reactor, lock, _modify_state,
+            with_lock, self.reactor, lock,
+            functools.partial(_cas_modify_state, 1, 1) if cas
+            else _modify_state,
             log.bind(category='locking', lock_reason='modify_state'),
             acquire_timeout=150,
             release_timeout=30)
@@ -908,7 +1263,7 @@ class CassScalingGroup(object):
 
         d = self.view_config()
         d.addCallback(_do_update_config)
-        return d
+        return d.addBoth(self._invalidate, 'group_config')
 
     def update_launch_config(self, data):
         """
@@ -931,7 +1286,7 @@ class CassScalingGroup(object):
 
         d = self.view_config()
         d.addCallback(_do_update_launch)
-        return d
+        return d.addBoth(self._invalidate, 'launch_config')
 
     def _naive_list_policies(self, limit=None, marker=None):
         """
@@ -971,25 +1326,41 @@ class CassScalingGroup(object):
         d = self._naive_list_policies(limit=limit, marker=marker)
         return d.addCallback(_check_if_empty)
 
-    def get_policy(self, policy_id, version=None):
+    def get_policy(self, policy_id, version=None, cached=False):
         """
         see :meth:`otter.models.interface.IScalingGroup.get_policy`
         """
+        name = ('policy', policy_id)
+
         def fetch_policy(_):
+            rows = self._cached(name) if cached else None
+            if rows is not None and (version is None or
+                                     rows[0]['version'] == version):
+                return _extract_policy(rows)
+            fetched = self.reactor.seconds()
             query = _cql_view_policy.format(cf=self.policies_table)
             d = self.connection.execute(query,
                                         {"tenantId": self.tenant_id,
                                          "groupId": self.uuid,
                                          "policyId": policy_id},
                                         DEFAULT_CONSISTENCY)
-            return d.addCallback(_extract_policy)
+            return d.addCallback(_cache_policy, fetched)
+
+        def _cache_policy(rows, fetched):
+            if len(rows) > 0:
+                self._cache(name, rows, fetched)
+            return _extract_policy(rows)
 
         def _extract_policy(rows):
             if len(rows) == 0 or version and rows[0]['version'] != version:
                 raise NoSuchPolicyError(self.tenant_id, self.uuid, policy_id)
             return _jsonloads_data(rows[0]['data'])
 
-        d = self.view_config()  # Ensure group exists
+        # Ensure group exists
+        if cached:
+            d = self.view_config(cached=True)
+        else:
+            d = self.view_config()
         return d.addCallback(fetch_policy)
 
     def create_policies(self, data):
@@ -1069,7 +1440,7 @@ class CassScalingGroup(object):
         d = self.get_policy(policy_id)
         d.addCallback(_do_update_schedule)
         d.addCallback(_do_update_policy)
-        return d
+        return d.addBoth(self._invalidate, ('policy', policy_id))
 
     def delete_policy(self, policy_id):
         """
@@ -1095,7 +1466,8 @@ class CassScalingGroup(object):
         d.addCallback(
             lambda _: self._naive_list_webhooks(policy_id, QUERY_LIMIT, None))
         d.addCallback(_do_delete)
-        return d
+        d.addBoth(self._invalidate_capabilities, policy_id)
+        return d.addBoth(self._invalidate, ('policy', policy_id))
 
     def _naive_list_all_webhooks(self):
         """
@@ -1262,7 +1634,8 @@ class CassScalingGroup(object):
                 DEFAULT_CONSISTENCY)
             return d
 
-        return self.get_webhook(policy_id, webhook_id).addCallback(_do_delete)
+        d = self.get_webhook(policy_id, webhook_id).addCallback(_do_delete)
+        return d.addBoth(self._invalidate_capabilities, policy_id)
 
     def delete_group(self):
         """
@@ -1324,12 +1697,25 @@ class CassScalingGroup(object):
                       log.bind(category='locking', lock_reason='delete_group'),
                       acquire_timeout=150,
                       release_timeout=30)
+        d.addBoth(self._invalidate)
+        d.addBoth(self._invalidate_capabilities)
         # Cleanup /locks/<groupID> znode as it will not be required anymore
         d.addCallback(_delete_lock_znode)
         d.addCallback(lambda _: None)
         return d
 
 
+_VALID_GROUP_PROPS = ['created_at', 'desired', 'status', 'deleting']
+
+
+def _valid_group_row(row):
+    """Is the scaling group row that of a valid group?"""
+    return (row.get('created_at') is not None and
+            row.get('desired') is not None and
+            row.get('status') not in ('DISABLED', 'ERROR') and
+            not row.get('deleting', False))
+
+
 @implementer(IScalingGroupCollection, IScalingScheduleCollection)
 class CassScalingGroupCollection:
     """
@@ -1387,6 +1773,20 @@ class CassScalingGroupCollection:
         self.event_table = "scaling_schedule_v2"
         self.buckets = None
         self.kz_client = None
+        # (tenant_id, group_id) -> (time fetched, active servers)
+        self._active_caches = {}
+        cache_size = config_value('group_cache.size')
+        self.group_cache = GroupDocumentCache(
+            reactor,
+            size=GROUP_CACHE_SIZE if cache_size is None else cache_size,
+            ttl=config_value('group_cache.ttl') or GROUP_CACHE_TTL)
+        cache_size = config_value('capability_cache.size')
+        self.capability_cache = CapabilityCache(
+            reactor,
+            size=CAPABILITY_CACHE_SIZE if cache_size is None else cache_size,
+            ttl=config_value('capability_cache.ttl') or CAPABILITY_CACHE_TTL,
+            unknown_ttl=(config_value('capability_cache.unknown_ttl') or
+                         UNKNOWN_CAPABILITY_TTL))
 
     def set_scheduler_buckets(self, buckets):
         """
@@ -1512,38 +1912,96 @@ class CassScalingGroupCollection:
         d.addCallback(_build_states)
         return d
 
+    def get_active_caches(self, tenant_id, group_ids):
+        """
+        see :meth:`IScalingGroupCollection.get_active_caches`.
+
+        The servers caches of up to :data:`ACTIVE_CACHES_PER_QUERY` groups
+        are fetched with one query. Fetched active servers are kept for
+        :data:`ACTIVE_CACHE_TTL` seconds.
+        """
+        now = self.reactor.seconds()
+        self._active_caches = {
+            key: (fetched, active)
+            for key, (fetched, active) in self._active_caches.iteritems()
+            if now - fetched < ACTIVE_CACHE_TTL}
+        actives = {group_id: self._active_caches[(tenant_id, group_id)][1]
+                   for group_id in group_ids
+                   if (tenant_id, group_id) in self._active_caches}
+        missing = sorted(set(group_ids) - set(actives))
+
+        def fetch(chunk):
+            params = {'tenantId': tenant_id}
+            for i, group_id in enumerate(chunk):
+                params['groupId{}'.format(i)] = group_id
+            query = _cql_active_caches.format(
+                cf='servers_cache',
+                group_ids=', '.join(':groupId{}'.format(i)
+                                    for i in range(len(chunk))))
+            return self.connection.execute(query, params, DEFAULT_CONSISTENCY)
+
+        def got_rows(results):
+            rows_by_group = groupby(lambda r: r['groupId'], concat(results))
+            for group_id in missing:
+                servers, _ = servers_from_cache_rows(
+                    rows_by_group.get(group_id, []), True)
+                active = {server['id']: server for server in servers}
+                self._active_caches[(tenant_id, group_id)] = (now, active)
+                actives[group_id] = active
+            return actives
+
+        d = defer.gatherResults(
+            [fetch(chunk)
+             for chunk in partition_all(ACTIVE_CACHES_PER_QUERY, missing)],
+            consumeErrors=True)
+        d.addErrback(unwrap_first_error)
+        return d.addCallback(got_rows)
+
     def get_scaling_group(self, log, tenant_id, scaling_group_id):
         """
         see :meth:`IScalingGroupCollection.get_scaling_group`
         """
         return CassScalingGroup(log, tenant_id, scaling_group_id,
                                 self.connection, self.buckets, self.kz_client,
-                                self.reactor, self.local_locks)
+                                self.reactor, self.local_locks,
+                                self.group_cache, self.capability_cache)
 
     def fetch_and_delete(self, bucket, now, size=100):
         """
         Fetch events to be occurring now or before in a bucket
         and delete them after fetching
         """
-        def delete_events(events):
-            if not events:
-                return events
-            data = {'bucket': bucket}
-            queries = []
-            for i, event in enumerate(events):
-                event_name = 'event{}'.format(i)
-                queries.append(
-                    _cql_delete_bucket_event.format(cf=self.event_table,
-                                                    name=event_name))
-                data[event_name + 'policyId'] = event['policyId']
-                data[event_name + 'trigger'] = event['trigger']
-            b = Batch(queries, data, DEFAULT_CONSISTENCY)
-            return b.execute(self.connection).addCallback(lambda _: events)
+        d = self.fetch_events(bucket, now, size)
+        return d.addCallback(
+            lambda events: self.delete_events(bucket, events).addCallback(
+                lambda _: events))
 
-        d = self.connection.execute(
+    def fetch_events(self, bucket, until, size=100):
+        """
+        see :meth:`IScalingScheduleCollection.fetch_events`
+        """
+        return self.connection.execute(
             _cql_fetch_batch_of_events.format(cf=self.event_table),
-            {"size": size, "now": now, "bucket": bucket}, DEFAULT_CONSISTENCY)
-        return d.addCallback(delete_events)
+            {"size": size, "now": until, "bucket": bucket},
+            DEFAULT_CONSISTENCY)
+
+    def delete_events(self, bucket, events):
+        """
+        see :meth:`IScalingScheduleCollection.delete_events`
+        """
+        if not events:
+            return defer.succeed(None)
+        data = {'bucket': bucket}
+        queries = []
+        for i, event in enumerate(events):
+            event_name = 'event{}'.format(i)
+            queries.append(
+                _cql_delete_bucket_event.format(cf=self.event_table,
+                                                name=event_name))
+            data[event_name + 'policyId'] = event['policyId']
+            data[event_name + 'trigger'] = event['trigger']
+        b = Batch(queries, data, DEFAULT_CONSISTENCY)
+        return b.execute(self.connection)
 
     def add_cron_events(self, cron_events):
         """
@@ -1572,16 +2030,30 @@ class CassScalingGroupCollection:
     def webhook_info_by_hash(self, log, capability_hash):
         """
         see :meth:`IScalingGroupCollection.webhook_info_by_hash`
+
+        Hashes are looked up in :attr:`capability_cache` first.
         """
+        def check_info(info):
+            if info is None:
+                raise UnrecognizedCapabilityError(capability_hash, 1)
+            return info
+
+        cached, info = self.capability_cache.get(capability_hash)
+        if cached:
+            return defer.maybeDeferred(check_info, info)
+
         d = self.connection.execute(
             _cql_find_webhook_token.format(cf=self.webhook_keys_table),
             {"webhookKey": capability_hash}, ConsistencyLevel.ONE)
 
         def extract_info(rows):
             if len(rows) == 0:
-                raise UnrecognizedCapabilityError(capability_hash, 1)
-            r = rows[0]
-            return (r['tenantId'], r['groupId'], r['policyId'])
+                info = None
+            else:
+                r = rows[0]
+                info = (r['tenantId'], r['groupId'], r['policyId'])
+            self.capability_cache.set(capability_hash, info)
+            return check_info(info)
 
         d.addCallback(extract_info)
         return d
@@ -1710,20 +2182,112 @@ class CassScalingGroupCollection:
                               self.reactor.seconds() - start_time}))
         return d
 
-    def get_all_valid_groups(self):
+    def get_all_valid_groups(self, props=()):
         """
         Get all *valid* scaling groups
 
+        :param ``list`` props: Columns to fetch, as in
+            :meth:`scan_valid_groups`
+
         :return: `Deferred` fired with ``list`` of group ``dict``
         """
-        def _valid_group_row(row):
-            return (row.get('created_at') is not None and
-                    row.get('desired') is not None and
-                    row.get('status') not in ('DISABLED', 'ERROR') and
-                    not row.get('deleting', False))
-
-        d = self.get_scaling_group_rows()
-        return d.addCallback(lambda gs: list(filter(_valid_group_row, gs)))
+        groups = []
+        d = self.scan_valid_groups(groups.extend, props)
+        return d.addCallback(lambda _: groups)
+
+    def scan_valid_groups(self, handle_groups, props=()):
+        """
+        Scan all *valid* scaling groups, handing them over in batches as
+        they are fetched like :meth:`scan_scaling_group_rows` does.
+
+        :param handle_groups: Callable called with each non-empty ``list``
+            of valid group ``dict``. It can return a `Deferred` like the
+            ``handle_rows`` of :meth:`scan_scaling_group_rows`.
+        :param ``list`` props: Columns to fetch, as named in CQL, besides
+            ``"tenantId"``, ``"groupId"`` and those telling whether the group
+            is valid: ``created_at``, ``desired``, ``status`` and
+            ``deleting``
+
+        :return: `Deferred` fired with None after all groups are handled
+        """
+        def handle_rows(rows):
+            groups = [row for row in rows if _valid_group_row(row)]
+            if groups:
+                return handle_groups(groups)
+
+        return self.scan_scaling_group_rows(
+            handle_rows, props=list(props) + _VALID_GROUP_PROPS)
+
+    def scan_scaling_group_rows(self, handle_rows, props=None,
+                                batch_size=100, ranges=None, parallel=None):
+        """
+        Scan all scaling group rows in Cassandra, handing them over in
+        batches as they are fetched rather than collecting them in one list.
+
+        The token ring is split into ``ranges`` token ranges, ``parallel`` of
+        which are scanned at a time. Each range is paged through like
+        :meth:`get_scaling_group_rows` does. Batches of different ranges are
+        handed over in no particular order.
+
+        :param handle_rows: Callable called with each non-empty ``list`` of
+            row ``dict`` fetched. If it returns a `Deferred`, the range's next
+            batch is fetched only after it fires.
+        :param ``list`` props: Columns to fetch, as named in CQL. All columns
+            are fetched if it is None. ``"tenantId"`` and ``"groupId"`` are
+            always fetched since they are needed to page through rows.
+        :param int batch_size: Number of rows to fetch at a time
+        :param int ranges: Number of token ranges to split the ring in.
+            Defaults to config ``group_scan.ranges`` or :data:`SCAN_RANGES`.
+        :param int parallel: Number of ranges to scan at a time. Defaults to
+            config ``group_scan.parallel`` or :data:`SCAN_PARALLEL`.
+
+        :return: `Deferred` fired with None after all rows are handled
+        """
+        ranges = ranges or config_value('group_scan.ranges') or SCAN_RANGES
+        parallel = (parallel or config_value('group_scan.parallel') or
+                    SCAN_PARALLEL)
+        if props is None:
+            cols = '*'
+        else:
+            cols = ','.join(
+                sorted(set(props) | set(['"tenantId"', '"groupId"'])))
+        query = ('SELECT ' + cols +
+                 ' FROM scaling_group WHERE {where} LIMIT :limit;')
+        where_range = ('token("tenantId") > :start AND '
+                       'token("tenantId") <= :end')
+        where_key = '"tenantId"=:tenantId AND "groupId">:groupId'
+        where_next = ('token("tenantId") > token(:tenantId) AND '
+                      'token("tenantId") <= :end')
+
+        def fetch(where, **params):
+            params['limit'] = batch_size
+            return self.connection.execute(
+                query.format(where=where), params, ConsistencyLevel.ONE)
+
+        @defer.inlineCallbacks
+        def scan_range((start, end)):
+            batch = yield fetch(where_range, start=start, end=end)
+            while batch:
+                yield handle_rows(batch)
+                if len(batch) < batch_size:
+                    break
+                # The last tenant of the batch may have more groups. Get them
+                # before getting the tenants after it in the range
+                tenant_id = batch[-1]['tenantId']
+                while len(batch) == batch_size:
+                    batch = yield fetch(where_key, tenantId=tenant_id,
+                                        groupId=batch[-1]['groupId'])
+                    if batch:
+                        yield handle_rows(batch)
+                batch = yield fetch(where_next, tenantId=tenant_id, end=end)
+
+        sem = defer.DeferredSemaphore(parallel)
+        d = defer.gatherResults(
+            [sem.run(scan_range, token_range)
+             for token_range in token_ranges(ranges)],
+            consumeErrors=True)
+        d.addErrback(unwrap_first_error)
+        return d.addCallback(lambda _: None)
 
     @defer.inlineCallbacks
     def get_scaling_group_rows(self, props=None, batch_size=100):
@@ -1732,12 +2296,13 @@ class CassScalingGroupCollection:
         each dict has all columns in table if `props` is None. Otherwise
         only columns given in `props` are retreived
 
+        Use :meth:`scan_scaling_group_rows` to handle rows as they are
+        fetched instead.
+
         :param ``list`` props: List of extra properties to extract
         :param int batch_size: Number of groups to fetch at a time
         :return: `Deferred` fired with ``list`` of ``dict``
         """
-        # TODO: Currently returning all groups as one giant list for now.
-        # Will try to use Twisted tubes to do streaming later
         if props is None:
             cols = "*"
         else:
@@ -1782,13 +2347,97 @@ class CassScalingGroupCollection:
         defer.returnValue(groups)
 
 
+SERVER_BLOB_KEYS = ('id', 'name', 'status', 'OS-EXT-STS:task_state',
+                    'created', 'addresses', 'metadata', 'links', 'flavor',
+                    'image')
+"""Keys of the Nova server JSON kept in compact server blobs"""
+
+
+def encode_server_blob(server, blob_format='json'):
+    """
+    Encode a server dict to be stored as ``server_blob`` in the servers
+    cache.
+
+    :param dict server: Nova server JSON
+    :param str blob_format: "json" to store the whole JSON, "compact" to
+        store only :data:`SERVER_BLOB_KEYS`, with only the IDs of flavor and
+        image, or "compressed" to store that compressed
+
+    :return: ``str`` blob, prefixed with its format version unless it is
+        the whole JSON
+    """
+    if blob_format == 'json':
+        return json.dumps(server, sort_keys=True)
+    compact = {k: server[k] for k in SERVER_BLOB_KEYS if k in server}
+    for k in ('flavor', 'image'):
+        if isinstance(compact.get(k), dict):
+            compact[k] = {'id': compact[k].get('id')}
+    data = json.dumps(compact, sort_keys=True, separators=(',', ':'))
+    if blob_format == 'compact':
+        return 'c1:' + data
+    elif blob_format == 'compressed':
+        return 'z1:' + base64.b64encode(zlib.compress(data))
+    raise ValueError('Unknown server blob format {}'.format(blob_format))
+
+
+def decode_server_blob(blob):
+    """
+    Decode a ``server_blob`` encoded by :func:`encode_server_blob` in any
+    format.
+
+    :return: Server ``dict``
+    """
+    if blob.startswith('{'):
+        return json.loads(blob)
+    version, _, data = blob.partition(':')
+    if version == 'c1':
+        return json.loads(data)
+    elif version == 'z1':
+        return json.loads(zlib.decompress(base64.b64decode(data)))
+    raise ValueError('Unknown server blob version {}'.format(version))
+
+
+def servers_from_cache_rows(rows, only_as_active):
+    """
+    Get the servers cached in a group's ``servers_cache`` rows.
+
+    :param list rows: The group's rows with ``server_blob``,
+        ``server_as_active``, ``last_update`` and ``generation``, ordered by
+        ``last_update`` descending
+    :param bool only_as_active: Should it return only otter active servers?
+
+    :return: (servers, last update time) tuple as returned by
+        :meth:`IScalingGroupServersCache.get_servers`
+    """
+    if len(rows) == 0:
+        return [], None
+    last_update = rows[0].get('generation')
+    if last_update is None:
+        # Written by insert_servers: every server is in a row with the
+        # same last_update
+        last_update = rows[0]['last_update']
+        rows = takewhile(lambda r: r['last_update'] == last_update, rows)
+
+    def _dict(r): return decode_server_blob(r['server_blob'])
+    rfunc = (
+        compose(map(_dict), filter(lambda r: r['server_as_active']))
+        if only_as_active else map(_dict))
+
+    return list(rfunc(rows)), last_update
+
+
 @implementer(IScalingGroupServersCache)
 class CassScalingGroupServersCache(object):
     """
     Collection of cache of scaling group servers
     """
 
-    def __init__(self, tenant_id, group_id, clock=None):
+    def __init__(self, tenant_id, group_id, clock=None, blob_format=None):
+        """
+        :param str blob_format: Format servers are written in as per
+            :func:`encode_server_blob`. Defaults to
+            "converger.server_blob_format" config or "json".
+        """
         self.tenantId = tenant_id
         self.groupId = group_id
         self.table = "servers_cache"
@@ -1798,27 +2447,22 @@ class CassScalingGroupServersCache(object):
             self.clock = reactor
         else:
             self.clock = clock
+        if blob_format is None:
+            blob_format = (config_value('converger.server_blob_format') or
+                           'json')
+        self.blob_format = blob_format
 
     @do
     def get_servers(self, only_as_active):
         """
         See :method:`IScalingGroupServersCache.get_servers`
         """
-        query = ('SELECT server_blob, server_as_active, last_update FROM {cf} '
+        query = ('SELECT server_blob, server_as_active, last_update, '
+                 'generation FROM {cf} '
                  'WHERE "tenantId"=:tenantId AND "groupId"=:groupId '
                  'ORDER BY last_update DESC;')
         rows = yield cql_eff(query.format(cf=self.table), self.params)
-        if len(rows) == 0:
-            yield do_return(([], None))
-        last_update = rows[0]['last_update']
-        rows = takewhile(lambda r: r['last_update'] == last_update, rows)
-
-        def _dict(r): return json.loads(r['server_blob'])
-        rfunc = (
-            compose(map(_dict), filter(lambda r: r['server_as_active']))
-            if only_as_active else map(_dict))
-
-        yield do_return((list(rfunc(rows)), last_update))
+        yield do_return(servers_from_cache_rows(rows, only_as_active))
 
     def insert_servers(self, last_update, servers, clear_others):
         """
@@ -1839,7 +2483,8 @@ class CassScalingGroupServersCache(object):
             params['server_id{}'.format(i)] = server['id']
             params['server_as_active{}'.format(i)] = server.pop(
                 '_is_as_active', False)
-            params['server_blob{}'.format(i)] = json.dumps(server)
+            params['server_blob{}'.format(i)] = encode_server_blob(
+                server, self.blob_format)
             queries.append(query.format(cf=self.table, i=i))
         if clear_others:
             return self.delete_servers().on(
@@ -1848,6 +2493,56 @@ class CassScalingGroupServersCache(object):
         else:
             return cql_eff(batch(queries, get_client_ts(self.clock)), params)
 
+    @do
+    def update_servers(self, last_update, servers):
+        """
+        See :method:`IScalingGroupServersCache.update_servers`
+        """
+        if len(servers) == 0:
+            yield self.delete_servers()
+            yield do_return(None)
+        query = ('SELECT last_update, server_id, server_hash FROM {cf} '
+                 'WHERE "tenantId"=:tenantId AND "groupId"=:groupId;')
+        rows = yield cql_eff(query.format(cf=self.table), self.params)
+        written = {(r['server_id'], r['server_hash']): r['last_update']
+                   for r in rows if r['server_hash'] is not None}
+
+        insert = ('INSERT INTO {cf} ("tenantId", "groupId", last_update, '
+                  'server_id, server_blob, server_as_active, server_hash) '
+                  'VALUES(:tenantId, :groupId, :last_update, :server_id{i}, '
+                  ':server_blob{i}, :server_as_active{i}, :server_hash{i});')
+        delete = ('DELETE FROM {cf} WHERE "tenantId"=:tenantId AND '
+                  '"groupId"=:groupId AND last_update=:old_update{i} AND '
+                  'server_id=:old_id{i};')
+        params = merge(self.params, {"last_update": last_update})
+        queries = []
+        kept = set()
+        for i, server in enumerate(servers):
+            as_active = server.pop('_is_as_active', False)
+            blob = encode_server_blob(server, self.blob_format)
+            server_hash = hashlib.sha1(
+                '{}:{}'.format(as_active, blob)).hexdigest()
+            key = (server['id'], server_hash)
+            if key in written:
+                kept.add((written[key], server['id']))
+                continue
+            params['server_id{}'.format(i)] = server['id']
+            params['server_as_active{}'.format(i)] = as_active
+            params['server_blob{}'.format(i)] = blob
+            params['server_hash{}'.format(i)] = server_hash
+            queries.append(insert.format(cf=self.table, i=i))
+        stale = sorted(set((r['last_update'], r['server_id']) for r in rows)
+                       - kept)
+        for i, (old_update, old_id) in enumerate(stale):
+            params['old_update{}'.format(i)] = old_update
+            params['old_id{}'.format(i)] = old_id
+            queries.append(delete.format(cf=self.table, i=i))
+        queries.append(
+            'UPDATE {cf} SET generation=:last_update WHERE '
+            '"tenantId"=:tenantId AND "groupId"=:groupId;'.format(
+                cf=self.table))
+        yield cql_eff(batch(queries, get_client_ts(self.clock)), params)
+
     def delete_servers(self):
         """
         See :method:`IScalingGroupServersCache.delete_servers`
@@ -1859,6 +2554,67 @@ class CassScalingGroupServersCache(object):
             merge(self.params, {"ts": get_client_ts(self.clock)}))
 
 
+@implementer(ICLBNodeDrainedAtCache)
+class CassCLBNodeDrainedAtCache(object):
+    """
+    Cache of times when a tenant's CLB nodes started DRAINING
+    """
+
+    def __init__(self, tenant_id, clock=None):
+        self.tenant_id = tenant_id
+        self.table = "clb_node_drained_at"
+        self.params = {"tenantId": self.tenant_id}
+        if clock is None:
+            from twisted.internet import reactor
+            self.clock = reactor
+        else:
+            self.clock = clock
+
+    def get_drained_at(self):
+        """
+        See :method:`ICLBNodeDrainedAtCache.get_drained_at`
+        """
+        query = ('SELECT lb_id, node_id, drained_at FROM {cf} '
+                 'WHERE "tenantId"=:tenantId;')
+        return cql_eff(query.format(cf=self.table), self.params).on(
+            lambda rows: {(r['lb_id'], r['node_id']): r['drained_at']
+                          for r in rows})
+
+    def insert_drained_at(self, drained_at):
+        """
+        See :method:`ICLBNodeDrainedAtCache.insert_drained_at`
+        """
+        if len(drained_at) == 0:
+            return Effect(Constant(None))
+        query = ('INSERT INTO {cf} ("tenantId", lb_id, node_id, drained_at) '
+                 'VALUES(:tenantId, :lb_id{i}, :node_id{i}, :drained_at{i});')
+        params = self.params.copy()
+        queries = []
+        for i, ((lb_id, node_id), at) in enumerate(sorted(drained_at.items())):
+            params['lb_id{}'.format(i)] = lb_id
+            params['node_id{}'.format(i)] = node_id
+            params['drained_at{}'.format(i)] = at
+            queries.append(query.format(cf=self.table, i=i))
+        return cql_eff(batch(queries, get_client_ts(self.clock)), params)
+
+    def delete_drained_at(self, nodes):
+        """
+        See :method:`ICLBNodeDrainedAtCache.delete_drained_at`
+        """
+        nodes = sorted(nodes)
+        if len(nodes) == 0:
+            return Effect(Constant(None))
+        query = ('DELETE FROM {cf} WHERE "tenantId"=:tenantId AND '
+                 'lb_id=:lb_id{i} AND node_id=:node_id{i};')
+        params = self.params.copy()
+        queries = []
+        for i, (lb_id, node_id) in enumerate(nodes):
+            params['lb_id{}'.format(i)] = lb_id
+            params['node_id{}'.format(i)] = node_id
+            queries.append(query.format(cf=self.table, i=i))
+        return cql_eff(batch(queries, get_client_ts(self.clock)), params)
+
+
 @implementer(IAdmin)
 class CassAdmin(object):
     """
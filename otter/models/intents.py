@@ -12,6 +12,7 @@ from txeffect import deferred_performer
 
 from otter.log.intents import merge_effectful_fields
 from otter.models.cass import CassScalingGroupServersCache
+from otter.util.config import config_value
 from otter.util.fp import assoc_obj
 
 
@@ -90,8 +91,13 @@ class UpdateServersCache(object):
 
 @sync_performer
 def perform_update_servers_cache(disp, intent):
-    """ Perform :obj:`UpdateServersCache` """
+    """
+    Perform :obj:`UpdateServersCache` by rewriting the cache, or by writing
+    only the changed servers if ``converger.diff_servers_cache`` is set
+    """
     cache = CassScalingGroupServersCache(intent.tenant_id, intent.group_id)
+    if config_value('converger.diff_servers_cache'):
+        return cache.update_servers(intent.time, intent.servers)
     return cache.insert_servers(intent.time, intent.servers, True)
 
 
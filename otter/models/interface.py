@@ -303,8 +303,11 @@ class IScalingGroup(Interface):
             with this uuid) does not exist
         """
 
-    def view_config():
+    def view_config(cached=False):
         """
+        :param bool cached: May the config be a recently fetched one, which
+            is not necessarily the latest?
+
         :return: a view of the config, as specified by
             :data:`otter.json_schema.group_schemas.config`
         :rtype: a :class:`twisted.internet.defer.Deferred` that fires with
@@ -314,8 +317,11 @@ class IScalingGroup(Interface):
             with this uuid) does not exist
         """
 
-    def view_launch_config():
+    def view_launch_config(cached=False):
         """
+        :param bool cached: May the launch config be a recently fetched one,
+            which is not necessarily the latest?
+
         :return: a view of the launch config, as specified by
             :data:`otter.json_schema.group_schemas.launch_config`
         :rtype: a :class:`twisted.internet.defer.Deferred` that fires with
@@ -422,6 +428,9 @@ class IScalingGroup(Interface):
             arguments the :class:`IScalingGroup`, a :class:`GroupState`, and
             returns a :class:`GroupState`.  Other arguments provided to
             :func:`modify_state` will be passed to the ``callable``.
+        :param bool modify_state_retryable: keyword argument, not passed to
+            the ``callable``, saying it has no side effects and can be called
+            again if the state changes before its result is saved
 
         :return: a :class:`twisted.internet.defer.Deferred` that fires with None
 
@@ -483,7 +492,7 @@ class IScalingGroup(Interface):
             with this uuid) does not exist
         """
 
-    def get_policy(policy_id, version=None):
+    def get_policy(policy_id, version=None, cached=False):
         """
         Gets the specified policy on this particular scaling group.
 
@@ -493,6 +502,9 @@ class IScalingGroup(Interface):
         :param version: version of policy to check as Type-1 UUID
         :type version: ``UUID``
 
+        :param bool cached: May the policy be a recently fetched one, which
+            is not necessarily the latest?
+
         :return: a policy, as specified by
             :data:`otter.json_schema.group_schemas.policy`
         :rtype: a :class:`twisted.internet.defer.Deferred` that fires with
@@ -665,12 +677,61 @@ class IScalingGroupServersCache(Interface):
         :return: Effect of None
         """
 
+    def update_servers(last_update, servers):
+        """
+        Replace the servers cache of the group, writing only the servers that
+        are new or changed since the cache was last updated with this method,
+        and deleting those that are gone. The update time is recorded once
+        for the group rather than with every server.
+
+        :param datetime last_update: Update time of the cache
+        :param list servers: List of server dicts as in
+            :meth:`insert_servers`
+
+        :return: Effect of None
+        """
+
     def delete_servers():
         """
         Remove all servers of the group
         """
 
 
+class ICLBNodeDrainedAtCache(Interface):
+    """
+    Cache of times when a tenant's CLB nodes started DRAINING
+    """
+    tenant_id = Attribute("Rackspace Tenant ID of the owner of the nodes.")
+
+    def get_drained_at():
+        """
+        Return the cached DRAINING times of the tenant's CLB nodes.
+
+        :return: Effect of ``dict`` mapping (lb_id, node_id) tuple to
+            EPOCH seconds when the node started DRAINING
+        :rtype: Effect
+        """
+
+    def insert_drained_at(drained_at):
+        """
+        Add DRAINING times of CLB nodes to the cache
+
+        :param dict drained_at: Mapping of (lb_id, node_id) tuple to EPOCH
+            seconds when the node started DRAINING
+
+        :return: Effect of None
+        """
+
+    def delete_drained_at(nodes):
+        """
+        Remove DRAINING times of CLB nodes from the cache
+
+        :param nodes: Iterable of (lb_id, node_id) tuples
+
+        :return: Effect of None
+        """
+
+
 class IScalingScheduleCollection(Interface):
     """
     A list of scaling events in the future
@@ -686,6 +747,28 @@ class IScalingScheduleCollection(Interface):
         :rtype: deferred :class:`list` of :class:`dict`
         """
 
+    def fetch_events(bucket, until, size=100):
+        """
+        Fetch a batch of scheduled events in a bucket without deleting them.
+
+        :param int bucket: Index of bucket from which to fetch events.
+        :param datetime until: Time up to which events are fetched.
+        :param int size: The maximum number of events to fetch.
+        :return: Deferred that fires with a sequence of events, in the order
+            of their trigger time.
+        :rtype: deferred :class:`list` of :class:`dict`
+        """
+
+    def delete_events(bucket, events):
+        """
+        Delete scheduled events from a bucket.
+
+        :param int bucket: Index of bucket the events are in.
+        :param events: Events as returned by :meth:`fetch_events`.
+        :type events: :class:`list` of :class:`dict`
+        :return: Deferred that fires with :data:`None`
+        """
+
     def add_cron_events(cron_events):
         """
         Add cron events equally distributed among the buckets.
@@ -773,6 +856,20 @@ class IScalingGroupCollection(Interface):
             :class:`list` of :class:`GroupState`
         """
 
+    def get_active_caches(tenant_id, group_ids):
+        """
+        Get the active servers of several groups of a tenant from their
+        servers caches at once
+
+        :param tenant_id: the tenant ID of the scaling groups
+        :param list group_ids: IDs of the scaling groups
+
+        :return: a ``dict`` of group ID to ``dict`` of server ID to server
+            as in :meth:`IScalingGroupServersCache.get_servers`
+        :rtype: a :class:`twisted.internet.defer.Deferred` that fires with
+            a :class:`dict`
+        """
+
     def get_scaling_group(log, tenant_id, scaling_group_id):
         """
         Get a scaling group model
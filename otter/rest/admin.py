@@ -1,6 +1,13 @@
 """
 Autoscale REST endpoints having to do with administration of Otter.
 """
+import json
+
+from otter.convergence.timing import TimingRegistry
+from otter.log import log
+from otter.rest.decorators import (fails_with, succeeds_with,
+                                   with_transaction_id)
+from otter.rest.errors import exception_codes
 from otter.rest.metrics import OtterMetrics
 from otter.rest.otterapp import OtterApp
 
@@ -11,11 +18,15 @@ class OtterAdmin(object):
     """
     app = OtterApp()
 
-    def __init__(self, store):
+    def __init__(self, store, timings=None):
         """
         Initialize OtterAdmin.
+
+        :param timings: :obj:`TimingRegistry` of convergence phases to expose
         """
+        self.log = log.bind(system='otter.rest.admin')
         self.store = store
+        self.timings = TimingRegistry() if timings is None else timings
 
     @app.route('/', methods=['GET'])
     def root(self, request):
@@ -30,3 +41,14 @@ class OtterAdmin(object):
         Routes related to metrics are delegated to OtterMetrics.
         """
         return OtterMetrics(self.store).app.resource()
+
+    @app.route('/convergence/timings/', methods=['GET'])
+    @with_transaction_id()
+    @fails_with(exception_codes)
+    @succeeds_with(200)
+    def convergence_timings(self, request):
+        """
+        Get latency histograms and outcome counts of the phases of convergence
+        run by this node, as returned by :func:`TimingRegistry.as_json`.
+        """
+        return json.dumps({'timings': self.timings.as_json()})
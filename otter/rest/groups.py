@@ -205,12 +205,12 @@ class OtterGroups(object):
         def fetch_active_caches(group_states):
             if not tenant_is_enabled(self.tenant_id, config_value):
                 return group_states, [None] * len(group_states)
-            d = gatherResults(
-                [get_active_cache(
-                    self.store.reactor, self.store.connection, self.tenant_id,
-                    state.group_id)
-                 for state in group_states])
-            return d.addCallback(lambda cache: (group_states, cache))
+            d = self.store.get_active_caches(
+                self.tenant_id, [state.group_id for state in group_states])
+            return d.addCallback(
+                lambda caches: (group_states,
+                                [caches[state.group_id]
+                                 for state in group_states]))
 
         deferred = self.store.list_scaling_group_states(
             self.log, self.tenant_id, **paginate)
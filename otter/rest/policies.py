@@ -380,13 +380,14 @@ class OtterPolicy(object):
         """
         group = self.store.get_scaling_group(self.log, self.tenant_id,
                                              self.scaling_group_id)
-        d = controller.modify_and_trigger(
-            self.dispatcher,
-            group,
-            bound_log_kwargs(self.log),
-            partial(controller.maybe_execute_scaling_policy,
-                    self.log, transaction_id(request),
-                    policy_id=self.policy_id),
+        d = controller.coalesced_modify_and_trigger(
+            (self.tenant_id, self.scaling_group_id, self.policy_id),
+            dispatcher=self.dispatcher,
+            group=group,
+            logargs=bound_log_kwargs(self.log),
+            modifier=partial(controller.maybe_execute_scaling_policy,
+                             self.log, transaction_id(request),
+                             policy_id=self.policy_id),
             modify_state_reason='execute_policy')
         d.addCallback(lambda _: "{}")  # Return value TBD
         return d
@@ -4,9 +4,14 @@ is right all the time and is probably what caused your regular clock to get brok
 in the first place.
 """
 
-from datetime import datetime
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
 from functools import partial
 
+from kazoo.recipe.partitioner import PartitionState
+
+from toolz.itertoolz import groupby
+
 from twisted.application.service import MultiService
 from twisted.internet import defer
 
@@ -26,7 +31,8 @@ class SchedulerService(MultiService):
     """
 
     def __init__(self, dispatcher, batchsize, store, partitioner_factory,
-                 threshold=60):
+                 threshold=60, lookahead=None, clock=None,
+                 max_concurrent=None):
         """
         Initialize the scheduler service
 
@@ -35,15 +41,48 @@ class SchedulerService(MultiService):
         :param store: cassandra store
         :param partitioner_factory: Callable of (log, callback) ->
             :obj:`Partitioner`
+        :param int lookahead: If given, events occurring within these many
+            seconds are prefetched on each iteration and executed at their
+            trigger time by a :obj:`TimerWheel`. Otherwise, events occurring
+            now and earlier are fetched and executed on each iteration.
+        :param clock: ``IReactorTime`` provider used to execute prefetched
+            events
+        :param int max_concurrent: If given, at most these many events are
+            executed at a time, taking turns among tenants. Otherwise all
+            fetched events are executed at once.
         """
         MultiService.__init__(self)
         self.store = store
         self.threshold = threshold
         self.log = otter_log.bind(system='otter.scheduler')
+        self.batchsize = batchsize
+        self.lookahead = lookahead
+        check = (self._check_events if lookahead is None
+                 else self._prefetch_events)
         self.partitioner = partitioner_factory(
-            self.log, partial(self._check_events, batchsize))
+            self.log, partial(check, batchsize))
         self.partitioner.setServiceParent(self)
         self.dispatcher = dispatcher
+        if clock is None:
+            from twisted.internet import reactor
+            clock = reactor
+        self.wheel = TimerWheel(clock, self._fire_events)
+        # Serializes prefetching events with deleting fired events so that
+        # events being fired are not prefetched again
+        self._wheel_lock = defer.DeferredLock()
+        self._buckets = set()
+        self._truncated = set()
+        self.pool = (None if max_concurrent is None
+                     else ExecutionPool(max_concurrent))
+
+    def stopService(self):
+        """
+        Stop the service, dropping prefetched events. They are still in the
+        store and will be fetched by whoever gets their buckets.
+        """
+        self.wheel.clear()
+        self._buckets = set()
+        return MultiService.stopService(self)
 
     def reset(self, path):
         """
@@ -98,11 +137,252 @@ class SchedulerService(MultiService):
 
         return defer.gatherResults(
             [check_events_in_bucket(
-                log, self.dispatcher, self.store, bucket, utcnow, batchsize)
+                log, self.dispatcher, self.store, bucket, utcnow, batchsize,
+                pool=self.pool)
              for bucket in buckets])
 
+    def _prefetch_events(self, batchsize, buckets):
+        """
+        Prefetch events occurring within :attr:`lookahead` seconds into
+        :attr:`wheel`.
+
+        Events are only deleted from the store when they are fired, which
+        makes the partitioner's hold on a bucket the lease on its prefetched
+        events: if this node dies or loses the bucket, the events are fetched
+        by the bucket's next owner. Events of buckets that are no longer
+        owned are dropped from the wheel.
+        """
+        utcnow = datetime.utcnow()
+        log = self.log.bind(scheduler_run_id=generate_transaction_id(),
+                            utcnow=utcnow)
+        lost = self._buckets - set(buckets)
+        if lost:
+            self.wheel.remove_buckets(lost)
+            self._truncated -= lost
+        self._buckets = set(buckets)
+        until = utcnow + timedelta(seconds=self.lookahead)
+        return self._wheel_lock.run(
+            self._prefetch_buckets, log, buckets, until, batchsize)
+
+    def _prefetch_buckets(self, log, buckets, until, batchsize):
+        """
+        Fetch events of the buckets occurring before or at ``until`` and add
+        them to :attr:`wheel`. Must be called with :attr:`_wheel_lock` held.
+        """
+        def add_events(events, bucket):
+            if bucket not in self._buckets:
+                return
+            if len(events) == batchsize:
+                self._truncated.add(bucket)
+            else:
+                self._truncated.discard(bucket)
+            for event in events:
+                self.wheel.add(bucket, event, datetime.utcnow())
+
+        def prefetch(bucket):
+            d = self.store.fetch_events(bucket, until, batchsize)
+            d.addCallback(add_events, bucket)
+            d.addErrback(log.bind(bucket=bucket).err)
+            return d
+
+        return defer.gatherResults(map(prefetch, buckets))
+
+    def _fire_events(self, slot, entries):
+        """
+        Delete and execute prefetched events whose trigger time has come.
+        Events of buckets not owned anymore are left for the new owner.
+
+        If a bucket's last prefetch was limited by the batch size, its next
+        events are prefetched after the fired ones are deleted.
+
+        :param datetime slot: Time the events are fired at
+        :param entries: ``list`` of ``(bucket, event)`` tuples
+        """
+        log = self.log.bind(scheduler_run_id=generate_transaction_id(),
+                            utcnow=slot)
+        if self.partitioner.get_current_state() != PartitionState.ACQUIRED:
+            return
+        owned = set(self.partitioner.get_current_buckets())
+        by_bucket = groupby(lambda entry: entry[0],
+                            [entry for entry in entries if entry[0] in owned])
+        if not by_bucket:
+            return
+        events = {bucket: [event for _, event in bucket_entries]
+                  for bucket, bucket_entries in by_bucket.items()}
+
+        def delete():
+            d = defer.gatherResults(
+                [self.store.delete_events(bucket, bucket_events)
+                 for bucket, bucket_events in events.items()],
+                consumeErrors=True)
+            d.addCallback(refill)
+            return d
+
+        def refill(_):
+            truncated = self._truncated.intersection(events)
+            if truncated:
+                until = datetime.utcnow() + timedelta(seconds=self.lookahead)
+                return self._prefetch_buckets(log, truncated, until,
+                                              self.batchsize)
+
+        d = self._wheel_lock.run(delete)
+        d.addCallback(lambda _: process_events(
+            [event for bucket_events in events.values()
+             for event in bucket_events],
+            self.dispatcher, self.store, log, pool=self.pool))
+        d.addErrback(log.err, 'sch-fire-events-err')
+        return d
+
+
+def _slot_of(trigger):
+    """
+    Return the time of the slot of a :obj:`TimerWheel` an event with the
+    given trigger time is fired at, i.e. the trigger time rounded up to a
+    second.
+    """
+    slot = trigger.replace(microsecond=0)
+    if slot < trigger:
+        slot += timedelta(seconds=1)
+    return slot
+
+
+class TimerWheel(object):
+    """
+    Scheduled events kept in memory in slots of a second, each slot fired
+    by a single delayed call at its time.
+
+    :param clock: ``IReactorTime`` provider
+    :param fire: Callable called with the slot's time and ``list`` of
+        ``(bucket, event)`` tuples in it when a slot is due. Its events are
+        not added again until the ``Deferred`` it may return fires.
+    """
+
+    def __init__(self, clock, fire):
+        self.clock = clock
+        self.fire = fire
+        # slot time -> {event key: (bucket, event)}
+        self._slots = {}
+        # slot time -> IDelayedCall
+        self._calls = {}
+        # keys of events in the wheel or being fired
+        self._keys = set()
+
+    def __len__(self):
+        return sum(map(len, self._slots.values()))
+
+    def add(self, bucket, event, now):
+        """
+        Add an event of a bucket to be fired at its trigger time, or as soon
+        as possible if it is due already. An event already in the wheel is
+        not added again.
+
+        :param datetime now: The current time
+        :return: ``True`` if the event was added, ``False`` otherwise
+        """
+        key = (bucket, event['policyId'], event['trigger'])
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        slot = _slot_of(event['trigger'])
+        self._slots.setdefault(slot, {})[key] = (bucket, event)
+        if slot not in self._calls:
+            delay = max((slot - now).total_seconds(), 0)
+            self._calls[slot] = self.clock.callLater(delay, self._fire, slot)
+        return True
+
+    def remove_buckets(self, buckets):
+        """
+        Remove events of the given buckets that are not being fired.
+        """
+        for slot, entries in self._slots.items():
+            for key in [key for key in entries if key[0] in buckets]:
+                del entries[key]
+                self._keys.discard(key)
+            if not entries:
+                del self._slots[slot]
+                self._calls.pop(slot).cancel()
+
+    def clear(self):
+        """
+        Remove all events that are not being fired.
+        """
+        for call in self._calls.values():
+            call.cancel()
+        for entries in self._slots.values():
+            self._keys.difference_update(entries)
+        self._slots = {}
+        self._calls = {}
+
+    def _fire(self, slot):
+        del self._calls[slot]
+        entries = self._slots.pop(slot)
+
+        def forget(result):
+            self._keys.difference_update(entries)
+            return result
+
+        return defer.maybeDeferred(
+            self.fire, slot, entries.values()).addBoth(forget)
+
+
+class ExecutionPool(object):
+    """
+    Runs functions on behalf of tenants with at most ``limit`` of them
+    running at a time. Waiting calls are started in turns of tenants, so that
+    a tenant with many waiting calls does not hold up the others.
+
+    :param int limit: Maximum number of calls running at a time
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.running = 0
+        # tenant id -> deque of (Deferred, f, args, kwargs), in turn order
+        self._waiting = OrderedDict()
+        self._starting = False
+
+    def run(self, tenant_id, f, *args, **kwargs):
+        """
+        Call ``f(*args, **kwargs)`` on behalf of the tenant when it is its
+        turn and fewer than ``limit`` calls are running.
+
+        :return: `Deferred` that fires with the result of the call
+        """
+        d = defer.Deferred()
+        self._waiting.setdefault(tenant_id, deque()).append(
+            (d, f, args, kwargs))
+        self._start()
+        return d
 
-def check_events_in_bucket(log, dispatcher, store, bucket, now, batchsize):
+    def _start(self):
+        # Calls that complete synchronously call this again while starting;
+        # the loop below will pick up the room they left rather than
+        # recursing once per waiting call
+        if self._starting:
+            return
+        self._starting = True
+        try:
+            while self.running < self.limit and self._waiting:
+                tenant_id, calls = self._waiting.popitem(last=False)
+                d, f, args, kwargs = calls.popleft()
+                if calls:
+                    # to the back of the line for the tenant's next call
+                    self._waiting[tenant_id] = calls
+                self.running += 1
+                result = defer.maybeDeferred(f, *args, **kwargs)
+                result.addBoth(self._done)
+                result.chainDeferred(d)
+        finally:
+            self._starting = False
+
+    def _done(self, result):
+        self.running -= 1
+        self._start()
+        return result
+
+
+def check_events_in_bucket(log, dispatcher, store, bucket, now, batchsize,
+                           pool=None):
     """
     Retrieves events in the given bucket that occur before or at now,
     in batches of batchsize, for processing
@@ -113,6 +393,7 @@ def check_events_in_bucket(log, dispatcher, store, bucket, now, batchsize):
     :param bucket: Bucket to check events in
     :param now: Time before which events are checked
     :param batchsize: Number of events to check at a time
+    :param pool: :obj:`ExecutionPool` to execute events in, if any
 
     :return: a deferred that fires with None
     """
@@ -125,7 +406,7 @@ def check_events_in_bucket(log, dispatcher, store, bucket, now, batchsize):
 
     def _do_check():
         d = store.fetch_and_delete(bucket, now, batchsize)
-        d.addCallback(process_events, dispatcher, store, log)
+        d.addCallback(process_events, dispatcher, store, log, pool=pool)
         d.addCallback(check_for_more)
         d.addErrback(log.err)
         return d
@@ -133,7 +414,7 @@ def check_events_in_bucket(log, dispatcher, store, bucket, now, batchsize):
     return _do_check()
 
 
-def process_events(events, dispatcher, store, log):
+def process_events(events, dispatcher, store, log, pool=None):
     """
     Executes all the events and adds the next occurrence of each event
     to the buckets
@@ -142,6 +423,9 @@ def process_events(events, dispatcher, store, log):
     :param dispatcher: Effect dispatcher
     :param store: `IScalingGroupCollection` provider
     :param log: A bound log for logging
+    :param pool: :obj:`ExecutionPool` to execute events in. If given, the
+        lag between the events' trigger time and their execution is logged.
+        Otherwise all events are executed at once.
 
     :return: a `Deferred` that fires with number of events processed
     """
@@ -152,11 +436,28 @@ def process_events(events, dispatcher, store, log):
 
     deleted_policy_ids = set()
 
-    deferreds = [
-        execute_event(dispatcher, store, log, event, deleted_policy_ids)
-        for event in events
-    ]
+    if pool is None:
+        deferreds = [
+            execute_event(dispatcher, store, log, event, deleted_policy_ids)
+            for event in events
+        ]
+    else:
+        lags = []
+
+        def execute(event):
+            lags.append(
+                (datetime.utcnow() - event['trigger']).total_seconds())
+            return execute_event(dispatcher, store, log, event,
+                                 deleted_policy_ids)
+
+        deferreds = [pool.run(event['tenantId'], execute, event)
+                     for event in events]
     d = defer.gatherResults(deferreds, consumeErrors=True)
+    if pool is not None:
+        d.addCallback(lambda _: log.msg(
+            'sch-exec-lag', num_events=len(lags),
+            max_lag_seconds=max(lags),
+            mean_lag_seconds=sum(lags) / len(lags)))
     d.addCallback(lambda _: add_cron_events(store, log, events, deleted_policy_ids))
     return d.addCallback(lambda _: len(events))
 
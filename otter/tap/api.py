@@ -33,7 +33,12 @@ from otter.constants import (
     CONVERGENCE_DIRTY_DIR,
     CONVERGENCE_PARTITIONER_PATH,
     get_service_configs)
-from otter.convergence.service import Converger
+from otter.convergence.service import (
+    Converger,
+    DEFAULT_NUM_BUCKETS,
+    DEFAULT_RING_BUCKETS,
+    uses_hash_ring)
+from otter.convergence.timing import TimingRegistry
 from otter.effect_dispatcher import get_full_dispatcher
 from otter.log import log
 from otter.log.cloudfeeds import CloudFeedsObserver
@@ -46,7 +51,9 @@ from otter.scheduler import SchedulerService
 from otter.supervisor import SupervisorService, set_supervisor
 from otter.util.config import config_value, set_config_data
 from otter.util.cqlbatch import TimingOutCQLClient
+from otter.util.cqlprepared import PreparingCassandraCluster
 from otter.util.deferredutils import timeout_deferred
+from otter.util.hashring import default_member, ring_partition_func
 from otter.util.zkpartitioner import Partitioner
 
 assert os.environ.get("PYRSISTENT_NO_C_EXTENSION"), (
@@ -191,10 +198,15 @@ def makeService(config):
         clientFromString(reactor, str(host))
         for host in config_value('cassandra.seed_hosts')]
 
+    if config_value('cassandra.prepared_statements'):
+        cluster_class = PreparingCassandraCluster
+    else:
+        cluster_class = RoundRobinCassandraCluster
+
     cassandra_cluster = LoggingCQLClient(
         TimingOutCQLClient(
             reactor,
-            RoundRobinCassandraCluster(
+            cluster_class(
                 seed_endpoints,
                 config_value('cassandra.keyspace'),
                 disconnect_on_cancel=True),
@@ -236,10 +248,14 @@ def makeService(config):
     api_service = service(str(config_value('port')), site)
     api_service.setServiceParent(parent)
 
+    # Timings of convergence, recorded by the converger and exposed on the
+    # admin port
+    timings = TimingRegistry()
+
     # Setup admin service
     admin_port = config_value('admin')
     if admin_port:
-        admin = OtterAdmin(admin_store)
+        admin = OtterAdmin(admin_store, timings)
         admin_site = Site(admin.app.resource())
         admin_site.displayTracebacks = False
         admin_service = service(str(admin_port), admin_site)
@@ -299,7 +315,15 @@ def makeService(config):
                 config_value('converger.interval') or 10,
                 config_value('converger.build_timeout') or 3600,
                 config_value('converger.limited_retry_iterations') or 10,
-                config_value('converger.step_limits') or {})
+                config_value('converger.step_limits') or {},
+                config_value('converger.gather_cache_ttl'),
+                timings,
+                config_value('converger.max_in_flight'),
+                config_value('converger.buckets'),
+                config_value('converger.weight'),
+                config_value('converger.max_backoff'),
+                config_value('converger.step_throttles'),
+                config_value('converger.clb_batch_window'))
 
         d.addCallback(on_client_ready)
         d.addErrback(log.err, 'Could not start TxKazooClient')
@@ -308,20 +332,41 @@ def makeService(config):
 
 
 def setup_converger(parent, kz_client, dispatcher, interval, build_timeout,
-                    limited_retry_iterations, step_limits):
+                    limited_retry_iterations, step_limits,
+                    gather_cache_ttl=None, timings=None,
+                    max_in_flight=None, num_buckets=None, weight=None,
+                    max_backoff=None, step_throttles=None,
+                    clb_batch_window=None):
     """
     Create a Converger service, which has a Partitioner as a child service, so
     that if the Converger is stopped, the partitioner is also stopped.
+
+    With :func:`uses_hash_ring`, the ``num_buckets`` buckets are distributed
+    between converger nodes with a consistent-hash ring on which this node has
+    ``weight`` times the points of a node of weight 1. Otherwise Kazoo deals
+    them out in turn and ``weight`` is ignored.
     """
+    ring_kwargs = {}
+    default_buckets = DEFAULT_NUM_BUCKETS
+    if uses_hash_ring():
+        ring_kwargs = dict(partition_func=ring_partition_func(),
+                           identifier=default_member(weight or 1))
+        default_buckets = DEFAULT_RING_BUCKETS
     partitioner_factory = partial(
         Partitioner,
         kz_client=kz_client,
         interval=interval,
         partitioner_path=CONVERGENCE_PARTITIONER_PATH,
         time_boundary=15,  # time boundary
+        **ring_kwargs
     )
-    cvg = Converger(log, dispatcher, 10, partitioner_factory, build_timeout,
-                    interval / 2, limited_retry_iterations, step_limits)
+    cvg = Converger(log, dispatcher, num_buckets or default_buckets,
+                    partitioner_factory, build_timeout,
+                    interval / 2, limited_retry_iterations, step_limits,
+                    gather_cache_ttl=gather_cache_ttl, timings=timings,
+                    max_in_flight=max_in_flight, max_backoff=max_backoff,
+                    step_throttles=step_throttles,
+                    clb_batch_window=clb_batch_window)
     cvg.setServiceParent(parent)
     watch_children(kz_client, CONVERGENCE_DIRTY_DIR, cvg.divergent_changed)
 
@@ -338,12 +383,16 @@ def setup_scheduler(parent, dispatcher, store, kz_client):
     partition_path = (config_value('scheduler.partition.path') or
                       '/scheduler_partition')
     time_boundary = config_value('scheduler.partition.time_boundary') or 15
+    interval = int(config_value('scheduler.interval'))
+    lookahead = None
+    if config_value('scheduler.mode') == 'prefetch':
+        lookahead = config_value('scheduler.lookahead') or 2 * interval
     partitioner_factory = partial(
         Partitioner,
-        kz_client, int(config_value('scheduler.interval')), partition_path,
-        buckets, time_boundary)
+        kz_client, interval, partition_path, buckets, time_boundary)
     scheduler_service = SchedulerService(
         dispatcher, int(config_value('scheduler.batchsize')),
-        store, partitioner_factory)
+        store, partitioner_factory, lookahead=lookahead, clock=reactor,
+        max_concurrent=config_value('scheduler.max_concurrent_events'))
     scheduler_service.setServiceParent(parent)
     return scheduler_service
@@ -663,6 +663,7 @@ class CLBClientTests(SynchronousTestCase):
             cm.exception,
             CLBRateLimitError("OverLimit Retry...",
                               lb_id=six.text_type(self.lb_id)))
+        self.assertEqual(cm.exception.retry_after, "2015-06-13T22:30:10Z")
 
         # Ignored errors
         bad_resps = [
@@ -1034,6 +1035,17 @@ class NovaClientTests(SynchronousTestCase):
 
         self.assertEqual(cm.exception,
                          NovaRateLimitError("OverLimit Retry..."))
+        self.assertEqual(cm.exception.retry_after, "2015-02-27T23:42:27Z")
+
+        # The Retry-After header is preferred to the body's retryAfter
+        dispatcher = EQFDispatcher([(
+            intent,
+            service_request_eqf(
+                stub_pure_response(json.dumps(failure_body), 413,
+                                   {'Retry-After': '30'})))])
+        with self.assertRaises(NovaRateLimitError) as cm:
+            sync_perform(dispatcher, effect)
+        self.assertEqual(cm.exception.retry_after, '30')
 
     def assert_handles_nova_compute_fault(self, intent, effect):
         """
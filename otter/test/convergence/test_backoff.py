@@ -0,0 +1,90 @@
+"""Tests for :mod:`otter.convergence.backoff`."""
+
+from effect import Effect, sync_perform
+
+from twisted.internet.task import Clock
+from twisted.trial.unittest import SynchronousTestCase
+
+from otter.convergence.backoff import (
+    ConvergenceBackoff,
+    GetBackedOff,
+    RecordConvergence,
+    get_backoff_dispatcher)
+
+
+class ConvergenceBackoffTests(SynchronousTestCase):
+    """
+    Tests for :obj:`ConvergenceBackoff` and performing its intents.
+    """
+
+    def setUp(self):
+        self.clock = Clock()
+        self.random = 0
+        self.backoff = ConvergenceBackoff(
+            self.clock, 10, max_delay=100, random=lambda: self.random)
+        self.dispatcher = get_backoff_dispatcher(self.backoff)
+
+    def _record(self, group_id, version, idle):
+        sync_perform(self.dispatcher,
+                     Effect(RecordConvergence(group_id, version, idle)))
+
+    def _backed_off(self):
+        return sync_perform(self.dispatcher, Effect(GetBackedOff()))
+
+    def test_idle(self):
+        """
+        A group is backed off for twice the interval after an idle iteration.
+        """
+        self._record('g1', 3, True)
+        self.assertEqual(self._backed_off(), {'g1': 3})
+        self.clock.advance(19)
+        self.assertEqual(self._backed_off(), {'g1': 3})
+        self.clock.advance(1)
+        self.assertEqual(self._backed_off(), {})
+
+    def test_exponential(self):
+        """
+        The delay doubles with every consecutive idle iteration, up to
+        ``max_delay``.
+        """
+        self.assertEqual(
+            [self.backoff.delay(idle) for idle in range(1, 6)],
+            [20, 40, 80, 100, 100])
+        for _ in range(3):
+            self._record('g1', 3, True)
+        self.clock.advance(79)
+        self.assertEqual(self._backed_off(), {'g1': 3})
+        self.clock.advance(1)
+        self.assertEqual(self._backed_off(), {})
+
+    def test_jitter(self):
+        """
+        Delays are shortened by a random fraction of up to ``jitter``.
+        """
+        self.random = 0.5
+        self.assertEqual(self.backoff.delay(4), 87.5)
+
+    def test_not_idle(self):
+        """
+        A group is not backed off anymore after an iteration that is not idle.
+        """
+        self._record('g1', 3, True)
+        self._record('g1', 3, False)
+        self.assertEqual(self._backed_off(), {})
+        # and starts over
+        self._record('g1', 3, True)
+        self.clock.advance(20)
+        self.assertEqual(self._backed_off(), {})
+
+    def test_forget_stale(self):
+        """
+        Groups whose delay ended ``max_delay`` ago are forgotten, so their
+        next idle iteration starts over.
+        """
+        self._record('g1', 3, True)
+        self._record('g1', 3, True)
+        self.clock.advance(140)
+        self.assertEqual(self._backed_off(), {})
+        self._record('g1', 3, True)
+        self.clock.advance(20)
+        self.assertEqual(self._backed_off(), {})
@@ -0,0 +1,272 @@
+"""Tests for :mod:`otter.convergence.batching`."""
+
+from functools import partial
+
+from effect import (
+    ComposedDispatcher, Constant, Effect, TypeDispatcher, sync_performer)
+
+from pyrsistent import s
+
+from twisted.internet.defer import Deferred, fail, succeed
+from twisted.internet.task import Clock
+from twisted.trial.unittest import SynchronousTestCase
+
+from txeffect import perform
+
+from otter.cloud_client import TenantScope, perform_tenant_scope
+from otter.convergence.batching import (
+    BatchedStep,
+    StepBatcher,
+    get_batch_dispatcher)
+from otter.convergence.model import CLBDescription, StepResult
+from otter.convergence.steps import AddNodesToCLB, RemoveNodesFromCLB
+from otter.effect_dispatcher import get_full_dispatcher
+from otter.log.intents import get_log_dispatcher
+from otter.test.utils import mock_log, stub_json_response
+
+
+def remove(lb_id, *node_ids):
+    """Return a :obj:`RemoveNodesFromCLB` step."""
+    return RemoveNodesFromCLB(lb_id=lb_id, node_ids=s(*node_ids))
+
+
+class StepBatcherTests(SynchronousTestCase):
+    """Tests for :obj:`StepBatcher`."""
+
+    def setUp(self):
+        self.clock = Clock()
+        self.batcher = StepBatcher(self.clock, 1, limit=4)
+        self.executed = []
+        self.busy = Deferred()
+
+    def execute(self, step, context='group', result=StepResult.SUCCESS):
+        """Record executing the step and succeed with it."""
+        self.executed.append((context, step))
+        return succeed((result, [step]))
+
+    def submit(self, step, execute=None, tenant_id='t1'):
+        """Submit step with :meth:`execute`, merged in tenant context."""
+        return self.batcher.submit(
+            tenant_id, step, execute or self.execute,
+            partial(self.execute, context='tenant'))
+
+    def keep_busy(self, tenant_id='t1', lb_id='lb'):
+        """
+        Submit a step for the load balancer that keeps executing until
+        ``self.busy`` fires.
+        """
+        d = self.submit(remove(lb_id, 'busy'), lambda step: self.busy,
+                        tenant_id=tenant_id)
+        self.assertNoResult(d)
+
+    def test_executes_lone_step(self):
+        """
+        A step is executed right away in its group's context when no other
+        step for the load balancer is executing.
+        """
+        d = self.submit(remove('lb', '1'))
+        self.assertEqual(self.successResultOf(d),
+                         (StepResult.SUCCESS, [remove('lb', '1')]))
+        self.assertEqual(self.executed, [('group', remove('lb', '1'))])
+        d = self.submit(remove('lb', '2'))
+        self.assertEqual(self.successResultOf(d),
+                         (StepResult.SUCCESS, [remove('lb', '2')]))
+
+    def test_merge(self):
+        """
+        Steps of a tenant for the same load balancer submitted within the
+        window while another step for it is executing are merged, executed
+        in the tenant's context, and the merged step's result is the result
+        of each of them.
+        """
+        self.keep_busy()
+        d1 = self.submit(remove('lb', '1'))
+        self.clock.advance(0.5)
+        d2 = self.submit(remove('lb', '2', '3'))
+        self.assertNoResult(d1)
+        self.clock.advance(0.5)
+        merged = remove('lb', '1', '2', '3')
+        self.assertEqual(self.executed, [('tenant', merged)])
+        self.assertEqual(self.successResultOf(d1),
+                         (StepResult.SUCCESS, [merged]))
+        self.assertEqual(self.successResultOf(d2),
+                         (StepResult.SUCCESS, [merged]))
+
+    def test_not_merged(self):
+        """
+        Steps of other tenants, for other load balancers or of other types
+        are not merged.
+        """
+        add = AddNodesToCLB(
+            lb_id='lb',
+            address_configs=s(('1.1.1.1', CLBDescription(lb_id='lb',
+                                                         port=80))))
+        self.keep_busy()
+        steps = [('t1', remove('lb', '1')), ('t2', remove('lb', '2')),
+                 ('t1', remove('lb2', '3')), ('t1', add)]
+        for tenant_id, step in steps:
+            self.submit(step, tenant_id=tenant_id)
+        self.clock.advance(1)
+        self.assertEqual(sorted(self.executed),
+                         sorted(('group', step) for _, step in steps))
+
+    def test_window_restarts(self):
+        """
+        Steps submitted after a window has ended wait for a new window while
+        a step for the load balancer is still executing.
+        """
+        self.keep_busy()
+        self.submit(remove('lb', '1'))
+        self.clock.advance(1)
+        d = self.submit(remove('lb', '2'))
+        self.assertNoResult(d)
+        self.clock.advance(1)
+        self.assertEqual(self.executed, [('group', remove('lb', '1')),
+                                         ('group', remove('lb', '2'))])
+
+    def test_limit(self):
+        """
+        Merged steps change at most ``limit`` nodes. A step that changes more
+        is not split.
+        """
+        self.keep_busy()
+        for step in [remove('lb', '1', '2'), remove('lb', '3', '4'),
+                     remove('lb', '5'), remove('lb', *'abcdef')]:
+            self.submit(step)
+        self.clock.advance(1)
+        self.assertEqual(self.executed,
+                         [('tenant', remove('lb', '1', '2', '3', '4')),
+                          ('group', remove('lb', '5')),
+                          ('group', remove('lb', *'abcdef'))])
+
+    def test_unsuccessful_merge(self):
+        """
+        When a merged step does not succeed, each of the steps is executed
+        again on its own in its group's context and gets its own result.
+        """
+        self.keep_busy()
+        d1 = self.batcher.submit(
+            't1', remove('lb', '1'), self.execute,
+            partial(self.execute, context='tenant',
+                    result=StepResult.FAILURE))
+        d2 = self.submit(
+            remove('lb', '2'),
+            partial(self.execute, result=StepResult.FAILURE))
+        self.clock.advance(1)
+        self.assertEqual(self.successResultOf(d1),
+                         (StepResult.SUCCESS, [remove('lb', '1')]))
+        self.assertEqual(self.successResultOf(d2),
+                         (StepResult.FAILURE, [remove('lb', '2')]))
+        self.assertEqual(self.executed,
+                         [('tenant', remove('lb', '1', '2')),
+                          ('group', remove('lb', '1')),
+                          ('group', remove('lb', '2'))])
+
+    def test_failure(self):
+        """
+        When executing a merged step fails, each of the steps is executed
+        again on its own.
+        """
+        self.keep_busy()
+        self.batcher.submit('t1', remove('lb', '1'), self.execute,
+                            lambda step: fail(ValueError('bad')))
+        d = self.submit(remove('lb', '2'),
+                        lambda step: fail(ValueError('bad')))
+        self.clock.advance(1)
+        self.assertEqual(self.executed, [('group', remove('lb', '1'))])
+        self.failureResultOf(d, ValueError)
+
+    def test_idle_again(self):
+        """
+        Steps keep waiting to be merged with the steps already waiting after
+        the executing step completes, and are executed right away again once
+        no step for the load balancer is waiting or executing.
+        """
+        self.keep_busy()
+        self.submit(remove('lb', '1'))
+        self.busy.callback((StepResult.SUCCESS, []))
+        d = self.submit(remove('lb', '2'))
+        self.assertNoResult(d)
+        self.clock.advance(1)
+        self.successResultOf(d)
+        d = self.submit(remove('lb', '3'))
+        self.assertEqual(self.successResultOf(d),
+                         (StepResult.SUCCESS, [remove('lb', '3')]))
+
+    def test_perform(self):
+        """
+        :obj:`BatchedStep` is performed by submitting the step to the batcher,
+        and steps are executed by performing the effect returned by
+        ``execute_step``, with the intent's dispatcher when on their own and
+        with the tenant dispatcher, in the tenant's scope, when merged.
+        """
+        def performer(context):
+            return TypeDispatcher({tuple: sync_performer(
+                lambda d, i: (StepResult.SUCCESS, [(context, i)]))})
+
+        tenant_dispatcher = ComposedDispatcher([
+            performer('tenant'), get_log_dispatcher(mock_log(), {}),
+            TypeDispatcher({TenantScope: sync_performer(
+                lambda d, i: i.effect.on(
+                    lambda r: (r[0], [(i.tenant_id, r[1])])))})])
+        dispatcher = ComposedDispatcher([
+            get_batch_dispatcher(
+                self.batcher,
+                lambda tenant_id, step: Effect((tenant_id, step)),
+                tenant_dispatcher),
+            performer('group')])
+        self.keep_busy()
+        d1 = perform(dispatcher,
+                     Effect(BatchedStep('t1', remove('lb', '1'))))
+        d2 = perform(dispatcher,
+                     Effect(BatchedStep('t1', remove('lb', '2'))))
+        self.clock.advance(1)
+        result = (StepResult.SUCCESS,
+                  [('t1', [('tenant', ('t1', remove('lb', '1', '2')))])])
+        self.assertEqual(self.successResultOf(d1), result)
+        self.assertEqual(self.successResultOf(d2), result)
+        self.busy.callback((StepResult.SUCCESS, []))
+        d = perform(dispatcher, Effect(BatchedStep('t1', remove('lb', '3'))))
+        self.assertEqual(self.successResultOf(d),
+                         (StepResult.SUCCESS,
+                          [('group', ('t1', remove('lb', '3')))]))
+
+    def test_perform_service_requests(self):
+        """
+        Merged steps are performed in the scope of the tenant, so their
+        service requests are made for the tenant by the converger's
+        dispatcher, once for all the merged steps.
+        """
+        requests = []
+
+        def concretize(authenticator, log, service_configs, throttler,
+                       tenant_id, service_request):
+            requests.append((tenant_id, service_request.method,
+                             service_request.url,
+                             sorted(service_request.params['id'])))
+            return Effect(Constant(stub_json_response({}, 202)))
+
+        dispatcher = ComposedDispatcher([
+            TypeDispatcher({TenantScope: partial(
+                perform_tenant_scope, None, None, None, None,
+                _concretize=concretize)}),
+            get_full_dispatcher(None, None, mock_log(), None, None, None,
+                                None, None)])
+        dispatcher = ComposedDispatcher([
+            get_batch_dispatcher(
+                self.batcher, lambda tenant_id, step: step.as_effect(),
+                dispatcher),
+            dispatcher])
+        self.keep_busy()
+        ds = [perform(dispatcher,
+                      Effect(TenantScope(
+                          Effect(BatchedStep('t1', remove('lb', node_id))),
+                          't1')))
+              for node_id in ('1', '2')]
+        self.clock.advance(1)
+        for d in ds:
+            self.assertEqual(self.successResultOf(d),
+                             (StepResult.SUCCESS, []))
+        self.assertEqual(
+            requests,
+            [('t1', 'DELETE', 'loadbalancers/lb/nodes', ['1', '2'])])
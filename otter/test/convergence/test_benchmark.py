@@ -0,0 +1,127 @@
+"""Tests for the convergence planning benchmarks."""
+
+from collections import Counter
+
+from twisted.trial.unittest import SynchronousTestCase
+
+from otter.convergence.benchmark import (
+    MIXES,
+    Mix,
+    Size,
+    generate_group,
+    measure,
+    run_benchmarks)
+from otter.convergence.model import CLBNode, RCv3Node, ServerState
+from otter.convergence.planning import Destiny, get_destiny
+
+
+class GenerateGroupTests(SynchronousTestCase):
+    """
+    Tests for :func:`generate_group`.
+    """
+
+    def test_sizes(self):
+        """
+        The group has the number of servers asked for, and the tenant has the
+        number of nodes asked for, with every server on every LB.
+        """
+        desired, servers, nodes = generate_group(
+            Size(servers=10, nodes=50), MIXES['steady'])
+        self.assertEqual(desired.capacity, 10)
+        self.assertEqual(len(servers), 10)
+        self.assertEqual(len(nodes), 50)
+        for server in servers:
+            self.assertEqual(
+                Counter(type(node) for node in nodes
+                        if node.matches(server)),
+                {CLBNode: 2, RCv3Node: 1})
+
+    def test_more_group_nodes_than_asked_for(self):
+        """
+        The nodes of the group's servers are never left out to meet the
+        number of nodes asked for.
+        """
+        _, _, nodes = generate_group(
+            Size(servers=10, nodes=5), MIXES['steady'])
+        self.assertEqual(len(nodes), 30)
+
+    def test_mix(self):
+        """
+        Servers get their states in proportion to the mix's weights, and the
+        capacity is in the mix's ratio to the number of servers.
+        """
+        mix = Mix(capacity_ratio=0.5,
+                  states=((2, ServerState.ACTIVE), (1, ServerState.BUILD),
+                          (1, 'DRAINING')),
+                  unbalanced_every=2)
+        desired, servers, nodes = generate_group(
+            Size(servers=8, nodes=0), mix)
+        self.assertEqual(desired.capacity, 4)
+        self.assertEqual(
+            Counter(get_destiny(server) for server in servers),
+            {Destiny.CONSIDER_AVAILABLE: 4,
+             Destiny.WAIT_WITH_TIMEOUT: 2,
+             Destiny.DRAIN: 2})
+        # half of the unbalanced servers have no nodes, the other half
+        # are on the CLBs with the wrong weight
+        self.assertEqual(len(nodes), 6 * 3)
+        self.assertEqual(
+            len([node for node in nodes if isinstance(node, CLBNode) and
+                 node.description.weight == 2]),
+            2 * 2)
+
+    def test_deterministic(self):
+        """
+        The same size and mix always generate the same group.
+        """
+        size = Size(servers=20, nodes=100)
+        self.assertEqual(generate_group(size, MIXES['churn']),
+                         generate_group(size, MIXES['churn']))
+
+
+class MeasureTests(SynchronousTestCase):
+    """
+    Tests for :func:`measure`.
+    """
+
+    def test_isolated(self):
+        """
+        The function is run in a child process and its measurements are
+        returned.
+        """
+        seconds, peak, steps = measure(lambda: range(3))
+        self.assertEqual(steps, 3)
+        self.assertTrue(seconds >= 0)
+        self.assertTrue(peak >= 0)
+
+    def test_not_isolated(self):
+        """
+        The function is run in this process if ``isolate`` is false.
+        """
+        called = []
+        seconds, peak, steps = measure(lambda: called.append(1) or called,
+                                       isolate=False)
+        self.assertEqual(called, [1])
+        self.assertEqual(steps, 1)
+
+
+class RunBenchmarksTests(SynchronousTestCase):
+    """
+    Tests for :func:`run_benchmarks`.
+    """
+
+    def test_results(self):
+        """
+        There is a result for every size, mix and stage.
+        """
+        results = run_benchmarks(['small'], ['steady', 'scale-up'],
+                                 repeat=2, isolate=False)
+        self.assertEqual(
+            [(r['size'], r['mix'], r['stage']) for r in results],
+            [('small', mix, stage)
+             for mix in ('steady', 'scale-up')
+             for stage in ('converge', 'limit', 'optimize', 'plan')])
+        self.assertEqual(
+            set((r['servers'], r['nodes']) for r in results), {(10, 100)})
+        self.assertEqual([r['steps'] for r in results[:4]], [0, 0, 0, 0])
+        self.assertNotEqual(results[4]['steps'], 0)
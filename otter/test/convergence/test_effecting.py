@@ -1,27 +1,61 @@
 """Tests for convergence effecting."""
 
-from effect import Constant, Effect, Error, ParallelEffects, sync_perform
+from effect import (
+    ComposedDispatcher, Constant, Effect, Error, ParallelEffects,
+    TypeDispatcher, sync_perform, sync_performer)
+
+from pyrsistent import s
 
 from testtools.matchers import MatchesException
 
+from twisted.internet.task import Clock
 from twisted.trial.unittest import SynchronousTestCase
 
+from otter.convergence.batching import BatchedStep
 from otter.convergence.effecting import steps_to_effect
 from otter.convergence.model import ErrorReason, StepResult
+from otter.convergence.steps import RemoveNodesFromCLB
+from otter.convergence.throttling import StepThrottle, get_throttle_dispatcher
+from otter.convergence.timing import TimingRegistry, get_timing_dispatcher
 from otter.test.utils import TestStep, matches, test_dispatcher
 
 
 class StepsToEffectTests(SynchronousTestCase):
     """Tests for :func:`steps_to_effect`"""
     def test_uses_step_request(self):
-        """Steps are converted to requests."""
+        """
+        Steps are converted to requests executed through the step throttle,
+        and the time taken by each is recorded under its type with its result
+        as outcome.
+        """
         steps = [TestStep(Effect(Constant((StepResult.SUCCESS, 'foo')))),
                  TestStep(Effect(Error(RuntimeError('uh oh'))))]
-        effect = steps_to_effect(steps)
+        effect = steps_to_effect(steps, 'tenant')
         self.assertIs(type(effect.intent), ParallelEffects)
         expected_exc_info = matches(MatchesException(RuntimeError('uh oh')))
+        timings = TimingRegistry()
+        clock = Clock()
+        dispatcher = test_dispatcher(ComposedDispatcher([
+            get_throttle_dispatcher(StepThrottle(clock)),
+            get_timing_dispatcher(clock, timings)]))
         self.assertEqual(
-            sync_perform(test_dispatcher(), effect),
+            sync_perform(dispatcher, effect),
             [(StepResult.SUCCESS, 'foo'),
              (StepResult.RETRY,
               [ErrorReason.Exception(expected_exc_info)])])
+        self.assertEqual(timings.as_json()['execute-TestStep']['outcomes'],
+                         {'SUCCESS': 1, 'error': 1})
+
+    def test_batched_steps(self):
+        """
+        CLB steps that can be merged with those of other groups are executed
+        through :obj:`BatchedStep`.
+        """
+        step = RemoveNodesFromCLB(lb_id='lb', node_ids=s('1'))
+        effect = steps_to_effect([step], 'tenant')
+        dispatcher = TypeDispatcher({
+            BatchedStep: sync_performer(
+                lambda d, i: (StepResult.SUCCESS, [i]))})
+        self.assertEqual(
+            sync_perform(dispatcher, effect),
+            [(StepResult.SUCCESS, [BatchedStep('tenant', step)])])
@@ -8,8 +8,10 @@ from effect import (
     ComposedDispatcher,
     Constant,
     Effect,
+    Error,
     ParallelEffects,
     TypeDispatcher,
+    base_dispatcher,
     sync_perform)
 
 from effect.async import perform_parallel_async
@@ -18,11 +20,13 @@ from effect.testing import (
 
 import mock
 
-from pyrsistent import freeze
+from pyrsistent import freeze, pmap, pset
 
 from toolz.curried import map
 from toolz.functoolz import compose
 
+from twisted.internet.defer import Deferred, succeed
+from twisted.internet.task import Clock
 from twisted.trial.unittest import SynchronousTestCase
 
 from otter.auth import NoSuchEndpoint
@@ -32,13 +36,24 @@ from otter.cloud_client import (
 )
 from otter.constants import ServiceType
 from otter.convergence.gathering import (
+    CLBDrainedAtCache,
+    CachedGather,
+    GatherCache,
+    GetCLBDrainedAt,
+    IsDue,
+    UpdateCLBDrainedAt,
+    cached_gather,
     extract_CLB_drained_at,
+    full_resync_due,
     get_all_launch_server_data,
     get_all_launch_stack_data,
     get_all_scaling_group_servers,
     get_all_server_details,
     get_all_stacks,
     get_clb_contents,
+    get_drained_at_dispatcher,
+    get_gather_cache_dispatcher,
+    get_group_clb_ids,
     get_rcv3_contents,
     get_scaling_group_servers,
     get_scaling_group_stacks,
@@ -51,17 +66,23 @@ from otter.convergence.model import (
     RCv3Description,
     RCv3Node,
     ServerState)
+from otter.convergence.timing import (
+    TimingRegistry, get_timing_dispatcher, timed)
 from otter.log.intents import Log
 from otter.test.utils import (
     EffectServersCache,
     StubResponse,
     intent_func,
     nested_sequence,
+    noop,
     patch,
     resolve_stubs,
     server,
-    stack
+    stack,
+    test_dispatcher,
+    timed_sequence
 )
+from otter.util.config import set_config_data
 from otter.util.fp import assoc_obj
 from otter.util.retry import (
     Retry, ShouldDelayAndRetry, exponential_backoff_interval, retry_times)
@@ -92,6 +113,135 @@ def svc_request_args(**params):
         'url': 'servers/detail'}
 
 
+class GatherCacheTests(SynchronousTestCase):
+    """Tests for :obj:`GatherCache` and :func:`cached_gather`."""
+
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = GatherCache(self.clock, 10)
+        self.fetches = []
+
+    def _fetch(self, result):
+        def fetch():
+            self.fetches.append(result)
+            return result
+        return fetch
+
+    def test_fetches_and_caches(self):
+        """
+        The result is fetched the first time and served from the cache until
+        TTL is elapsed, after which it is fetched again.
+        """
+        d = self.cache.get('k', self._fetch(succeed('r1')))
+        self.assertEqual(self.successResultOf(d), 'r1')
+        self.clock.advance(9)
+        d = self.cache.get('k', self._fetch(succeed('r2')))
+        self.assertEqual(self.successResultOf(d), 'r1')
+        self.assertEqual(len(self.fetches), 1)
+        self.clock.advance(1)
+        d = self.cache.get('k', self._fetch(succeed('r2')))
+        self.assertEqual(self.successResultOf(d), 'r2')
+        self.assertEqual(len(self.fetches), 2)
+
+    def test_keys_separate(self):
+        """Results of different keys are cached separately."""
+        self.cache.get('k1', self._fetch('r1'))
+        d = self.cache.get('k2', self._fetch('r2'))
+        self.assertEqual(self.successResultOf(d), 'r2')
+
+    def test_single_flight(self):
+        """
+        Getting a key that is being fetched waits on the ongoing fetch
+        instead of fetching again.
+        """
+        fetch_d = Deferred()
+        d1 = self.cache.get('k', self._fetch(fetch_d))
+        d2 = self.cache.get('k', self._fetch(succeed('other')))
+        self.assertNoResult(d1)
+        self.assertNoResult(d2)
+        fetch_d.callback('r')
+        self.assertEqual(self.successResultOf(d1), 'r')
+        self.assertEqual(self.successResultOf(d2), 'r')
+        self.assertEqual(len(self.fetches), 1)
+
+    def test_failure_not_cached(self):
+        """
+        A failed fetch fails all the waiters and is not cached.
+        """
+        fetch_d = Deferred()
+        d1 = self.cache.get('k', self._fetch(fetch_d))
+        d2 = self.cache.get('k', self._fetch(None))
+        fetch_d.errback(ValueError('bad'))
+        self.failureResultOf(d1, ValueError)
+        self.failureResultOf(d2, ValueError)
+        d = self.cache.get('k', self._fetch(succeed('r')))
+        self.assertEqual(self.successResultOf(d), 'r')
+
+    def test_expire(self):
+        """:func:`GatherCache.expire` removes results older than TTL."""
+        self.cache.get('k1', self._fetch('r1'))
+        self.clock.advance(5)
+        self.cache.get('k2', self._fetch('r2'))
+        self.clock.advance(5)
+        self.cache.expire()
+        self.assertEqual(self.cache._results, {'k2': (5, 'r2')})
+
+    def test_due(self):
+        """
+        Work is due the first time and then only after interval has elapsed
+        since it was last due.
+        """
+        self.assertTrue(self.cache.due('k', 30))
+        self.clock.advance(29)
+        self.assertFalse(self.cache.due('k', 30))
+        self.assertTrue(self.cache.due('k2', 30))
+        self.clock.advance(1)
+        self.assertTrue(self.cache.due('k', 30))
+        self.assertFalse(self.cache.due('k', 30))
+
+    def test_expire_due(self):
+        """
+        :func:`GatherCache.expire` removes due times older than their interval.
+        """
+        self.cache.due('k1', 5)
+        self.cache.due('k2', 50)
+        self.clock.advance(5)
+        self.cache.expire()
+        self.assertEqual(self.cache._due, {'k2': (0, 50)})
+
+    def test_perform_is_due(self):
+        """:obj:`IsDue` is performed with :func:`GatherCache.due`."""
+        dispatcher = test_dispatcher(get_gather_cache_dispatcher(self.cache))
+        self.assertTrue(sync_perform(dispatcher, Effect(IsDue('k', 10))))
+        self.assertFalse(sync_perform(dispatcher, Effect(IsDue('k', 10))))
+
+    def test_perform_cached_gather(self):
+        """
+        :obj:`CachedGather` returned by :func:`cached_gather` is performed by
+        performing the wrapped effect once per tenant and name.
+        """
+        dispatcher = ComposedDispatcher([
+            get_gather_cache_dispatcher(self.cache),
+            TypeDispatcher({str: lambda d, i, box: box.succeed(i)}),
+            base_dispatcher])
+        eff = cached_gather('tid', 'name', Effect('r1'))
+        self.assertEqual(eff.intent, CachedGather(('tid', 'name'),
+                                                  Effect('r1')))
+        self.assertEqual(sync_perform(dispatcher, eff), 'r1')
+        self.assertEqual(
+            sync_perform(dispatcher,
+                         cached_gather('tid', 'name', Effect('r2'))),
+            'r1')
+        self.assertEqual(
+            sync_perform(dispatcher,
+                         cached_gather('tid2', 'name', Effect('r2'))),
+            'r2')
+        eff = cached_gather('tid', 'other', Effect(Error(ValueError('e'))))
+        self.assertEqual(
+            sync_perform(dispatcher, eff.on(error=lambda e: e[0])),
+            ValueError)
+
+
 class GetAllServerDetailsTests(SynchronousTestCase):
     """
     Tests for :func:`get_all_server_details`.  The service request is
@@ -245,7 +395,11 @@ class GetScalingGroupServersTests(SynchronousTestCase):
                                     {'id': 'b', 'b': 'c'}]
         sequence = [
             (("cachegstidgid", False), lambda i: (object(), None)),
-            (("all-as",), lambda i: {} if empty else {"gid": current})]
+            (CachedGather(('tid', 'as-servers'),
+                          timed('gather-nova', Effect(("all-as",)))),
+             nested_sequence([timed_sequence('gather-nova', [
+                 (("all-as",), lambda i: {} if empty else {"gid": current})
+             ])]))]
         self.assertEqual(perform_sequence(sequence, self._invoke()), current)
 
     def test_no_cache(self):
@@ -274,13 +428,90 @@ class GetScalingGroupServersTests(SynchronousTestCase):
         last_update = datetime(2010, 5, 20)
         sequence = [
             (("cachegstidgid", False), lambda i: (cache, last_update)),
-            (("alls",), lambda i: current)]
+            (CachedGather(('tid', 'servers'),
+                          timed('gather-nova', Effect(("alls",)))),
+             nested_sequence([timed_sequence(
+                 'gather-nova', [(("alls",), lambda i: current)])]))]
         del_cache_server = deepcopy(cache[1])
         del_cache_server["status"] = "DELETED"
         self.assertEqual(
             self.freeze(perform_sequence(sequence, self._invoke())),
             self.freeze([del_cache_server, cache[-1]] + current[0:2]))
 
+    def test_from_cache_changes_since(self):
+        """
+        If cache is there and a full resync is not due then only the servers
+        changed since the cache was updated are listed and merged into the
+        cached servers
+        """
+        asmetakey = "rax:autoscale:group:id"
+        cache = [
+            {'id': 'a', 'metadata': {asmetakey: "gid"}},  # gets updated
+            {'id': 'b', 'metadata': {asmetakey: "gid"}},  # deleted
+            {'id': 'd', 'metadata': {asmetakey: "gid"}},  # meta removed
+            {'id': 'c', 'metadata': {asmetakey: "gid"}}]  # same
+        changes = [
+            {'id': 'a', 'b': 'c', 'metadata': {asmetakey: "gid"}},
+            {'id': 'b', 'status': 'DELETED', 'metadata': {asmetakey: "gid"}},
+            {'id': 'z', 'z': 'w', 'metadata': {asmetakey: "gid"}},  # new
+            {'id': 'd', 'metadata': {"changed": "yes"}},
+            {'id': 'o', 'metadata': {asmetakey: "other"}}]
+        last_update = datetime(2010, 5, 31, 0, 0, 10)
+        sequence = [
+            (("cachegstidgid", False), lambda i: (cache, last_update)),
+            (CachedGather(('tid', 'servers-since-2010-05-31T00:00:10'),
+                          timed('gather-nova',
+                                Effect(("alls", last_update)))),
+             nested_sequence([timed_sequence('gather-nova', [
+                 (("alls", last_update), lambda i: changes)])]))]
+        eff = get_scaling_group_servers(
+            'tid', 'gid', datetime(2010, 5, 31, 0, 0, 50),
+            cache_class=EffectServersCache,
+            all_as_servers=intent_func("all-as"),
+            all_servers=intent_func("alls"), full_resync_interval=60)
+        self.assertEqual(
+            self.freeze(perform_sequence(sequence, eff)),
+            self.freeze([cache[-1]] + changes[0:3]))
+
+    def test_full_resync_interval_config(self):
+        """
+        Servers are fully listed in the first update in every
+        "converger.full_resync_interval" config seconds, which defaults to
+        600.
+        """
+        last_update = datetime(2010, 5, 30, 23, 59, 30)
+        sequence = [
+            (("cachegstidgid", False), lambda i: ([], last_update)),
+            (CachedGather(('tid', 'servers'),
+                          timed('gather-nova', Effect(("alls",)))),
+             nested_sequence([timed_sequence(
+                 'gather-nova', [(("alls",), lambda i: [])])]))]
+        self.assertEqual(perform_sequence(sequence, self._invoke()), [])
+        set_config_data({'converger': {'full_resync_interval': 3600}})
+        self.addCleanup(set_config_data, {})
+        self.now = datetime(2010, 5, 30, 23, 50)
+        last_update = datetime(2010, 5, 30, 23, 40)
+        sequence = [
+            (("cachegstidgid", False), lambda i: ([], last_update)),
+            (CachedGather(('tid', 'servers-since-2010-05-30T23:40:00'),
+                          timed('gather-nova',
+                                Effect(("alls", last_update)))),
+             nested_sequence([timed_sequence(
+                 'gather-nova', [(("alls", last_update), lambda i: [])])]))]
+        self.assertEqual(perform_sequence(sequence, self._invoke()), [])
+
+    def test_full_resync_due(self):
+        """
+        :func:`full_resync_due` returns True only if ``now`` is in a later
+        interval window than ``last_update``
+        """
+        self.assertFalse(full_resync_due(
+            datetime(2010, 5, 31, 0, 1), datetime(2010, 5, 31, 0, 9), 600))
+        self.assertTrue(full_resync_due(
+            datetime(2010, 5, 31, 0, 9), datetime(2010, 5, 31, 0, 11), 600))
+        self.assertTrue(full_resync_due(
+            datetime(2010, 5, 30), datetime(2010, 5, 31), 600))
+
     def test_mark_deleted_servers_precedence(self):
         """
         In :func:`mark_deleted_servers`, if old list has common servers with
@@ -407,6 +638,9 @@ class GetCLBContentsTests(SynchronousTestCase):
             self, 'otter.convergence.gathering.extract_CLB_drained_at',
             side_effect=lambda f: self.feeds[f])
 
+    def drained_at_req(self, cached=pmap()):
+        return (GetCLBDrainedAt('tid'), lambda i: cached)
+
     def test_success(self):
         """
         Gets LB contents with drained_at correctly
@@ -420,10 +654,15 @@ class GetCLBContentsTests(SynchronousTestCase):
                    {'loadBalancers': [{'id': 1}, {'id': 2}]}),
             parallel_sequence([[nodes_req(1, [node11, node12])],
                                [nodes_req(2, [node21, node22])]]),
-            parallel_sequence([[node_feed_req(1, '11', '11feed')],
-                               [node_feed_req(2, '22', '22feed')]]),
+            self.drained_at_req(),
+            timed_sequence('gather-clb-feeds', [
+                parallel_sequence([[node_feed_req(1, '11', '11feed')],
+                                   [node_feed_req(2, '22', '22feed')]])]),
+            (UpdateCLBDrainedAt('tid', pmap({('1', '11'): 1.0,
+                                             ('2', '22'): 2.0}), pset()),
+             noop)
         ]
-        eff = get_clb_contents()
+        eff = get_clb_contents('tid')
         self.assertEqual(
             perform_sequence(seq, eff),
             [assoc_obj(CLBNode.from_node_json(1, node11), drained_at=1.0),
@@ -438,9 +677,11 @@ class GetCLBContentsTests(SynchronousTestCase):
         seq = [
             lb_req('loadbalancers', True, {'loadBalancers': []}),
             parallel_sequence([]),  # No LBs to fetch
-            parallel_sequence([]),  # No nodes to fetch
+            self.drained_at_req(),
+            # No nodes to fetch
+            timed_sequence('gather-clb-feeds', [parallel_sequence([])]),
         ]
-        eff = get_clb_contents()
+        eff = get_clb_contents('tid')
         self.assertEqual(perform_sequence(seq, eff), [])
 
     def test_no_nodes(self):
@@ -451,9 +692,11 @@ class GetCLBContentsTests(SynchronousTestCase):
             lb_req('loadbalancers', True,
                    {'loadBalancers': [{'id': 1}, {'id': 2}]}),
             parallel_sequence([[nodes_req(1, [])], [nodes_req(2, [])]]),
-            parallel_sequence([]),  # No nodes to fetch
+            self.drained_at_req(),
+            # No nodes to fetch
+            timed_sequence('gather-clb-feeds', [parallel_sequence([])]),
         ]
-        self.assertEqual(perform_sequence(seq, get_clb_contents()), [])
+        self.assertEqual(perform_sequence(seq, get_clb_contents('tid')), [])
 
     def test_no_draining(self):
         """
@@ -464,12 +707,14 @@ class GetCLBContentsTests(SynchronousTestCase):
                    {'loadBalancers': [{'id': 1}, {'id': 2}]}),
             parallel_sequence([[nodes_req(1, [node('11', 'a11')])],
                                [nodes_req(2, [node('21', 'a21')])]]),
-            parallel_sequence([])  # No nodes to fetch
+            self.drained_at_req(),
+            # No nodes to fetch
+            timed_sequence('gather-clb-feeds', [parallel_sequence([])])
         ]
         make_desc = partial(CLBDescription, port=20, weight=2,
                             condition=CLBNodeCondition.ENABLED,
                             type=CLBNodeType.PRIMARY)
-        eff = get_clb_contents()
+        eff = get_clb_contents('tid')
         self.assertEqual(
             perform_sequence(seq, eff),
             [CLBNode(node_id='11', address='a11',
@@ -490,12 +735,14 @@ class GetCLBContentsTests(SynchronousTestCase):
                 [lb_req('loadbalancers/2/nodes', True,
                         CLBNotFoundError(lb_id=u'2'))],
             ]),
-            parallel_sequence([])  # No nodes to fetch
+            self.drained_at_req(),
+            # No nodes to fetch
+            timed_sequence('gather-clb-feeds', [parallel_sequence([])])
         ]
         make_desc = partial(CLBDescription, port=20, weight=2,
                             condition=CLBNodeCondition.ENABLED,
                             type=CLBNodeType.PRIMARY)
-        eff = get_clb_contents()
+        eff = get_clb_contents('tid')
         self.assertEqual(
             perform_sequence(seq, eff),
             [CLBNode(node_id='11', address='a11',
@@ -515,15 +762,185 @@ class GetCLBContentsTests(SynchronousTestCase):
                                node('12', 'a12')])],
                 [nodes_req(2, [node21])]
             ]),
-            parallel_sequence([
+            self.drained_at_req(),
+            timed_sequence('gather-clb-feeds', [parallel_sequence([
                 [node_feed_req(1, '11', CLBNotFoundError(lb_id=u'1'))],
-                [node_feed_req(2, '21', '22feed')]]),
+                [node_feed_req(2, '21', '22feed')]])]),
+            (UpdateCLBDrainedAt('tid', pmap({('2', '21'): 2.0}), pset()),
+             noop)
         ]
-        eff = get_clb_contents()
+        eff = get_clb_contents('tid')
         self.assertEqual(
             perform_sequence(seq, eff),
             [assoc_obj(CLBNode.from_node_json(2, node21), drained_at=2.0)])
 
+    def test_cached_drained_at(self):
+        """
+        Feeds are not fetched for DRAINING nodes whose drain start time is
+        cached and nodes that are not DRAINING anymore are removed from the
+        cache.
+        """
+        node11 = node('11', 'a11', condition='DRAINING')
+        node12 = node('12', 'a12')
+        node21 = node('21', 'a21', condition='DRAINING')
+        seq = [
+            lb_req('loadbalancers', True,
+                   {'loadBalancers': [{'id': 1}, {'id': 2}]}),
+            parallel_sequence([[nodes_req(1, [node11, node12])],
+                               [nodes_req(2, [node21])]]),
+            self.drained_at_req(
+                pmap({('1', '11'): 5.0, ('1', '12'): 4.0, ('3', '31'): 3.0})),
+            timed_sequence('gather-clb-feeds', [
+                parallel_sequence([[node_feed_req(2, '21', '22feed')]])]),
+            (UpdateCLBDrainedAt('tid', pmap({('2', '21'): 2.0}),
+                                pset([('1', '12'), ('3', '31')])),
+             noop)
+        ]
+        self.assertEqual(
+            perform_sequence(seq, get_clb_contents('tid')),
+            [assoc_obj(CLBNode.from_node_json(1, node11), drained_at=5.0),
+             CLBNode.from_node_json(1, node12),
+             assoc_obj(CLBNode.from_node_json(2, node21), drained_at=2.0)])
+
+    def test_all_drained_at_cached(self):
+        """
+        The cache is not updated if it already has all the DRAINING nodes.
+        """
+        node11 = node('11', 'a11', condition='DRAINING')
+        seq = [
+            lb_req('loadbalancers', True, {'loadBalancers': [{'id': 1}]}),
+            parallel_sequence([[nodes_req(1, [node11])]]),
+            self.drained_at_req(pmap({('1', '11'): 5.0})),
+            timed_sequence('gather-clb-feeds', [parallel_sequence([])])
+        ]
+        self.assertEqual(
+            perform_sequence(seq, get_clb_contents('tid')),
+            [assoc_obj(CLBNode.from_node_json(1, node11), drained_at=5.0)])
+
+    def test_lb_ids(self):
+        """
+        Only the given load balancers are gathered and only their nodes are
+        removed from the drained_at cache.
+        """
+        node11 = node('11', 'a11')
+        node31 = node('31', 'a31', condition='DRAINING')
+        seq = [
+            parallel_sequence([[nodes_req(1, [node11])],
+                               [nodes_req(3, [node31])]]),
+            self.drained_at_req(
+                pmap({('1', '11'): 5.0, ('2', '21'): 4.0, ('3', '31'): 3.0})),
+            timed_sequence('gather-clb-feeds', [parallel_sequence([])]),
+            (UpdateCLBDrainedAt('tid', pmap(), pset([('1', '11')])), noop)
+        ]
+        self.assertEqual(
+            perform_sequence(seq, get_clb_contents('tid', [1, 3])),
+            [CLBNode.from_node_json(1, node11),
+             assoc_obj(CLBNode.from_node_json(3, node31), drained_at=3.0)])
+
+
+class CLBDrainedAtCacheTests(SynchronousTestCase):
+    """Tests for :obj:`CLBDrainedAtCache`."""
+
+    def setUp(self):
+        self.cache = CLBDrainedAtCache(cache_class=EffectDrainedAtCache)
+
+    def test_get_reads_once(self):
+        """
+        Tenant's times are read from the persistent cache only the first
+        time.
+        """
+        seq = [(('get', 'tid'), lambda i: {('1', '11'): 2.0})]
+        self.assertEqual(
+            perform_sequence(seq, self.cache.get('tid')),
+            pmap({('1', '11'): 2.0}))
+        self.assertEqual(perform_sequence([], self.cache.get('tid')),
+                         pmap({('1', '11'): 2.0}))
+
+    def test_get_shared(self):
+        """
+        Times of tenants whose groups other nodes converge too are read from
+        the persistent cache every time, and not kept in memory.
+        """
+        self.cache.is_shared = lambda tid: tid == 'tid'
+        for drained_at in (2.0, 3.0):
+            seq = [(('get', 'tid'),
+                    lambda i, t=drained_at: {('1', '11'): t})]
+            self.assertEqual(
+                perform_sequence(seq, self.cache.get('tid')),
+                pmap({('1', '11'): drained_at}))
+        new = pmap({('2', '21'): 4.0})
+        seq = [parallel_sequence([[(('insert', 'tid', new), noop)],
+                                  [(('delete', 'tid', pset()), noop)]])]
+        perform_sequence(seq, self.cache.update('tid', new, pset()))
+        self.assertEqual(self.cache._tenants, {})
+
+    def test_update(self):
+        """
+        Updates are written to the persistent cache and then to memory.
+        """
+        self.cache._tenants['tid'] = pmap({('1', '11'): 2.0,
+                                           ('1', '12'): 3.0})
+        new = pmap({('2', '21'): 4.0})
+        evict = pset([('1', '12')])
+        seq = [parallel_sequence([[(('insert', 'tid', new), noop)],
+                                  [(('delete', 'tid', evict), noop)]])]
+        perform_sequence(seq, self.cache.update('tid', new, evict))
+        self.assertEqual(perform_sequence([], self.cache.get('tid')),
+                         pmap({('1', '11'): 2.0, ('2', '21'): 4.0}))
+
+    def test_update_not_in_memory(self):
+        """
+        Updating a tenant that is not in memory only writes to the
+        persistent cache.
+        """
+        new = pmap({('2', '21'): 4.0})
+        seq = [parallel_sequence([[(('insert', 'tid', new), noop)],
+                                  [(('delete', 'tid', pset()), noop)]])]
+        perform_sequence(seq, self.cache.update('tid', new, pset()))
+        self.assertEqual(self.cache._tenants, {})
+
+    def test_retain(self):
+        """
+        `retain` keeps only the tenants matching predicate.
+        """
+        self.cache._tenants = {'t1': pmap(), 't2': pmap()}
+        self.cache.retain(lambda tid: tid == 't2')
+        self.assertEqual(self.cache._tenants, {'t2': pmap()})
+
+    def test_dispatcher(self):
+        """
+        :func:`get_drained_at_dispatcher` performs the intents with the cache.
+        """
+        self.cache._tenants['tid'] = pmap({('1', '11'): 2.0})
+        disp = test_dispatcher(get_drained_at_dispatcher(self.cache))
+        self.assertEqual(
+            sync_perform(disp, Effect(GetCLBDrainedAt('tid'))),
+            pmap({('1', '11'): 2.0}))
+        seq = [parallel_sequence([[(('insert', 'tid', pmap()), noop)],
+                                  [(('delete', 'tid', pset([('1', '11')])),
+                                    noop)]])]
+        perform_sequence(
+            seq, Effect(UpdateCLBDrainedAt('tid', pmap(),
+                                           pset([('1', '11')]))),
+            get_drained_at_dispatcher(self.cache))
+        self.assertEqual(self.cache._tenants['tid'], pmap())
+
+
+class EffectDrainedAtCache(object):
+    """ICLBNodeDrainedAtCache implementation for testing."""
+
+    def __init__(self, tenant_id):
+        self.tenant_id = tenant_id
+
+    def get_drained_at(self):
+        return Effect(('get', self.tenant_id))
+
+    def insert_drained_at(self, drained_at):
+        return Effect(('insert', self.tenant_id, drained_at))
+
+    def delete_drained_at(self, nodes):
+        return Effect(('delete', self.tenant_id, nodes))
+
 
 class GetRCv3ContentsTests(SynchronousTestCase):
     """
@@ -635,6 +1052,10 @@ def _constant_as_eff(args, retval):
     return lambda *a: Effect(Stub(Constant(retval))) if a == args else (1 / 0)
 
 
+def _constant_eff(args, retval):
+    return lambda *a: Effect(Constant(retval)) if a == args else (1 / 0)
+
+
 class GetAllLaunchServerDataTests(SynchronousTestCase):
     """Tests for :func:`get_all_launch_server_data`."""
 
@@ -659,6 +1080,18 @@ class GetAllLaunchServerDataTests(SynchronousTestCase):
              'links': [{'href': 'link2', 'rel': 'self'}]}
         ]
         self.now = datetime(2010, 10, 20, 03, 30, 00)
+        self.cache = GatherCache(Clock(), 10)
+        self.timings = TimingRegistry()
+        self.lc = {'args': {'server': {}, 'loadBalancers': [
+            {'loadBalancerId': 1, 'port': 80},
+            {'loadBalancerId': 2, 'port': 80, 'type': 'RackConnectV3'}]}}
+
+    def _perform(self, eff):
+        return sync_perform(
+            test_dispatcher(ComposedDispatcher([
+                get_gather_cache_dispatcher(self.cache),
+                get_timing_dispatcher(Clock(), self.timings)])),
+            eff)
 
     def test_success(self):
         """
@@ -673,10 +1106,11 @@ class GetAllLaunchServerDataTests(SynchronousTestCase):
             'tid',
             'gid',
             self.now,
-            get_scaling_group_servers=_constant_as_eff(
+            self.lc,
+            get_scaling_group_servers=_constant_eff(
                 ('tid', 'gid', self.now), self.servers),
-            get_clb_contents=_constant_as_eff((), clb_nodes),
-            get_rcv3_contents=_constant_as_eff((), rcv3_nodes))
+            get_clb_contents=_constant_eff(('tid',), clb_nodes),
+            get_rcv3_contents=_constant_eff((), rcv3_nodes))
 
         expected_servers = [
             server('a', ServerState.ACTIVE, servicenet_address='10.0.0.1',
@@ -687,9 +1121,14 @@ class GetAllLaunchServerDataTests(SynchronousTestCase):
                    links=freeze([{'href': 'link2', 'rel': 'self'}]),
                    json=freeze(self.servers[1]))
         ]
-        self.assertEqual(resolve_stubs(eff),
+        self.assertEqual(self._perform(eff),
                          {'servers': expected_servers,
                           'lb_nodes': clb_nodes + rcv3_nodes})
+        self.assertEqual(
+            self.cache._results,
+            {('tid', 'clb'): (0, clb_nodes), ('tid', 'rcv3'): (0, rcv3_nodes)})
+        self.assertEqual(
+            sorted(self.timings.as_json()), ['gather-clb', 'gather-rcv3'])
 
     def test_no_group_servers(self):
         """
@@ -700,12 +1139,105 @@ class GetAllLaunchServerDataTests(SynchronousTestCase):
             'tid',
             'gid',
             self.now,
-            get_scaling_group_servers=_constant_as_eff(
+            self.lc,
+            get_scaling_group_servers=_constant_eff(
                 ('tid', 'gid', self.now), []),
-            get_clb_contents=_constant_as_eff((), []),
-            get_rcv3_contents=_constant_as_eff((), []))
+            get_clb_contents=_constant_eff(('tid',), []),
+            get_rcv3_contents=_constant_eff((), []))
+
+        self.assertEqual(self._perform(eff), {'servers': [], 'lb_nodes': []})
 
-        self.assertEqual(resolve_stubs(eff), {'servers': [], 'lb_nodes': []})
+    def test_shares_lb_contents(self):
+        """
+        The tenant's load balancer contents are taken from the gather cache
+        if they were gathered earlier for another group.
+        """
+        clb_nodes = [CLBNode(node_id='node1', address='ip1',
+                             description=CLBDescription(lb_id='lb1', port=80))]
+        self.cache.get(('tid', 'clb'), lambda: clb_nodes)
+        self.cache.get(('tid', 'rcv3'), lambda: [])
+        eff = get_all_launch_server_data(
+            'tid',
+            'gid',
+            self.now,
+            self.lc,
+            get_scaling_group_servers=_constant_eff(
+                ('tid', 'gid', self.now), []),
+            get_clb_contents=lambda tid: Effect(('get-clb',)),
+            get_rcv3_contents=lambda: Effect(('get-rcv3',)))
+        self.assertEqual(self._perform(eff),
+                         {'servers': [], 'lb_nodes': clb_nodes})
+        self.assertEqual(self.timings.as_json(), {})
+
+    def test_targeted_clbs(self):
+        """
+        If a full scan of the tenant's CLBs is not due then only the CLBs in
+        the launch config and the servers' metadata are gathered.
+        """
+        self.cache.due(('tid', 'gid', 'clb-full-scan'), 600)
+        self.servers[0]['metadata'] = {
+            'rax:autoscale:lb:CloudLoadBalancer:3': '[{"port": 80}]',
+            'rax:autoscale:lb:RackConnectV3:4': ''}
+        clb_nodes = [CLBNode(node_id='node1', address='ip1',
+                             description=CLBDescription(lb_id='3', port=80))]
+        eff = get_all_launch_server_data(
+            'tid',
+            'gid',
+            self.now,
+            self.lc,
+            get_scaling_group_servers=_constant_eff(
+                ('tid', 'gid', self.now), self.servers),
+            get_clb_contents=_constant_eff(('tid', ['1', '3']), clb_nodes),
+            get_rcv3_contents=_constant_eff((), []),
+            clb_full_scan_interval=600)
+        self.assertEqual(self._perform(eff)['lb_nodes'], clb_nodes)
+        self.assertEqual(self.cache._results[('tid', ('clb', '1', '3'))],
+                         (0, clb_nodes))
+
+    def test_full_scan_per_group(self):
+        """
+        A full scan of the tenant's CLBs is due for each group separately, so
+        it is not skipped because another group of the tenant got one.
+        """
+        self.cache.due(('tid', 'other', 'clb-full-scan'), 600)
+        clb_nodes = [CLBNode(node_id='node1', address='ip1',
+                             description=CLBDescription(lb_id='9', port=80))]
+        eff = get_all_launch_server_data(
+            'tid',
+            'gid',
+            self.now,
+            self.lc,
+            get_scaling_group_servers=_constant_eff(
+                ('tid', 'gid', self.now), self.servers),
+            get_clb_contents=_constant_eff(('tid',), clb_nodes),
+            get_rcv3_contents=_constant_eff((), []),
+            clb_full_scan_interval=600)
+        self.assertEqual(self._perform(eff)['lb_nodes'], clb_nodes)
+        self.assertEqual(self.cache._results[('tid', 'clb')], (0, clb_nodes))
+
+
+class GetGroupCLBIdsTests(SynchronousTestCase):
+    """Tests for :func:`get_group_clb_ids`."""
+
+    def test_config_and_metadata(self):
+        """
+        CLB IDs from launch config and servers' metadata are returned.
+        """
+        lc = {'args': {'server': {}, 'loadBalancers': [
+            {'loadBalancerId': 1, 'port': 80},
+            {'loadBalancerId': 2, 'port': 80, 'type': 'RackConnectV3'}]}}
+        servers = [
+            server('a', ServerState.ACTIVE,
+                   desired_lbs=pset([CLBDescription(lb_id='1', port=80),
+                                     CLBDescription(lb_id='5', port=8080)])),
+            server('b', ServerState.ACTIVE,
+                   desired_lbs=pset([RCv3Description(lb_id='6')]))]
+        self.assertEqual(get_group_clb_ids(lc, servers), set(['1', '5']))
+
+    def test_none(self):
+        """No CLBs configured or in metadata returns empty set."""
+        self.assertEqual(get_group_clb_ids({'args': {'server': {}}}, []),
+                         set())
 
 
 class GetAllStacksTests(SynchronousTestCase):
@@ -766,6 +1298,7 @@ class GetAllLaunchStackDataTests(SynchronousTestCase):
             'tid',
             'gid',
             self.now,
+            {'args': {}},
             get_scaling_group_stacks=_constant_as_eff(('gid',), self.stacks))
 
         self.assertEqual(resolve_stubs(eff), {'stacks': expected_stacks})
@@ -779,6 +1312,7 @@ class GetAllLaunchStackDataTests(SynchronousTestCase):
             'tid',
             'gid',
             self.now,
+            {'args': {}},
             get_scaling_group_stacks=_constant_as_eff(('gid',), []))
 
         self.assertEqual(resolve_stubs(eff), {'stacks': []})
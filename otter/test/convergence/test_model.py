@@ -16,6 +16,7 @@ from otter.convergence.model import (
     CLBNode,
     CLBNodeCondition,
     CLBNodeType,
+    EncodedJSON,
     HeatStack,
     IDrainable,
     ILBDescription,
@@ -413,6 +414,40 @@ def sample_servers():
     ]
 
 
+class EncodedJSONTests(SynchronousTestCase):
+    """
+    Tests for :obj:`EncodedJSON`.
+    """
+
+    def test_round_trip(self):
+        """
+        A document decodes to what was encoded, thawing pyrsistent
+        collections.
+        """
+        document = sample_servers()[1]
+        self.assertEqual(EncodedJSON.encode(document).decode(), document)
+        self.assertEqual(EncodedJSON.encode(freeze(document)).decode(),
+                         document)
+
+    def test_decode_copies(self):
+        """
+        Every decoding is a new copy of the document.
+        """
+        encoded = EncodedJSON.encode({'a': [1]})
+        encoded.decode()['a'].append(2)
+        self.assertEqual(encoded.decode(), {'a': [1]})
+
+    def test_equality(self):
+        """
+        Encodings of equal documents are equal and hash the same.
+        """
+        a = EncodedJSON.encode({'a': 1, 'b': {'c': 2, 'd': 3}})
+        b = EncodedJSON.encode(freeze({'b': {'d': 3, 'c': 2}, 'a': 1}))
+        self.assertEqual(a, b)
+        self.assertEqual(hash(a), hash(b))
+        self.assertNotEqual(a, EncodedJSON.encode({'a': 2}))
+
+
 class NovaServerTests(SynchronousTestCase):
     """
     Tests for :func:`NovaServer.from_server_details_json` and
@@ -438,7 +473,8 @@ class NovaServerTests(SynchronousTestCase):
                        created=self.createds[0],
                        servicenet_address='',
                        links=freeze(self.servers[0]['links']),
-                       json=freeze(self.servers[0])))
+                       metadata=pmap(self.servers[0].get('metadata', {})),
+                       json=EncodedJSON.encode(self.servers[0])))
 
     def test_without_private(self):
         """
@@ -454,7 +490,8 @@ class NovaServerTests(SynchronousTestCase):
                        created=self.createds[0],
                        servicenet_address='',
                        links=freeze(self.servers[0]['links']),
-                       json=freeze(self.servers[0])))
+                       metadata=pmap(self.servers[0].get('metadata', {})),
+                       json=EncodedJSON.encode(self.servers[0])))
 
     def test_with_servicenet(self):
         """
@@ -469,7 +506,8 @@ class NovaServerTests(SynchronousTestCase):
                        created=self.createds[1],
                        servicenet_address='10.0.0.1',
                        links=freeze(self.servers[1]['links']),
-                       json=freeze(self.servers[1])))
+                       metadata=pmap(self.servers[1].get('metadata', {})),
+                       json=EncodedJSON.encode(self.servers[1])))
 
     def test_without_image_id(self):
         """
@@ -487,7 +525,8 @@ class NovaServerTests(SynchronousTestCase):
                            created=self.createds[0],
                            servicenet_address='',
                            links=freeze(self.servers[0]['links']),
-                           json=freeze(self.servers[0])))
+                           metadata=pmap(self.servers[0].get('metadata', {})),
+                           json=EncodedJSON.encode(self.servers[0])))
         del self.servers[0]['image']
         self.assertEqual(
             NovaServer.from_server_details_json(self.servers[0]),
@@ -498,7 +537,8 @@ class NovaServerTests(SynchronousTestCase):
                        created=self.createds[0],
                        servicenet_address='',
                        links=freeze(self.servers[0]['links']),
-                       json=freeze(self.servers[0])))
+                       metadata=pmap(self.servers[0].get('metadata', {})),
+                       json=EncodedJSON.encode(self.servers[0])))
 
     def test_with_lb_metadata(self):
         """
@@ -536,7 +576,8 @@ class NovaServerTests(SynchronousTestCase):
                            RCv3Description(lb_id='1')]),
                        servicenet_address='',
                        links=freeze(self.servers[0]['links']),
-                       json=freeze(self.servers[0])))
+                       metadata=pmap(self.servers[0].get('metadata', {})),
+                       json=EncodedJSON.encode(self.servers[0])))
 
     def test_lbs_from_metadata_ignores_unsupported_lb_types(self):
         """
@@ -557,7 +598,8 @@ class NovaServerTests(SynchronousTestCase):
                        desired_lbs=pset(),
                        servicenet_address='',
                        links=freeze(self.servers[0]['links']),
-                       json=freeze(self.servers[0])))
+                       metadata=pmap(self.servers[0].get('metadata', {})),
+                       json=EncodedJSON.encode(self.servers[0])))
 
     def test_deleting_server(self):
         """
@@ -575,7 +617,8 @@ class NovaServerTests(SynchronousTestCase):
                        desired_lbs=pset(),
                        servicenet_address='',
                        links=freeze(self.servers[0]['links']),
-                       json=freeze(self.servers[0])))
+                       metadata=pmap(self.servers[0].get('metadata', {})),
+                       json=EncodedJSON.encode(self.servers[0])))
 
     def test_repr_nova(self):
         """
@@ -592,11 +635,12 @@ class NovaServerTests(SynchronousTestCase):
             'hostId': '12356773526246'
         })
         server = NovaServer.from_server_details_json(server_json)
+        # the JSON is kept encoded, so it comes back with unicode strings
         expected_json = {
-            'status': server_json['status'],
-            'OS-EXT-STS:task_state': None,
-            'updated': '2020-10-10T10:00:00Z',
-            'metadata': {'some': 'stuff'}
+            u'status': unicode(server_json['status']),
+            u'OS-EXT-STS:task_state': None,
+            u'updated': u'2020-10-10T10:00:00Z',
+            u'metadata': {u'some': u'stuff'}
         }
         self.assertEqual(
             repr(server),
@@ -607,6 +651,14 @@ class NovaServerTests(SynchronousTestCase):
                 'valid_image', 'valid_flavor', self.servers[0]['links'], set(),
                 '', expected_json]]))
 
+    def test_metadata(self):
+        """
+        The server's metadata is kept outside of its JSON.
+        """
+        self.servers[0]['metadata'] = {'some': 'stuff'}
+        server = NovaServer.from_server_details_json(self.servers[0])
+        self.assertEqual(server.metadata, pmap({'some': 'stuff'}))
+
     def test_unknown_state(self):
         """
         When nova provides an unknown server state, it's set to
@@ -617,7 +669,7 @@ class NovaServerTests(SynchronousTestCase):
         server_json['status'] = 'ablrduelh'
         server = NovaServer.from_server_details_json(server_json)
         self.assertEqual(server.state, ServerState.UNKNOWN_TO_OTTER)
-        self.assertEqual(server.json['status'], 'ablrduelh')
+        self.assertEqual(server.json.decode()['status'], 'ablrduelh')
 
 
 class IPAddressTests(SynchronousTestCase):
@@ -20,6 +20,7 @@ from otter.convergence.model import (
 from otter.convergence.planning import (
     DRAINING_METADATA,
     Destiny,
+    _lb_nodes_matcher,
     converge_launch_server,
     converge_launch_stack,
     get_destiny,
@@ -748,6 +749,62 @@ class DrainAndDeleteServerTests(SynchronousTestCase):
             ]))
 
 
+class LBNodesMatcherTests(SynchronousTestCase):
+    """
+    Tests for :func:`_lb_nodes_matcher`.
+    """
+
+    def setUp(self):
+        """
+        Some CLB and RCv3 nodes belonging to a couple of servers.
+        """
+        desc = CLBDescription(lb_id='5', port=80)
+        rcv3_desc = RCv3Description(lb_id='lb')
+        self.nodes = [
+            CLBNode(node_id='1', address='1.1.1.1', description=desc),
+            RCv3Node(node_id='2', cloud_server_id='abc',
+                     description=rcv3_desc),
+            CLBNode(node_id='3', address='2.2.2.2', description=desc),
+            CLBNode(node_id='4', address='1.1.1.1',
+                    description=CLBDescription(lb_id='6', port=80)),
+            RCv3Node(node_id='5', cloud_server_id='def',
+                     description=rcv3_desc)]
+
+    def test_same_as_matches(self):
+        """
+        The nodes returned for a server are the ones that
+        :func:`ILBNode.matches` it, in the order they were given.
+        """
+        matcher = _lb_nodes_matcher(self.nodes)
+        servers = [
+            server('abc', ServerState.ACTIVE, servicenet_address='1.1.1.1'),
+            server('def', ServerState.ACTIVE, servicenet_address='2.2.2.2'),
+            server('ghi', ServerState.ACTIVE, servicenet_address='3.3.3.3'),
+            server('jkl', ServerState.ACTIVE)]
+        for srv in servers:
+            self.assertEqual(
+                matcher(srv),
+                [node for node in self.nodes if node.matches(srv)])
+        self.assertEqual(
+            [node.node_id for node in matcher(servers[0])], ['1', '2', '4'])
+
+    def test_unindexed_nodes(self):
+        """
+        Nodes of a type that is not indexed are checked against every server.
+        """
+        class AnyNode(object):
+            def matches(self, server):
+                return True
+
+        node = AnyNode()
+        matcher = _lb_nodes_matcher(self.nodes[:1] + [node])
+        self.assertEqual(
+            matcher(server('abc', ServerState.ACTIVE,
+                           servicenet_address='1.1.1.1')),
+            [self.nodes[0], node])
+        self.assertEqual(matcher(server('def', ServerState.ACTIVE)), [node])
+
+
 class ConvergeLaunchServerTests(SynchronousTestCase):
     """
     Tests for :func:`converge_launch_server` that do not specifically cover
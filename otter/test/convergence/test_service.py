@@ -18,16 +18,20 @@ from kazoo.recipe.partitioner import PartitionState
 
 import mock
 
-from pyrsistent import freeze, pbag, pmap, pset, s, thaw
+from pyrsistent import freeze, pbag, pmap, pset, s
 
 from twisted.internet.defer import fail, succeed
+from twisted.internet.task import Clock
 from twisted.trial.unittest import SynchronousTestCase
 
 from otter.cloud_client import NoSuchCLBError, TenantScope
 from otter.constants import CONVERGENCE_DIRTY_DIR
+from otter.convergence.backoff import GetBackedOff, RecordConvergence
 from otter.convergence.composition import (get_desired_server_group_state,
                                            get_desired_stack_group_state)
-from otter.convergence.gathering import (get_all_launch_server_data,
+from otter.convergence.effecting import step_outcome
+from otter.convergence.gathering import (cached_gather,
+                                         get_all_launch_server_data,
                                          get_all_launch_stack_data)
 from otter.convergence.model import (
     CLBDescription, CLBNode, ConvergenceIterationStatus, ErrorReason,
@@ -42,6 +46,7 @@ from otter.convergence.service import (
     converge_one_group,
     execute_convergence,
     get_executor,
+    get_divergent_versions,
     get_my_divergent_groups,
     is_autoscale_active,
     launch_server_executor,
@@ -51,7 +56,10 @@ from otter.convergence.service import (
     update_servers_cache,
     update_stacks_cache)
 from otter.convergence.steps import ConvergeLater, CreateServer
-from otter.log.intents import BoundFields, Log, LogErr, MsgWithTime
+from otter.convergence.throttling import ThrottledStep
+from otter.convergence.workqueue import QueuedConvergence
+from otter.log.intents import (
+    BoundFields, Log, LogErr, MsgWithTime, get_log_dispatcher)
 from otter.models.intents import (
     DeleteGroup,
     GetScalingGroupInfo,
@@ -73,7 +81,9 @@ from otter.test.utils import (
     noop,
     raise_,
     raise_to_exc_info,
+    timed_sequence,
     transform_eq)
+from otter.util.config import set_config_data
 from otter.util.zk import CreateOrSet, DeleteNode, GetChildren, GetStat
 
 
@@ -149,7 +159,7 @@ class ConvergerTests(SynchronousTestCase):
         self.log = mock_log()
         self.num_buckets = 10
 
-    def _converger(self, converge_all_groups, dispatcher=None):
+    def _converger(self, converge_all_groups, dispatcher=None, clock=None):
         if dispatcher is None:
             dispatcher = _get_dispatcher()
         # patch global default step limits to have empty {} step_limits
@@ -161,7 +171,7 @@ class ConvergerTests(SynchronousTestCase):
             self._pfactory, build_timeout=3600,
             interval=15,
             limited_retry_iterations=23, step_limits={},
-            converge_all_groups=converge_all_groups)
+            converge_all_groups=converge_all_groups, clock=clock)
 
     def _pfactory(self, buckets, log, got_buckets):
         self.assertEqual(buckets, range(self.num_buckets))
@@ -185,7 +195,7 @@ class ConvergerTests(SynchronousTestCase):
         performed.
         """
         def converge_all_groups(currently_converging, recent, waiting,
-                                _my_buckets, all_buckets,
+                                flag_versions, _my_buckets, all_buckets,
                                 divergent_flags, build_timeout, interval,
                                 limited_retry_iterations, step_limits):
             return Effect(
@@ -217,13 +227,114 @@ class ConvergerTests(SynchronousTestCase):
             result, = self.fake_partitioner.got_buckets(my_buckets)
         self.assertEqual(self.successResultOf(result), 'foo')
 
+    def test_buckets_acquired_watched_flags(self):
+        """
+        When the divergent flags have been seen by the watch, they are not
+        fetched again when buckets are allocated.
+        """
+        def converge_all_groups(currently_converging, recent, waiting,
+                                flag_versions, _my_buckets, all_buckets,
+                                divergent_flags, build_timeout, interval,
+                                limited_retry_iterations, step_limits):
+            self.assertIs(flag_versions, converger.flag_versions)
+            return Effect(('converge-all', divergent_flags))
+
+        sequence = self._log_sequence(
+            [(('converge-all', ['flag1']), lambda i: 'foo')])
+        converger = self._converger(converge_all_groups, dispatcher=sequence)
+        # not acquired, so nothing is converged, but the flags are kept
+        converger.divergent_changed(['flag1'])
+
+        with sequence.consume():
+            result, = self.fake_partitioner.got_buckets([0])
+        self.assertEqual(self.successResultOf(result), 'foo')
+
+    def test_shares_gathered_data(self):
+        """
+        Effects are performed with a dispatcher that shares gathered data
+        through the converger's :obj:`GatherCache` which expires old results
+        before converging.
+        """
+        def converge_all_groups(currently_converging, recent, waiting,
+                                flag_versions, _my_buckets, all_buckets,
+                                divergent_flags, build_timeout, interval,
+                                limited_retry_iterations, step_limits):
+            return cached_gather('tenant', 'clb', Effect('gather'))
+
+        clock = Clock()
+        sequence = SequenceDispatcher([
+            (GetChildren(CONVERGENCE_DIRTY_DIR), lambda i: ['flag1']),
+            ('gather', lambda i: 'new')
+        ])
+        dispatcher = ComposedDispatcher([
+            sequence, get_log_dispatcher(self.log, {}), base_dispatcher])
+        converger = self._converger(converge_all_groups,
+                                    dispatcher=dispatcher, clock=clock)
+        self.assertEqual(converger.gather_cache.ttl, 15)
+        converger.gather_cache.get(('tenant', 'clb'), lambda: 'old')
+        clock.advance(15)
+
+        with sequence.consume():
+            result, = self.fake_partitioner.got_buckets([0])
+        self.assertEqual(self.successResultOf(result), 'new')
+        self.assertEqual(converger.gather_cache._results,
+                         {('tenant', 'clb'): (15, 'new')})
+
+    def test_drops_drained_at_of_other_tenants(self):
+        """
+        Before converging, the CLB nodes' drained_at cache forgets the
+        tenants that are not in our buckets.
+        """
+        sequence = SequenceDispatcher([
+            (GetChildren(CONVERGENCE_DIRTY_DIR), lambda i: []),
+            ('converge-all', noop)])
+        dispatcher = ComposedDispatcher([
+            sequence, get_log_dispatcher(self.log, {}), base_dispatcher])
+        converger = self._converger(lambda *a: Effect('converge-all'),
+                                    dispatcher=dispatcher)
+        # bucket_of_tenant('t2', 10) == 3, bucket_of_tenant('t3', 10) == 4
+        converger.drained_at_cache._tenants = {'t2': pmap(), 't3': pmap()}
+        with sequence.consume():
+            self.fake_partitioner.got_buckets([3])
+        self.assertEqual(converger.drained_at_cache._tenants, {'t2': pmap()})
+
+    def test_split_tenants_drained_at_not_kept(self):
+        """
+        The CLB nodes' drained_at cache does not keep the times of split
+        tenants in memory, since other nodes converge their groups too.
+        """
+        converger = self._converger(lambda *a: None)
+        set_config_data({'converger': {'split_tenants': ['t2']}})
+        self.addCleanup(set_config_data, {})
+        self.assertTrue(converger.drained_at_cache.is_shared('t2'))
+        self.assertFalse(converger.drained_at_cache.is_shared('t3'))
+
+    def test_drops_queued_versions(self):
+        """
+        Before converging, the convergence queue forgets the flag versions of
+        groups that are not divergent in our buckets anymore.
+        """
+        sequence = SequenceDispatcher([
+            (GetChildren(CONVERGENCE_DIRTY_DIR),
+             lambda i: ['t2_g2', 't3_g3']),
+            ('converge-all', noop)])
+        dispatcher = ComposedDispatcher([
+            sequence, get_log_dispatcher(self.log, {}), base_dispatcher])
+        converger = self._converger(lambda *a: Effect('converge-all'),
+                                    dispatcher=dispatcher)
+        # bucket_of_tenant('t2', 10) == 3, bucket_of_tenant('t3', 10) == 4
+        converger.queue._versions = {'g2': 1, 'g3': 1, 'deleted': 1}
+        with sequence.consume():
+            self.fake_partitioner.got_buckets([3])
+        self.assertEqual(converger.queue._versions, {'g2': 1})
+
     def test_buckets_acquired_errors(self):
         """
         Errors raised from performing the converge_all_groups effect are
         logged, and None is the ultimate result.
         """
         def converge_all_groups(currently_converging, recent, waiting,
-                                _my_buckets, all_buckets,
+                                flag_versions, _my_buckets, all_buckets,
                                 divergent_flags, build_timeout, interval,
                                 limited_retry_iterations, step_limits):
             return Effect('converge-all')
@@ -255,7 +366,7 @@ class ConvergerTests(SynchronousTestCase):
                                     dispatcher=dispatcher)
         # Doesn't try to get buckets
         self.fake_partitioner.get_current_buckets = lambda s: 1 / 0
-        converger.divergent_changed(['group1', 'group2'])
+        converger.divergent_changed(['tenant1_group1', 'tenant2_group2'])
 
     def test_divergent_changed_not_ours(self):
         """
@@ -266,7 +377,7 @@ class ConvergerTests(SynchronousTestCase):
         converger = self._converger(lambda *a, **kw: 1 / 0,
                                     dispatcher=dispatcher)
         self.fake_partitioner.current_state = PartitionState.ACQUIRED
-        converger.divergent_changed(['group1', 'group2'])
+        converger.divergent_changed(['tenant1_group1', 'tenant2_group2'])
 
     def test_divergent_changed(self):
         """
@@ -276,24 +387,39 @@ class ConvergerTests(SynchronousTestCase):
         :func:`converge_all_groups`.
         """
         def converge_all_groups(currently_converging, recent, waiting,
-                                _my_buckets, all_buckets,
+                                flag_versions, _my_buckets, all_buckets,
                                 divergent_flags, build_timeout, interval,
                                 limited_retry_iterations, step_limits):
             return Effect(('converge-all-groups', divergent_flags))
 
         intents = [
-            (('converge-all-groups', ['group1', 'group2']),
+            (('converge-all-groups', ['tenant1_group1', 'tenant2_group2']),
              noop)
         ]
         sequence = self._log_sequence(intents)
 
         converger = self._converger(converge_all_groups, dispatcher=sequence)
 
-        # sha1('group1') % 10 == 3
+        # bucket_of_tenant('tenant1', 10) == 9
         self.fake_partitioner.current_state = PartitionState.ACQUIRED
-        self.fake_partitioner.my_buckets = [3]
+        self.fake_partitioner.my_buckets = [9]
         with sequence.consume():
-            converger.divergent_changed(['group1', 'group2'])
+            converger.divergent_changed(['tenant1_group1', 'tenant2_group2'])
+
+    def test_divergent_changed_forgets_versions(self):
+        """
+        When notified that divergent groups have changed, the kept versions
+        of flags that are gone are forgotten, even if nothing is converged.
+        """
+        converger = self._converger(lambda *a, **kw: 1 / 0,
+                                    dispatcher=SequenceDispatcher([]))
+        converger.flag_versions = Reference(pmap({
+            '/groups/divergent/tenant1_group1': 3,
+            '/groups/divergent/tenant2_group2': 4}))
+        converger.divergent_changed(['tenant2_group2'])
+        self.assertEqual(
+            sync_perform(_get_dispatcher(), converger.flag_versions.read()),
+            pmap({'/groups/divergent/tenant2_group2': 4}))
 
 
 def add_to_recently(recently, group_id, cvg_time):
@@ -349,6 +475,8 @@ class ConvergeOneGroupTests(SynchronousTestCase):
         self.group_id = 'g1'
         self.version = 5
         self.waiting = Reference(pmap())
+        self.flag_path = '/groups/divergent/tenant-id_g1'
+        self.flag_versions = Reference(pmap({self.flag_path: 5}))
         self._exec_intent = (
             'ec', self.tenant_id, self.group_id, 3600, self.waiting, 43, {})
 
@@ -374,7 +502,7 @@ class ConvergeOneGroupTests(SynchronousTestCase):
         if recent is None:
             recent = Reference(pmap())
         eff = converge_one_group(
-            converging, recent, self.waiting,
+            converging, recent, self.waiting, self.flag_versions,
             self.tenant_id, self.group_id, self.version,
             3600, 43, {}, execute_convergence=self._execute_convergence)
         fb_dispatcher = _get_dispatcher() if allow_refs else base_dispatcher
@@ -391,11 +519,18 @@ class ConvergeOneGroupTests(SynchronousTestCase):
         ]
 
     def test_success(self):
-        """When execute_convergence returns Stop, the dirty flag is deleted."""
+        """
+        When execute_convergence returns Stop, the dirty flag is deleted and
+        its version forgotten.
+        """
         sequence = [
             self._expect_exec(ConvergenceIterationStatus.Stop()),
+            (RecordConvergence(self.group_id, self.version, False), noop),
         ] + self._clean_divergent()
         self._verify_sequence(sequence)
+        self.assertEqual(
+            sync_perform(_get_dispatcher(), self.flag_versions.read()),
+            pmap())
 
     def test_record_recently_converged(self):
         """
@@ -412,9 +547,13 @@ class ConvergeOneGroupTests(SynchronousTestCase):
             (Func(time.time), lambda i: 100),
             add_to_recently(recently, self.group_id, 100),
             remove_from_currently(currently, self.group_id),
+            (RecordConvergence(self.group_id, self.version, False), noop),
+            (ModifyReference(self.flag_versions,
+                             match_func(pmap({self.flag_path: 5}), pmap())),
+             dispatch(reference_dispatcher)),
         ] + self._clean_divergent()
         eff = converge_one_group(
-            currently, recently, self.waiting,
+            currently, recently, self.waiting, self.flag_versions,
             self.tenant_id, self.group_id, self.version,
             3600, 43, {}, execute_convergence=self._execute_convergence)
         perform_sequence(sequence, eff)
@@ -468,10 +607,12 @@ class ConvergeOneGroupTests(SynchronousTestCase):
         """
         When the version of the dirty flag changes during a call to
         converge_one_group, and DeleteNode raises a BadVersionError, the error
-        is logged and nothing else is cleaned up.
+        is logged and nothing else is cleaned up. The stale version is
+        forgotten so that it is fetched again next time.
         """
         sequence = [
             self._expect_exec(ConvergenceIterationStatus.Stop()),
+            (RecordConvergence(self.group_id, self.version, False), noop),
             (DeleteNode(path='/groups/divergent/tenant-id_g1',
                         version=self.version),
              lambda i: raise_(BadVersionError())),
@@ -480,6 +621,9 @@ class ConvergeOneGroupTests(SynchronousTestCase):
                       dirty_version=self.version)), noop)
         ]
         self._verify_sequence(sequence)
+        self.assertEqual(
+            sync_perform(_get_dispatcher(), self.flag_versions.read()),
+            pmap())
 
     def test_delete_node_not_found(self):
         """
@@ -488,6 +632,7 @@ class ConvergeOneGroupTests(SynchronousTestCase):
         """
         sequence = [
             self._expect_exec(ConvergenceIterationStatus.Stop()),
+            (RecordConvergence(self.group_id, self.version, False), noop),
             (DeleteNode(path='/groups/divergent/tenant-id_g1',
                         version=self.version),
              lambda i: raise_(NoNodeError())),
@@ -501,6 +646,7 @@ class ConvergeOneGroupTests(SynchronousTestCase):
         """When marking clean raises arbitrary errors, an error is logged."""
         sequence = [
             self._expect_exec(ConvergenceIterationStatus.Stop()),
+            (RecordConvergence(self.group_id, self.version, False), noop),
             (DeleteNode(path='/groups/divergent/tenant-id_g1',
                         version=self.version),
              lambda i: raise_(ZeroDivisionError())),
@@ -514,12 +660,52 @@ class ConvergeOneGroupTests(SynchronousTestCase):
     def test_retry(self):
         """
         When execute_convergence returns Continue, the divergent flag is not
-        deleted.
+        deleted and its version is statted again and kept.
+        """
+        sequence = [
+            self._expect_exec(ConvergenceIterationStatus.Continue()),
+            (RecordConvergence(self.group_id, self.version, False), noop),
+            (GetStat(self.flag_path), lambda i: ZNodeStatStub(version=5)),
+        ]
+        self._verify_sequence(sequence)
+        self.assertEqual(
+            sync_perform(_get_dispatcher(), self.flag_versions.read()),
+            pmap({self.flag_path: 5}))
+
+    def test_flag_set_again(self):
+        """
+        When the divergent flag was set again while converging, the new
+        version is kept. When it was deleted, its version is forgotten.
         """
         sequence = [
-            self._expect_exec(ConvergenceIterationStatus.Continue())
+            self._expect_exec(ConvergenceIterationStatus.Continue()),
+            (RecordConvergence(self.group_id, self.version, False), noop),
+            (GetStat(self.flag_path), lambda i: ZNodeStatStub(version=7)),
         ]
         self._verify_sequence(sequence)
+        self.assertEqual(
+            sync_perform(_get_dispatcher(), self.flag_versions.read()),
+            pmap({self.flag_path: 7}))
+        sequence[-1] = (GetStat(self.flag_path), noop)
+        self._verify_sequence(sequence)
+        self.assertEqual(
+            sync_perform(_get_dispatcher(), self.flag_versions.read()),
+            pmap())
+
+    def test_idle(self):
+        """
+        When execute_convergence returns Idle, the divergent flag is not
+        deleted and the iteration is recorded as idle.
+        """
+        sequence = [
+            self._expect_exec(ConvergenceIterationStatus.Idle()),
+            (RecordConvergence(self.group_id, self.version, True), noop),
+            (GetStat(self.flag_path), lambda i: ZNodeStatStub(version=5)),
+        ]
+        self._verify_sequence(sequence)
+        self.assertEqual(
+            sync_perform(_get_dispatcher(), self.flag_versions.read()),
+            pmap({self.flag_path: 5}))
 
     def test_delete_flag_unconditionally_when_group_deleted(self):
         """
@@ -529,6 +715,7 @@ class ConvergeOneGroupTests(SynchronousTestCase):
         """
         sequence = [
             self._expect_exec(ConvergenceIterationStatus.GroupDeleted()),
+            (RecordConvergence(self.group_id, self.version, False), noop),
             (DeleteNode(path='/groups/divergent/tenant-id_g1', version=-1),
              noop),
             (Log('mark-clean-success', {}), noop),
@@ -551,6 +738,7 @@ class ConvergeAllGroupsTests(SynchronousTestCase):
         self.currently_converging = Reference(pset())
         self.recently_converged = Reference(pmap())
         self.waiting = Reference(pmap())
+        self.flag_versions = Reference(pmap())
         self.my_buckets = [1, 6]
         self.all_buckets = range(10)
         self.group_infos = [
@@ -563,7 +751,7 @@ class ConvergeAllGroupsTests(SynchronousTestCase):
     def _converge_all_groups(self, flags):
         return converge_all_groups(
             self.currently_converging, self.recently_converged, self.waiting,
-            self.my_buckets, self.all_buckets,
+            self.flag_versions, self.my_buckets, self.all_buckets,
             flags,
             3600,
             15,
@@ -573,13 +761,15 @@ class ConvergeAllGroupsTests(SynchronousTestCase):
 
     def _converge_one_group(self,
                             currently_converging, recently_converged, waiting,
-                            tenant_id, group_id, version, build_timeout,
+                            flag_versions, tenant_id, group_id, version,
+                            build_timeout,
                             limited_retry_iterations, step_limits):
         return Effect(
             ('converge', tenant_id, group_id, version, build_timeout,
              limited_retry_iterations, step_limits))
 
-    def _expect_group_converged(self, tenant_id, group_id):
+    def _expect_group_converged(self, tenant_id, group_id, waiting=False,
+                                version=5):
         """
         Return a SequenceDispatcher two-tuple that matches the usual sequence
         of intents for converging a single group.
@@ -588,17 +778,34 @@ class ConvergeAllGroupsTests(SynchronousTestCase):
             BoundFields(mock.ANY,
                         dict(tenant_id=tenant_id, scaling_group_id=group_id)),
             nested_sequence([
-                (GetStat(
-                    path='/groups/divergent/{tenant_id}_{group_id}'.format(
-                        tenant_id=tenant_id, group_id=group_id)),
-                 lambda i: ZNodeStatStub(version=5)),
-                (TenantScope(mock.ANY, tenant_id),
+                (QueuedConvergence(tenant_id, group_id, version, waiting,
+                                   mock.ANY),
                  nested_sequence([
-                     (('converge', tenant_id, group_id, 5, 3600, 23, {}),
-                      lambda i: 'converged {}!'.format(group_id)),
+                     (TenantScope(mock.ANY, tenant_id),
+                      nested_sequence([
+                          (('converge', tenant_id, group_id, version, 3600, 23,
+                            {}),
+                           lambda i: 'converged {}!'.format(group_id)),
+                      ])),
                  ])),
             ]))
 
+    def _expect_versions_fetched(self, *flags):
+        """
+        Return sequence items that expect the flags' versions to be fetched
+        and kept in ``flag_versions``.
+        """
+        paths = ['/groups/divergent/' + flag for flag in flags]
+        return [
+            (ReadReference(self.flag_versions), lambda i: pmap()),
+            parallel_sequence([
+                [(GetStat(path=path), lambda i: ZNodeStatStub(version=5))]
+                for path in paths]),
+            (ModifyReference(
+                self.flag_versions,
+                match_func(pmap(), pmap(dict.fromkeys(paths, 5)))),
+             noop)]
+
     def test_converge_all_groups(self):
         """
         Fetches divergent groups and runs converge_one_group for each one
@@ -613,6 +820,9 @@ class ConvergeAllGroupsTests(SynchronousTestCase):
              noop),
             (ReadReference(self.recently_converged), lambda i: pmap()),
             (Func(time.time), lambda i: 100),
+            (ReadReference(self.waiting), lambda i: pmap()),
+            (GetBackedOff(), lambda i: {}),
+        ] + self._expect_versions_fetched('00_g1', '01_g2') + [
             parallel_sequence([[self._expect_group_converged('00', 'g1')],
                                [self._expect_group_converged('01', 'g2')]])
         ]
@@ -634,6 +844,9 @@ class ConvergeAllGroupsTests(SynchronousTestCase):
              noop),
             (ReadReference(ref=self.recently_converged), lambda i: pmap()),
             (Func(time.time), lambda i: 100),
+            (ReadReference(self.waiting), lambda i: pmap()),
+            (GetBackedOff(), lambda i: {}),
+        ] + self._expect_versions_fetched('01_g2') + [
             parallel_sequence([[self._expect_group_converged('01', 'g2')]])
         ]
         self.assertEqual(perform_sequence(sequence, eff), ['converged g2!'])
@@ -652,6 +865,9 @@ class ConvergeAllGroupsTests(SynchronousTestCase):
             (ReadReference(ref=self.recently_converged),
              lambda i: pmap({'g1': 5})),
             (Func(time.time), lambda i: 14),
+            (ReadReference(self.waiting), lambda i: pmap()),
+            (GetBackedOff(), lambda i: {}),
+            (ReadReference(self.flag_versions), lambda i: pmap()),
             parallel_sequence([])  # No groups to converge
         ]
         self.assertEqual(perform_sequence(sequence, eff), [])
@@ -678,6 +894,9 @@ class ConvergeAllGroupsTests(SynchronousTestCase):
                              match_func("literally anything",
                                         pmap({'g2': 10}))),
              noop),
+            (ReadReference(self.waiting), lambda i: pmap()),
+            (GetBackedOff(), lambda i: {}),
+        ] + self._expect_versions_fetched('00_g1') + [
             parallel_sequence([[self._expect_group_converged('00', 'g1')]])
         ]
         self.assertEqual(perform_sequence(sequence, eff), ['converged g1!'])
@@ -689,7 +908,7 @@ class ConvergeAllGroupsTests(SynchronousTestCase):
 
         result = converge_all_groups(
             self.currently_converging, self.recently_converged, self.waiting,
-            self.my_buckets, self.all_buckets, [],
+            self.flag_versions, self.my_buckets, self.all_buckets, [],
             3600, 15, 23, {}, converge_one_group=converge_one_group)
         self.assertEqual(sync_perform(_get_dispatcher(), result), None)
 
@@ -704,11 +923,10 @@ class ConvergeAllGroupsTests(SynchronousTestCase):
         eff = self._converge_all_groups(['00_g1'])
 
         def get_bound_sequence(tid, gid):
-            # since this GetStat is going to return None, no more effects will
-            # be run. This is the crux of what we're testing.
+            # since the GetStat returned None, no more effects will be run.
+            # This is the crux of what we're testing.
             znode = '/groups/divergent/{}_{}'.format(tid, gid)
             return [
-                (GetStat(path=znode), noop),
                 (Log('converge-divergent-flag-disappeared',
                      fields={'znode': znode}),
                  noop)]
@@ -721,6 +939,11 @@ class ConvergeAllGroupsTests(SynchronousTestCase):
              noop),
             (ReadReference(ref=self.recently_converged), lambda i: pmap()),
             (Func(time.time), lambda i: 100),
+            (ReadReference(self.waiting), lambda i: pmap()),
+            (GetBackedOff(), lambda i: {}),
+            (ReadReference(self.flag_versions), lambda i: pmap()),
+            parallel_sequence([
+                [(GetStat(path='/groups/divergent/00_g1'), noop)]]),
             parallel_sequence([
                 [(BoundFields(mock.ANY, fields={'tenant_id': '00',
                                                 'scaling_group_id': 'g1'}),
@@ -729,6 +952,152 @@ class ConvergeAllGroupsTests(SynchronousTestCase):
         ]
         self.assertEqual(perform_sequence(sequence, eff), [None])
 
+    def test_waiting_groups(self):
+        """
+        Groups waiting on LIMITED_RETRY steps are queued as such.
+        """
+        eff = self._converge_all_groups(['00_g1', '01_g2'])
+        sequence = [
+            (ReadReference(ref=self.currently_converging),
+             lambda i: pset()),
+            (Log('converge-all-groups',
+                 dict(group_infos=self.group_infos, currently_converging=[])),
+             noop),
+            (ReadReference(self.recently_converged), lambda i: pmap()),
+            (Func(time.time), lambda i: 100),
+            (ReadReference(self.waiting), lambda i: pmap({'g2': 3})),
+            (GetBackedOff(), lambda i: {}),
+        ] + self._expect_versions_fetched('00_g1', '01_g2') + [
+            parallel_sequence([
+                [self._expect_group_converged('00', 'g1')],
+                [self._expect_group_converged('01', 'g2', waiting=True)]])
+        ]
+        self.assertEqual(perform_sequence(sequence, eff),
+                         ['converged g1!', 'converged g2!'])
+
+    def test_known_versions(self):
+        """
+        Versions of flags that were seen before are not fetched again, and
+        the versions of flags that are not divergent anymore are forgotten.
+        """
+        self.flag_versions = Reference(pmap({'/groups/divergent/00_g1': 5,
+                                             '/groups/divergent/01_gone': 2}))
+        eff = self._converge_all_groups(['00_g1'])
+        sequence = [
+            (ReadReference(ref=self.currently_converging), lambda i: pset()),
+            (Log('converge-all-groups',
+                 dict(group_infos=[self.group_infos[0]],
+                      currently_converging=[])),
+             noop),
+            (ReadReference(self.recently_converged), lambda i: pmap()),
+            (Func(time.time), lambda i: 100),
+            (ReadReference(self.waiting), lambda i: pmap()),
+            (GetBackedOff(), lambda i: {}),
+            (ReadReference(self.flag_versions),
+             dispatch(reference_dispatcher)),
+            (ModifyReference(self.flag_versions, mock.ANY),
+             dispatch(reference_dispatcher)),
+            parallel_sequence([[self._expect_group_converged('00', 'g1')]])
+        ]
+        self.assertEqual(perform_sequence(sequence, eff), ['converged g1!'])
+        self.assertEqual(
+            sync_perform(_get_dispatcher(), self.flag_versions.read()),
+            pmap({'/groups/divergent/00_g1': 5}))
+
+    def test_backed_off(self):
+        """
+        Groups that are backed off are not converged unless their flag was
+        set again since. Setting a flag again does not change the divergent
+        directory's children, so their flags are statted again to know.
+        """
+        self.flag_versions = Reference(pmap({'/groups/divergent/00_g1': 5,
+                                             '/groups/divergent/01_g2': 5}))
+        eff = self._converge_all_groups(['00_g1', '01_g2'])
+        sequence = [
+            (ReadReference(ref=self.currently_converging), lambda i: pset()),
+            (Log('converge-all-groups',
+                 dict(group_infos=self.group_infos, currently_converging=[])),
+             noop),
+            (ReadReference(self.recently_converged), lambda i: pmap()),
+            (Func(time.time), lambda i: 100),
+            (ReadReference(self.waiting), lambda i: pmap()),
+            (GetBackedOff(), lambda i: {'g1': 5, 'g2': 5}),
+            parallel_sequence([
+                [(GetStat('/groups/divergent/00_g1'),
+                  lambda i: ZNodeStatStub(version=5))],
+                [(GetStat('/groups/divergent/01_g2'),
+                  lambda i: ZNodeStatStub(version=6))]]),
+            (ModifyReference(self.flag_versions, mock.ANY),
+             dispatch(reference_dispatcher)),
+            (ReadReference(self.flag_versions),
+             dispatch(reference_dispatcher)),
+            parallel_sequence([
+                [self._expect_group_converged('01', 'g2', version=6)]])
+        ]
+        self.assertEqual(perform_sequence(sequence, eff), ['converged g2!'])
+        self.assertEqual(
+            sync_perform(_get_dispatcher(), self.flag_versions.read()),
+            pmap({'/groups/divergent/00_g1': 5,
+                  '/groups/divergent/01_g2': 6}))
+
+    def test_backed_off_flag_gone(self):
+        """
+        A backed off group whose flag does not exist anymore is not
+        converged, and the version of its flag is forgotten.
+        """
+        self.flag_versions = Reference(pmap({'/groups/divergent/00_g1': 5}))
+        eff = self._converge_all_groups(['00_g1'])
+        sequence = [
+            (ReadReference(ref=self.currently_converging), lambda i: pset()),
+            (Log('converge-all-groups',
+                 dict(group_infos=[self.group_infos[0]],
+                      currently_converging=[])),
+             noop),
+            (ReadReference(self.recently_converged), lambda i: pmap()),
+            (Func(time.time), lambda i: 100),
+            (ReadReference(self.waiting), lambda i: pmap()),
+            (GetBackedOff(), lambda i: {'g1': 5}),
+            parallel_sequence([
+                [(GetStat('/groups/divergent/00_g1'), noop)]]),
+            (ModifyReference(self.flag_versions, mock.ANY),
+             dispatch(reference_dispatcher)),
+            (ReadReference(self.flag_versions),
+             dispatch(reference_dispatcher)),
+            parallel_sequence([])
+        ]
+        self.assertEqual(perform_sequence(sequence, eff), [])
+        self.assertEqual(
+            sync_perform(_get_dispatcher(), self.flag_versions.read()),
+            pmap())
+
+    def test_versions_fetched_in_batches(self):
+        """
+        Versions of new flags are fetched a batch at a time.
+        """
+        flags = ['00_g%d' % i for i in range(3)]
+        eff = get_divergent_versions(
+            self.flag_versions, flags + ['other'],
+            ['/groups/divergent/' + flag for flag in flags], batch_size=2)
+        sequence = [
+            (ReadReference(self.flag_versions), lambda i: pmap()),
+            parallel_sequence([
+                [(GetStat('/groups/divergent/00_g0'),
+                  lambda i: ZNodeStatStub(version=1))],
+                [(GetStat('/groups/divergent/00_g1'), noop)]]),
+            parallel_sequence([
+                [(GetStat('/groups/divergent/00_g2'),
+                  lambda i: ZNodeStatStub(version=3))]]),
+            (ModifyReference(self.flag_versions, mock.ANY),
+             dispatch(reference_dispatcher)),
+        ]
+        self.assertEqual(
+            perform_sequence(sequence, eff),
+            {'/groups/divergent/00_g0': 1, '/groups/divergent/00_g2': 3})
+        self.assertEqual(
+            sync_perform(_get_dispatcher(), self.flag_versions.read()),
+            pmap({'/groups/divergent/00_g0': 1,
+                  '/groups/divergent/00_g2': 3}))
+
 
 class GetMyDivergentGroupsTests(SynchronousTestCase):
 
@@ -747,6 +1116,39 @@ class GetMyDivergentGroupsTests(SynchronousTestCase):
              {'tenant_id': '00', 'group_id': 'gr2',
               'dirty-flag': '/groups/divergent/00_gr2'}])
 
+    def test_hash_ring(self):
+        """
+        With the ``converger.hash_ring`` config, tenants are associated with
+        buckets by jump consistent hashing.
+        """
+        set_config_data({'converger': {'hash_ring': True}})
+        self.addCleanup(set_config_data, {})
+        # jump_hash of '00' is 7 and of '01' is 9 with 10 buckets.
+        result = get_my_divergent_groups(
+            [7], range(10), ['00_gr1', '01_gr3'])
+        self.assertEqual(
+            result,
+            [{'tenant_id': '00', 'group_id': 'gr1',
+              'dirty-flag': '/groups/divergent/00_gr1'}])
+
+    def test_split_tenant(self):
+        """
+        The groups of tenants in the ``converger.split_tenants`` config are
+        associated with buckets by group instead of by tenant.
+        """
+        set_config_data({'converger': {'split_tenants': ['00']}})
+        self.addCleanup(set_config_data, {})
+        # sha1('00_gr1') % 10 is 1, sha1('00_gr2') % 10 is 0 and
+        # sha1('01') % 10 is 1.
+        result = get_my_divergent_groups(
+            [1], range(10), ['00_gr1', '00_gr2', '01_gr3'])
+        self.assertEqual(
+            result,
+            [{'tenant_id': '00', 'group_id': 'gr1',
+              'dirty-flag': '/groups/divergent/00_gr1'},
+             {'tenant_id': '01', 'group_id': 'gr3',
+              'dirty-flag': '/groups/divergent/01_gr3'}])
+
 
 def _get_dispatcher():
     return ComposedDispatcher([
@@ -815,6 +1217,16 @@ class NonConcurrentlyTests(SynchronousTestCase):
         self.assertEqual(self._get_locks(), pset([]))
 
 
+def timed_step(seq, step_type='TestStep'):
+    """
+    Return a parallel branch expecting the throttled and timed execution of a
+    step of type ``step_type`` that performs ``seq``.
+    """
+    return [(ThrottledStep('tenant-id', mock.ANY, mock.ANY),
+             nested_sequence([
+                 timed_sequence('execute-' + step_type, seq, step_outcome)]))]
+
+
 class ExecuteConvergenceTests(SynchronousTestCase):
     """Tests for :func:`execute_convergence`."""
 
@@ -843,8 +1255,9 @@ class ExecuteConvergenceTests(SynchronousTestCase):
                    links=freeze([{'href': 'link2', 'rel': 'self'}]))
         )
         self.state_active = {}
-        self.cache = [thaw(self.servers[0].json.set('_is_as_active', True)),
-                      thaw(self.servers[1].json.set('_is_as_active', True))]
+        self.cache = [
+            dict(self.servers[0].json.decode(), _is_as_active=True),
+            dict(self.servers[1].json.decode(), _is_as_active=True)]
         self.gsgi = GetScalingGroupInfo(tenant_id='tenant-id',
                                         group_id='group-id')
         self.manifest = {  # Many details elided!
@@ -860,7 +1273,7 @@ class ExecuteConvergenceTests(SynchronousTestCase):
     def get_seq(self, with_cache=True):
         exec_seq = [
             (self.gsgi, lambda i: self.gsgi_result),
-            (("gacd", self.tenant_id, self.group_id, self.now),
+            (("gacd", self.tenant_id, self.group_id, self.now, self.lc),
              self.gacd_runner)
         ]
         if with_cache:
@@ -873,7 +1286,8 @@ class ExecuteConvergenceTests(SynchronousTestCase):
             (Log("begin-convergence", {}), noop),
             (Func(datetime.utcnow), lambda i: self.now),
             (MsgWithTime("gather-convergence-data", mock.ANY),
-             nested_sequence(exec_seq))
+             nested_sequence([timed_sequence('gather', exec_seq)])),
+            timed_sequence('plan', [])
         ]
 
     def _invoke(self, plan=None, executor_base=launch_server_executor):
@@ -900,11 +1314,15 @@ class ExecuteConvergenceTests(SynchronousTestCase):
             (Log('execute-convergence-results',
                  {'results': [], 'worst_status': 'SUCCESS'}), noop),
             clean_waiting(self.waiting, self.group_id),
-            (UpdateServersCache(
-                "tenant-id", "group-id", self.now,
-                [thaw(self.servers[0].json.set('_is_as_active', True)),
-                 thaw(self.servers[1].json.set("_is_as_active", True))]),
-             noop)
+            timed_sequence('convergence-succeeded', [
+                timed_sequence('update-cache', [
+                    (UpdateServersCache(
+                        "tenant-id", "group-id", self.now,
+                        [dict(self.servers[0].json.decode(),
+                              _is_as_active=True),
+                         dict(self.servers[1].json.decode(),
+                              _is_as_active=True)]),
+                     noop)])])
         ]
         self.state_active = {
             'a': {'id': 'a', 'links': [{'href': 'link1', 'rel': 'self'}]},
@@ -947,9 +1365,10 @@ class ExecuteConvergenceTests(SynchronousTestCase):
                  dict(servers=self.servers, lb_nodes=self.lb_nodes,
                       steps=steps, now=self.now, desired=dgs)), noop),
             parallel_sequence([
-                [({'dgs': dgs, 'servers': self.servers,
-                   'lb_nodes': (), 'now': 0},
-                  noop)]
+                timed_step([
+                    ({'dgs': dgs, 'servers': self.servers,
+                      'lb_nodes': (), 'now': 0},
+                     noop)])
             ]),
             (Log('execute-convergence-results',
                  {'results': [{'step': steps[0],
@@ -958,15 +1377,19 @@ class ExecuteConvergenceTests(SynchronousTestCase):
                   'worst_status': 'SUCCESS'}), noop),
             clean_waiting(self.waiting, self.group_id),
             # Note that servers arg is non-deleted servers
-            (UpdateServersCache(
-                "tenant-id", "group-id", self.now,
-                [thaw(self.servers[0].json.set("_is_as_active", True)),
-                 thaw(self.servers[1].json.set("_is_as_active", True))]),
-             noop)
+            timed_sequence('convergence-succeeded', [
+                timed_sequence('update-cache', [
+                    (UpdateServersCache(
+                        "tenant-id", "group-id", self.now,
+                        [dict(self.servers[0].json.decode(),
+                              _is_as_active=True),
+                         dict(self.servers[1].json.decode(),
+                              _is_as_active=True)]),
+                     noop)])])
         ]
 
         # all the servers updated in cache in beginning
-        self.cache.append(thaw(deleted.json))
+        self.cache.append(deleted.json.decode())
 
         self.assertEqual(
             perform_sequence(self.get_seq() + sequence, self._invoke(plan)),
@@ -1003,11 +1426,12 @@ class ExecuteConvergenceTests(SynchronousTestCase):
             parallel_sequence([]),
             (Log(msg='execute-convergence', fields=mock.ANY), noop),
             parallel_sequence([
-                [("step_intent", lambda i: (
-                     StepResult.RETRY, [
-                         ErrorReason.Exception(exc_info),
-                         ErrorReason.String('foo'),
-                         ErrorReason.Structured({'foo': 'bar'})]))]
+                timed_step([
+                    ("step_intent", lambda i: (
+                        StepResult.RETRY, [
+                            ErrorReason.Exception(exc_info),
+                            ErrorReason.String('foo'),
+                            ErrorReason.Structured({'foo': 'bar'})]))])
             ]),
             (Log(msg='execute-convergence-results', fields=expected_fields),
              noop),
@@ -1037,7 +1461,9 @@ class ExecuteConvergenceTests(SynchronousTestCase):
             ]),
             (Log(msg='execute-convergence', fields=mock.ANY), noop),
             parallel_sequence([
-                [("create-server", lambda i: (StepResult.RETRY, []))]
+                timed_step(
+                    [("create-server", lambda i: (StepResult.RETRY, []))],
+                    'CreateServer')
             ]),
             (Log(msg='execute-convergence-results', fields=mock.ANY), noop),
             clean_waiting(self.waiting, self.group_id),
@@ -1058,14 +1484,15 @@ class ExecuteConvergenceTests(SynchronousTestCase):
             parallel_sequence([]),
             (Log('execute-convergence', mock.ANY), noop),
             parallel_sequence([
-                [("step", lambda i: (step_result, []))]
+                timed_step([("step", lambda i: (step_result, []))])
             ]),
             (Log('execute-convergence-results', mock.ANY), noop),
             clean_waiting(self.waiting, self.group_id),
         ]
         if with_delete:
-            sequence.append((DeleteGroup(tenant_id=self.tenant_id,
-                                         group_id=self.group_id), noop))
+            sequence.append(timed_sequence('convergence-succeeded', [
+                (DeleteGroup(tenant_id=self.tenant_id,
+                             group_id=self.group_id), noop)]))
         self.assertEqual(
             # skipping cache update intents returned in get_seq()
             perform_sequence(self.get_seq(False) + sequence,
@@ -1104,9 +1531,9 @@ class ExecuteConvergenceTests(SynchronousTestCase):
             parallel_sequence([]),
             (Log('execute-convergence', mock.ANY), noop),
             parallel_sequence([
-                [("step1", lambda i: (StepResult.SUCCESS, []))],
-                [("retry", lambda i: (StepResult.RETRY,
-                                      [ErrorReason.String('mywish')]))],
+                timed_step([("step1", lambda i: (StepResult.SUCCESS, []))]),
+                timed_step([("retry", lambda i: (
+                    StepResult.RETRY, [ErrorReason.String('mywish')]))]),
             ]),
             (Log('execute-convergence-results', mock.ANY), noop),
             clean_waiting(self.waiting, self.group_id),
@@ -1139,29 +1566,31 @@ class ExecuteConvergenceTests(SynchronousTestCase):
             parallel_sequence([]),
             (Log(msg='execute-convergence', fields=mock.ANY), noop),
             parallel_sequence([
-                [("success1", success)],
-                [("retry", lambda i: (StepResult.RETRY, []))],
-                [("success2", success)],
-                [("fail1", lambda i: (StepResult.FAILURE,
-                                      [ErrorReason.Exception(exc_info)]))],
-                [("fail2", lambda i: (StepResult.FAILURE,
-                                      [ErrorReason.Exception(exc_info2)]))],
-                [("success3", success)],
+                timed_step([("success1", success)]),
+                timed_step([("retry", lambda i: (StepResult.RETRY, []))]),
+                timed_step([("success2", success)]),
+                timed_step([("fail1", lambda i: (
+                    StepResult.FAILURE, [ErrorReason.Exception(exc_info)]))]),
+                timed_step([("fail2", lambda i: (
+                    StepResult.FAILURE, [ErrorReason.Exception(exc_info2)]))]),
+                timed_step([("success3", success)]),
             ]),
             (Log(msg='execute-convergence-results', fields=mock.ANY), noop),
             clean_waiting(self.waiting, self.group_id),
-            (UpdateGroupStatus(scaling_group=self.group,
-                               status=ScalingGroupStatus.ERROR),
-             noop),
-            (Log('group-status-error',
-                 dict(isError=True, cloud_feed=True, status='ERROR',
-                      reasons=['Cloud Load Balancer does not exist: nolb1',
-                               'Cloud Load Balancer does not exist: nolb2'])),
-             noop),
-            (UpdateGroupErrorReasons(
-                self.group,
-                ['Cloud Load Balancer does not exist: nolb1',
-                 'Cloud Load Balancer does not exist: nolb2']), noop)
+            timed_sequence('convergence-failed', [
+                (UpdateGroupStatus(scaling_group=self.group,
+                                   status=ScalingGroupStatus.ERROR),
+                 noop),
+                (Log('group-status-error',
+                     dict(isError=True, cloud_feed=True, status='ERROR',
+                          reasons=[
+                              'Cloud Load Balancer does not exist: nolb1',
+                              'Cloud Load Balancer does not exist: nolb2'])),
+                 noop),
+                (UpdateGroupErrorReasons(
+                    self.group,
+                    ['Cloud Load Balancer does not exist: nolb1',
+                     'Cloud Load Balancer does not exist: nolb2']), noop)])
         ]
         self.assertEqual(
             perform_sequence(self.get_seq() + sequence, self._invoke(plan)),
@@ -1181,20 +1610,22 @@ class ExecuteConvergenceTests(SynchronousTestCase):
             parallel_sequence([]),
             (Log(msg='execute-convergence', fields=mock.ANY), noop),
             parallel_sequence([
-                [("fail", lambda i: (StepResult.FAILURE,
-                                     [ErrorReason.Exception(exc_info)]))]
+                timed_step([("fail", lambda i: (
+                    StepResult.FAILURE, [ErrorReason.Exception(exc_info)]))])
             ]),
             (Log(msg='execute-convergence-results', fields=mock.ANY), noop),
             clean_waiting(self.waiting, self.group_id),
-            (UpdateGroupStatus(scaling_group=self.group,
-                               status=ScalingGroupStatus.ERROR),
-             noop),
-            (Log('group-status-error',
-                 dict(isError=True, cloud_feed=True, status='ERROR',
-                      reasons=['Unknown error occurred'])),
-             noop),
-            (UpdateGroupErrorReasons(self.group, ['Unknown error occurred']),
-             noop)
+            timed_sequence('convergence-failed', [
+                (UpdateGroupStatus(scaling_group=self.group,
+                                   status=ScalingGroupStatus.ERROR),
+                 noop),
+                (Log('group-status-error',
+                     dict(isError=True, cloud_feed=True, status='ERROR',
+                          reasons=['Unknown error occurred'])),
+                 noop),
+                (UpdateGroupErrorReasons(self.group,
+                                         ['Unknown error occurred']),
+                 noop)])
         ]
         self.assertEqual(
             perform_sequence(self.get_seq() + sequence, self._invoke(plan)),
@@ -1214,21 +1645,25 @@ class ExecuteConvergenceTests(SynchronousTestCase):
             parallel_sequence([]),
             (Log(msg='execute-convergence', fields=mock.ANY), noop),
             parallel_sequence([
-                [("step", lambda i: (StepResult.SUCCESS, []))]
+                timed_step([("step", lambda i: (StepResult.SUCCESS, []))])
             ]),
             (Log(msg='execute-convergence-results', fields=mock.ANY), noop),
             clean_waiting(self.waiting, self.group_id),
-            (UpdateGroupStatus(scaling_group=self.group,
-                               status=ScalingGroupStatus.ACTIVE),
-             noop),
-            (Log('group-status-active',
-                 dict(cloud_feed=True, status='ACTIVE')),
-             noop),
-            (UpdateServersCache(
-                "tenant-id", "group-id", self.now,
-                [thaw(self.servers[0].json.set('_is_as_active', True)),
-                 thaw(self.servers[1].json.set('_is_as_active', True))]),
-             noop),
+            timed_sequence('convergence-succeeded', [
+                (UpdateGroupStatus(scaling_group=self.group,
+                                   status=ScalingGroupStatus.ACTIVE),
+                 noop),
+                (Log('group-status-active',
+                     dict(cloud_feed=True, status='ACTIVE')),
+                 noop),
+                timed_sequence('update-cache', [
+                    (UpdateServersCache(
+                        "tenant-id", "group-id", self.now,
+                        [dict(self.servers[0].json.decode(),
+                              _is_as_active=True),
+                         dict(self.servers[1].json.decode(),
+                              _is_as_active=True)]),
+                     noop)])]),
         ]
         self.assertEqual(
             perform_sequence(self.get_seq() + sequence, self._invoke(plan)),
@@ -1248,17 +1683,21 @@ class ExecuteConvergenceTests(SynchronousTestCase):
             (Log(msg='execute-convergence', fields=mock.ANY), noop),
             (Log(msg='execute-convergence-results', fields=mock.ANY), noop),
             clean_waiting(self.waiting, self.group_id),
-            (UpdateGroupStatus(scaling_group=self.group,
-                               status=ScalingGroupStatus.ACTIVE),
-             noop),
-            (Log('group-status-active',
-                 dict(cloud_feed=True, status='ACTIVE')),
-             noop),
-            (UpdateServersCache(
-                "tenant-id", "group-id", self.now,
-                [thaw(self.servers[0].json.set("_is_as_active", True)),
-                 thaw(self.servers[1].json.set("_is_as_active", True))]),
-             noop)
+            timed_sequence('convergence-succeeded', [
+                (UpdateGroupStatus(scaling_group=self.group,
+                                   status=ScalingGroupStatus.ACTIVE),
+                 noop),
+                (Log('group-status-active',
+                     dict(cloud_feed=True, status='ACTIVE')),
+                 noop),
+                timed_sequence('update-cache', [
+                    (UpdateServersCache(
+                        "tenant-id", "group-id", self.now,
+                        [dict(self.servers[0].json.decode(),
+                              _is_as_active=True),
+                         dict(self.servers[1].json.decode(),
+                              _is_as_active=True)]),
+                     noop)])])
         ]
         self.state_active = {
             'a': {'id': 'a', 'links': [{'href': 'link1', 'rel': 'self'}]},
@@ -1283,7 +1722,8 @@ class ExecuteConvergenceTests(SynchronousTestCase):
         sequence = [
             parallel_sequence([]),
             (Log('execute-convergence', mock.ANY), noop),
-            parallel_sequence([[]]),  # Only "base" intents in here
+            # Only "base" intents in here
+            parallel_sequence([timed_step([], 'ConvergeLater')]),
             (Log('execute-convergence-results', mock.ANY), noop),
             (ReadReference(self.waiting), dispatch(reference_dispatcher)),
             (ModifyReference(self.waiting,
@@ -1310,20 +1750,22 @@ class ExecuteConvergenceTests(SynchronousTestCase):
         sequence = [
             parallel_sequence([]),
             (Log('execute-convergence', mock.ANY), noop),
-            parallel_sequence([[]]),  # Only "base" intents in here
+            # Only "base" intents in here
+            parallel_sequence([timed_step([], 'ConvergeLater')]),
             (Log('execute-convergence-results', mock.ANY), noop),
             (ReadReference(self.waiting), dispatch(reference_dispatcher)),
             (Log('converge-limited-retry-too-long', fields={}), noop),
             clean_waiting(self.waiting, self.group_id),
-            (UpdateGroupStatus(scaling_group=self.group,
-                               status=ScalingGroupStatus.ERROR),
-             noop),
-            (Log('group-status-error',
-                 dict(isError=True, cloud_feed=True, status='ERROR',
-                      reasons=['Timed out: bar', "Timed out: foo"])),
-             noop),
-            (UpdateGroupErrorReasons(
-                self.group, ['Timed out: bar', "Timed out: foo"]), noop),
+            timed_sequence('convergence-failed', [
+                (UpdateGroupStatus(scaling_group=self.group,
+                                   status=ScalingGroupStatus.ERROR),
+                 noop),
+                (Log('group-status-error',
+                     dict(isError=True, cloud_feed=True, status='ERROR',
+                          reasons=['Timed out: bar', "Timed out: foo"])),
+                 noop),
+                (UpdateGroupErrorReasons(
+                    self.group, ['Timed out: bar', "Timed out: foo"]), noop)])
         ]
         self.assertEqual(
             perform_sequence(self.get_seq() + sequence, self._invoke(plan)),
@@ -1343,7 +1785,8 @@ class ExecuteConvergenceTests(SynchronousTestCase):
         sequence = [
             parallel_sequence([]),
             (Log('execute-convergence', mock.ANY), noop),
-            parallel_sequence([[]]),  # Only "base" intents in here
+            # Only "base" intents in here
+            parallel_sequence([timed_step([], 'ConvergeLater')]),
             (Log('execute-convergence-results', mock.ANY), noop),
             (ReadReference(self.waiting), dispatch(reference_dispatcher)),
             (ModifyReference(self.waiting,
@@ -1355,6 +1798,26 @@ class ExecuteConvergenceTests(SynchronousTestCase):
             perform_sequence(self.get_seq() + sequence, self._invoke(plan)),
             ConvergenceIterationStatus.Continue())
 
+    def test_converge_later_idle(self):
+        """
+        When all the steps are :obj:`ConvergeLater`, the iteration is idle.
+        """
+        reasons = [ErrorReason.UserMessage('building')]
+
+        def plan(*args, **kwargs):
+            return [ConvergeLater(reasons)]
+
+        sequence = [
+            parallel_sequence([]),
+            (Log('execute-convergence', mock.ANY), noop),
+            parallel_sequence([timed_step([], 'ConvergeLater')]),
+            (Log('execute-convergence-results', mock.ANY), noop),
+            clean_waiting(self.waiting, self.group_id),
+        ]
+        self.assertEqual(
+            perform_sequence(self.get_seq() + sequence, self._invoke(plan)),
+            ConvergenceIterationStatus.Idle())
+
     def test_limited_retry_resolved(self):
         """
         When we've been waiting for LIMITED_RETRY and then we're not waiting
@@ -1372,11 +1835,15 @@ class ExecuteConvergenceTests(SynchronousTestCase):
                              match_func(pmap({self.group_id: 43}),
                                         pmap())),
              dispatch(reference_dispatcher)),
-            (UpdateServersCache(
-                "tenant-id", "group-id", self.now,
-                [thaw(self.servers[0].json.set("_is_as_active", True)),
-                 thaw(self.servers[1].json.set("_is_as_active", True))]),
-             noop)
+            timed_sequence('convergence-succeeded', [
+                timed_sequence('update-cache', [
+                    (UpdateServersCache(
+                        "tenant-id", "group-id", self.now,
+                        [dict(self.servers[0].json.decode(),
+                              _is_as_active=True),
+                         dict(self.servers[1].json.decode(),
+                              _is_as_active=True)]),
+                     noop)])])
         ]
         self.assertEqual(
             perform_sequence(self.get_seq() + sequence, self._invoke(plan)),
@@ -1387,12 +1854,12 @@ class ExecuteConvergenceTests(SynchronousTestCase):
         Without any steps, using a launch_stack launch config stops
         convergence.
         """
-        lc = {'args': {'stack': {'stack_name': 'foo'}},
-              'type': 'launch_stack'}
+        self.lc = {'args': {'stack': {'stack_name': 'foo'}},
+                   'type': 'launch_stack'}
 
         self.manifest = {
             'state': self.state,
-            'launchConfiguration': lc,
+            'launchConfiguration': self.lc,
         }
 
         self.gsgi_result = (self.group, self.manifest)
@@ -1409,6 +1876,8 @@ class ExecuteConvergenceTests(SynchronousTestCase):
                              match_func(pmap({self.group_id: 43}),
                                         pmap())),
              dispatch(reference_dispatcher)),
+            timed_sequence('convergence-succeeded', [
+                timed_sequence('update-cache', [])])
         ]
         result = perform_sequence(
             self.get_seq(with_cache=False) + seq,
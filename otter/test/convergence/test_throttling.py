@@ -0,0 +1,234 @@
+"""Tests for :mod:`otter.convergence.throttling`."""
+
+from effect import (
+    ComposedDispatcher, Effect, TypeDispatcher, sync_performer)
+
+from twisted.internet.defer import Deferred, fail, succeed
+from twisted.internet.task import Clock
+from twisted.trial.unittest import SynchronousTestCase
+
+from txeffect import perform
+
+from otter.cloud_client import CLBRateLimitError, NovaRateLimitError
+from otter.convergence.model import ErrorReason, StepResult
+from otter.convergence.steps import (
+    AddNodesToCLB, CreateServer, DeleteServer)
+from otter.convergence.throttling import (
+    DEFAULT_RETRY_AFTER,
+    StepLimit,
+    StepThrottle,
+    ThrottledStep,
+    TokenBucket,
+    get_step_throttles_from_conf,
+    get_throttle_dispatcher)
+from otter.test.utils import raise_to_exc_info
+
+
+class GetStepThrottlesFromConfTests(SynchronousTestCase):
+    """Tests for :func:`get_step_throttles_from_conf`."""
+
+    def test_conf(self):
+        """Step names are mapped to classes and limits to StepLimits."""
+        self.assertEqual(
+            get_step_throttles_from_conf(
+                {'create_server': {'concurrency': 5, 'rate': 2, 'burst': 4},
+                 'add_nodes_to_clb': {'concurrency': 1}}),
+            {CreateServer: StepLimit(5, 2, 4),
+             AddNodesToCLB: StepLimit(concurrency=1)})
+
+
+class TokenBucketTests(SynchronousTestCase):
+    """Tests for :obj:`TokenBucket`."""
+
+    def test_burst(self):
+        """
+        ``burst`` tokens can be taken at once, after which tokens are taken
+        in advance.
+        """
+        bucket = TokenBucket(2, 3, 0)
+        self.assertEqual([bucket.take(0) for _ in range(5)],
+                         [0, 0, 0, 0.5, 1])
+
+    def test_refill(self):
+        """Tokens are added ``rate`` per second, up to ``burst``."""
+        bucket = TokenBucket(2, 3, 0)
+        for _ in range(3):
+            bucket.take(0)
+        self.assertEqual(bucket.take(1), 0)
+        self.assertEqual(bucket.take(100), 0)
+        self.assertEqual(bucket.tokens, 2)
+
+
+class StepThrottleTests(SynchronousTestCase):
+    """
+    Tests for :obj:`StepThrottle` and performing :obj:`ThrottledStep` with
+    it.
+    """
+
+    def setUp(self):
+        self.clock = Clock()
+        self.throttle = StepThrottle(self.clock)
+        self.deferreds = []
+
+    def _run(self, tenant_id, step_type, d=None):
+        """
+        Run a step with the throttle whose execution results in ``d``, or in
+        a new Deferred kept in ``self.deferreds`` when the execution starts.
+        """
+        def execute():
+            if d is not None:
+                return d
+            self.deferreds.append(Deferred())
+            return self.deferreds[-1]
+
+        return self.throttle.run(tenant_id, step_type, execute)
+
+    def test_perform(self):
+        """
+        :obj:`ThrottledStep` is performed by running its effect with the
+        throttle.
+        """
+        dispatcher = ComposedDispatcher([
+            get_throttle_dispatcher(self.throttle),
+            TypeDispatcher(
+                {str: sync_performer(lambda d, i: 'executed ' + i)})])
+        d = perform(dispatcher,
+                    Effect(ThrottledStep('t1', CreateServer, Effect('step'))))
+        self.assertEqual(self.successResultOf(d), 'executed step')
+
+    def test_unlimited(self):
+        """Steps without limits are run right away."""
+        results = [self._run('t1', CreateServer) for _ in range(20)]
+        self.assertEqual(len(self.deferreds), 20)
+        self.deferreds[0].callback((StepResult.SUCCESS, []))
+        self.assertEqual(self.successResultOf(results[0]),
+                         (StepResult.SUCCESS, []))
+
+    def test_concurrency(self):
+        """
+        At most ``concurrency`` steps of a type are run at once for a tenant.
+        Other tenants and step types are not affected.
+        """
+        self.throttle.limits = {CreateServer: StepLimit(concurrency=2)}
+        for _ in range(3):
+            self._run('t1', CreateServer)
+        self.assertEqual(len(self.deferreds), 2)
+        self._run('t2', CreateServer)
+        self._run('t1', DeleteServer)
+        self.assertEqual(len(self.deferreds), 4)
+        self.deferreds[0].callback((StepResult.SUCCESS, []))
+        self.assertEqual(len(self.deferreds), 5)
+
+    def test_rate(self):
+        """
+        Steps of a type are started at most ``rate`` per second for a tenant,
+        after a burst of ``burst`` steps.
+        """
+        self.throttle.limits = {CreateServer: StepLimit(rate=2, burst=2)}
+        for _ in range(4):
+            self._run('t1', CreateServer)
+        self.assertEqual(len(self.deferreds), 2)
+        self.clock.advance(0.5)
+        self.assertEqual(len(self.deferreds), 3)
+        self.clock.advance(0.5)
+        self.assertEqual(len(self.deferreds), 4)
+
+    def test_rate_across_bursts(self):
+        """
+        The rate holds across bursts of steps that do not overlap: a tenant
+        whose steps are all done does not get a full token bucket again
+        until it has refilled.
+        """
+        self.throttle.limits = {CreateServer: StepLimit(rate=1, burst=2)}
+        for _ in range(2):
+            self._run('t1', CreateServer,
+                      succeed((StepResult.SUCCESS, [])))
+        self.throttle.expire()
+        self._run('t1', CreateServer)
+        self.assertEqual(self.deferreds, [])
+        self.clock.advance(0.5)
+        self.throttle.expire()
+        self.clock.advance(0.5)
+        self.assertEqual(len(self.deferreds), 1)
+
+    def test_expire(self):
+        """
+        :meth:`StepThrottle.expire` forgets lanes with no steps in flight
+        whose token bucket is full again, and rate limiting that has ended.
+        """
+        self.throttle.limits = {
+            CreateServer: StepLimit(rate=1, burst=1),
+            DeleteServer: StepLimit(concurrency=1)}
+        self._run('t1', CreateServer, succeed((StepResult.SUCCESS, [])))
+        self._run('t2', DeleteServer)
+        self._run('t3', DeleteServer, succeed((StepResult.SUCCESS, [])))
+        self.throttle._rate_limited = {('t1', 'service'): 1}
+        self.throttle.expire()
+        self.assertEqual(sorted(self.throttle._lanes),
+                         [('t1', CreateServer), ('t2', DeleteServer)])
+        self.clock.advance(1)
+        self.throttle.expire()
+        self.assertEqual(self.throttle._lanes.keys(), [('t2', DeleteServer)])
+        self.assertEqual(self.throttle._rate_limited, {})
+        self.deferreds[0].callback((StepResult.SUCCESS, []))
+        self.throttle.expire()
+        self.assertEqual(self.throttle._lanes, {})
+
+    def test_rate_limited_error(self):
+        """
+        When a step fails with a rate limiting error, the tenant's steps using
+        the same service are not run but retried, until the time given by the
+        error has passed.
+        """
+        error = NovaRateLimitError('slow down')
+        error.retry_after = '30'
+        d = self._run('t1', CreateServer, fail(error))
+        self.failureResultOf(d, NovaRateLimitError)
+
+        result = self.successResultOf(self._run('t1', DeleteServer))
+        self.assertEqual(
+            result,
+            (StepResult.RETRY,
+             [ErrorReason.String(
+                 'rate-limited by CLOUD_SERVERS for 30 more seconds')]))
+        self.assertEqual(self.deferreds, [])
+        # other services and tenants are not held back
+        self._run('t1', AddNodesToCLB)
+        self._run('t2', CreateServer)
+        self.assertEqual(len(self.deferreds), 2)
+        self.clock.advance(30)
+        self._run('t1', CreateServer)
+        self.assertEqual(len(self.deferreds), 3)
+
+    def test_rate_limited_reason(self):
+        """
+        When a step's result has a rate limiting error as reason, the
+        tenant's steps using the same service are held back too. A timestamp
+        given by the error is when to retry.
+        """
+        self.clock.advance(1434234600)  # 2015-06-13T22:30:00Z
+        error = CLBRateLimitError('slow down')
+        error.retry_after = '2015-06-13T22:30:10Z'
+        self._run('t1', AddNodesToCLB, succeed(
+            (StepResult.RETRY,
+             [ErrorReason.Exception(raise_to_exc_info(error))])))
+        self.successResultOf(self._run('t1', AddNodesToCLB))
+        self.assertEqual(self.deferreds, [])
+        self.clock.advance(10)
+        self._run('t1', AddNodesToCLB)
+        self.assertEqual(len(self.deferreds), 1)
+
+    def test_rate_limited_default(self):
+        """
+        When a rate limiting error does not tell when to retry, the tenant's
+        steps are held back for :data:`DEFAULT_RETRY_AFTER` seconds.
+        """
+        self.failureResultOf(
+            self._run('t1', CreateServer, fail(NovaRateLimitError('slow'))),
+            NovaRateLimitError)
+        self.clock.advance(DEFAULT_RETRY_AFTER - 1)
+        self.successResultOf(self._run('t1', CreateServer))
+        self.assertEqual(self.deferreds, [])
+        self.clock.advance(1)
+        self._run('t1', CreateServer)
+        self.assertEqual(len(self.deferreds), 1)
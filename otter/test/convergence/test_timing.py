@@ -0,0 +1,114 @@
+"""Tests for :mod:`otter.convergence.timing`."""
+
+from effect import Effect, Error, Func, sync_perform
+
+from twisted.internet.task import Clock
+from twisted.trial.unittest import SynchronousTestCase
+
+from otter.convergence.timing import (
+    Histogram, TimingRegistry, get_timing_dispatcher, timed)
+from otter.test.utils import test_dispatcher
+
+
+class HistogramTests(SynchronousTestCase):
+    """
+    Tests for :obj:`Histogram`.
+    """
+
+    def test_observe(self):
+        """
+        Values are counted in the first bucket whose bound they do not
+        exceed, and values above every bound overflow to ``+Inf``.
+        """
+        histogram = Histogram((1, 5))
+        for value in (0.5, 1, 3, 7, 9):
+            histogram.observe(value)
+        self.assertEqual(
+            histogram.as_json(),
+            {'count': 5, 'sum': 20.5,
+             'buckets': [[1, 2], [5, 3], ['+Inf', 5]]})
+
+    def test_empty(self):
+        """
+        A histogram without values has all buckets at 0.
+        """
+        self.assertEqual(
+            Histogram((1,)).as_json(),
+            {'count': 0, 'sum': 0.0, 'buckets': [[1, 0], ['+Inf', 0]]})
+
+
+class TimingRegistryTests(SynchronousTestCase):
+    """
+    Tests for :obj:`TimingRegistry`.
+    """
+
+    def test_as_json(self):
+        """
+        Latencies and outcomes are kept per name.
+        """
+        registry = TimingRegistry((1,))
+        registry.observe('plan', 0.5, 'success')
+        registry.observe('plan', 2, 'error')
+        registry.observe('gather', 0.1, 'success')
+        self.assertEqual(
+            registry.as_json(),
+            {'plan': {'latency': {'count': 2, 'sum': 2.5,
+                                  'buckets': [[1, 1], ['+Inf', 2]]},
+                      'outcomes': {'success': 1, 'error': 1}},
+             'gather': {'latency': {'count': 1, 'sum': 0.1,
+                                    'buckets': [[1, 1], ['+Inf', 1]]},
+                        'outcomes': {'success': 1}}})
+
+
+class PerformTimedTests(SynchronousTestCase):
+    """
+    Tests for performing :obj:`Timed`.
+    """
+
+    def setUp(self):
+        self.clock = Clock()
+        self.registry = TimingRegistry()
+        self.dispatcher = test_dispatcher(
+            get_timing_dispatcher(self.clock, self.registry))
+
+    def _observed(self, name):
+        latency = self.registry.as_json()[name]['latency']
+        return latency['count'], latency['sum']
+
+    def test_success(self):
+        """
+        The result of the effect is returned and the time it took is recorded
+        with ``success`` outcome.
+        """
+        def work():
+            self.clock.advance(3)
+            return 'result'
+
+        self.assertEqual(
+            sync_perform(self.dispatcher, timed('work', Effect(Func(work)))),
+            'result')
+        self.assertEqual(self._observed('work'), (1, 3))
+        self.assertEqual(self.registry.as_json()['work']['outcomes'],
+                         {'success': 1})
+
+    def test_outcome(self):
+        """
+        The outcome is got from the result with the given function.
+        """
+        eff = timed('work', Effect(Func(lambda: 'result')),
+                    lambda result: result.upper())
+        sync_perform(self.dispatcher, eff)
+        self.assertEqual(self.registry.as_json()['work']['outcomes'],
+                         {'RESULT': 1})
+
+    def test_error(self):
+        """
+        The error of the effect is propagated and recorded with ``error``
+        outcome.
+        """
+        eff = timed('work', Effect(Error(ValueError('boom'))),
+                    lambda result: self.fail('outcome called'))
+        self.assertRaises(ValueError, sync_perform, self.dispatcher, eff)
+        self.assertEqual(self._observed('work'), (1, 0))
+        self.assertEqual(self.registry.as_json()['work']['outcomes'],
+                         {'error': 1})
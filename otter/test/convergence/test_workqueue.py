@@ -0,0 +1,181 @@
+"""Tests for :mod:`otter.convergence.workqueue`."""
+
+from effect import (
+    ComposedDispatcher, Effect, TypeDispatcher, base_dispatcher,
+    sync_performer)
+
+from twisted.internet.defer import Deferred
+from twisted.trial.unittest import SynchronousTestCase
+
+from txeffect import deferred_performer, perform
+
+from otter.convergence.workqueue import (
+    ConvergenceQueue,
+    QueuedConvergence,
+    get_queue_dispatcher)
+
+
+class ConvergenceQueueTests(SynchronousTestCase):
+    """
+    Tests for :obj:`ConvergenceQueue` and performing
+    :obj:`QueuedConvergence` with it.
+    """
+
+    def setUp(self):
+        self.queue = ConvergenceQueue(max_in_flight=2)
+        self.started = []
+        self.deferreds = {}
+
+        @deferred_performer
+        def perform_converge(dispatcher, intent):
+            group_id = intent[1]
+            self.started.append(group_id)
+            self.deferreds[group_id] = Deferred()
+            return self.deferreds[group_id]
+
+        self.dispatcher = ComposedDispatcher([
+            get_queue_dispatcher(self.queue),
+            TypeDispatcher({tuple: perform_converge}),
+            base_dispatcher])
+
+    def _submit(self, tenant_id, group_id, version=1, waiting=False):
+        return perform(
+            self.dispatcher,
+            Effect(QueuedConvergence(
+                tenant_id, group_id, version, waiting,
+                Effect(('converge', group_id)))))
+
+    def _finish(self, group_id, result=None):
+        self.deferreds.pop(group_id).callback(result)
+
+    def test_max_in_flight(self):
+        """
+        No more than ``max_in_flight`` convergences run at once. Queued ones
+        start as running ones finish, and get their results.
+        """
+        d1 = self._submit('t1', 'g1')
+        self._submit('t2', 'g2')
+        d3 = self._submit('t3', 'g3')
+        self.assertEqual(self.started, ['g1', 'g2'])
+        self.assertEqual((self.queue.in_flight, len(self.queue)), (2, 1))
+        self._finish('g1', 'result1')
+        self.assertEqual(self.successResultOf(d1), 'result1')
+        self.assertEqual(self.started, ['g1', 'g2', 'g3'])
+        self._finish('g3', 'result3')
+        self.assertEqual(self.successResultOf(d3), 'result3')
+        self.assertEqual((self.queue.in_flight, len(self.queue)), (1, 0))
+
+    def test_failure(self):
+        """
+        A failed convergence fails its submission and makes room for the
+        next one.
+        """
+        self.queue.max_in_flight = 1
+        d1 = self._submit('t1', 'g1')
+        self._submit('t1', 'g2')
+        self.deferreds.pop('g1').errback(ValueError('boom'))
+        self.failureResultOf(d1, ValueError)
+        self.assertEqual(self.started, ['g1', 'g2'])
+
+    def test_synchronous(self):
+        """
+        Convergences that finish synchronously make room for the next ones.
+        """
+        self.queue.max_in_flight = 1
+        dispatcher = ComposedDispatcher([
+            get_queue_dispatcher(self.queue),
+            TypeDispatcher({
+                tuple: sync_performer(lambda d, i: 'converged ' + i[1])})])
+        results = [
+            perform(dispatcher, Effect(QueuedConvergence(
+                't1', group_id, 1, False, Effect(('converge', group_id)))))
+            for group_id in ('g1', 'g2', 'g3')]
+        self.assertEqual([self.successResultOf(d) for d in results],
+                         ['converged g1', 'converged g2', 'converged g3'])
+        self.assertEqual(self.queue.in_flight, 0)
+
+    def test_already_queued(self):
+        """
+        A group that is already queued is not queued again.
+        """
+        self.queue.max_in_flight = 1
+        self._submit('t1', 'blocker')
+        self._submit('t1', 'g1')
+        d = self._submit('t1', 'g1', version=2)
+        self.assertIsNone(self.successResultOf(d))
+        self.assertEqual(len(self.queue), 1)
+
+    def test_retain(self):
+        """
+        The flag versions of groups that are not retained are forgotten, so
+        they are new again when they are next queued.
+        """
+        for group_id in ('kept', 'gone'):
+            self._submit('t1', group_id)
+            self._finish(group_id)
+        self.queue.retain(lambda group_id: group_id == 'kept')
+        self.assertEqual(self.queue._versions, {'kept': 1})
+        self.queue.max_in_flight = 1
+        self._submit('t1', 'blocker')
+        self._submit('t1', 'kept')
+        self._submit('t1', 'gone')
+        self.assertEqual(self._started_in_turn(), ['gone', 'kept'])
+
+    def test_retain_drops_queued(self):
+        """
+        Queued convergences of groups that are not retained are dropped:
+        they never start, and their submissions succeed with None.
+        """
+        self.queue.max_in_flight = 1
+        self._submit('t1', 'blocker')
+        d_gone = self._submit('t1', 'gone')
+        d_kept = self._submit('t2', 'kept')
+        self.queue.retain(lambda group_id: group_id != 'gone')
+        self.assertIsNone(self.successResultOf(d_gone))
+        self.assertEqual(len(self.queue), 1)
+        self.assertEqual(self._started_in_turn(), ['kept'])
+        self.assertIsNone(self.successResultOf(d_kept))
+        self._submit('t1', 'gone')
+        self.assertEqual(self.started, ['kept', 'gone'])
+
+    def _started_in_turn(self):
+        """
+        Finish the running convergences one at a time and return the
+        convergences started in turn.
+        """
+        del self.started[:]
+        while self.deferreds:
+            self._finish(sorted(self.deferreds)[0])
+        return self.started
+
+    def test_priority(self):
+        """
+        Groups marked divergent since their convergence last started go
+        first, and groups waiting on LIMITED_RETRY steps go last.
+        """
+        for group_id in ('new', 'continuing', 'waiting'):
+            self._submit('t1', group_id)
+            self._finish(group_id)
+        self.queue.max_in_flight = 1
+        self._submit('t1', 'blocker')
+        self._submit('t1', 'waiting', waiting=True)
+        self._submit('t1', 'continuing')
+        self._submit('t1', 'new', version=2)
+        self._submit('t1', 'unseen', waiting=True)
+        self.assertEqual(self._started_in_turn(),
+                         ['new', 'unseen', 'continuing', 'waiting'])
+
+    def test_tenant_fairness(self):
+        """
+        Convergences of the same priority are started round-robin between
+        tenants.
+        """
+        self.queue.max_in_flight = 1
+        self._submit('z', 'blocker')
+        for group_id in ('a1', 'a2', 'a3'):
+            self._submit('a', group_id)
+        self._submit('b', 'b1')
+        self._submit('c', 'c1')
+        self._submit('c', 'c2')
+        self.assertEqual(self._started_in_turn(),
+                         ['a1', 'b1', 'c1', 'a2', 'c2', 'a3'])
@@ -1,6 +1,7 @@
 """
 Tests for :mod:`otter.models.cass`
 """
+import hashlib
 import itertools
 import json
 from collections import namedtuple
@@ -35,18 +36,27 @@ from txeffect import deferred_performer
 
 from otter.json_schema import group_examples
 from otter.models.cass import (
+    ACTIVE_CACHES_PER_QUERY,
+    ACTIVE_CACHE_TTL,
     CQLQueryExecute,
+    CapabilityCache,
     CassAdmin,
+    CassCLBNodeDrainedAtCache,
     CassScalingGroup,
     CassScalingGroupCollection,
     CassScalingGroupServersCache,
+    GroupDocumentCache,
+    StateConflictError,
     WeakLocks,
     _assemble_webhook_from_row,
     assemble_webhooks_in_policies,
     cql_eff,
+    decode_server_blob,
+    encode_server_blob,
     get_cql_dispatcher,
     perform_cql_query,
     serialize_json_data,
+    token_ranges,
     verified_view
 )
 from otter.models.interface import (
@@ -71,6 +81,7 @@ from otter.test.utils import (
     LockMixin,
     matches,
     mock_log,
+    noop,
     patch,
     test_dispatcher)
 from otter.util.config import set_config_data
@@ -366,6 +377,131 @@ scaling_group_entry = {
 }
 
 
+class GroupDocumentCacheTests(SynchronousTestCase):
+    """
+    Tests for :obj:`GroupDocumentCache`
+    """
+
+    def setUp(self):
+        self.clock = Clock()
+        self.clock.advance(10)
+        self.cache = GroupDocumentCache(self.clock, size=2, ttl=30)
+
+    def test_get_set(self):
+        """
+        Documents set are got until ``ttl`` seconds after they were fetched.
+        """
+        self.assertIsNone(self.cache.get('t', 'g', 'doc'))
+        self.cache.set('t', 'g', 'doc', 'value', 5)
+        self.assertEqual(self.cache.get('t', 'g', 'doc'), 'value')
+        self.assertIsNone(self.cache.get('t', 'g', 'other'))
+        self.assertIsNone(self.cache.get('t', 'g2', 'doc'))
+        self.clock.advance(24)
+        self.assertEqual(self.cache.get('t', 'g', 'doc'), 'value')
+        self.clock.advance(1)
+        self.assertIsNone(self.cache.get('t', 'g', 'doc'))
+
+    def test_lru(self):
+        """
+        Documents of at most ``size`` groups are kept, evicting the least
+        recently used group.
+        """
+        self.cache.set('t', 'g1', 'doc', 'v1', 10)
+        self.cache.set('t', 'g2', 'doc', 'v2', 10)
+        self.cache.get('t', 'g1', 'doc')
+        self.cache.set('t', 'g3', 'doc', 'v3', 10)
+        self.assertEqual(
+            [self.cache.get('t', g, 'doc') for g in ('g1', 'g2', 'g3')],
+            ['v1', None, 'v3'])
+
+    def test_size_0(self):
+        """Nothing is cached if ``size`` is 0."""
+        self.cache.size = 0
+        self.cache.set('t', 'g', 'doc', 'value', 10)
+        self.assertIsNone(self.cache.get('t', 'g', 'doc'))
+
+    def test_invalidate(self):
+        """
+        Invalidated documents are not got, and documents fetched before they
+        were invalidated are not cached.
+        """
+        self.cache.set('t', 'g', 'doc', 'value', 10)
+        self.cache.set('t', 'g', 'other', 'value', 10)
+        self.cache.invalidate('t', 'g', 'doc')
+        self.assertIsNone(self.cache.get('t', 'g', 'doc'))
+        self.assertEqual(self.cache.get('t', 'g', 'other'), 'value')
+        self.cache.set('t', 'g', 'doc', 'stale', 9)
+        self.assertIsNone(self.cache.get('t', 'g', 'doc'))
+        self.cache.set('t', 'g', 'doc', 'new', 11)
+        self.assertEqual(self.cache.get('t', 'g', 'doc'), 'new')
+
+    def test_invalidate_group(self):
+        """
+        All documents of a group are invalidated if no name is given.
+        """
+        self.cache.set('t', 'g', 'doc', 'value', 10)
+        self.cache.invalidate('t', 'g')
+        self.assertIsNone(self.cache.get('t', 'g', 'doc'))
+        self.cache.set('t', 'g', 'other', 'stale', 9)
+        self.assertIsNone(self.cache.get('t', 'g', 'other'))
+
+
+class CapabilityCacheTests(SynchronousTestCase):
+    """
+    Tests for :obj:`CapabilityCache`
+    """
+
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = CapabilityCache(self.clock, size=2, ttl=30,
+                                     unknown_ttl=5)
+
+    def test_get_set(self):
+        """
+        Policies of hashes are kept for ``ttl`` seconds, and hashes that do
+        not exist for ``unknown_ttl`` seconds.
+        """
+        self.assertEqual(self.cache.get('h1'), (False, None))
+        self.cache.set('h1', ('t', 'g', 'p'))
+        self.cache.set('h2', None)
+        self.assertEqual(self.cache.get('h1'), (True, ('t', 'g', 'p')))
+        self.assertEqual(self.cache.get('h2'), (True, None))
+        self.clock.advance(5)
+        self.assertEqual(self.cache.get('h2'), (False, None))
+        self.clock.advance(25)
+        self.assertEqual(self.cache.get('h1'), (False, None))
+
+    def test_lru(self):
+        """
+        At most ``size`` hashes are kept, evicting the least recently used.
+        """
+        self.cache.set('h1', ('t', 'g', 'p1'))
+        self.cache.set('h2', ('t', 'g', 'p2'))
+        self.cache.get('h1')
+        self.cache.set('h3', ('t', 'g', 'p3'))
+        self.assertEqual([self.cache.get(h)[0] for h in ('h1', 'h2', 'h3')],
+                         [True, False, True])
+
+    def test_invalidate(self):
+        """
+        Hashes of a group's webhooks, or only of one of its policies, are
+        invalidated.
+        """
+        self.cache.size = 10
+        self.cache.set('h1', ('t', 'g', 'p1'))
+        self.cache.set('h2', ('t', 'g', 'p2'))
+        self.cache.set('h3', ('t', 'g2', 'p3'))
+        self.cache.set('h4', None)
+        self.cache.invalidate('t', 'g', 'p1')
+        self.assertEqual(
+            [self.cache.get(h)[0] for h in ('h1', 'h2', 'h3', 'h4')],
+            [False, True, True, True])
+        self.cache.invalidate('t', 'g')
+        self.assertEqual(
+            [self.cache.get(h)[0] for h in ('h2', 'h3', 'h4')],
+            [False, True, True])
+
+
 class CassScalingGroupTestCase(IScalingGroupProviderMixin, LockMixin,
                                SynchronousTestCase):
     """
@@ -1919,6 +2055,19 @@ class CassScalingGroupTests(CassScalingGroupTestCase):
         self.connection.execute.assert_called_once_with(
             expectedCql, expectedData, ConsistencyLevel.QUORUM)
 
+    @mock.patch('otter.models.cass.CassScalingGroup.get_webhook')
+    def test_delete_webhook_invalidates_capabilities(self, mock_gw):
+        """
+        Deleting a webhook invalidates the capability hashes of its policy.
+        """
+        self.returns = [None]
+        mock_gw.return_value = defer.succeed(
+            {'data': '{}', 'capability': {"version": "1", "hash": "h"}})
+        self.group.capability_cache = CapabilityCache(self.clock)
+        self.group.capability_cache.set('h', ('11111', '12345678g', '3444'))
+        self.successResultOf(self.group.delete_webhook('3444', '4555'))
+        self.assertEqual(self.group.capability_cache.get('h'), (False, None))
+
     @mock.patch('otter.models.cass.CassScalingGroup.get_webhook',
                 return_value=defer.fail(NoSuchWebhookError(*range(4))))
     def test_delete_non_existant_webhooks(self, mock_gw):
@@ -2235,6 +2384,221 @@ class GetPolicyTests(CassScalingGroupTestCase):
         self.flushLoggedErrors(NoSuchPolicyError)
 
 
+class ModifyStateCASTests(CassScalingGroupTestCase):
+    """
+    Tests for :func:`CassScalingGroup.modify_state` with compare-and-set.
+    """
+
+    def setUp(self):
+        super(ModifyStateCASTests, self).setUp()
+        set_config_data({'modify_state': {'strategy': 'cas',
+                                          'cas_attempts': 2}})
+        self.states = []
+        self.serial = patch(self, 'otter.models.cass.serialize_json_data',
+                            side_effect=lambda *args: _S(args[0]))
+
+    def row(self, version):
+        """Return group row with given state version."""
+        return merge(scaling_group_entry,
+                     {'tenantId': self.tenant_id, 'groupId': self.group_id,
+                      'state_version': version})
+
+    def modifier(self, group, state):
+        """Record the state and return a new one."""
+        self.states.append(state)
+        return GroupState(self.tenant_id, self.group_id, 'a', {}, {}, None,
+                          {}, True, ScalingGroupStatus.ACTIVE, desired=5)
+
+    def cas_call(self, version):
+        """Expected call writing state if version is ``version``."""
+        return mock.call(
+            'UPDATE scaling_group SET active = :active, pending = :pending, '
+            '"groupTouched" = :groupTouched, '
+            '"policyTouched" = :policyTouched, paused = :paused, '
+            'desired = :desired, state_version = :new_version '
+            'WHERE "tenantId" = :tenantId AND "groupId" = :groupId '
+            'IF state_version = :version AND group_config = :group_config',
+            {"tenantId": self.tenant_id, "groupId": self.group_id,
+             "active": _S({}), "pending": _S({}),
+             "groupTouched": '0001-01-01T00:00:00Z',
+             "policyTouched": _S({}), "paused": True, "desired": 5,
+             "version": version, "new_version": 'timeuuid',
+             "group_config": scaling_group_entry['group_config']},
+            ConsistencyLevel.QUORUM)
+
+    def conflict(self, version):
+        """Result of a write that was not applied due to ``version``."""
+        return [{'[applied]': False, 'state_version': version,
+                 'group_config': scaling_group_entry['group_config']}]
+
+    def test_succeeds(self):
+        """
+        The state is written if its version is still the one read, without
+        taking the ZooKeeper lock.
+        """
+        self.returns = [[self.row('v1')], [{'[applied]': True}]]
+        d = self.group.modify_state(self.modifier,
+                                    modify_state_retryable=True)
+        self.assertIsNone(self.successResultOf(d))
+        self.assertEqual(len(self.states), 1)
+        self.assertEqual(self.states[0].desired, 0)
+        view_call = mock.call(
+            'SELECT "tenantId", "groupId", group_config, '
+            'launch_config, active, pending, "groupTouched", '
+            '"policyTouched", paused, desired, created_at, status, '
+            'error_reasons, deleting, state_version FROM scaling_group '
+            'WHERE "tenantId" = :tenantId AND "groupId" = :groupId',
+            {"tenantId": self.tenant_id, "groupId": self.group_id},
+            ConsistencyLevel.QUORUM)
+        self.assertEqual(self.connection.execute.mock_calls,
+                         [view_call, self.cas_call('v1')])
+        self.assertFalse(self.kz_client.Lock.called)
+
+    def test_retries(self):
+        """
+        When the state's version changed, the state is read and modified
+        again.
+        """
+        self.returns = [[self.row(None)], self.conflict('v2'),
+                        [self.row('v2')], [{'[applied]': True}]]
+        d = self.group.modify_state(self.modifier,
+                                    modify_state_retryable=True)
+        self.assertIsNone(self.successResultOf(d))
+        self.assertEqual(len(self.states), 2)
+        calls = self.connection.execute.mock_calls
+        self.assertEqual([calls[1], calls[3]],
+                         [self.cas_call(None), self.cas_call('v2')])
+
+    def test_gives_up(self):
+        """
+        :obj:`StateConflictError` is raised when the state's version changed
+        in each of ``cas_attempts`` attempts.
+        """
+        self.returns = [[self.row('v1')], self.conflict('v2'),
+                        [self.row('v2')], self.conflict('v3')]
+        d = self.group.modify_state(self.modifier,
+                                    modify_state_retryable=True)
+        self.failureResultOf(d, StateConflictError)
+        self.assertEqual(len(self.states), 2)
+
+    def test_group_deleted(self):
+        """
+        :obj:`NoSuchScalingGroupError` is raised without retrying when the
+        group is deleted before the state is written, since the write then
+        finds no group config.
+        """
+        self.returns = [[self.row(None)], [{'[applied]': False}]]
+        d = self.group.modify_state(self.modifier,
+                                    modify_state_retryable=True)
+        self.failureResultOf(d, NoSuchScalingGroupError)
+        self.assertEqual(len(self.states), 1)
+        self.assertEqual(self.connection.execute.call_count, 2)
+
+    def test_not_retryable(self):
+        """
+        A modifier not marked retryable is called once holding the
+        ZooKeeper lock, and a conflict writing its state fails with
+        :obj:`StateConflictError` rather than calling it again.
+        """
+        self.returns = [[self.row('v1')], self.conflict('v2')]
+        d = self.group.modify_state(self.modifier)
+        self.failureResultOf(d, StateConflictError)
+        self.assertEqual(len(self.states), 1)
+        self.assertEqual(self.connection.execute.mock_calls[1],
+                         self.cas_call('v1'))
+        self.kz_client.Lock.assert_called_once_with(
+            '/locks/' + self.group.uuid)
+        self.lock._acquire.assert_called_once_with(timeout=120)
+        self.lock.release.assert_called_once_with()
+
+    def test_modifier_error(self):
+        """
+        The state is not written if the modifier fails.
+        """
+        self.returns = [[self.row('v1')]]
+
+        def modifier(group, state):
+            raise ValueError('bad')
+
+        d = self.group.modify_state(modifier, modify_state_retryable=True)
+        self.failureResultOf(d, ValueError)
+        self.assertEqual(self.connection.execute.call_count, 1)
+
+
+class CachedDocumentsTests(CassScalingGroupTestCase):
+    """
+    Tests for getting documents of :obj:`CassScalingGroup` from its
+    ``group_cache``.
+    """
+
+    def setUp(self):
+        super(CachedDocumentsTests, self).setUp()
+        self.group.group_cache = GroupDocumentCache(self.clock, ttl=30)
+
+    def test_view_config(self):
+        """
+        ``view_config(cached=True)`` gets the config from the cache until it
+        expires. Configs are cached even if fetched without ``cached``.
+        """
+        row = {'group_config': '{"name": "a"}', 'created_at': 24}
+        self.returns = [[row], [row]]
+        self.assertEqual(self.successResultOf(self.group.view_config()),
+                         {'name': 'a'})
+        self.assertEqual(
+            self.successResultOf(self.group.view_config(cached=True)),
+            {'name': 'a'})
+        self.assertEqual(self.connection.execute.call_count, 1)
+        self.clock.advance(30)
+        self.successResultOf(self.group.view_config(cached=True))
+        self.assertEqual(self.connection.execute.call_count, 2)
+
+    def test_view_launch_config(self):
+        """
+        ``view_launch_config(cached=True)`` gets the launch config from the
+        cache.
+        """
+        self.returns = [[{'launch_config': '{"type": "launch_server"}',
+                          'created_at': 24}]]
+        for _ in range(2):
+            self.assertEqual(
+                self.successResultOf(
+                    self.group.view_launch_config(cached=True)),
+                {'type': 'launch_server'})
+        self.assertEqual(self.connection.execute.call_count, 1)
+
+    def test_update_config_invalidates(self):
+        """
+        Updating the config invalidates the cached config.
+        """
+        row = {'group_config': '{}', 'created_at': 24}
+        self.returns = [[row], None, [row]]
+        self.successResultOf(self.group.update_config({'name': 'b'}))
+        self.clock.advance(1)
+        self.successResultOf(self.group.view_config(cached=True))
+        self.assertEqual(self.connection.execute.call_count, 3)
+
+    def test_get_policy(self):
+        """
+        ``get_policy(cached=True)`` gets the policy from the cache, unless
+        its version is not the one asked for.
+        """
+        config_row = {'group_config': '{}', 'created_at': 24}
+        self.returns = [[config_row],
+                        [{'data': '{"name": "p"}', 'version': 'v1'}],
+                        [{'data': '{"name": "p2"}', 'version': 'v2'}]]
+        for _ in range(2):
+            self.assertEqual(
+                self.successResultOf(
+                    self.group.get_policy('p1', 'v1', cached=True)),
+                {'name': 'p'})
+        self.assertEqual(self.connection.execute.call_count, 2)
+        self.assertEqual(
+            self.successResultOf(
+                self.group.get_policy('p1', 'v2', cached=True)),
+            {'name': 'p2'})
+        self.assertEqual(self.connection.execute.call_count, 3)
+
+
 class ViewManifestTests(CassScalingGroupTestCase):
     """
     Tests for :func:`view_manifest`
@@ -2962,6 +3326,32 @@ class CassScalingScheduleCollectionTestCase(
             [mock.call(fetch_cql, fetch_data, ConsistencyLevel.QUORUM),
              mock.call(del_cql, del_data, ConsistencyLevel.QUORUM)])
 
+    def test_fetch_events(self):
+        """
+        `fetch_events` fetches events up to the given time without deleting
+        them.
+        """
+        events = [{'tenantId': '1d2', 'groupId': 'gr2', 'policyId': 'ef',
+                   'trigger': 100, 'cron': 'c1', 'version': 'uuid1'}]
+        self.returns = [events]
+        result = self.successResultOf(
+            self.collection.fetch_events(2, 1234, 10))
+        self.assertEqual(result, events)
+        self.connection.execute.assert_called_once_with(
+            'SELECT "tenantId", "groupId", "policyId", "trigger", '
+            'cron, version '
+            'FROM scaling_schedule_v2 '
+            'WHERE bucket = :bucket AND trigger <= :now LIMIT :size;',
+            {'bucket': 2, 'now': 1234, 'size': 10}, ConsistencyLevel.QUORUM)
+
+    def test_delete_no_events(self):
+        """
+        `delete_events` does not query Cassandra when there are no events.
+        """
+        d = self.collection.delete_events(2, [])
+        self.assertIsNone(self.successResultOf(d))
+        self.assertFalse(self.connection.execute.called)
+
     def test_add_cron_events(self):
         """
         Tests for `add_cron_events`
@@ -3541,6 +3931,71 @@ class CassScalingGroupsCollectionTestCase(IScalingGroupCollectionProviderMixin,
                                         paused=False,
                                         status=ScalingGroupStatus.ACTIVE)])
 
+    def _cache_row(self, group_id, server_id, as_active=True):
+        return {'groupId': group_id, 'server_as_active': as_active,
+                'server_blob': '{{"id": "{}"}}'.format(server_id),
+                'last_update': '2010-10-20T00:00:00', 'generation': None}
+
+    def test_get_active_caches(self):
+        """
+        ``get_active_caches`` gets the active servers of all the groups with
+        one query, and keeps them for :data:`ACTIVE_CACHE_TTL` seconds
+        """
+        self.returns = [[self._cache_row('g1', 's1'),
+                         self._cache_row('g1', 's2', False),
+                         self._cache_row('g2', 's3')]]
+        d = self.collection.get_active_caches('123', ['g1', 'g2', 'g3'])
+        caches = {'g1': {'s1': {'id': 's1'}},
+                  'g2': {'s3': {'id': 's3'}},
+                  'g3': {}}
+        self.assertEqual(self.successResultOf(d), caches)
+        self.connection.execute.assert_called_once_with(
+            'SELECT "groupId", server_blob, server_as_active, last_update, '
+            'generation FROM servers_cache WHERE "tenantId"=:tenantId AND '
+            '"groupId" IN (:groupId0, :groupId1, :groupId2);',
+            {'tenantId': '123', 'groupId0': 'g1', 'groupId1': 'g2',
+             'groupId2': 'g3'},
+            ConsistencyLevel.QUORUM)
+
+        # cached
+        self.clock.advance(ACTIVE_CACHE_TTL - 1)
+        d = self.collection.get_active_caches('123', ['g1', 'g2'])
+        self.assertEqual(self.successResultOf(d),
+                         {'g1': caches['g1'], 'g2': caches['g2']})
+        self.assertEqual(self.connection.execute.call_count, 1)
+
+        # only expired or new ones are fetched
+        self.returns = [[self._cache_row('g1', 's4')]]
+        self.clock.advance(1)
+        d = self.collection.get_active_caches('123', ['g1'])
+        self.assertEqual(self.successResultOf(d),
+                         {'g1': {'s4': {'id': 's4'}}})
+        self.assertEqual(self.connection.execute.call_count, 2)
+
+    def test_get_active_caches_many(self):
+        """
+        ``get_active_caches`` fetches the servers caches of at most
+        :data:`ACTIVE_CACHES_PER_QUERY` groups with one query
+        """
+        group_ids = ['g{}'.format(i) for i in range(ACTIVE_CACHES_PER_QUERY)]
+        self.returns = [[self._cache_row('g0', 's1')],
+                        [self._cache_row('x', 's2')]]
+        d = self.collection.get_active_caches('123', group_ids + ['x'])
+        caches = self.successResultOf(d)
+        self.assertEqual(caches['g0'], {'s1': {'id': 's1'}})
+        self.assertEqual(caches['x'], {'s2': {'id': 's2'}})
+        self.assertEqual(self.connection.execute.call_count, 2)
+
+    def test_get_active_caches_error(self):
+        """
+        ``get_active_caches`` fails with the error of fetching the caches,
+        and does not keep anything
+        """
+        self.returns = [ValueError('bad')]
+        d = self.collection.get_active_caches('123', ['g1'])
+        self.failureResultOf(d, ValueError)
+        self.assertEqual(self.collection._active_caches, {})
+
     def _extract_execute_query(self, call):
         args, _ = call
         query, params, c = args
@@ -3590,6 +4045,24 @@ class CassScalingGroupsCollectionTestCase(IScalingGroupCollectionProviderMixin,
         self.connection.execute.assert_called_once_with(
             expectedCql, expectedData, ConsistencyLevel.ONE)
 
+    def test_webhook_info_by_hash_cached(self):
+        """
+        `webhook_info_by_hash` gets the info of hashes, and that they do not
+        exist, from the collection's capability cache after fetching them.
+        """
+        self.returns = [_cassandrify_data([
+            {'tenantId': '123', 'groupId': 'group1', 'policyId': 'pol1'}]),
+            []]
+        for _ in range(2):
+            self.assertEqual(
+                self.successResultOf(
+                    self.collection.webhook_info_by_hash(self.mock_log, 'x')),
+                ('123', 'group1', 'pol1'))
+            self.failureResultOf(
+                self.collection.webhook_info_by_hash(self.mock_log, 'y'),
+                UnrecognizedCapabilityError)
+        self.assertEqual(self.connection.execute.call_count, 2)
+
     def test_get_counts(self):
         """
         Check get_count returns dictionary in proper format
@@ -3723,6 +4196,68 @@ class CassScalingGroupsCollectionHealthCheckTestCase(
             (True, {'cassandra_time': 0}))
 
 
+class ServerBlobTests(SynchronousTestCase):
+    """
+    Tests for :func:`encode_server_blob` and :func:`decode_server_blob`
+    """
+
+    def setUp(self):
+        self.server = {
+            "id": "a", "name": "srv", "status": "ACTIVE",
+            "created": "2015-01-01T00:00:00Z", "updated": "2015-01-02",
+            "addresses": {"private": [{"addr": "10.0.0.1", "version": 4}]},
+            "metadata": {"rax:auto_scaling_group_id": "gid"},
+            "links": [{"href": "link", "rel": "self"}],
+            "flavor": {"id": "f", "links": [{"href": "flink"}]},
+            "image": {"id": "i", "links": [{"href": "ilink"}]},
+            "OS-EXT-STS:task_state": None,
+            "OS-EXT-IPS-MAC:mac_addr": "aa:bb"}
+        self.compact = {
+            k: v for k, v in self.server.items()
+            if k not in ("updated", "OS-EXT-IPS-MAC:mac_addr")}
+        self.compact.update(flavor={"id": "f"}, image={"id": "i"})
+
+    def test_json(self):
+        """
+        The "json" format is the whole server JSON, without version
+        """
+        blob = encode_server_blob(self.server, 'json')
+        self.assertEqual(blob, json.dumps(self.server, sort_keys=True))
+        self.assertEqual(decode_server_blob(blob), self.server)
+
+    def test_compact(self):
+        """
+        The "compact" format keeps only the keys otter uses
+        """
+        blob = encode_server_blob(self.server, 'compact')
+        self.assertTrue(blob.startswith('c1:{'))
+        self.assertEqual(decode_server_blob(blob), self.compact)
+
+    def test_compressed(self):
+        """
+        The "compressed" format is the compact one compressed
+        """
+        blob = encode_server_blob(self.server, 'compressed')
+        self.assertTrue(blob.startswith('z1:'))
+        self.assertLess(len(blob), len(encode_server_blob(self.server)))
+        self.assertEqual(decode_server_blob(blob), self.compact)
+
+    def test_image_not_dict(self):
+        """
+        Image that is not a dict, as for servers booted from volume, is kept
+        """
+        self.server["image"] = ""
+        blob = encode_server_blob(self.server, 'compact')
+        self.assertEqual(decode_server_blob(blob)["image"], "")
+
+    def test_unknown(self):
+        """
+        Unknown formats and versions are errors
+        """
+        self.assertRaises(ValueError, encode_server_blob, self.server, 'bla')
+        self.assertRaises(ValueError, decode_server_blob, 'x9:{}')
+
+
 class CassGroupServersCacheTests(SynchronousTestCase):
     """
     Tests for :class:`CassScalingGroupServersCache`
@@ -3741,8 +4276,8 @@ class CassGroupServersCacheTests(SynchronousTestCase):
     def _test_get_servers(self, only_as_active, query_result, exp_result):
         sequence = [
             (CQLQueryExecute(
-                query=('SELECT server_blob, server_as_active, last_update '
-                       'FROM servers_cache '
+                query=('SELECT server_blob, server_as_active, last_update, '
+                       'generation FROM servers_cache '
                        'WHERE "tenantId"=:tenantId AND "groupId"=:groupId '
                        'ORDER BY last_update DESC;'),
                 params=self.params, consistency_level=ConsistencyLevel.QUORUM),
@@ -3813,6 +4348,34 @@ class CassGroupServersCacheTests(SynchronousTestCase):
               "server_as_active": True}],
             ([{"d": "e"}], self.dt))
 
+    def test_get_servers_compact(self):
+        """
+        `get_servers` decodes servers in any blob format
+        """
+        self._test_get_servers(
+            False,
+            [{"server_blob": '{"a": "b"}', "last_update": self.dt,
+              "server_as_active": False},
+             {"server_blob": 'c1:{"d":"e"}', "last_update": self.dt,
+              "server_as_active": False},
+             {"server_blob": encode_server_blob({"id": "f"}, 'compressed'),
+              "last_update": self.dt, "server_as_active": False}],
+            ([{"a": "b"}, {"d": "e"}, {"id": "f"}], self.dt))
+
+    def test_get_servers_generation(self):
+        """
+        `get_servers` returns all servers, with the generation as last update
+        time, when the cache was written by `update_servers`
+        """
+        dt_earlier = datetime(2010, 10, 15, 10, 0, 0)
+        rows = [{"server_blob": '{"a": "b"}', "last_update": dt_earlier,
+                 "server_as_active": True, "generation": self.dt},
+                {"server_blob": '{"d": "e"}', "last_update": self.dt,
+                 "server_as_active": False, "generation": self.dt}]
+        self._test_get_servers(
+            False, rows, ([{"a": "b"}, {"d": "e"}], self.dt))
+        self._test_get_servers(True, rows, ([{"a": "b"}], self.dt))
+
     def _test_insert_servers(self, eff, ts=2500000):
         query = (
             'BEGIN BATCH USING TIMESTAMP {} '
@@ -3856,6 +4419,20 @@ class CassGroupServersCacheTests(SynchronousTestCase):
         eff = resolve_effect(eff, None)
         self._test_insert_servers(eff, 3500000)
 
+    def test_insert_servers_blob_format(self):
+        """
+        `insert_servers` encodes servers in the cache's blob format, which
+        defaults to "converger.server_blob_format" config
+        """
+        set_config_data({"converger": {"server_blob_format": "compact"}})
+        self.addCleanup(set_config_data, {})
+        cache = CassScalingGroupServersCache(
+            self.tenant_id, self.group_id, self.clock)
+        self.assertEqual(cache.blob_format, "compact")
+        eff = cache.insert_servers(
+            self.dt, [{"id": "a", "updated": "now"}], clear_others=False)
+        self.assertEqual(eff.intent.params["server_blob0"], 'c1:{"id":"a"}')
+
     def test_insert_empty(self):
         """
         `insert_servers` does nothing if called with empty servers list
@@ -3874,6 +4451,125 @@ class CassGroupServersCacheTests(SynchronousTestCase):
         self.assertEqual(eff.intent, "delete")
         self.assertIsNone(resolve_effect(eff, None))
 
+    def _test_update_servers(self, servers, rows, query, params):
+        """
+        `update_servers` with the given servers performs the given batch when
+        the cache has the given rows
+        """
+        sequence = [
+            (CQLQueryExecute(
+                query=('SELECT last_update, server_id, server_hash FROM '
+                       'servers_cache WHERE "tenantId"=:tenantId AND '
+                       '"groupId"=:groupId;'),
+                params=self.params, consistency_level=ConsistencyLevel.QUORUM),
+             lambda i: rows),
+            (CQLQueryExecute(
+                query=query, params=merge(self.params, params),
+                consistency_level=ConsistencyLevel.QUORUM),
+             noop)]
+        self.assertIsNone(
+            perform_sequence(sequence,
+                             self.cache.update_servers(self.dt, servers)))
+
+    def test_update_servers_new(self):
+        """
+        `update_servers` inserts all servers with their hash, and records the
+        generation, when the cache is empty
+        """
+        self._test_update_servers(
+            [{"id": "a", "_is_as_active": True}, {"id": "b"}], [],
+            'BEGIN BATCH USING TIMESTAMP 2500000 '
+            'INSERT INTO servers_cache ("tenantId", "groupId", last_update, '
+            'server_id, server_blob, server_as_active, server_hash) '
+            'VALUES(:tenantId, :groupId, :last_update, :server_id0, '
+            ':server_blob0, :server_as_active0, :server_hash0); '
+            'INSERT INTO servers_cache ("tenantId", "groupId", last_update, '
+            'server_id, server_blob, server_as_active, server_hash) '
+            'VALUES(:tenantId, :groupId, :last_update, :server_id1, '
+            ':server_blob1, :server_as_active1, :server_hash1); '
+            'UPDATE servers_cache SET generation=:last_update WHERE '
+            '"tenantId"=:tenantId AND "groupId"=:groupId; APPLY BATCH;',
+            {"last_update": self.dt,
+             "server_id0": "a", "server_blob0": '{"id": "a"}',
+             "server_as_active0": True,
+             "server_hash0": hashlib.sha1(
+                 'True:{"id": "a"}').hexdigest(),
+             "server_id1": "b", "server_blob1": '{"id": "b"}',
+             "server_as_active1": False,
+             "server_hash1": hashlib.sha1(
+                 'False:{"id": "b"}').hexdigest()})
+
+    def test_update_servers_diff(self):
+        """
+        `update_servers` leaves unchanged servers alone, rewrites changed
+        ones and deletes those that are gone
+        """
+        earlier = datetime(2010, 10, 15, 10, 0, 0)
+        rows = [
+            {"last_update": earlier, "server_id": "a",
+             "server_hash": hashlib.sha1('True:{"id": "a"}').hexdigest()},
+            {"last_update": earlier, "server_id": "b",
+             "server_hash": hashlib.sha1('True:{"id": "b"}').hexdigest()},
+            {"last_update": earlier, "server_id": "c",
+             "server_hash": hashlib.sha1('True:{"id": "c"}').hexdigest()}]
+        self._test_update_servers(
+            [{"id": "a", "_is_as_active": True}, {"id": "b"}], rows,
+            'BEGIN BATCH USING TIMESTAMP 2500000 '
+            'INSERT INTO servers_cache ("tenantId", "groupId", last_update, '
+            'server_id, server_blob, server_as_active, server_hash) '
+            'VALUES(:tenantId, :groupId, :last_update, :server_id1, '
+            ':server_blob1, :server_as_active1, :server_hash1); '
+            'DELETE FROM servers_cache WHERE "tenantId"=:tenantId AND '
+            '"groupId"=:groupId AND last_update=:old_update0 AND '
+            'server_id=:old_id0; '
+            'DELETE FROM servers_cache WHERE "tenantId"=:tenantId AND '
+            '"groupId"=:groupId AND last_update=:old_update1 AND '
+            'server_id=:old_id1; '
+            'UPDATE servers_cache SET generation=:last_update WHERE '
+            '"tenantId"=:tenantId AND "groupId"=:groupId; APPLY BATCH;',
+            {"last_update": self.dt,
+             "server_id1": "b", "server_blob1": '{"id": "b"}',
+             "server_as_active1": False,
+             "server_hash1": hashlib.sha1(
+                 'False:{"id": "b"}').hexdigest(),
+             "old_update0": earlier, "old_id0": "b",
+             "old_update1": earlier, "old_id1": "c"})
+
+    def test_update_servers_legacy_rows(self):
+        """
+        `update_servers` rewrites servers in rows written by
+        `insert_servers`, which have no hash
+        """
+        earlier = datetime(2010, 10, 15, 10, 0, 0)
+        self._test_update_servers(
+            [{"id": "a"}],
+            [{"last_update": earlier, "server_id": "a",
+              "server_hash": None}],
+            'BEGIN BATCH USING TIMESTAMP 2500000 '
+            'INSERT INTO servers_cache ("tenantId", "groupId", last_update, '
+            'server_id, server_blob, server_as_active, server_hash) '
+            'VALUES(:tenantId, :groupId, :last_update, :server_id0, '
+            ':server_blob0, :server_as_active0, :server_hash0); '
+            'DELETE FROM servers_cache WHERE "tenantId"=:tenantId AND '
+            '"groupId"=:groupId AND last_update=:old_update0 AND '
+            'server_id=:old_id0; '
+            'UPDATE servers_cache SET generation=:last_update WHERE '
+            '"tenantId"=:tenantId AND "groupId"=:groupId; APPLY BATCH;',
+            {"last_update": self.dt,
+             "server_id0": "a", "server_blob0": '{"id": "a"}',
+             "server_as_active0": False,
+             "server_hash0": hashlib.sha1('False:{"id": "a"}').hexdigest(),
+             "old_update0": earlier, "old_id0": "a"})
+
+    def test_update_servers_empty(self):
+        """
+        `update_servers` deletes the whole cache if there are no servers
+        """
+        self.cache.delete_servers = lambda: Effect("delete")
+        self.assertIsNone(
+            perform_sequence([("delete", noop)],
+                             self.cache.update_servers(self.dt, [])))
+
     def test_delete_servers(self):
         """
         `delete_servers` issues query to delete the whole cache
@@ -3885,6 +4581,82 @@ class CassGroupServersCacheTests(SynchronousTestCase):
                     merge(self.params, {"ts": 2500000})))
 
 
+class CassCLBNodeDrainedAtCacheTests(SynchronousTestCase):
+    """
+    Tests for :class:`CassCLBNodeDrainedAtCache`
+    """
+
+    def setUp(self):
+        self.clock = Clock()
+        self.clock.advance(2.5)
+        self.cache = CassCLBNodeDrainedAtCache('tid', self.clock)
+
+    def test_get_drained_at(self):
+        """
+        `get_drained_at` reads the tenant's rows as mapping of
+        (lb_id, node_id) to drained_at
+        """
+        sequence = [
+            (CQLQueryExecute(
+                query=('SELECT lb_id, node_id, drained_at '
+                       'FROM clb_node_drained_at WHERE "tenantId"=:tenantId;'),
+                params={"tenantId": "tid"},
+                consistency_level=ConsistencyLevel.QUORUM),
+             lambda i: [{"lb_id": "1", "node_id": "11", "drained_at": 3.0},
+                        {"lb_id": "2", "node_id": "21", "drained_at": 4.5}])]
+        self.assertEqual(
+            perform_sequence(sequence, self.cache.get_drained_at(),
+                             test_dispatcher(sequence)),
+            {("1", "11"): 3.0, ("2", "21"): 4.5})
+
+    def test_insert_drained_at(self):
+        """
+        `insert_drained_at` inserts all the times in a batch
+        """
+        query = (
+            'BEGIN BATCH USING TIMESTAMP 2500000 '
+            'INSERT INTO clb_node_drained_at ("tenantId", lb_id, node_id, '
+            'drained_at) VALUES(:tenantId, :lb_id0, :node_id0, '
+            ':drained_at0); '
+            'INSERT INTO clb_node_drained_at ("tenantId", lb_id, node_id, '
+            'drained_at) VALUES(:tenantId, :lb_id1, :node_id1, '
+            ':drained_at1); APPLY BATCH;')
+        self.assertEqual(
+            self.cache.insert_drained_at({("2", "21"): 4.5,
+                                          ("1", "11"): 3.0}),
+            cql_eff(query, {"tenantId": "tid",
+                            "lb_id0": "1", "node_id0": "11",
+                            "drained_at0": 3.0,
+                            "lb_id1": "2", "node_id1": "21",
+                            "drained_at1": 4.5}))
+
+    def test_delete_drained_at(self):
+        """
+        `delete_drained_at` deletes all the given nodes in a batch
+        """
+        query = (
+            'BEGIN BATCH USING TIMESTAMP 2500000 '
+            'DELETE FROM clb_node_drained_at WHERE "tenantId"=:tenantId AND '
+            'lb_id=:lb_id0 AND node_id=:node_id0; '
+            'DELETE FROM clb_node_drained_at WHERE "tenantId"=:tenantId AND '
+            'lb_id=:lb_id1 AND node_id=:node_id1; APPLY BATCH;')
+        self.assertEqual(
+            self.cache.delete_drained_at([("2", "21"), ("1", "11")]),
+            cql_eff(query, {"tenantId": "tid",
+                            "lb_id0": "1", "node_id0": "11",
+                            "lb_id1": "2", "node_id1": "21"}))
+
+    def test_empty(self):
+        """
+        `insert_drained_at` and `delete_drained_at` do nothing when given
+        nothing
+        """
+        self.assertEqual(self.cache.insert_drained_at({}),
+                         Effect(Constant(None)))
+        self.assertEqual(self.cache.delete_drained_at([]),
+                         Effect(Constant(None)))
+
+
 class CassAdminTestCase(SynchronousTestCase):
     """
     Tests for :class:`CassAdmin`
@@ -3953,14 +4725,14 @@ class CassAdminTestCase(SynchronousTestCase):
 
 
 class GetScalingGroupsTests(SynchronousTestCase):
-    """Tests for ``get_all_valid_groups``."""
-
-    @mock.patch("otter.models.cass.CassScalingGroupCollection"
-                ".get_scaling_group_rows")
-    def test_success(self, mock_gsgr):
-        clock = Clock()
-        client = mock.Mock(spec=CQLClient)
-        collection = CassScalingGroupCollection(client, clock, 1)
+    """Tests for ``get_all_valid_groups`` and ``scan_valid_groups``."""
+
+    def setUp(self):
+        self.mock_scan = patch(
+            self, ('otter.models.cass.CassScalingGroupCollection.'
+                   'scan_scaling_group_rows'))
+        self.collection = CassScalingGroupCollection(
+            mock.Mock(spec=CQLClient), Clock(), 1)
         rows = [
             {'created_at': '0', 'desired': 'some', 'status': 'ACTIVE'},
             {'desired': 'some', 'status': 'ACTIVE'},  # no created_at
@@ -3969,11 +4741,39 @@ class GetScalingGroupsTests(SynchronousTestCase):
             {'created_at': '0', 'desired': 'some', 'status': 'DISABLED'},
             {'created_at': '0', 'desired': 'some', 'deleting': 'True', },
             {'created_at': '0', 'desired': 'some', 'status': 'ERROR'}]
-        rows = [assoc(row, "tenantId", "t1") for row in rows]
-        mock_gsgr.return_value = defer.succeed(rows)
-        results = self.successResultOf(collection.get_all_valid_groups())
-        self.assertEqual(results, [rows[0], rows[3]])
-        mock_gsgr.assert_called_once_with()
+        self.rows = [assoc(row, "tenantId", "t1") for row in rows]
+
+        def scan(handle_rows, props):
+            handle_rows(self.rows[:3])
+            handle_rows(self.rows[3:])
+            handle_rows(self.rows[4:])
+            return defer.succeed(None)
+
+        self.mock_scan.side_effect = scan
+
+    def test_success(self):
+        """
+        Only valid groups are returned, fetching only the columns telling
+        whether they are valid besides those asked for.
+        """
+        results = self.successResultOf(
+            self.collection.get_all_valid_groups(props=['launch_config']))
+        self.assertEqual(results, [self.rows[0], self.rows[3]])
+        self.mock_scan.assert_called_once_with(
+            mock.ANY, props=['launch_config', 'created_at', 'desired',
+                             'status', 'deleting'])
+
+    def test_scan(self):
+        """
+        ``scan_valid_groups`` hands over each batch of valid groups, skipping
+        batches without any.
+        """
+        batches = []
+        d = self.collection.scan_valid_groups(batches.append)
+        self.assertIsNone(self.successResultOf(d))
+        self.assertEqual(batches, [[self.rows[0]], [self.rows[3]]])
+        self.mock_scan.assert_called_once_with(
+            mock.ANY, props=['created_at', 'desired', 'status', 'deleting'])
 
 
 class GetScalingGroupRowsTests(SynchronousTestCase):
@@ -4076,3 +4876,128 @@ class GetScalingGroupRowsTests(SynchronousTestCase):
             {'limit': 5, 'tenantId': 2}, [])
         d = self.collection.get_scaling_group_rows(batch_size=5)
         self.assertEqual(list(self.successResultOf(d)), groups1 + groups2)
+
+
+class ScanScalingGroupRowsTests(SynchronousTestCase):
+    """Tests for ``scan_scaling_group_rows``."""
+
+    def setUp(self):
+        """Mock"""
+        self.client = mock.Mock(spec=CQLClient)
+        self.collection = CassScalingGroupCollection(self.client, Clock(), 1)
+        self.exec_args = {}
+        self.queries = []
+
+        def _exec(query, params, c):
+            self.queries.append((query, params))
+            return self.exec_args.get(freeze((query, params)),
+                                      defer.succeed([]))
+
+        self.client.execute.side_effect = _exec
+        self.select = 'SELECT * FROM scaling_group WHERE '
+        self.where_range = ('token("tenantId") > :start AND '
+                            'token("tenantId") <= :end LIMIT :limit;')
+        self.batches = []
+
+    def _add_exec_args(self, where, params, ret):
+        self.exec_args[freeze((self.select + where, params))] = ret
+
+    def test_token_ranges(self):
+        """
+        :func:`token_ranges` splits the whole ring into contiguous ranges.
+        """
+        ranges = token_ranges(3)
+        self.assertEqual(len(ranges), 3)
+        self.assertEqual(ranges[0][0], -2 ** 63)
+        self.assertEqual(ranges[-1][1], 2 ** 63 - 1)
+        self.assertEqual([end for _, end in ranges[:-1]],
+                         [start for start, _ in ranges[1:]])
+
+    def test_ranges_in_parallel(self):
+        """
+        Each token range is scanned, at most ``parallel`` of them at a time,
+        and batches are handed over as they are fetched.
+        """
+        ranges = token_ranges(3)
+        pending = [defer.Deferred() for _ in ranges]
+        for (start, end), d in zip(ranges, pending):
+            self._add_exec_args(
+                self.where_range, {'start': start, 'end': end, 'limit': 5},
+                d)
+        d = self.collection.scan_scaling_group_rows(
+            self.batches.append, batch_size=5, ranges=3, parallel=2)
+        self.assertEqual(len(self.queries), 2)
+        pending[1].callback([{'tenantId': 't2', 'groupId': 'g'}])
+        self.assertEqual(self.batches, [[{'tenantId': 't2', 'groupId': 'g'}]])
+        self.assertEqual(len(self.queries), 3)
+        pending[0].callback([])
+        pending[2].callback([{'tenantId': 't3', 'groupId': 'g'}])
+        self.assertIsNone(self.successResultOf(d))
+        self.assertEqual(self.batches,
+                         [[{'tenantId': 't2', 'groupId': 'g'}],
+                          [{'tenantId': 't3', 'groupId': 'g'}]])
+
+    def test_pages_through_range(self):
+        """
+        A range with more rows than the batch size is paged through by
+        getting the remaining groups of the last tenant of a batch and then
+        the tenants after it in the range.
+        """
+        groups1 = [{'tenantId': 1, 'groupId': i} for i in range(3)]
+        groups2 = [{'tenantId': 2, 'groupId': i} for i in range(2)]
+        [(start, end)] = token_ranges(1)
+        self._add_exec_args(
+            self.where_range, {'start': start, 'end': end, 'limit': 2},
+            defer.succeed(groups1[:2]))
+        self._add_exec_args(
+            '"tenantId"=:tenantId AND "groupId">:groupId LIMIT :limit;',
+            {'tenantId': 1, 'groupId': 1, 'limit': 2},
+            defer.succeed(groups1[2:]))
+        self._add_exec_args(
+            ('token("tenantId") > token(:tenantId) AND '
+             'token("tenantId") <= :end LIMIT :limit;'),
+            {'tenantId': 1, 'end': end, 'limit': 2},
+            defer.succeed(groups2))
+        d = self.collection.scan_scaling_group_rows(
+            self.batches.append, batch_size=2, ranges=1)
+        self.assertIsNone(self.successResultOf(d))
+        self.assertEqual(self.batches, [groups1[:2], groups1[2:], groups2])
+        self.assertEqual(len(self.queries), 5)
+
+    def test_waits_for_handler(self):
+        """
+        The next batch of a range is fetched after the Deferred returned by
+        the handler fires.
+        """
+        [(start, end)] = token_ranges(1)
+        self._add_exec_args(
+            self.where_range, {'start': start, 'end': end, 'limit': 1},
+            defer.succeed([{'tenantId': 1, 'groupId': 1}]))
+        handled = defer.Deferred()
+        d = self.collection.scan_scaling_group_rows(
+            lambda rows: handled, batch_size=1, ranges=1)
+        self.assertEqual(len(self.queries), 1)
+        handled.callback(None)
+        self.assertIsNone(self.successResultOf(d))
+        self.assertEqual(len(self.queries), 3)
+
+    def test_props(self):
+        """
+        Only the given columns and the key columns are fetched.
+        """
+        self.collection.scan_scaling_group_rows(
+            self.batches.append, props=['launch'], ranges=1)
+        self.assertEqual(
+            self.queries[0][0],
+            'SELECT "groupId","tenantId",launch FROM scaling_group WHERE ' +
+            self.where_range)
+
+    def test_error(self):
+        """
+        The scan fails with the first error of scanning a range.
+        """
+        self.client.execute.side_effect = lambda *a: defer.fail(
+            ValueError('bad'))
+        d = self.collection.scan_scaling_group_rows(
+            self.batches.append, ranges=2)
+        self.failureResultOf(d, ValueError)
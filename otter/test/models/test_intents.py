@@ -16,7 +16,8 @@ from otter.models.intents import (
 from otter.models.interface import (
     GroupState, IScalingGroupCollection, ScalingGroupStatus)
 from otter.test.utils import (
-    EffectServersCache, IsBoundWith, iMock, matches, mock_group, mock_log)
+    EffectServersCache, IsBoundWith, iMock, matches, mock_group, mock_log,
+    set_config_for_test)
 
 
 class ScalingGroupIntentsTests(SynchronousTestCase):
@@ -147,6 +148,26 @@ class ScalingGroupIntentsTests(SynchronousTestCase):
             self.get_dispatcher(self.get_store())])
         self.assertIsNone(sync_perform(disp, eff))
 
+    @mock.patch('otter.models.intents.CassScalingGroupServersCache',
+                new=EffectServersCache)
+    def test_perform_update_servers_cache_diff(self):
+        """
+        Performing :obj:`UpdateServersCache` writes only changed servers
+        when ``converger.diff_servers_cache`` is set
+        """
+        set_config_for_test(self, {'converger': {'diff_servers_cache': True}})
+        dt = datetime(1970, 1, 1)
+        eff = Effect(UpdateServersCache('tid', 'gid', dt, [{'id': 'a'}]))
+
+        @sync_performer
+        def perform_update_tuple(disp, intent):
+            self.assertEqual(intent, ('cacheustidgid', dt, [{'id': 'a'}]))
+
+        disp = ComposedDispatcher([
+            TypeDispatcher({tuple: perform_update_tuple}),
+            self.get_dispatcher(self.get_store())])
+        self.assertIsNone(sync_perform(disp, eff))
+
     def test_perform_update_error_reasons(self):
         """
         Performing :obj:`UpdateGroupErrorReasons` calls `update_error_reasons`
@@ -324,6 +324,13 @@ def setup_mod_and_trigger(testcase):
 
     testcase.mock_controller.modify_and_trigger.side_effect = mod_and_trigger
 
+    def coalesced(key, dispatcher, group, logargs, modifier, **kwargs):
+        return testcase.mock_controller.modify_and_trigger(
+            dispatcher, group, logargs, modifier, **kwargs)
+
+    testcase.mock_controller.coalesced_modify_and_trigger.side_effect = \
+        coalesced
+
 
 class AdminRestAPITestMixin(RequestTestMixin):
     """
@@ -341,4 +348,5 @@ class AdminRestAPITestMixin(RequestTestMixin):
             self, 'otter.rest.decorators.generate_transaction_id',
             return_value='a-wild-transaction-id')
 
-        self.root = OtterAdmin(self.mock_store).app.resource()
+        self.admin = OtterAdmin(self.mock_store)
+        self.root = self.admin.app.resource()
@@ -26,3 +26,16 @@ class AdminEndpointsTestCase(AdminRestAPITestMixin, SynchronousTestCase):
 
         response_body = json.loads(self.assert_status_code(200))
         self.assertEqual(metrics, response_body)
+
+    def test_convergence_timings(self):
+        """
+        '/convergence/timings/' returns the timings recorded by this node.
+        """
+        self.endpoint = '/convergence/timings/'
+        self.admin.timings.observe('plan', 0.2, 'success')
+
+        response_body = json.loads(self.assert_status_code(200))
+        self.assertEqual(response_body,
+                         {'timings': self.admin.timings.as_json()})
+        self.assertEqual(response_body['timings']['plan']['outcomes'],
+                         {'success': 1})
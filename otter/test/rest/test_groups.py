@@ -395,22 +395,22 @@ class AllGroupsEndpointTestCase(RestAPITestMixin, SynchronousTestCase):
             "groups_links": []
         })
 
-    @mock.patch('otter.rest.groups.get_active_cache')
-    def test_list_group_convergence(self, mock_gac):
+    def test_list_group_convergence(self):
         """
         ``list_all_scaling_groups`` returns state that has active servers
-        taken from servers cache table
+        taken from servers cache table of all groups at once
         """
         set_config_data({'convergence-tenants': ['11111'], 'url_root': 'root'})
         self.addCleanup(set_config_data, {})
 
-        mock_gac.return_value = defer.succeed({'s1': {'links': 'l'}})
-        self.mock_store.connection = 'connection'
-        self.mock_store.reactor = 'reactor'
+        self.mock_store.get_active_caches.return_value = defer.succeed(
+            {'one': {'s1': {'links': 'l'}}, 'two': {}})
 
         self.mock_store.list_scaling_group_states.return_value = defer.succeed(
             [GroupState('11111', 'one', '1', None, None, None, {}, False,
-                        ScalingGroupStatus.ACTIVE, desired=2)]
+                        ScalingGroupStatus.ACTIVE, desired=2),
+             GroupState('11111', 'two', '2', None, None, None, {}, False,
+                        ScalingGroupStatus.ACTIVE, desired=0)]
         )
 
         body = self.assert_status_code(200)
@@ -419,8 +419,9 @@ class AllGroupsEndpointTestCase(RestAPITestMixin, SynchronousTestCase):
         self.assertEqual(resp['groups'][0]['state']['pendingCapacity'], 1)
         self.assertEqual(resp['groups'][0]['state']['active'],
                          [{'id': 's1', 'links': 'l'}])
-        mock_gac.assert_called_once_with(
-            'reactor', 'connection', '11111', 'one')
+        self.assertEqual(resp['groups'][1]['state']['activeCapacity'], 0)
+        self.mock_store.get_active_caches.assert_called_once_with(
+            '11111', ['one', 'two'])
 
     def test_list_group_passes_limit_query(self):
         """
@@ -571,6 +571,9 @@ class OnePolicyTestCase(RestAPITestMixin, SynchronousTestCase):
         self.mock_store.get_scaling_group.assert_called_once_with(
             mock.ANY, '11111', '1')
         self.assertEqual(self.mock_controller.modify_and_trigger.call_count, 1)
+        self.assertEqual(
+            self.mock_controller.coalesced_modify_and_trigger.call_args[0],
+            (('11111', '1', self.policy_id),))
         exec_pol = self.mock_controller.maybe_execute_scaling_policy
         exec_pol.assert_called_once_with(
             mock.ANY,
@@ -476,6 +476,9 @@ class OneWebhookTestCase(RestAPITestMixin, SynchronousTestCase):
         self.mock_controller.modify_and_trigger.assert_called_once_with(
             "disp", self.mock_group, logargs, mock.ANY,
             modify_state_reason="execute_webhook")
+        self.assertEqual(
+            self.mock_controller.coalesced_modify_and_trigger.call_args[0],
+            ((self.tenant_id, self.group_id, self.policy_id),))
         exec_pol = self.mock_controller.maybe_execute_scaling_policy
         exec_pol.assert_called_once_with(
             matches(IsBoundWith(**logargs)),
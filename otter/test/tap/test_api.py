@@ -18,6 +18,9 @@ from otter.auth import CachingAuthenticator, SingleTenantAuthenticator
 from otter.constants import (
     CONVERGENCE_DIRTY_DIR, ServiceType, get_service_configs)
 from otter.convergence.service import Converger
+from otter.convergence.steps import CreateServer
+from otter.convergence.throttling import StepLimit
+from otter.convergence.timing import TimingRegistry
 from otter.log.cloudfeeds import CloudFeedsObserver
 from otter.log.formatters import get_fanout, set_fanout
 from otter.models.cass import CassScalingGroupCollection as OriginalStore
@@ -35,6 +38,7 @@ from otter.test.test_effect_dispatcher import full_intents
 from otter.test.utils import CheckFailure, matches, patch
 from otter.util.config import set_config_data
 from otter.util.deferredutils import DeferredPool
+from otter.util.hashring import parse_member
 from otter.util.zkpartitioner import Partitioner
 
 
@@ -389,6 +393,22 @@ class APIMakeServiceTests(SynchronousTestCase):
             [self.clientFromString.return_value],
             'otter_test', disconnect_on_cancel=True)
 
+    def test_cassandra_cluster_prepared_statements(self):
+        """
+        makeService configures a PreparingCassandraCluster instead when
+        prepared statements are enabled in the config.
+        """
+        Preparing = patch(self, 'otter.tap.api.PreparingCassandraCluster')
+        config = deepcopy(test_config)
+        config['cassandra']['prepared_statements'] = True
+        makeService(config)
+        Preparing.assert_called_once_with(
+            [self.clientFromString.return_value],
+            'otter_test', disconnect_on_cancel=True)
+        self.assertFalse(self.RoundRobinCassandraCluster.called)
+        self.TimingOutCQLClient.assert_called_once_with(
+            self.reactor, Preparing.return_value, 10)
+
     def test_cassandra_scaling_group_collection_with_cluster(self):
         """
         makeService configures a CassScalingGroupCollection with the
@@ -690,7 +710,8 @@ class APIMakeServiceTests(SynchronousTestCase):
         parent = makeService(config)
 
         mock_setup_converger.assert_called_once_with(
-            parent, kz_client, mock.ANY, 10, 3600, 10, {"step": 10})
+            parent, kz_client, mock.ANY, 10, 3600, 10, {"step": 10}, None,
+            mock.ANY, None, None, None, None, None, None)
 
         dispatcher = mock_setup_converger.call_args[0][2]
 
@@ -716,10 +737,20 @@ class ConvergerSetupTests(SynchronousTestCase):
         kz_client = object()
         dispatcher = object()
         interval = 50
-        setup_converger(ms, kz_client, dispatcher, interval, 35, 52, {"a": 3})
+        timings = TimingRegistry()
+        setup_converger(ms, kz_client, dispatcher, interval, 35, 52, {"a": 3},
+                        4, timings, 7, 20, 3, 120,
+                        {"create_server": {"concurrency": 2}}, 0.5)
         [converger] = ms.services
         self.assertIs(converger.__class__, Converger)
         self.assertEqual(converger.build_timeout, 35)
+        self.assertEqual(converger.gather_cache.ttl, 4)
+        self.assertIs(converger.timings, timings)
+        self.assertEqual(converger.queue.max_in_flight, 7)
+        self.assertEqual(converger.backoff.max_delay, 120)
+        self.assertEqual(converger.throttle.limits,
+                         {CreateServer: StepLimit(concurrency=2)})
+        self.assertEqual(converger.batcher.window, 0.5)
         self.assertEqual(converger._dispatcher, dispatcher)
         self.assertEqual(converger.interval, interval / 2)
         self.assertEqual(converger.limited_retry_iterations, 52)
@@ -731,9 +762,41 @@ class ConvergerSetupTests(SynchronousTestCase):
         self.assertIs(partitioner, converger.partitioner)
         self.assertIs(partitioner.kz_client, kz_client)
         self.assertEqual(timer.step, interval)
+        self.assertEqual(partitioner.buckets, range(20))
+        self.assertIsNone(partitioner.partition_func)
+        self.assertIsNone(partitioner.identifier)
         mock_watch_children.assert_called_once_with(
             kz_client, CONVERGENCE_DIRTY_DIR, converger.divergent_changed)
 
+    @mock.patch('otter.tap.api.watch_children')
+    def test_default_buckets(self, mock_watch_children):
+        """
+        There are 10 buckets by default.
+        """
+        ms = MultiService()
+        setup_converger(ms, object(), object(), 50, 35, 52, {})
+        [converger] = ms.services
+        self.assertEqual(converger.partitioner.buckets, range(10))
+
+    @mock.patch('otter.tap.api.watch_children')
+    def test_hash_ring(self, mock_watch_children):
+        """
+        With the ``converger.hash_ring`` config, buckets are distributed with
+        a consistent-hash ring on which the node has the given weight, and
+        there are 128 of them by default.
+        """
+        set_config_data({'converger': {'hash_ring': True}})
+        self.addCleanup(set_config_data, {})
+        ms = MultiService()
+        setup_converger(ms, object(), object(), 50, 35, 52, {},
+                        weight=3)
+        [converger] = ms.services
+        partitioner = converger.partitioner
+        self.assertEqual(partitioner.buckets, range(128))
+        self.assertEqual(parse_member(partitioner.identifier)[1], 3)
+        self.assertEqual(
+            partitioner.partition_func('a', ['a'], range(128)), range(128))
+
 
 class SchedulerSetupTests(SynchronousTestCase):
     """
@@ -777,6 +840,29 @@ class SchedulerSetupTests(SynchronousTestCase):
         self.assertEqual(svc.partitioner.kz_client, self.kz_client)
         self.assertEqual(svc.partitioner.partitioner_path, '/part_path')
         self.assertEqual(svc.dispatcher, "disp")
+        self.assertIsNone(svc.lookahead)
+        self.assertIsNone(svc.pool)
+
+    def test_max_concurrent_events(self):
+        """
+        `SchedulerService` executes events in a pool limited to the
+        configured number of concurrent events.
+        """
+        self.config['scheduler']['max_concurrent_events'] = 50
+        svc = setup_scheduler(self.parent, "disp", self.store, self.kz_client)
+        self.assertEqual(svc.pool.limit, 50)
+
+    def test_prefetch_mode(self):
+        """
+        `SchedulerService` prefetches events within the configured lookahead
+        in prefetch mode, which defaults to twice the interval.
+        """
+        self.config['scheduler']['mode'] = 'prefetch'
+        svc = setup_scheduler(self.parent, "disp", self.store, self.kz_client)
+        self.assertEqual(svc.lookahead, 20)
+        self.config['scheduler']['lookahead'] = 30
+        svc = setup_scheduler(self.parent, "disp", self.store, self.kz_client)
+        self.assertEqual(svc.lookahead, 30)
 
     def test_mock_store_with_scheduler(self):
         """
@@ -2,6 +2,7 @@
 Tests for :mod:`otter.controller`
 """
 from datetime import datetime, timedelta
+from functools import partial
 
 from effect import (
     ComposedDispatcher,
@@ -1220,6 +1221,19 @@ class MaybeExecuteScalingPolicyTestCase(SynchronousTestCase):
         # state should have been updated
         self.assertEqual(self.mock_state.policy_touched["pol1"], "now")
 
+    def test_cached_documents(self):
+        """
+        The policy, config and launch config may be recently fetched ones.
+        """
+        self.mocks['execute_launch_config'].return_value = defer.succeed(None)
+        controller.maybe_execute_scaling_policy(
+            self.mock_log, 'transaction', self.group, self.mock_state, 'pol1',
+            'ver')
+        self.group.get_policy.assert_called_once_with(
+            'pol1', 'ver', cached=True)
+        self.group.view_config.assert_called_once_with(cached=True)
+        self.group.view_launch_config.assert_called_once_with(cached=True)
+
     def test_execute_launch_config_failure_on_positive_delta(self):
         """
         If ``execute_launch_config`` fails for some reason, then state should
@@ -1553,6 +1567,35 @@ class ModifyAndTriggerTests(SynchronousTestCase):
         self.assertEqual(self.group.modify_state_values[-1], "newstate")
         self.assertFalse(self.disp.consumed())
 
+    def test_retryable(self):
+        """
+        Executing a policy of a convergence tenant is marked retryable since
+        it only computes the new desired capacity. Other modifiers, and
+        executing policies of worker tenants, are not.
+        """
+        modifier = partial(controller.maybe_execute_scaling_policy, "log",
+                           "tid", policy_id="p")
+        self.group.modify_state.side_effect = None
+        self.group.modify_state.return_value = defer.succeed(None)
+
+        def modify_and_trigger(modifier):
+            self.group.modify_state.reset_mock()
+            disp = SequenceDispatcher([
+                (BoundFields(mock.ANY, self.logargs),
+                 nested_sequence([(("tg", "t", "g"), noop)]))])
+            d = controller.modify_and_trigger(
+                disp, self.group, self.logargs, modifier)
+            self.assertIsNone(self.successResultOf(d))
+
+        modify_and_trigger(modifier)
+        self.group.modify_state.assert_called_once_with(
+            modifier, modify_state_retryable=True)
+        modify_and_trigger(self.modify)
+        self.group.modify_state.assert_called_once_with(self.modify)
+        set_non_conv_tenant("t", self)
+        modify_and_trigger(modifier)
+        self.group.modify_state.assert_called_once_with(modifier)
+
     def test_error(self):
         """
         Does not trigger convergence if group.modify_state() errors
@@ -1575,6 +1618,77 @@ class ModifyAndTriggerTests(SynchronousTestCase):
         self.assertTrue(self.disp.consumed())
 
 
+class CoalescedModifyAndTriggerTests(SynchronousTestCase):
+    """
+    Tests for :func:`coalesced_modify_and_trigger`
+    """
+
+    def setUp(self):
+        self.calls = []
+        self.d = defer.Deferred()
+        patch(self, "otter.controller.modify_and_trigger",
+              side_effect=lambda **kw: self.calls.append(kw) or self.d)
+        self.cooldown = 30
+        self.groups = {}
+
+    def get_group(self, name):
+        """Return mock group whose policies have ``self.cooldown``."""
+        if name not in self.groups:
+            group = self.groups[name] = iMock(IScalingGroup)
+            group.get_policy.side_effect = (
+                lambda policy_id, cached: defer.succeed(
+                    {'cooldown': self.cooldown}))
+        return self.groups[name]
+
+    def call(self, key, group="group"):
+        return controller.coalesced_modify_and_trigger(
+            key, dispatcher="disp", group=self.get_group(group), logargs={},
+            modifier="mod", modify_state_reason="r")
+
+    def test_coalesces(self):
+        """
+        A call made while an earlier call with the same key has not completed
+        gets the earlier call's result without calling
+        :func:`modify_and_trigger` again.
+        """
+        d1 = self.call(("t", "g", "p"))
+        d2 = self.call(("t", "g", "p"), group="other group")
+        self.assertEqual(
+            self.calls,
+            [dict(dispatcher="disp", group=self.groups["group"], logargs={},
+                  modifier="mod", modify_state_reason="r")])
+        self.groups["group"].get_policy.assert_called_once_with(
+            "p", cached=True)
+        self.assertNoResult(d2)
+        self.d.errback(ValueError("a"))
+        self.failureResultOf(d1, ValueError)
+        self.failureResultOf(d2, ValueError)
+        # calls after it completed call it again
+        self.d = defer.succeed(None)
+        self.successResultOf(self.call(("t", "g", "p")))
+        self.assertEqual(len(self.calls), 2)
+
+    def test_other_keys(self):
+        """
+        Calls with other keys are not coalesced.
+        """
+        self.call(("t", "g", "p"))
+        self.call(("t", "g", "p2"))
+        self.assertEqual(len(self.calls), 2)
+        self.d.callback(None)
+
+    def test_no_cooldown(self):
+        """
+        Executions of a policy without cooldown are not coalesced, so that
+        each of them applies the policy's change.
+        """
+        self.cooldown = 0
+        self.call(("t", "g", "p"))
+        self.call(("t", "g", "p"))
+        self.assertEqual(len(self.calls), 2)
+        self.d.callback(None)
+
+
 _should_retry_params = ShouldDelayAndRetry(
     can_retry=retry_times(3),
     next_interval=exponential_backoff_interval(2))
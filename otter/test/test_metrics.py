@@ -24,7 +24,6 @@ from otter.auth import IAuthenticator
 from otter.cloud_client import TenantScope, service_request
 from otter.constants import ServiceType
 from otter.metrics import (
-    GetAllValidGroups,
     GroupMetrics,
     MetricsService,
     Options,
@@ -327,7 +326,20 @@ class CollectMetricsTests(SynchronousTestCase):
              "launch_config": '{"type": "launch_stack"}'},
             {"tenantId": "t2", "groupId": "g11",
              "launch_config": '{"type": "launch_server"}'}]
-        self.lc_groups = {"t1": self.groups[:2], "t2": [self.groups[-1]]}
+        self.lc_groups = {
+            "t1": [{"tenantId": "t1", "groupId": "g1"},
+                   {"tenantId": "t1", "groupId": "g2"}],
+            "t2": [{"tenantId": "t2", "groupId": "g11"}]}
+        self.store = patch(
+            self, "otter.metrics.CassScalingGroupCollection").return_value
+
+        def scan_valid_groups(handle_groups, props):
+            self.assertEqual(props, ["launch_config"])
+            handle_groups(self.groups[:3])
+            handle_groups(self.groups[3:])
+            return succeed(None)
+
+        self.store.scan_valid_groups.side_effect = scan_valid_groups
 
         self.add_to_cloud_metrics = patch(
             self, 'otter.metrics.add_to_cloud_metrics',
@@ -344,7 +356,6 @@ class CollectMetricsTests(SynchronousTestCase):
                        "non-convergence-tenants": ["ct"]}
 
         self.sequence = SequenceDispatcher([
-            (GetAllValidGroups(), const(self.groups)),
             (TenantScope(mock.ANY, "tid"),
              nested_sequence([
                  (("atcm", 200, "r", "metrics", 2, self.config,
@@ -366,6 +377,8 @@ class CollectMetricsTests(SynchronousTestCase):
             self.assertEqual(self.successResultOf(d), "metrics")
 
         self.connect_cass_servers.assert_called_once_with(_reactor, 'c')
+        self.store.scan_valid_groups.assert_called_once_with(
+            mock.ANY, props=["launch_config"])
         self.get_all_metrics.assert_called_once_with(
             self.get_dispatcher.return_value, self.lc_groups, self.log,
             _print=False)
@@ -392,20 +405,16 @@ class CollectMetricsTests(SynchronousTestCase):
                                 authenticator=auth)
             self.assertEqual(self.successResultOf(d), "metrics")
         self.get_dispatcher.assert_called_once_with(
-            _reactor, auth, self.log, mock.ANY, mock.ANY)
+            _reactor, auth, self.log, mock.ANY, self.store)
 
     def test_without_metrics(self):
         """
         Doesnt add metrics to blueflood if metrics config is not there
         """
-        sequence = SequenceDispatcher([
-            (GetAllValidGroups(), const(self.groups))
-        ])
-        self.get_dispatcher.return_value = sequence
+        self.get_dispatcher.return_value = SequenceDispatcher([])
         del self.config["metrics"]
-        with sequence.consume():
-            d = collect_metrics("reactor", self.config, self.log)
-            self.assertEqual(self.successResultOf(d), "metrics")
+        d = collect_metrics("reactor", self.config, self.log)
+        self.assertEqual(self.successResultOf(d), "metrics")
         self.assertFalse(self.add_to_cloud_metrics.called)
 
 
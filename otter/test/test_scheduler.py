@@ -5,7 +5,10 @@ from datetime import datetime, timedelta
 
 import mock
 
+from kazoo.recipe.partitioner import PartitionState
+
 from twisted.internet import defer
+from twisted.internet.task import Clock
 from twisted.trial.unittest import SynchronousTestCase
 
 from otter.controller import CannotExecutePolicyError
@@ -17,7 +20,9 @@ from otter.models.interface import (
     NoSuchScalingGroupError
 )
 from otter.scheduler import (
+    ExecutionPool,
     SchedulerService,
+    TimerWheel,
     add_cron_events,
     check_events_in_bucket,
     execute_event,
@@ -196,9 +201,295 @@ class SchedulerServiceTests(SchedulerTests, DeferredFunctionMixin):
         log = self.scheduler_service.log.bind.return_value
         self.assertEqual(self.check_events_in_bucket.mock_calls,
                          [mock.call(log, "disp", self.mock_store, 2,
-                                    'utcnow', 100),
+                                    'utcnow', 100, pool=None),
                           mock.call(log, "disp", self.mock_store, 3,
-                                    'utcnow', 100)])
+                                    'utcnow', 100, pool=None)])
+
+
+class TimerWheelTests(SynchronousTestCase):
+    """
+    Tests for `TimerWheel`.
+    """
+
+    def setUp(self):
+        """
+        Create a wheel that records fired slots.
+        """
+        self.clock = Clock()
+        self.fired = []
+        self.fire_d = None
+
+        def fire(slot, entries):
+            self.fired.append((slot, sorted(entries)))
+            return self.fire_d
+
+        self.wheel = TimerWheel(self.clock, fire)
+        self.now = datetime(2015, 1, 1, 0, 0, 0)
+
+    def event(self, policy_id, seconds):
+        """Return an event triggering ``seconds`` from now."""
+        return {'policyId': policy_id,
+                'trigger': self.now + timedelta(seconds=seconds)}
+
+    def test_fires_at_slot(self):
+        """
+        Events are fired together at their trigger time rounded up to a
+        second, and events that are due are fired right away.
+        """
+        e1, e2, e3, e4 = (self.event('p1', 0.5), self.event('p2', 1),
+                          self.event('p3', 3), self.event('p4', -5))
+        for bucket, event in [(1, e1), (2, e2), (1, e3), (1, e4)]:
+            self.assertTrue(self.wheel.add(bucket, event, self.now))
+        self.assertEqual(len(self.wheel), 4)
+        self.clock.advance(0)
+        self.assertEqual(self.fired, [(e4['trigger'], [(1, e4)])])
+        self.clock.advance(1)
+        self.assertEqual(self.fired[1:],
+                         [(e2['trigger'], [(1, e1), (2, e2)])])
+        self.clock.advance(2)
+        self.assertEqual(self.fired[2:], [(e3['trigger'], [(1, e3)])])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_not_added_again(self):
+        """
+        An event is not added again while it is in the wheel or being fired.
+        """
+        self.fire_d = defer.Deferred()
+        event = self.event('p1', 1)
+        self.wheel.add(1, event, self.now)
+        self.assertFalse(self.wheel.add(1, dict(event), self.now))
+        self.clock.advance(1)
+        self.assertFalse(self.wheel.add(1, event, self.now))
+        self.fire_d.callback(None)
+        self.assertTrue(self.wheel.add(1, event, self.now))
+
+    def test_remove_buckets(self):
+        """
+        Events of removed buckets are not fired, and slots left empty are
+        cancelled.
+        """
+        e1, e2 = self.event('p1', 1), self.event('p2', 2)
+        self.wheel.add(1, e1, self.now)
+        self.wheel.add(2, e2, self.now)
+        self.wheel.remove_buckets([2])
+        self.assertEqual(len(self.clock.getDelayedCalls()), 1)
+        self.clock.advance(2)
+        self.assertEqual(self.fired, [(e1['trigger'], [(1, e1)])])
+        self.assertTrue(self.wheel.add(2, e2, self.now))
+
+    def test_clear(self):
+        """
+        Clearing the wheel cancels all its slots.
+        """
+        self.wheel.add(1, self.event('p1', 1), self.now)
+        self.wheel.clear()
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+        self.assertEqual(len(self.wheel), 0)
+
+
+class PrefetchSchedulerServiceTests(SchedulerTests):
+    """
+    Tests for `SchedulerService` prefetching events.
+    """
+
+    def setUp(self):
+        """
+        Create a service prefetching events within 20 seconds.
+        """
+        super(PrefetchSchedulerServiceTests, self).setUp()
+        self.now = datetime(2015, 1, 1, 0, 0, 0)
+        self.mock_datetime = patch(self, 'otter.scheduler.datetime')
+        self.mock_datetime.utcnow.side_effect = lambda: self.now
+        self.log = mock_log()
+        patch(self, 'otter.scheduler.otter_log').bind.return_value = self.log
+
+        def pfactory(log, callable):
+            self.fake_partitioner = FakePartitioner(
+                log, callable, PartitionState.ACQUIRED)
+            return self.fake_partitioner
+
+        self.clock = Clock()
+        self.service = SchedulerService(
+            "disp", 2, self.mock_store, pfactory, lookahead=20,
+            clock=self.clock)
+        self.events = {}
+        self.mock_store.fetch_events.side_effect = (
+            lambda bucket, until, size: defer.succeed(
+                [e for e in self.events.get(bucket, [])
+                 if e['trigger'] <= until][:size]))
+        self.mock_store.delete_events.side_effect = self.delete_events
+        self.process_events = patch(
+            self, 'otter.scheduler.process_events',
+            side_effect=lambda events, *a, **kw: defer.succeed(len(events)))
+
+    def delete_events(self, bucket, events):
+        """Delete the events from :attr:`events`."""
+        self.events[bucket] = [e for e in self.events[bucket]
+                               if e not in events]
+        return defer.succeed(None)
+
+    def event(self, policy_id, seconds):
+        """Return an event triggering ``seconds`` from now."""
+        return {'tenantId': 't', 'groupId': 'g', 'policyId': policy_id,
+                'trigger': self.now + timedelta(seconds=seconds),
+                'cron': None, 'version': 'v'}
+
+    def got_buckets(self, buckets):
+        """Have the partitioner give the buckets to the service."""
+        self.fake_partitioner.my_buckets = buckets
+        return self.fake_partitioner.got_buckets(buckets)
+
+    def test_fires_prefetched_events(self):
+        """
+        Events within the lookahead are fetched without being deleted, and
+        are deleted and executed at their trigger time.
+        """
+        e1, e2, e3 = (self.event('p1', 5), self.event('p2', 5),
+                      self.event('p3', 30))
+        self.events = {1: [e1, e3], 2: [e2]}
+        self.successResultOf(self.got_buckets([1, 2]))
+        self.mock_store.fetch_events.assert_has_calls(
+            [mock.call(b, self.now + timedelta(seconds=20), 2)
+             for b in [1, 2]])
+        self.assertEqual(len(self.service.wheel), 2)
+        self.assertFalse(self.mock_store.delete_events.called)
+
+        self.clock.advance(5)
+        self.assertEqual(self.events, {1: [e3], 2: []})
+        [call] = self.process_events.mock_calls
+        self.assertEqual(sorted(call[1][0]), sorted([e1, e2]))
+        self.assertEqual(call[1][1:3], ("disp", self.mock_store))
+        self.assertIsNone(call[2]['pool'])
+
+    def test_not_prefetched_again(self):
+        """
+        Events prefetched again before they are fired are executed once.
+        """
+        self.events = {1: [self.event('p1', 5)]}
+        self.got_buckets([1])
+        self.got_buckets([1])
+        self.clock.advance(5)
+        self.assertEqual(self.process_events.call_count, 1)
+
+    def test_lost_buckets(self):
+        """
+        Events of buckets that are not owned anymore are dropped, on
+        prefetching or when they are due.
+        """
+        self.events = {1: [self.event('p1', 5)], 2: [self.event('p2', 5)]}
+        self.got_buckets([1, 2])
+        self.got_buckets([1])
+        self.assertEqual(len(self.service.wheel), 1)
+        self.fake_partitioner.my_buckets = []
+        self.clock.advance(5)
+        self.assertFalse(self.process_events.called)
+        self.assertFalse(self.mock_store.delete_events.called)
+
+    def test_not_acquired(self):
+        """
+        Events are not fired when the partition is not acquired.
+        """
+        self.events = {1: [self.event('p1', 5)]}
+        self.got_buckets([1])
+        self.fake_partitioner.current_state = PartitionState.ALLOCATING
+        self.clock.advance(5)
+        self.assertFalse(self.process_events.called)
+
+    def test_truncated_prefetch(self):
+        """
+        When a prefetch is limited by the batch size, the bucket's next
+        events are prefetched after the fired ones are deleted.
+        """
+        events = [self.event('p{}'.format(i), 0) for i in range(3)]
+        self.events = {1: events[:]}
+        self.got_buckets([1])
+        self.clock.advance(0)
+        self.assertEqual(self.events, {1: []})
+        self.assertEqual(
+            [sorted(call[0][0])
+             for call in self.process_events.call_args_list],
+            [sorted(events[:2]), events[2:]])
+
+    def test_stop_service(self):
+        """
+        Stopping the service drops prefetched events.
+        """
+        self.events = {1: [self.event('p1', 5)]}
+        self.got_buckets([1])
+        self.service.startService()
+        self.service.stopService()
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+
+class ExecutionPoolTests(SynchronousTestCase):
+    """
+    Tests for `ExecutionPool`.
+    """
+
+    def setUp(self):
+        """
+        Create a pool running 2 calls at a time.
+        """
+        self.pool = ExecutionPool(2)
+        self.started = []
+
+    def call(self, name):
+        """Record starting the call and return its pending Deferred."""
+        d = defer.Deferred()
+        self.started.append((name, d))
+        return d
+
+    def test_limit(self):
+        """
+        At most ``limit`` calls run at a time, and a waiting call is started
+        when a running one completes, with its result.
+        """
+        d1 = self.pool.run('t1', self.call, 'a')
+        self.pool.run('t2', self.call, 'b')
+        d3 = self.pool.run('t3', self.call, 'c')
+        self.assertEqual([name for name, _ in self.started], ['a', 'b'])
+        self.started[0][1].callback('r')
+        self.assertEqual(self.successResultOf(d1), 'r')
+        self.assertEqual([name for name, _ in self.started], ['a', 'b', 'c'])
+        self.started[2][1].errback(ValueError('bad'))
+        self.failureResultOf(d3, ValueError)
+        self.assertEqual(self.pool.running, 1)
+
+    def test_tenant_turns(self):
+        """
+        Waiting calls are started in turns of tenants rather than in the
+        order they were made.
+        """
+        self.pool.limit = 1
+        for tenant_id, name in [('t1', 'a1'), ('t1', 'a2'), ('t1', 'a3'),
+                                ('t2', 'b1'), ('t3', 'c1'), ('t2', 'b2')]:
+            self.pool.run(tenant_id, self.call, name)
+        while len(self.started) < 6:
+            self.started[-1][1].callback(None)
+        self.assertEqual([name for name, _ in self.started],
+                         ['a1', 'a2', 'b1', 'c1', 'a3', 'b2'])
+
+    def test_synchronous_error(self):
+        """
+        A call raising an error fails its Deferred and frees its place.
+        """
+        d = self.pool.run('t1', lambda: 1 / 0)
+        self.failureResultOf(d, ZeroDivisionError)
+        self.assertEqual(self.pool.running, 0)
+
+    def test_synchronous_calls(self):
+        """
+        Waiting calls that complete synchronously are started one after the
+        other without recursing, however many there are.
+        """
+        self.pool.limit = 1
+        blocker = self.pool.run('t1', self.call, 'blocker')
+        results = [self.pool.run('t2', lambda i=i: i) for i in range(5000)]
+        self.started[0][1].callback(None)
+        self.successResultOf(blocker)
+        self.assertEqual([self.successResultOf(d) for d in results],
+                         range(5000))
+        self.assertEqual(self.pool.running, 0)
 
 
 class CheckEventsInBucketTests(SchedulerTests):
@@ -243,7 +534,7 @@ class CheckEventsInBucketTests(SchedulerTests):
                                    'utcnow', 100)
         self.successResultOf(d)
         self.process_events.assert_called_once_with(
-            [], "disp", self.mock_store, self.log.bind())
+            [], "disp", self.mock_store, self.log.bind(), pool=None)
 
     def test_events_in_limit(self):
         """
@@ -266,7 +557,7 @@ class CheckEventsInBucketTests(SchedulerTests):
         self.mock_store.fetch_and_delete.assert_called_once_with(
             1, 'utcnow', 100)
         self.process_events.assert_called_once_with(
-            events, "disp", self.mock_store, self.log.bind())
+            events, "disp", self.mock_store, self.log.bind(), pool=None)
 
     def test_events_process_error(self):
         """
@@ -310,11 +601,11 @@ class CheckEventsInBucketTests(SchedulerTests):
                          [mock.call(events1,
                                     "disp",
                                     self.mock_store,
-                                    self.log.bind()),
+                                    self.log.bind(), pool=None),
                           mock.call(events2,
                                     "disp",
                                     self.mock_store,
-                                    self.log.bind())])
+                                    self.log.bind(), pool=None)])
 
     def test_events_batch_error(self):
         """
@@ -340,7 +631,7 @@ class CheckEventsInBucketTests(SchedulerTests):
                          [mock.call(1, 'now', 100)] * 2)
         self.process_events.assert_called_once_with(events, "disp",
                                                     self.mock_store,
-                                                    self.log.bind())
+                                                    self.log.bind(), pool=None)
 
     def test_events_batch_process(self):
         """
@@ -375,7 +666,7 @@ class CheckEventsInBucketTests(SchedulerTests):
                          [mock.call(1, 'now', 100)] * 3)
         self.assertEqual(self.process_events.mock_calls,
                          [mock.call(events, "disp", self.mock_store,
-                                    self.log.bind())
+                                    self.log.bind(), pool=None)
                           for events in [events1, events2, events3]])
 
 
@@ -427,6 +718,31 @@ class ProcessEventsTests(SchedulerTests):
         self.add_cron_events.assert_called_once_with(
             self.mock_store, self.log, events, set())
 
+    @mock.patch('otter.scheduler.datetime')
+    def test_pool(self, mock_datetime):
+        """
+        Events are executed in the given pool on behalf of their tenant, and
+        the lag between their trigger time and execution is logged.
+        """
+        mock_datetime.utcnow.return_value = datetime(1970, 1, 1, 0, 0, 10)
+        events = [{'tenantId': 't{}'.format(i),
+                   'trigger': datetime(1970, 1, 1, 0, 0, i)}
+                  for i in range(4)]
+        pool = ExecutionPool(2)
+        execs = [defer.Deferred() for _ in events]
+        self.execute_event.side_effect = list(execs)
+        d = process_events(events, "disp", self.mock_store, self.log,
+                           pool=pool)
+        self.assertEqual(self.execute_event.call_count, 2)
+        for exec_d in execs:
+            exec_d.callback(None)
+        self.assertEqual(self.successResultOf(d), 4)
+        self.assertEqual(
+            [c[1][3] for c in self.execute_event.mock_calls], events)
+        self.log.msg.assert_called_with(
+            'sch-exec-lag', num_events=4, max_lag_seconds=10.0,
+            mean_lag_seconds=8.5)
+
 
 class AddCronEventsTests(SchedulerTests):
     """
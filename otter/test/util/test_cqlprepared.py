@@ -0,0 +1,193 @@
+"""Tests for :mod:`otter.util.cqlprepared`."""
+
+from datetime import datetime
+from uuid import UUID
+
+import mock
+
+from silverberg.cassandra import ttypes
+from silverberg.client import ConsistencyLevel
+
+from twisted.internet.defer import fail, succeed
+from twisted.trial.unittest import SynchronousTestCase
+
+from otter.util.cqlprepared import (
+    PreparingCassandraCluster,
+    PreparingCQLClient,
+    parameterize,
+    serialize)
+
+
+M = 'org.apache.cassandra.db.marshal.'
+
+
+class ParameterizeTests(SynchronousTestCase):
+    """Tests for :func:`parameterize`."""
+
+    def test_parameters(self):
+        """
+        Parameters are replaced with markers and their values are returned
+        in order, including repeated ones.
+        """
+        self.assertEqual(
+            parameterize('SELECT * FROM t WHERE a=:a AND b=:b OR c=:a;',
+                         {'a': 1, 'b': 'x'}),
+            ('SELECT * FROM t WHERE a=? AND b=? OR c=?;', [1, 'x', 1]))
+
+    def test_batch(self):
+        """
+        Batches with a literal timestamp and numbered parameters map to the
+        same template for the same number of statements.
+        """
+        self.assertEqual(
+            parameterize('BEGIN BATCH USING TIMESTAMP 123 '
+                         'DELETE FROM t WHERE a=:a0 '
+                         'DELETE FROM t WHERE a=:a1 APPLY BATCH;',
+                         {'a0': 'x', 'a1': 'y'}),
+            ('BEGIN BATCH USING TIMESTAMP ? DELETE FROM t WHERE a=? '
+             'DELETE FROM t WHERE a=? APPLY BATCH;', [123, 'x', 'y']))
+
+    def test_unbound(self):
+        """
+        ``None`` is returned if a parameter has no value or a value is not
+        used by the query.
+        """
+        self.assertIsNone(parameterize('SELECT :a', {}))
+        self.assertIsNone(parameterize('SELECT :a', {'a': 1, 'b': 2}))
+
+
+class SerializeTests(SynchronousTestCase):
+    """Tests for :func:`serialize`."""
+
+    def test_types(self):
+        """Values are serialized as their Cassandra type."""
+        uuid = UUID('01234567-89ab-cdef-0123-456789abcdef')
+        for vtype, value, serialized in [
+                ('AsciiType', 'abc', 'abc'),
+                ('UTF8Type', u'é', '\xc3\xa9'),
+                ('BooleanType', True, '\x01'),
+                ('Int32Type', 258, '\x00\x00\x01\x02'),
+                ('LongType', -1, '\xff' * 8),
+                ('IntegerType', 128, '\x00\x80'),
+                ('IntegerType', -129, '\xff\x7f'),
+                ('DateType', datetime(1970, 1, 1, 0, 0, 1, 5000),
+                 '\x00\x00\x00\x00\x00\x00\x03\xed'),
+                ('TimeUUIDType', uuid, uuid.bytes),
+                ('ReversedType({}AsciiType)'.format(M), 'abc', 'abc')]:
+            self.assertEqual(serialize(M + vtype, value), serialized)
+
+    def test_unserializable(self):
+        """
+        ``TypeError`` is raised for ``None``, values not of the type and
+        types that are not supported.
+        """
+        for vtype, value in [('AsciiType', None), ('Int32Type', 'abc'),
+                             ('BooleanType', 1), ('AsciiType', ['a']),
+                             ('ListType({}AsciiType)'.format(M), ['a'])]:
+            self.assertRaises(TypeError, serialize, M + vtype, value)
+
+
+class PreparingCQLClientTests(SynchronousTestCase):
+    """Tests for :obj:`PreparingCQLClient`."""
+
+    def setUp(self):
+        self.client = PreparingCQLClient(mock.Mock(), 'otter')
+        self.thrift = mock.Mock(spec=['prepare_cql3_query',
+                                      'execute_prepared_cql3_query',
+                                      'execute_cql3_query'])
+        self.client._connection = lambda: succeed(self.thrift)
+        self.thrift.prepare_cql3_query.side_effect = (
+            lambda query, compression: succeed(ttypes.CqlPreparedResult(
+                itemId=query.count('?'), count=query.count('?'),
+                variable_types=[M + 'AsciiType', M + 'Int32Type'][
+                    :query.count('?')])))
+        self.thrift.execute_prepared_cql3_query.return_value = succeed(
+            ttypes.CqlResult(type=ttypes.CqlResultType.INT, num=3))
+        self.thrift.execute_cql3_query.return_value = succeed(
+            ttypes.CqlResult(type=ttypes.CqlResultType.VOID))
+
+    def test_prepares_once(self):
+        """
+        A query's template is prepared once on a connection, and executed
+        by the statement id with the values bound.
+        """
+        for _ in range(2):
+            d = self.client.execute('SELECT :a, :b', {'a': 'x', 'b': 2},
+                                    ConsistencyLevel.ONE)
+            self.assertEqual(self.successResultOf(d), 3)
+        self.thrift.prepare_cql3_query.assert_called_once_with(
+            'SELECT ?, ?', ttypes.Compression.NONE)
+        self.assertEqual(
+            self.thrift.execute_prepared_cql3_query.call_args_list,
+            [mock.call(2, ['x', '\x00\x00\x00\x02'], ConsistencyLevel.ONE)]
+            * 2)
+        self.assertFalse(self.thrift.execute_cql3_query.called)
+
+    def test_new_connection(self):
+        """Templates are prepared again on a new connection."""
+        self.client.execute('SELECT :a', {'a': 'x'}, ConsistencyLevel.ONE)
+        self.thrift = mock.Mock(wraps=self.thrift)
+        self.client.execute('SELECT :a', {'a': 'x'}, ConsistencyLevel.ONE)
+        self.assertEqual(self.thrift.prepare_cql3_query.call_count, 1)
+
+    def test_unbound(self):
+        """
+        Queries whose values can not be bound are executed like
+        :class:`CQLClient` does.
+        """
+        d = self.client.execute('SELECT :a, :b', {'a': None, 'b': 2},
+                                ConsistencyLevel.ONE)
+        self.assertIsNone(self.successResultOf(d))
+        self.thrift.execute_cql3_query.assert_called_once_with(
+            'SELECT null, 2', ttypes.Compression.NONE, ConsistencyLevel.ONE)
+        self.assertFalse(self.thrift.execute_prepared_cql3_query.called)
+
+    def test_max_statements(self):
+        """
+        Templates beyond ``max_statements`` on a connection are not
+        prepared.
+        """
+        self.client.max_statements = 1
+        self.client.execute('SELECT :a', {'a': 'x'}, ConsistencyLevel.ONE)
+        d = self.client.execute('SELECT :a, 1', {'a': 'x'},
+                                ConsistencyLevel.ONE)
+        self.successResultOf(d)
+        self.assertEqual(self.thrift.prepare_cql3_query.call_count, 1)
+        self.thrift.execute_cql3_query.assert_called_once_with(
+            "SELECT 'x', 1", ttypes.Compression.NONE, ConsistencyLevel.ONE)
+
+    def test_not_found(self):
+        """
+        When Cassandra does not know the prepared statement, the template is
+        prepared again and executed once more.
+        """
+        error = ttypes.InvalidRequestException(
+            why='Prepared query with ID 1 not found')
+        self.thrift.execute_prepared_cql3_query.side_effect = [
+            fail(error), fail(error)]
+        d = self.client.execute('SELECT :a', {'a': 'x'}, ConsistencyLevel.ONE)
+        self.failureResultOf(d, ttypes.InvalidRequestException)
+        self.assertEqual(self.thrift.prepare_cql3_query.call_count, 2)
+        self.assertEqual(
+            self.thrift.execute_prepared_cql3_query.call_count, 2)
+
+    def test_other_error(self):
+        """Other errors executing a prepared statement are not retried."""
+        self.thrift.execute_prepared_cql3_query.return_value = fail(
+            ttypes.InvalidRequestException(why='bad'))
+        d = self.client.execute('SELECT :a', {'a': 'x'}, ConsistencyLevel.ONE)
+        self.failureResultOf(d, ttypes.InvalidRequestException)
+        self.assertEqual(
+            self.thrift.execute_prepared_cql3_query.call_count, 1)
+
+
+class PreparingCassandraClusterTests(SynchronousTestCase):
+    """Tests for :obj:`PreparingCassandraCluster`."""
+
+    def test_clients(self):
+        """The cluster's clients are :obj:`PreparingCQLClient`."""
+        cluster = PreparingCassandraCluster([mock.Mock(), mock.Mock()],
+                                            'otter')
+        self.assertEqual(
+            [type(client) for client in cluster._seed_clients],
+            [PreparingCQLClient] * 2)
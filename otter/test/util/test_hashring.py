@@ -0,0 +1,110 @@
+"""Tests for otter.util.hashring"""
+
+from collections import Counter
+
+from twisted.trial.unittest import SynchronousTestCase
+
+from otter.util.hashring import (
+    HashRing,
+    default_member,
+    format_member,
+    jump_hash,
+    parse_member,
+    ring_partition_func)
+
+
+class JumpHashTests(SynchronousTestCase):
+    """Tests for :func:`jump_hash`."""
+
+    def test_in_range(self):
+        """Keys are mapped to buckets in ``range(num_buckets)``."""
+        buckets = set(jump_hash(key, 10) for key in range(1000))
+        self.assertEqual(buckets, set(range(10)))
+
+    def test_stable(self):
+        """The same key is always mapped to the same bucket."""
+        self.assertEqual(jump_hash(12345, 100), jump_hash(12345, 100))
+
+    def test_adding_bucket_moves_keys_to_it(self):
+        """
+        Keys that move when a bucket is added all move to the new bucket, and
+        about ``1 / num_buckets`` of them move.
+        """
+        moved = [key for key in range(10000)
+                 if jump_hash(key, 10) != jump_hash(key, 11)]
+        self.assertEqual(set(jump_hash(key, 11) for key in moved), set([10]))
+        self.assertTrue(700 < len(moved) < 1100)
+
+    def test_large_key(self):
+        """Keys larger than 64 bits are mapped by their lowest 64 bits."""
+        self.assertEqual(jump_hash((7 << 64) + 3, 10), jump_hash(3, 10))
+
+
+class MemberTests(SynchronousTestCase):
+    """Tests for member identifiers."""
+
+    def test_roundtrip(self):
+        """:func:`parse_member` parses what :func:`format_member` formats."""
+        self.assertEqual(parse_member(format_member('host-1', 3)),
+                         ('host-1', 3))
+
+    def test_no_weight(self):
+        """Identifiers without weight have weight 1."""
+        self.assertEqual(parse_member('host-1'), ('host-1', 1))
+
+    def test_default_member(self):
+        """:func:`default_member` has the given weight."""
+        self.assertEqual(parse_member(default_member(2))[1], 2)
+
+
+class HashRingTests(SynchronousTestCase):
+    """Tests for :obj:`HashRing`."""
+
+    def setUp(self):
+        self.members = [format_member('n{}'.format(i)) for i in range(4)]
+        self.keys = range(1000)
+
+    def owners(self, ring):
+        """Get the owner of each key."""
+        return [ring.member(key) for key in self.keys]
+
+    def test_even(self):
+        """Keys are spread about evenly between members of equal weight."""
+        counts = Counter(self.owners(HashRing(self.members)))
+        self.assertEqual(set(counts), set(self.members))
+        self.assertTrue(all(150 < c < 350 for c in counts.values()))
+
+    def test_weighted(self):
+        """Members get keys in proportion to their weight."""
+        heavy = format_member('heavy', 3)
+        counts = Counter(self.owners(HashRing(self.members[:1] + [heavy])))
+        self.assertTrue(650 < counts[heavy] < 850)
+
+    def test_adding_member(self):
+        """
+        Keys that move when a member is added all move to the new member.
+        """
+        new = format_member('n4')
+        before = self.owners(HashRing(self.members))
+        after = self.owners(HashRing(self.members + [new]))
+        moved = [a for b, a in zip(before, after) if a != b]
+        self.assertEqual(set(moved), set([new]))
+        self.assertTrue(100 < len(moved) < 300)
+
+    def test_no_members(self):
+        """Getting the member of a key in an empty ring fails."""
+        self.assertRaises(ValueError, HashRing([]).member, 'a')
+
+
+class RingPartitionFuncTests(SynchronousTestCase):
+    """Tests for :func:`ring_partition_func`."""
+
+    def test_partitions(self):
+        """
+        Every partition is given to exactly one member.
+        """
+        members = ['a', 'b', 'c']
+        partition = ring_partition_func()
+        owned = [partition(m, members, range(50)) for m in members]
+        self.assertEqual(sorted(sum(owned, [])), range(50))
+        self.assertTrue(all(owned))
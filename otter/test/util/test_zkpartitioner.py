@@ -72,10 +72,27 @@ class PartitionerTests(SynchronousTestCase):
         self.assertEqual(self.kz_client.SetPartitioner.call_args_list,
                          [mock.call(self.path,
                                     set=self.buckets,
+                                    partition_func=None,
+                                    identifier=None,
                                     time_boundary=self.time_boundary)] * 2)
         self.assertEqual(self.partitioner.partitioner, new_kz_partition)
         self.assertEqual(self.buckets_received, [])
 
+    def test_partition_func(self):
+        """
+        The partition function and identifier are given to the
+        :obj:`SetPartitioner`.
+        """
+        partitioner = Partitioner(
+            self.kz_client, 10, self.path, self.buckets, self.time_boundary,
+            self.log, self.buckets_received.append, clock=self.clock,
+            partition_func=len, identifier='me')
+        partitioner.startService()
+        self.assertEqual(
+            self.kz_client.SetPartitioner.call_args,
+            mock.call(self.path, set=self.buckets, partition_func=len,
+                      identifier='me', time_boundary=self.time_boundary))
+
     def test_invalid_state(self):
         """
         When none of the expected states are True, the ``finish`` method is
@@ -101,6 +118,8 @@ class PartitionerTests(SynchronousTestCase):
         self.assertEqual(self.kz_client.SetPartitioner.call_args_list,
                          [mock.call(self.path,
                                     set=self.buckets,
+                                    partition_func=None,
+                                    identifier=None,
                                     time_boundary=self.time_boundary)] * 2)
         self.assertEqual(self.partitioner.partitioner, new_kz_partition)
         self.assertEqual(self.buckets_received, [])
@@ -234,6 +253,8 @@ class PartitionerTests(SynchronousTestCase):
         self.kz_client.SetPartitioner.assert_called_once_with(
             '/new_path',
             set=self.buckets,
+            partition_func=None,
+            identifier=None,
             time_boundary=self.time_boundary)
         self.assertEqual(self.partitioner.partitioner,
                          self.kz_client.SetPartitioner.return_value)
@@ -38,7 +38,9 @@ from twisted.web.http_headers import Headers
 from zope.interface import directlyProvides, implementer, interface
 from zope.interface.verify import verifyObject
 
-from otter.convergence.model import HeatStack, NovaServer, ServerState
+from otter.convergence.model import (
+    EncodedJSON, HeatStack, NovaServer, ServerState)
+from otter.convergence.timing import Timed
 from otter.log.bound import BoundLog, bound_log_kwargs
 from otter.models.interface import IScalingGroup, IScalingGroupServersCache
 from otter.supervisor import ISupervisor
@@ -643,7 +645,8 @@ def mock_group(state, tenant_id='tenant', group_id='group'):
     group.pause_modify_state = False
     group.modify_state_values = []
 
-    def fake_modify_state(f, modify_state_reason=None, *args, **kwargs):
+    def fake_modify_state(f, modify_state_reason=None,
+                          modify_state_retryable=False, *args, **kwargs):
         d = maybeDeferred(f, group, state, *args, **kwargs)
         d.addCallback(lambda r: group.modify_state_values.append(r))
         if group.pause_modify_state:
@@ -799,6 +802,14 @@ def nested_sequence(seq, get_effect=attrgetter('effect'),
         get_effect)
 
 
+def timed_sequence(name, seq, outcome=None):
+    """
+    Return an intent-sequence item for a :obj:`Timed` called ``name`` whose
+    effect performs the intents in ``seq``.  See :func:`nested_sequence`.
+    """
+    return (Timed(name, mock.ANY, outcome), nested_sequence(seq))
+
+
 def test_dispatcher(disp=None):
     disps = [
         base_dispatcher,
@@ -958,6 +969,9 @@ class EffectServersCache(object):
     def insert_servers(self, time, servers, clear):
         return Effect((self.ids("is"), time, servers, clear))
 
+    def update_servers(self, time, servers):
+        return Effect((self.ids("us"), time, servers))
+
     def delete_servers(self):
         return Effect(self.ids("ds"))
 
@@ -975,7 +989,8 @@ def server(id, state, created=0, image_id='image', flavor_id='flavor',
         json = json.set('metadata', pmap(metadata))
     return NovaServer(id=id, state=state, created=created, image_id=image_id,
                       flavor_id=flavor_id,
-                      json=json, **kwargs)
+                      metadata=pmap(json.get('metadata', {})),
+                      json=EncodedJSON.encode(json), **kwargs)
 
 
 def stack(id, name='foostack', action='CREATE', status='COMPLETE'):
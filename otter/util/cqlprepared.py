@@ -0,0 +1,295 @@
+"""
+Executing CQL queries as prepared statements.
+
+Queries built by :mod:`otter.models.cass` are sent by silverberg as CQL
+strings with their parameters substituted in, so Cassandra parses every one
+of them again. :class:`PreparingCQLClient` instead turns the ``:name``
+parameters of a query into bind markers, prepares the resulting template
+once per connection and executes it by its statement id with the values
+bound. Batches built with per-statement parameter names (``:server_id0``,
+``:server_id1``, ...) and a literal ``USING TIMESTAMP`` map to one template
+for each number of statements.
+
+Queries that can not be bound, e.g. because a value is ``None`` or a
+collection, are executed like :class:`silverberg.client.CQLClient` does.
+"""
+
+import calendar
+import re
+import struct
+from datetime import datetime
+from uuid import UUID
+from weakref import WeakKeyDictionary
+
+from silverberg.cassandra import ttypes
+from silverberg.client import CQLClient
+from silverberg.cluster import RoundRobinCassandraCluster
+from silverberg.marshal import unmarshallers
+
+from twisted.internet.defer import Deferred, maybeDeferred
+
+
+MAX_PREPARED_STATEMENTS = 1000
+"""
+Maximum number of templates prepared on a connection. Queries of other
+templates are not prepared.
+"""
+
+_param_re = re.compile(
+    r"USING TIMESTAMP (?P<ts>\d+)"
+    r"|(?<!strategy_options):(?P<name>[a-zA-Z_][a-zA-Z0-9_]*)")
+
+_marshal = 'org.apache.cassandra.db.marshal.'
+_reversed = _marshal + 'ReversedType('
+
+
+def parameterize(query, args):
+    """
+    Turn a query taking ``:name`` parameters into a template with bind
+    markers.
+
+    :param str query: Query as given to :meth:`CQLClient.execute`
+    :param dict args: Values of the query's parameters
+
+    :return: ``(template, values)`` where ``values`` is the list of values to
+        bind to the markers in order, or ``None`` if a parameter has no
+        value or a value is not used by the query
+    """
+    values = []
+    used = set()
+
+    def bind(match):
+        if match.group('ts') is not None:
+            values.append(int(match.group('ts')))
+            return 'USING TIMESTAMP ?'
+        name = match.group('name')
+        if name not in args:
+            raise KeyError(name)
+        used.add(name)
+        values.append(args[name])
+        return '?'
+
+    try:
+        template = _param_re.sub(bind, query)
+    except KeyError:
+        return None
+    if len(used) != len(args):
+        return None
+    return template, values
+
+
+def _text(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, str):
+        return value
+    raise TypeError(value)
+
+
+def _bytes(value):
+    if isinstance(value, str):
+        return value
+    raise TypeError(value)
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return '\x01' if value else '\x00'
+    raise TypeError(value)
+
+
+def _varint(value):
+    if not isinstance(value, (int, long)) or isinstance(value, bool):
+        raise TypeError(value)
+    length = 1
+    while not -(1 << (8 * length - 1)) <= value < (1 << (8 * length - 1)):
+        length += 1
+    return ''.join(chr((value >> (8 * i)) & 0xff)
+                   for i in reversed(range(length)))
+
+
+def _struct(fmt):
+    def pack(value):
+        if isinstance(value, bool):
+            raise TypeError(value)
+        return struct.pack(fmt, value)
+    return pack
+
+
+def _timestamp(value):
+    if isinstance(value, datetime):
+        value = (calendar.timegm(value.utctimetuple()) * 1000 +
+                 value.microsecond // 1000)
+    return _struct('>q')(value)
+
+
+def _uuid(value):
+    if isinstance(value, UUID):
+        return value.bytes
+    raise TypeError(value)
+
+
+_serializers = {
+    _marshal + 'AsciiType': _text,
+    _marshal + 'UTF8Type': _text,
+    _marshal + 'BytesType': _bytes,
+    _marshal + 'BooleanType': _boolean,
+    _marshal + 'IntegerType': _varint,
+    _marshal + 'Int32Type': _struct('>i'),
+    _marshal + 'LongType': _struct('>q'),
+    _marshal + 'CounterColumnType': _struct('>q'),
+    _marshal + 'DateType': _timestamp,
+    _marshal + 'TimestampType': _timestamp,
+    _marshal + 'DoubleType': _struct('>d'),
+    _marshal + 'UUIDType': _uuid,
+    _marshal + 'TimeUUIDType': _uuid,
+}
+
+
+def serialize(variable_type, value):
+    """
+    Serialize a value bound to a marker of the given Cassandra type.
+
+    :raise: ``TypeError`` if values of the type can not be serialized or the
+        value is not of the type
+    """
+    if variable_type.startswith(_reversed):
+        variable_type = variable_type[len(_reversed):-1]
+    if value is None or variable_type not in _serializers:
+        raise TypeError(value)
+    try:
+        return _serializers[variable_type](value)
+    except struct.error:
+        raise TypeError(value)
+
+
+def _is_not_found(failure):
+    """
+    Is the failure Cassandra not knowing a prepared statement, which happens
+    when it evicted it from its cache?
+    """
+    return (failure.check(ttypes.InvalidRequestException) and
+            'not found' in (failure.value.why or ''))
+
+
+class PreparingCQLClient(CQLClient):
+    """
+    :class:`CQLClient` that executes queries as statements prepared once per
+    connection.
+
+    :param int max_statements: Maximum number of templates prepared on a
+        connection
+
+    Other arguments are those of :class:`CQLClient`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.max_statements = kwargs.pop('max_statements',
+                                         MAX_PREPARED_STATEMENTS)
+        super(PreparingCQLClient, self).__init__(*args, **kwargs)
+        # thrift client of connection -> {template: CqlPreparedResult}
+        self._statements = WeakKeyDictionary()
+
+    def execute(self, query, args, consistency):
+        """
+        See :meth:`silverberg.client.CQLClient.execute`
+        """
+        parameterized = parameterize(query, args)
+        if parameterized is None:
+            return super(PreparingCQLClient, self).execute(
+                query, args, consistency)
+        template, values = parameterized
+        d = self._connection()
+        d.addCallback(self._execute_template, template, values, consistency,
+                      query, args)
+        return d
+
+    def _execute_template(self, client, template, values, consistency,
+                          query, args, retry=True):
+        """
+        Execute the prepared statement of a template on the connection of
+        ``client`` with the given values, or the query itself if it is not
+        prepared or the values can not be bound.
+
+        :param bool retry: Prepare the template again and retry if Cassandra
+            does not know the prepared statement
+        """
+        d = maybeDeferred(self._prepare, client, template)
+        d.addCallback(self._execute_prepared, client, template, values,
+                      consistency, query, args, retry)
+        return d
+
+    def _prepare(self, client, template):
+        """
+        Get the prepared statement of a template on the connection of
+        ``client``, preparing it if it has not been.
+
+        :return: ``CqlPreparedResult`` or ``Deferred`` of it, or ``None`` if
+            too many templates are prepared already
+        """
+        statements = self._statements.setdefault(client, {})
+        if template in statements:
+            return statements[template]
+        if len(statements) >= self.max_statements:
+            return None
+
+        def prepared(result):
+            statements[template] = result
+            return result
+
+        d = client.prepare_cql3_query(template, ttypes.Compression.NONE)
+        return d.addCallback(prepared)
+
+    def _execute_prepared(self, prepared, client, template, values,
+                          consistency, query, args, retry):
+        """See :meth:`_execute_template`."""
+        try:
+            if prepared is None or len(values) != prepared.count:
+                raise TypeError(values)
+            bound = map(serialize, prepared.variable_types, values)
+        except TypeError:
+            return super(PreparingCQLClient, self).execute(
+                query, args, consistency)
+
+        def not_found(failure):
+            if not (retry and _is_not_found(failure)):
+                return failure
+            self._statements.get(client, {}).pop(template, None)
+            d = self._connection()
+            d.addCallback(self._execute_template, template, values,
+                          consistency, query, args, retry=False)
+            return d
+
+        d = client.execute_prepared_cql3_query(
+            prepared.itemId, bound, consistency)
+        if self._disconnect_on_cancel:
+            cancellable_d = Deferred(lambda d: self.disconnect())
+            d.chainDeferred(cancellable_d)
+            d = cancellable_d
+        d.addCallbacks(self._process_result, not_found)
+        return d
+
+    def _process_result(self, result):
+        """Get the rows, number or ``None`` a query resulted in."""
+        if result.type == ttypes.CqlResultType.ROWS:
+            return self._unmarshal_result(result.schema, result.rows,
+                                          unmarshallers)
+        elif result.type == ttypes.CqlResultType.INT:
+            return result.num
+        return None
+
+
+class PreparingCassandraCluster(RoundRobinCassandraCluster):
+    """
+    :class:`RoundRobinCassandraCluster` whose clients are
+    :class:`PreparingCQLClient`.
+    """
+
+    def __init__(self, seed_endpoints, keyspace, user=None, password=None,
+                 disconnect_on_cancel=False):
+        super(PreparingCassandraCluster, self).__init__(
+            [], keyspace, user, password, disconnect_on_cancel)
+        self._seed_clients = [
+            PreparingCQLClient(endpoint, keyspace, user, password,
+                               disconnect_on_cancel)
+            for endpoint in seed_endpoints]
@@ -0,0 +1,110 @@
+"""
+Consistent hashing, to distribute keys between nodes such that adding or
+removing a node moves only the keys it gains or loses.
+"""
+
+import os
+import socket
+from bisect import bisect
+from hashlib import md5
+
+
+DEFAULT_REPLICAS = 100
+"""Number of points a node of weight 1 has on a :obj:`HashRing`."""
+
+_MASK_64 = (1 << 64) - 1
+
+
+def _hash(s):
+    """Get a stable 64-bit hash of a string as an integer."""
+    return int(md5(s).hexdigest()[:16], 16)
+
+
+def jump_hash(key, num_buckets):
+    """
+    Map an integer key to one of ``num_buckets`` buckets with the jump
+    consistent hash of Lamping and Veach: when the number of buckets grows
+    from N to N + 1, only 1/(N + 1) of the keys move, all to the new bucket.
+
+    :param int key: Key to map. Only its lowest 64 bits are used.
+    :param int num_buckets: Number of buckets
+    :return: Bucket in ``range(num_buckets)``
+    """
+    key &= _MASK_64
+    bucket, jump = -1, 0
+    while jump < num_buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & _MASK_64
+        jump = int((bucket + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return bucket
+
+
+def format_member(name, weight=1):
+    """
+    Format the identifier of a weighted member of a :obj:`HashRing`.
+    """
+    return '{};weight={}'.format(name, weight)
+
+
+def parse_member(member):
+    """
+    Parse a member identifier formatted by :func:`format_member` into
+    ``(name, weight)``. Identifiers without weight have weight 1.
+    """
+    name, sep, weight = member.rpartition(';weight=')
+    if not sep:
+        return member, 1
+    return name, int(weight)
+
+
+def default_member(weight=1):
+    """
+    Get identifier of this process as a member of a :obj:`HashRing`, in the
+    same ``{hostname}-{pid}`` form as Kazoo's default identifiers.
+    """
+    return format_member(
+        '{}-{}'.format(socket.getfqdn(), os.getpid()), weight)
+
+
+class HashRing(object):
+    """
+    A consistent-hash ring of members, each with ``replicas`` points per
+    unit of weight, where a key belongs to the member owning the first point
+    at or after the key's hash.
+
+    :param members: Member identifiers, as per :func:`parse_member`
+    :param int replicas: Points on the ring per unit of weight
+    """
+
+    def __init__(self, members, replicas=DEFAULT_REPLICAS):
+        points = sorted(
+            (_hash('{}-{}'.format(name, i)), member)
+            for member in set(members)
+            for name, weight in [parse_member(member)]
+            for i in range(replicas * weight))
+        self._hashes = [h for h, _ in points]
+        self._members = [member for _, member in points]
+
+    def member(self, key):
+        """
+        Get the member that ``key`` belongs to.
+
+        :raise: ``ValueError`` if the ring has no members.
+        """
+        if not self._hashes:
+            raise ValueError('No members in the ring')
+        i = bisect(self._hashes, _hash(str(key))) % len(self._hashes)
+        return self._members[i]
+
+
+def ring_partition_func(replicas=DEFAULT_REPLICAS):
+    """
+    Get a ``partition_func`` for Kazoo's ``SetPartitioner`` that distributes
+    partitions with a :obj:`HashRing` of the party's members, so that a
+    member joining or leaving takes or gives partitions only to the others
+    in proportion to their weights, instead of reshuffling all of them.
+    """
+    def partition(identifier, members, partitions):
+        ring = HashRing(members, replicas)
+        return [p for p in partitions if ring.member(p) == identifier]
+    return partition
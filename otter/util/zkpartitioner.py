@@ -22,7 +22,7 @@ class Partitioner(MultiService, object):
     """
     def __init__(self, kz_client, interval, partitioner_path, buckets,
                  time_boundary, log, got_buckets,
-                 clock=None):
+                 clock=None, partition_func=None, identifier=None):
         """
         :param log: a bound log
         :param kz_client: txKazoo client
@@ -34,6 +34,12 @@ class Partitioner(MultiService, object):
         :param got_buckets: Callable which will be called with a list of
             buckets when buckets have been allocated to this node.
         :param clock: clock to use for checking the buckets on an interval.
+        :param partition_func: Callable of (identifier, members, buckets)
+            returning the buckets of the member ``identifier``, used to
+            distribute buckets. Defaults to Kazoo's, which deals them out in
+            turn to the sorted members.
+        :param identifier: Identifier of this node among the members.
+            Defaults to Kazoo's ``{hostname}-{pid}``.
         """
         MultiService.__init__(self)
         self.kz_client = kz_client
@@ -42,6 +48,8 @@ class Partitioner(MultiService, object):
         self.log = log
         self.got_buckets = got_buckets
         self.time_boundary = time_boundary
+        self.partition_func = partition_func
+        self.identifier = identifier
         ts = TimerService(interval, self.check_partition)
         ts.setServiceParent(self)
         ts.clock = clock
@@ -55,6 +63,8 @@ class Partitioner(MultiService, object):
         return self.kz_client.SetPartitioner(
             self.partitioner_path,
             set=self.buckets,
+            partition_func=self.partition_func,
+            identifier=self.identifier,
             time_boundary=self.time_boundary)
 
     def startService(self):
@@ -20,7 +20,6 @@ from datetime import datetime
 from effect import Effect, Func, parallel
 from effect.do import do, do_return
 
-from toolz.curried import filter
 from toolz.itertoolz import concat
 
 import treq
@@ -104,6 +103,26 @@ def get_groups_of_tenants(log, store, tenant_ids):
     return d
 
 
+def get_valid_groups(store, pred=lambda group: True):
+    """
+    Return all valid groups for which ``pred`` returns True, scanning them a
+    batch at a time
+
+    :param store: Otter scaling group collection
+    :param callable pred: Called with each valid group's row
+
+    :return: Deferred fired with list of {"tenantId": .., "groupId": ..} dict
+    """
+    groups = []
+
+    def add_groups(batch):
+        groups.extend({"tenantId": g["tenantId"], "groupId": g["groupId"]}
+                      for g in batch if pred(g))
+
+    d = store.scan_valid_groups(add_groups)
+    return d.addCallback(lambda _: groups)
+
+
 def get_groups(parsed, store, conf):
     """
     Return groups based on argument provided
@@ -120,15 +139,13 @@ def get_groups(parsed, store, conf):
         return succeed(
             [{"tenantId": tid, "groupId": gid} for tid, gid in groups])
     elif parsed.all:
-        d = store.get_all_valid_groups()
+        d = get_valid_groups(store)
     elif parsed.tenant_id:
         d = get_groups_of_tenants(log, store, parsed.tenant_id)
     elif parsed.disabled_tenants:
-        non_conv_tenants = conf["non-convergence-tenants"]
-        d = store.get_all_valid_groups()
-        d.addCallback(
-            filter(lambda g: g["tenantId"] not in set(non_conv_tenants)))
-        d.addCallback(list)
+        non_conv_tenants = set(conf["non-convergence-tenants"])
+        d = get_valid_groups(
+            store, lambda g: g["tenantId"] not in non_conv_tenants)
     elif parsed.conf_conv_tenants:
         d = get_groups_of_tenants(log, store, conf["convergence-tenants"])
     else: